@@ -0,0 +1,81 @@
+"""
+Benchmark of deleting many selected students at once (school.records).
+
+Generates a school, then removes a block of students, as at the end of a
+term, once with ``delete_records`` (one set-based transaction) and, on a
+fresh copy, with one ``delete_record`` call per student as the apps used to
+do. Both runs move the students and their registrations to the Deleted
+tables and refill the freed seats from the waitlists.
+
+Usage::
+
+    python benchmarks/bulk_delete.py --students 50000 --delete 10000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school import synthetic
+from school.database import Database
+from school.records import delete_record, delete_records
+
+
+def selected(connection, count):
+    """
+    Returns the id and version of the first students, as a table selection would.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        count (int): Number of students.
+
+    Returns:
+        list: (id, version) tuples.
+    """
+    return connection.execute('SELECT id, version FROM Students ORDER BY id LIMIT ?', (count,)).fetchall()
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--students', type=int, default=50_000)
+    parser.add_argument('--delete', type=int, default=10_000, help='students removed at once')
+    parser.add_argument('--one-by-one', type=int, default=1000,
+                        help='students removed one call at a time, for comparison')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, 'bulk.db')
+        db = Database(db_name)
+        synthetic.generate(db.connection, args.students, args.students // 100, args.students // 50, seed=1)
+        db.close()
+        shutil.copy(db_name, db_name + '.copy')
+
+        db = Database(db_name)
+        rows = selected(db.connection, args.delete)
+        registrations = db.connection.execute('SELECT COUNT(*) FROM Registrations').fetchone()[0]
+        start = time.perf_counter()
+        delete_records(db.connection, 'Students', rows)
+        elapsed = time.perf_counter() - start
+        moved = registrations - db.connection.execute('SELECT COUNT(*) FROM Registrations').fetchone()[0]
+        db.close()
+        print(f'delete_records: {len(rows)} students and {moved} registrations in {elapsed:.3f}s')
+
+        db = Database(db_name + '.copy')
+        rows = selected(db.connection, args.one_by_one)
+        start = time.perf_counter()
+        for row_id, version in rows:
+            delete_record(db.connection, 'Students', row_id, version)
+        elapsed = time.perf_counter() - start
+        db.close()
+        print(f'delete_record one by one: {len(rows)} students in {elapsed:.3f}s '
+              f'({elapsed / len(rows) * args.delete:.1f}s for {args.delete})')
+
+
+if __name__ == '__main__':
+    main()
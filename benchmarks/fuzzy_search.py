@@ -0,0 +1,150 @@
+"""
+Benchmark of the typo-tolerant name search (school.fuzzy).
+
+Builds a database of N students whose names are drawn from lists of first
+and last names, including spelling variants, then times misspelt searches:
+
+* LIKE: the ``LOWER(name) LIKE '%...%'`` scan the apps used, which misses
+  every misspelling;
+* scan: the edit distance to every word of every name, on a sample;
+* fuzzy: fuzzy.search over the trigram index.
+
+Usage::
+
+    python benchmarks/fuzzy_search.py --students 500000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school import fuzzy
+from school.database import Database
+
+FIRST_NAMES = (
+    'Mohammed Mohamad Muhammad Mohamed Ahmad Ahmed Ali Omar Omer Youssef Yousef Joseph Hassan Hasan Hussein '
+    'Khaled Khalid Karim Kareem Rami Ramy Fadi Georges George Elie Elias Charbel Nour Noor Rana Lara Maya '
+    'Mia Sara Sarah Lina Leena Rita Reem Rim Hiba Heba Layla Leila Zeinab Zainab Fatima Fatme Mariam Maryam '
+    'Taline Tala Jad Jaad Ziad Ziyad Walid Waleed Samir Sameer Nadim Nadeem Anthony Antoine Michael Michel '
+    'Christopher Kristopher Catherine Katherine Kathryn Jonathan Johnathan Stephanie Stefanie Nicholas Nicolas'
+).split()
+LAST_NAMES = (
+    'Chehade Chehadeh Shehadeh Charaf Sharaf Haddad Hadad Khoury Khouri Nassar Nasser Saad Saade Saadeh '
+    'Abboud Aboud Haidar Haydar Hayder Salameh Salame Mansour Mansur Karam Kiram Daher Dahir Aoun Awn '
+    'Fakhoury Fakhouri Bitar Baytar Ghanem Ghanim Hamdan Hamdane Jaber Jabir Kassab Qassab Makdissi '
+    'Maqdisi Najjar Nadjar Rizk Rizq Sabbagh Sabagh Tannous Tanous Youness Younes Younis Zein Zain'
+).split()
+SYLLABLES = 'ba be da di fa ga ha ka ki la li ma mi na ni ra ri sa si ta ti wa ya za zi'.split()
+
+# Searches as a registrar might type them, most of them misspelt
+SEARCHES = (
+    'Mohamed', 'Mohamad Hadad', 'Kathrine', 'Chehadi', 'Jonathon', 'Stephany', 'Khouy',
+    'Youssif Nassar', 'Salamé', 'Nasser Mohammad',
+)
+
+
+def setup(db_name, students, seed=0):
+    """
+    Creates a database of students with realistic name repetition.
+
+    Besides the fixed lists, one in ten students gets a made-up surname, so
+    the vocabulary grows with the school as it does with real names.
+
+    Args:
+        db_name (str): The database file to create.
+        students (int): Number of students.
+        seed (int): Seed of the random names.
+    """
+    generator = random.Random(seed)
+
+    def last_name():
+        if generator.random() < 0.1:
+            return ''.join(generator.choice(SYLLABLES) for _ in range(generator.randint(2, 4))).capitalize()
+        return generator.choice(LAST_NAMES)
+
+    db = Database(db_name)
+    db.connection.executemany(
+        'INSERT INTO Students (name, age, email, student_id) VALUES (?, ?, ?, ?)',
+        ((f'{generator.choice(FIRST_NAMES)} {last_name()}', 20, f'student{i}@school.edu', f'S{i:07d}')
+         for i in range(students))
+    )
+    db.connection.commit()
+    db.close()
+
+
+def scan(connection, text, sample):
+    """
+    Compares a search with every word of the names of a sample of students.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        text (str): The search.
+        sample (int): Number of students scanned.
+
+    Returns:
+        int: The number of close names in the sample.
+    """
+    searched = fuzzy.words(text)
+    found = 0
+    for (name,) in connection.execute('SELECT name FROM Students LIMIT ?', (sample,)):
+        name_words = fuzzy.words(name)
+        if all(any(fuzzy.edit_distance(word, other, fuzzy.max_edits(word)) <= fuzzy.max_edits(word)
+                   for other in name_words) for word in searched):
+            found += 1
+    return found
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--students', type=int, default=500_000)
+    parser.add_argument('--sample', type=int, default=50_000, help='students compared one by one by the scan')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, 'fuzzy.db')
+        start = time.perf_counter()
+        setup(db_name, args.students)
+        db = Database(db_name)
+        connection = db.connection
+        words = connection.execute('SELECT COUNT(DISTINCT word) FROM NameWords').fetchone()[0]
+        print(f'Built and indexed {args.students} students ({words} distinct words) '
+              f'in {time.perf_counter() - start:.1f}s')
+
+        print(f"{'search':>18}{'LIKE ms':>10}{'found':>7}{'scan ms':>10}{'fuzzy ms':>10}{'found':>7}  top result")
+        timings = []
+        for text in SEARCHES:
+            start = time.perf_counter()
+            like = connection.execute('SELECT COUNT(*) FROM Students WHERE LOWER(name) LIKE ?',
+                                      (f'%{text.lower()}%',)).fetchone()[0]
+            like_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            scan(connection, text, args.sample)
+            # Scale the sample up to the whole table
+            scan_time = (time.perf_counter() - start) * args.students / min(args.sample, args.students)
+
+            start = time.perf_counter()
+            matches = fuzzy.search(connection, text, ('Students',), limit=50)
+            fuzzy_time = time.perf_counter() - start
+            timings.append(fuzzy_time)
+
+            top = '-'
+            if matches:
+                name = connection.execute('SELECT name FROM Students WHERE id = ?', (matches[0].row_id,)).fetchone()[0]
+                top = f'{name} ({matches[0].distance} mistakes)'
+            print(f'{text:>18}{like_time * 1000:>10.1f}{like:>7}{scan_time * 1000:>10.0f}'
+                  f'{fuzzy_time * 1000:>10.1f}{len(matches):>7}  {top}', flush=True)
+        print(f'fuzzy search: median {statistics.median(timings) * 1000:.1f} ms, '
+              f'worst {max(timings) * 1000:.1f} ms')
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark of the parallel CSV import (school.importer) for 1, 2, 4 and 8 workers.
+
+Writes a CSV export with R student rows (a few of them invalid), then for
+each worker count measures:
+
+* parse: splitting, parsing and validating the file on the worker
+  processes, which is the part that should scale with cores;
+* import: the whole pipeline into a fresh database, where the single writer
+  eventually becomes the limit.
+
+Usage::
+
+    python benchmarks/import_scaling.py --rows 5000000 --workers 1 2 4 8
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school.database import Database
+from school.exchange import EXPORT_HEADER
+from school.importer import byte_ranges, import_csv, parsed_ranges
+
+
+def write_export(file_name, rows):
+    """
+    Writes a CSV export of students in the Tkinter app's layout.
+
+    One row in a thousand has a bad age and one in 997 a bad email, so the
+    validation work is realistic.
+
+    Args:
+        file_name (str): The file to write.
+        rows (int): Number of student rows.
+    """
+    with open(file_name, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(EXPORT_HEADER)
+        for i in range(rows):
+            writer.writerow([
+                'Student', f'S{i:08d}', f'Student Number {i}',
+                18 + i % 30 if i % 1000 else 'unknown',
+                f'student.{i}@school.edu' if i % 997 else f'student.{i}.school.edu',
+            ])
+
+
+def time_parse(file_name, workers):
+    """
+    Times parsing and validating the file without writing it.
+
+    Args:
+        file_name (str): The CSV file.
+        workers (int): Number of worker processes.
+
+    Returns:
+        tuple: Elapsed seconds and the number of records parsed.
+    """
+    start = time.perf_counter()
+    records = sum(sum(map(len, batch.values())) + len(errors)
+                  for batch, errors, _ in parsed_ranges(file_name, byte_ranges(file_name), workers))
+    return time.perf_counter() - start, records
+
+
+def time_import(file_name, db_name, workers):
+    """
+    Times importing the file into a fresh database.
+
+    Args:
+        file_name (str): The CSV file.
+        db_name (str): The database file to create.
+        workers (int): Number of worker processes.
+
+    Returns:
+        tuple: Elapsed seconds and the number of records added.
+    """
+    db = Database(db_name)
+    start = time.perf_counter()
+    added = sum(counts['added'] for counts, _, _, _ in import_csv(db.connection, file_name, workers))
+    elapsed = time.perf_counter() - start
+    db.close()
+    os.remove(db_name)
+    return elapsed, added
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--skip-import', action='store_true', help='only time parsing and validation')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'export.csv')
+        start = time.perf_counter()
+        write_export(file_name, args.rows)
+        print(f'Wrote {args.rows} rows ({os.path.getsize(file_name) / 2 ** 20:.0f} MiB) '
+              f'in {time.perf_counter() - start:.1f}s; {os.cpu_count()} CPUs available')
+
+        print(f"{'workers':>8}{'parse s':>10}{'rows/s':>12}{'speedup':>9}"
+              f"{'import s':>10}{'rows/s':>12}{'speedup':>9}")
+        base_parse = base_import = None
+        for workers in args.workers:
+            parse_time, records = time_parse(file_name, workers)
+            base_parse = base_parse or parse_time
+            line = f'{workers:>8}{parse_time:>10.2f}{records / parse_time:>12.0f}{base_parse / parse_time:>9.2f}'
+            if not args.skip_import:
+                import_time, added = time_import(file_name, os.path.join(directory, 'import.db'), workers)
+                base_import = base_import or import_time
+                line += f'{import_time:>10.2f}{added / import_time:>12.0f}{base_import / import_time:>9.2f}'
+            print(line, flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Load test for the HTTP/JSON server (school.server).
+
+Starts the server on a fresh seeded database (or targets a running one with
+``--url``), then opens C keep-alive client connections that send a mix of
+reads and registrations for a fixed duration. Prints throughput and latency
+percentiles per request kind, and checks afterwards that every course's
+enrolled count still matches its registrations.
+
+Usage::
+
+    python benchmarks/load_test.py --clients 50 --seconds 10 --writes 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from school.database import Database
+
+
+def setup(db_name, students, courses, capacity):
+    """
+    Creates a fresh database with students and capacity-limited courses.
+
+    Args:
+        db_name (str): The database file to create.
+        students (int): Number of students.
+        courses (int): Number of courses.
+        capacity (int): Capacity of every course.
+    """
+    db = Database(db_name)
+    db.connection.executemany(
+        'INSERT INTO Students (name, age, email, student_id) VALUES (?, ?, ?, ?)',
+        ((f'Student {i}', 20, f'student{i}@school.edu', f'S{i:05d}') for i in range(students))
+    )
+    db.connection.executemany(
+        'INSERT INTO Courses (course_id, course_name, capacity) VALUES (?, ?, ?)',
+        ((f'C{i:03d}', f'Course {i}', capacity) for i in range(courses))
+    )
+    db.connection.commit()
+    db.close()
+
+
+async def request(reader, writer, method, path, body=None):
+    """
+    Sends one request on a keep-alive connection and reads the response.
+
+    Args:
+        reader (asyncio.StreamReader): The response stream.
+        writer (asyncio.StreamWriter): The request stream.
+        method (str): The HTTP method.
+        path (str): The request target.
+        body (dict, optional): The JSON body.
+
+    Returns:
+        tuple: The status code and the decoded JSON payload.
+    """
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: load-test\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(data)}\r\n\r\n'.encode() + data
+    )
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = next(int(line.split(':', 1)[1]) for line in lines if line.lower().startswith('content-length'))
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, seed, deadline, write_ratio, students, courses, timings, errors):
+    """
+    Sends requests until the deadline and records their latencies.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        seed (int): Random seed of this client.
+        deadline (float): perf_counter() value at which to stop.
+        write_ratio (float): Fraction of requests that are registrations or drops.
+        students (int): Number of students in the database.
+        courses (int): Number of courses in the database.
+        timings (dict): Request kind -> list of latencies, filled in.
+        errors (dict): Status code -> count of unexpected responses, filled in.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    while time.perf_counter() < deadline:
+        student = f'S{rng.randrange(students):05d}'
+        course = f'C{rng.randrange(courses):03d}'
+        choice = rng.random()
+        if choice < write_ratio * 0.75:
+            kind, method, path, body = 'register', 'POST', '/registrations', {'student': student, 'course': course}
+        elif choice < write_ratio:
+            kind, method, path, body = 'drop', 'DELETE', f'/registrations?student={student}&course={course}', None
+        elif choice < write_ratio + (1 - write_ratio) / 2:
+            kind, method, path, body = 'get course', 'GET', f'/courses/{course}', None
+        else:
+            kind, method, path, body = 'list registrations', 'GET', f'/registrations?student={student}', None
+
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, method, path, body)
+        timings.setdefault(kind, []).append(time.perf_counter() - start)
+        # Dropping a pair that was never registered is an expected 404
+        if status >= 400 and not (kind == 'drop' and status == 404):
+            errors[status] = errors.get(status, 0) + 1
+    writer.close()
+
+
+async def wait_for_server(host, port, timeout=10.0):
+    """
+    Waits until the server accepts connections.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        timeout (float): Seconds to wait before giving up.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run(args, host, port):
+    """
+    Runs all clients and returns their measurements.
+
+    Args:
+        args (argparse.Namespace): The command line arguments.
+        host (str): The server host.
+        port (int): The server port.
+
+    Returns:
+        tuple: The timings, the errors and the elapsed time.
+    """
+    await wait_for_server(host, port)
+    timings, errors = {}, {}
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    await asyncio.gather(*(
+        client(host, port, seed, deadline, args.writes, args.students, args.courses, timings, errors)
+        for seed in range(args.clients)
+    ))
+    return timings, errors, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    """
+    Returns a percentile of sorted values.
+
+    Args:
+        values (list): The sorted values.
+        fraction (float): The percentile between 0 and 1.
+
+    Returns:
+        float: The value at that percentile.
+    """
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def report(timings, errors, elapsed):
+    """
+    Prints throughput and latency percentiles per request kind.
+
+    Args:
+        timings (dict): Request kind -> list of latencies.
+        errors (dict): Status code -> count of unexpected responses.
+        elapsed (float): Duration of the run in seconds.
+    """
+    total = sum(len(values) for values in timings.values())
+    print(f'{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)')
+    print(f"{'kind':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, values in sorted(timings.items()):
+        values.sort()
+        print(f'{kind:<20}{len(values):>8}'
+              f'{percentile(values, 0.50) * 1000:>10.2f}'
+              f'{percentile(values, 0.95) * 1000:>10.2f}'
+              f'{percentile(values, 0.99) * 1000:>10.2f}')
+    for status, count in sorted(errors.items()):
+        print(f'{count} unexpected responses with status {status}')
+
+
+def verify(db_name):
+    """
+    Checks that every course's enrolled count matches its registrations.
+
+    Args:
+        db_name (str): The database file.
+
+    Returns:
+        list: Descriptions of the broken invariants.
+    """
+    connection = sqlite3.connect(db_name)
+    problems = [
+        f'{course_id}: enrolled count {enrolled} but {actual} registrations'
+        for course_id, enrolled, actual in connection.execute('''
+            SELECT c.course_id, c.enrolled, (SELECT COUNT(*) FROM Registrations r WHERE r.course_id = c.id)
+            FROM Courses c
+        ''')
+        if enrolled != actual
+    ]
+    connection.close()
+    return problems
+
+
+def main():
+    """
+    Parses the command line, starts the server if needed and runs the load test.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--writes', type=float, default=0.2, help='fraction of write requests')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=50)
+    parser.add_argument('--capacity', type=int, default=30)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help='host:port of a running server seeded the same way')
+    args = parser.parse_args()
+
+    if args.url:
+        host, port = args.url.rsplit(':', 1)
+        report(*asyncio.run(run(args, host, int(port))))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, 'load.db')
+        setup(db_name, args.students, args.courses, args.capacity)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'school.server', '--db', db_name,
+             '--port', str(args.port), '--readers', str(args.readers)],
+            cwd=ROOT, stdout=subprocess.DEVNULL
+        )
+        try:
+            timings, errors, elapsed = asyncio.run(run(args, '127.0.0.1', args.port))
+        finally:
+            server.terminate()
+            server.wait()
+        report(timings, errors, elapsed)
+        problems = verify(db_name)
+
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if problems or errors:
+        sys.exit(1)
+    print('OK: enrolled counts match registrations')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark of the roster reports (school.reports) against per-course lookups.
+
+Builds a database with S students, C courses and R registrations per
+student, then writes the roster of every course to one file per course:
+
+* per course: the course list, then one query for each course's instructor
+  and one for its students, as a GUI would do it;
+* streaming: reports.rosters, one ordered join grouped in Python.
+
+Time and peak Python memory (tracemalloc) are printed for both; the time
+is taken on a run without tracemalloc, which slows every allocation.
+
+Usage::
+
+    python benchmarks/report_generation.py --students 100000 --courses 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school import reports
+from school.database import Database
+
+
+def setup(db_name, students, courses, per_student, seed=0):
+    """
+    Creates a database of students registered into random courses.
+
+    Args:
+        db_name (str): The database file to create.
+        students (int): Number of students.
+        courses (int): Number of courses.
+        per_student (int): Courses per student.
+        seed (int): Seed of the random course choice.
+    """
+    db = Database(db_name)
+    connection = db.connection
+    connection.executemany(
+        'INSERT INTO Instructors (name, age, email, instructor_id) VALUES (?, ?, ?, ?)',
+        ((f'Instructor {i}', 40, f'instructor{i}@school.edu', f'I{i:05d}') for i in range(max(1, courses // 3)))
+    )
+    connection.executemany(
+        'INSERT INTO Courses (course_id, course_name, instructor_id) VALUES (?, ?, ?)',
+        ((f'C{i:05d}', f'Course {i}', 1 + i % max(1, courses // 3)) for i in range(courses))
+    )
+    connection.executemany(
+        'INSERT INTO Students (name, age, email, student_id) VALUES (?, ?, ?, ?)',
+        ((f'Student {i}', 20, f'student{i}@school.edu', f'S{i:07d}') for i in range(students))
+    )
+    generator = random.Random(seed)
+    connection.executemany(
+        'INSERT OR IGNORE INTO Registrations (student_id, course_id) VALUES (?, ?)',
+        ((student, course) for student in range(1, students + 1)
+         for course in generator.sample(range(1, courses + 1), per_student))
+    )
+    connection.commit()
+    db.close()
+
+
+def per_course_rosters(connection):
+    """
+    Builds the rosters with one instructor and one student query per course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Yields:
+        Report: One per course, like reports.rosters.
+    """
+    for course_row, course_id, course_name, term, instructor_row in connection.execute(
+            'SELECT id, course_id, course_name, term, instructor_id FROM Courses ORDER BY course_id').fetchall():
+        instructor = connection.execute('SELECT name FROM Instructors WHERE id = ?', (instructor_row,)).fetchone()
+        students = connection.execute('''
+            SELECT s.student_id, s.name, s.email FROM Registrations r JOIN Students s ON s.id = r.student_id
+            WHERE r.course_id = ? ORDER BY s.name, s.student_id
+        ''', (course_row,)).fetchall()
+        title = f'{course_id} {course_name} - instructor: {instructor[0] if instructor else "unassigned"}'
+        yield reports.Report(course_id, title, ('Student ID', 'Name', 'Email'), students)
+
+
+def measure(generate, connection, directory):
+    """
+    Writes every roster to its own file, once timed and once traced.
+
+    Args:
+        generate (callable): Function returning the report stream.
+        connection (sqlite3.Connection): An open database connection.
+        directory (str): The output directory.
+
+    Returns:
+        tuple: Elapsed seconds, files written and peak traced memory in bytes.
+    """
+    start = time.perf_counter()
+    files = reports.write_report_files(generate(connection), 'csv', directory)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    reports.write_report_files(generate(connection), 'csv', directory)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, files, peak
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--students', type=int, default=100_000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--per-student', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, 'reports.db')
+        start = time.perf_counter()
+        setup(db_name, args.students, args.courses, args.per_student)
+        print(f'Built {args.students} students x {args.per_student} courses of {args.courses} '
+              f'in {time.perf_counter() - start:.1f}s')
+
+        db = Database(db_name)
+        print(f"{'method':>12}{'seconds':>10}{'files':>8}{'peak MiB':>10}")
+        for label, generate in (('per course', per_course_rosters), ('streaming', reports.rosters)):
+            elapsed, files, peak = measure(generate, db.connection, os.path.join(directory, label.replace(' ', '_')))
+            print(f'{label:>12}{elapsed:>10.2f}{files:>8}{peak / 2 ** 20:>10.1f}', flush=True)
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
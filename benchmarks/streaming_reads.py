@@ -0,0 +1,112 @@
+"""
+Benchmark of the streaming reads (school.queries) against fetchall.
+
+Builds databases of growing size and walks the whole Students table and the
+whole directory, both with ``cursor.fetchall()`` and with the fetchmany
+generators. The time is taken on a run without tracemalloc, and the peak
+Python memory (tracemalloc) on a second run; the peak of the generators
+should stay the same however many students there are.
+
+Usage::
+
+    python benchmarks/streaming_reads.py --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school import queries
+from school.database import Database
+
+
+def setup(db_name, students):
+    """
+    Creates a database of students.
+
+    Args:
+        db_name (str): The database file to create.
+        students (int): Number of students.
+    """
+    db = Database(db_name)
+    db.connection.executemany(
+        'INSERT INTO Students (name, age, email, student_id) VALUES (?, ?, ?, ?)',
+        ((f'Student {i}', 20, f'student{i}@school.edu', f'S{i:07d}') for i in range(students))
+    )
+    db.connection.commit()
+    db.close()
+
+
+def walk(rows):
+    """
+    Consumes rows the way an export does, keeping none of them.
+
+    Args:
+        rows (iterable): The rows.
+
+    Returns:
+        int: The number of rows.
+    """
+    count = 0
+    for count, _ in enumerate(rows, start=1):
+        pass
+    return count
+
+
+def measure(read, connection):
+    """
+    Walks one read once timed and once traced.
+
+    Args:
+        read (callable): Function returning the rows of a connection.
+        connection (sqlite3.Connection): An open database connection.
+
+    Returns:
+        tuple: Elapsed seconds, rows read and peak traced memory in bytes.
+    """
+    start = time.perf_counter()
+    count = walk(read(connection))
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    walk(read(connection))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, count, peak
+
+
+# The reads compared: label and function of a connection
+READS = (
+    ('students fetchall', lambda connection: connection.execute(
+        'SELECT name, age, email, student_id, id, version FROM Students').fetchall()),
+    ('iter_students', queries.iter_students),
+    ('directory fetchall', lambda connection: connection.execute(
+        'SELECT type, record_id, name, age, email FROM Directory ORDER BY kind, row_id').fetchall()),
+    ('iter_directory', queries.iter_directory),
+)
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    print(f"{'students':>10}{'read':>20}{'seconds':>10}{'rows':>10}{'peak MiB':>10}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            db_name = os.path.join(directory, 'streaming.db')
+            setup(db_name, size)
+            db = Database(db_name)
+            for label, read in READS:
+                elapsed, count, peak = measure(read, db.connection)
+                print(f'{size:>10}{label:>20}{elapsed:>10.2f}{count:>10}{peak / 2 ** 20:>10.2f}', flush=True)
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Stress test for several app instances sharing one database file.
+
+Spawns N processes that hammer the same database with registrations, drops
+and versioned updates, then checks that:
+
+* no operation failed with ``database is locked``,
+* every course's enrolled count matches its Registrations rows and never
+  exceeds its capacity,
+* the versioned counter updates lost nothing (each successful update is
+  reflected exactly once).
+
+Usage::
+
+    python benchmarks/stress_registrations.py --processes 8 --operations 300
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school.concurrency import ConflictError
+from school.database import Database
+from school.records import update_student
+from school.registration import drop, register
+
+
+def setup(db_name, students, courses, capacity):
+    """
+    Creates a fresh database with students and capacity-limited courses.
+
+    Args:
+        db_name (str): The database file to create.
+        students (int): Number of students.
+        courses (int): Number of courses.
+        capacity (int): Capacity of every course.
+    """
+    db = Database(db_name)
+    db.connection.executemany(
+        'INSERT INTO Students (name, age, email, student_id) VALUES (?, ?, ?, ?)',
+        ((f'Student {i}', 0, f'student{i}@school.edu', f'S{i:05d}') for i in range(students))
+    )
+    db.connection.executemany(
+        'INSERT INTO Courses (course_id, course_name, capacity) VALUES (?, ?, ?)',
+        ((f'C{i:03d}', f'Course {i}', capacity) for i in range(courses))
+    )
+    db.connection.commit()
+    db.close()
+
+
+def worker(db_name, seed, operations, students, courses):
+    """
+    Runs random registrations, drops and versioned age increments.
+
+    Args:
+        db_name (str): The shared database file.
+        seed (int): Random seed of this worker.
+        operations (int): Number of operations to run.
+        students (int): Number of students in the database.
+        courses (int): Number of courses in the database.
+
+    Returns:
+        dict: Counts of increments, conflicts and lock errors.
+    """
+    rng = random.Random(seed)
+    db = Database(db_name)
+    connection = db.connection
+    stats = {'increments': 0, 'conflicts': 0, 'locked': 0}
+    for _ in range(operations):
+        student = rng.randint(1, students)
+        try:
+            choice = rng.random()
+            if choice < 0.5:
+                register(connection, student, rng.randint(1, courses))
+            elif choice < 0.7:
+                drop(connection, student, rng.randint(1, courses))
+            else:
+                # Read-modify-write of a shared counter, retried on conflict
+                while True:
+                    name, age, email, version = connection.execute(
+                        'SELECT name, age, email, version FROM Students WHERE id = 1'
+                    ).fetchone()
+                    connection.commit()
+                    try:
+                        update_student(connection, 1, version, name, age + 1, email)
+                        stats['increments'] += 1
+                        break
+                    except ConflictError:
+                        stats['conflicts'] += 1
+        except sqlite3.OperationalError as e:
+            stats['locked'] += 1
+            print(f'worker {seed}: {e}', file=sys.stderr)
+    db.close()
+    return stats
+
+
+def verify(db_name):
+    """
+    Checks the invariants of the database after the run.
+
+    Args:
+        db_name (str): The shared database file.
+
+    Returns:
+        list: Descriptions of the broken invariants.
+    """
+    connection = sqlite3.connect(db_name)
+    problems = []
+    for course_id, capacity, enrolled, actual in connection.execute('''
+        SELECT c.course_id, c.capacity, c.enrolled,
+               (SELECT COUNT(*) FROM Registrations r WHERE r.course_id = c.id)
+        FROM Courses c
+    '''):
+        if enrolled != actual:
+            problems.append(f'{course_id}: enrolled count {enrolled} but {actual} registrations')
+        if capacity is not None and actual > capacity:
+            problems.append(f'{course_id}: {actual} registrations exceed capacity {capacity}')
+    connection.close()
+    return problems
+
+
+def main():
+    """
+    Parses the command line and runs the stress test.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=300)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--capacity', type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, 'stress.db')
+        setup(db_name, args.students, args.courses, args.capacity)
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(worker, [
+                (db_name, seed, args.operations, args.students, args.courses)
+                for seed in range(args.processes)
+            ])
+        elapsed = time.perf_counter() - start
+
+        increments = sum(result['increments'] for result in results)
+        conflicts = sum(result['conflicts'] for result in results)
+        locked = sum(result['locked'] for result in results)
+        problems = verify(db_name)
+
+        connection = sqlite3.connect(db_name)
+        counter = connection.execute('SELECT age FROM Students WHERE id = 1').fetchone()[0]
+        connection.close()
+        if counter != increments:
+            problems.append(f'lost updates: counter is {counter} after {increments} increments')
+        if locked:
+            problems.append(f'{locked} operations failed with a lock error')
+
+    total = args.processes * args.operations
+    print(f'{total} operations from {args.processes} processes in {elapsed:.2f}s '
+          f'({total / elapsed:.0f} ops/s), {conflicts} version conflicts retried')
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if problems:
+        sys.exit(1)
+    print('OK: no lost updates, no lock errors, capacities respected')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,96 +1,103 @@
 import sys
 import json
+import queue
 import re
 import sqlite3
+from itertools import islice
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QLineEdit, QPushButton, QComboBox,
     QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QGridLayout, QMenuBar,
-    QMenu, QAction, QMessageBox, QStackedWidget, QFileDialog
+    QMenu, QAction, QMessageBox, QStackedWidget, QFileDialog, QDialog, QPlainTextEdit
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5 import QtGui
 from SchoolStructs import *  # Assuming this is a custom module containing validation functions
+from school.archive import check_term
+from school.assignment import assign_instructor, auto_assign, read_preferences_csv, set_preferences
+from school.changes import ChangeWatcher, latest_token
+from school.concurrency import ConflictError
+from school.database import Database
+from school.queries import (
+    BATCH_SIZE, SearchCache, changed_rows, iter_course_names, iter_courses, iter_instructors, iter_students,
+    normalize_search
+)
+from school.records import delete_records
+from school.schedule import parse_slots, format_slots, set_course_slots, schedule_map
+from school.registration import (
+    REGISTERED, WAITLISTED, ALREADY_WAITLISTED, SCHEDULE_CONFLICT, parse_keys, read_pairs_csv, register_pairs, summarize,
+    register, drop, set_capacity, waitlist_position
+)
+
+# Milliseconds between two looks at the rows the change watcher found changed
+CHANGE_POLL_MS = 250
 
-# Database initialization and operations
-class Database:
+# Validation functions (assumed to be in SchoolStructs.py)
+# You might have functions like validate_email, validate_age, etc.
+
+def selected_records(table):
     """
-    Handles the database operations for the School Management System.
+    Returns the id and version of every selected row of a table.
+
+    Args:
+        table (QTableWidget): A table whose first column holds the
+            ``(id, version)`` of each row under Qt.UserRole.
+
+    Returns:
+        list: (id, version) tuples, one per selected row, top to bottom.
     """
-    def __init__(self, db_name='school.db'):
-        """
-        Initializes the Database object and creates tables if they don't exist.
+    rows = sorted({item.row() for item in table.selectedItems()})
+    return [table.item(row, 0).data(Qt.UserRole) for row in rows]
 
-        Args:
-            db_name (str): The name of the database file.
-        """
-        # Connect to the SQLite database (or create it if it doesn't exist)
-        self.connection = sqlite3.connect(db_name)
-        # Create the necessary tables
-        self.create_tables()
-
-    def create_tables(self):
-        """
-        Creates the necessary tables in the database if they do not already exist.
-        """
-        # Create a cursor object to execute SQL commands
-        cursor = self.connection.cursor()
-
-        # Create Students table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Students (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                student_id TEXT UNIQUE NOT NULL
-            )
-        ''')
-
-        # Create Instructors table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Instructors (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                instructor_id TEXT UNIQUE NOT NULL
-            )
-        ''')
-
-        # Create Courses table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Courses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                course_id TEXT UNIQUE NOT NULL,
-                course_name TEXT NOT NULL,
-                instructor_id INTEGER,
-                FOREIGN KEY (instructor_id) REFERENCES Instructors(id)
-            )
-        ''')
-
-        # Create Registrations table (for many-to-many relationship between Students and Courses)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Registrations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                course_id INTEGER NOT NULL,
-                FOREIGN KEY (student_id) REFERENCES Students(id),
-                FOREIGN KEY (course_id) REFERENCES Courses(id),
-                UNIQUE(student_id, course_id)
-            )
-        ''')
-
-        # Commit the changes to the database
-        self.connection.commit()
-
-    def close(self):
-        """
-        Closes the database connection.
-        """
-        self.connection.close()
 
-# Validation functions (assumed to be in SchoolStructs.py)
-# You might have functions like validate_email, validate_age, etc.
+def patch_rows(table, rows, append, set_row):
+    """
+    Replaces, removes and adds the rows of a table that changed in the database.
+
+    Args:
+        table (QTableWidget): A table whose first column holds the
+            ``(id, version)`` of each row under Qt.UserRole.
+        rows (dict): The current row of each changed id, or None for a row
+            that is gone.
+        append (bool): Add the rows the table does not show yet at the end,
+            when it lists the whole table rather than a search.
+        set_row (callable): Fills a row of the table, called as
+            set_row(row_number, row).
+    """
+    shown = set()
+    # Bottom up, so removing a row does not move the ones still to look at
+    for row_number in reversed(range(table.rowCount())):
+        row_id = table.item(row_number, 0).data(Qt.UserRole)[0]
+        if row_id in rows:
+            shown.add(row_id)
+            if rows[row_id] is None:
+                table.removeRow(row_number)
+            else:
+                set_row(row_number, rows[row_id])
+    if append:
+        for row_id, row in rows.items():
+            if row is not None and row_id not in shown:
+                row_number = table.rowCount()
+                table.insertRow(row_number)
+                set_row(row_number, row)
+
+
+def fetch_changed_rows(connection, changed):
+    """
+    Reads the rows other registrars changed, in the thread of the change watcher.
+
+    Args:
+        connection (sqlite3.Connection): The watcher's connection.
+        changed (dict): Sets of changed ids keyed by table name.
+
+    Returns:
+        tuple: The rows from school.queries.changed_rows, and the meeting
+            times of the changed courses keyed by ``Courses.id``.
+    """
+    rows = changed_rows(connection, changed)
+    schedules = schedule_map(connection, [course for course, row in rows.get('Courses', {}).items()
+                                          if row is not None])
+    return rows, schedules
+
 
 # Data models
 class Person:
@@ -159,7 +166,7 @@ class Course:
     """
     Represents a course.
     """
-    def __init__(self, course_id: str, course_name: str, instructor_id=None):
+    def __init__(self, course_id: str, course_name: str, instructor_id=None, capacity=None, time_slots=None, term=None):
         """
         Initializes a Course object.
 
@@ -167,10 +174,19 @@ class Course:
             course_id (str): The unique course ID.
             course_name (str): The name of the course.
             instructor_id (int, optional): The ID of the instructor teaching the course.
+            capacity (int, optional): The maximum number of registered students, None for unlimited.
+            time_slots (list, optional): The weekly meeting times as TimeSlot objects.
+            term (str, optional): The term the course is taught in, such as '2025-3'.
         """
+        # Validate capacity (must be a non-negative integer when given)
+        if capacity is not None and not validate_age(capacity):
+            raise ValueError("Capacity must be a non-negative integer.")
         self.course_id = course_id
         self.course_name = course_name
         self.instructor_id = instructor_id
+        self.capacity = capacity
+        self.time_slots = list(time_slots or [])
+        self.term = check_term(term) if term else None
 
 # Main application window
 class MainWindow(QMainWindow):
@@ -188,6 +204,10 @@ class MainWindow(QMainWindow):
 
         # Initialize the database
         self.db = Database()
+        # Results of recent searches, shared by the pages
+        self.search_cache = SearchCache()
+        # Follows the changes other registrars commit from the moment the tables are first loaded
+        self.watcher = ChangeWatcher(self.db.db_name, fetch_changed_rows, latest_token(self.db.connection))
 
         # Create a central widget
         self.central_widget = QWidget()
@@ -215,6 +235,12 @@ class MainWindow(QMainWindow):
         # Set up the menu bar
         self.setup_menu_bar()
 
+        # Patch the tables with the rows other registrars change, without reloading them
+        self.watcher.start()
+        self.change_timer = QTimer(self)
+        self.change_timer.timeout.connect(self.apply_changes)
+        self.change_timer.start(CHANGE_POLL_MS)
+
         # Start by showing the home page
         self.stacked_widget.setCurrentWidget(self.home_page)
 
@@ -298,10 +324,38 @@ class MainWindow(QMainWindow):
         Args:
             event (QCloseEvent): The close event.
         """
-        # Close the database connection before exiting
+        # Close the database connections before exiting
+        self.change_timer.stop()
+        self.watcher.stop()
         self.db.close()
         event.accept()
 
+    def apply_changes(self):
+        """
+        Patches the tables of the pages with the rows the change watcher found changed.
+
+        The watcher reads the rows in its own thread, so this only updates
+        the widgets. When it asks for a reload instead, each page runs again
+        whatever its table shows.
+        """
+        while True:
+            try:
+                update = self.watcher.updates.get_nowait()
+            except queue.Empty:
+                return
+            if update is None:
+                self.student_page.refresh_table()
+                self.instructor_page.refresh_table()
+                self.course_page.refresh_table()
+                continue
+            rows, schedules = update
+            if 'Students' in rows:
+                self.student_page.patch_students(rows['Students'])
+            if 'Instructors' in rows:
+                self.instructor_page.patch_instructors(rows['Instructors'])
+            if 'Courses' in rows:
+                self.course_page.patch_courses(rows['Courses'], schedules)
+
 # Home Page
 class HomePage(QWidget):
     """
@@ -462,48 +516,88 @@ class StudentPage(QWidget):
         """
         Loads student data from the database into the table.
         """
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('SELECT name, age, email, student_id FROM Students')
-        students = cursor.fetchall()
+        # New students of other registrars are added only while every student is listed
+        self.showing_all = True
+        self.show_students(iter_students(self.parent.db.connection))
+
+    def refresh_table(self):
+        """
+        Runs again the listing or the search the table shows.
+        """
+        if self.showing_all:
+            self.load_students()
+        else:
+            self.search_student_table()
+
+    def show_students(self, students):
+        """
+        Fills the student table, remembering the id and version of each row.
+
+        Args:
+            students (iterable): Student rows whose last two columns are the id and version.
+        """
         self.student_table.setRowCount(0)
         for row_data in students:
             row_number = self.student_table.rowCount()
             self.student_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.student_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+            self.set_student_row(row_number, row_data)
+
+    def set_student_row(self, row_number, row_data):
+        """
+        Fills one row of the student table.
+
+        Args:
+            row_number (int): The row of the table.
+            row_data (tuple): A student row whose last two columns are the id and version.
+        """
+        for column_number, data in enumerate(row_data[:-2]):
+            self.student_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        # The version lets deletes detect changes made by other registrars
+        self.student_table.item(row_number, 0).setData(Qt.UserRole, tuple(row_data[-2:]))
+
+    def patch_students(self, rows):
+        """
+        Updates the student table with the students other registrars changed.
+
+        Args:
+            rows (dict): The current StudentRow of each changed id, or None
+                for a deleted student.
+        """
+        patch_rows(self.student_table, rows, self.showing_all, self.set_student_row)
 
     def search_student_table(self):
         """
         Searches for students based on the query and updates the table.
+
+        Names containing the query come first, then names within a few
+        typing mistakes of it. A search repeated with no student changed
+        in between is shown from memory.
         """
-        query = self.student_search_entry.text().lower()
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('''
-            SELECT name, age, email, student_id FROM Students
-            WHERE LOWER(name) LIKE ? OR LOWER(student_id) LIKE ?
-        ''', ('%' + query + '%', '%' + query + '%'))
-        students = cursor.fetchall()
-        self.student_table.setRowCount(0)
-        for row_data in students:
-            row_number = self.student_table.rowCount()
-            self.student_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.student_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        query = normalize_search(self.student_search_entry.text())
+        connection = self.parent.db.connection
+        self.showing_all = False
+        self.show_students(self.parent.search_cache.search(
+            connection, ('Students',), ('students', query), lambda: iter_students(connection, query, fuzzy=True)))
 
     def delete_student_record(self):
         """
-        Deletes the selected student record from the database.
+        Deletes the selected student records from the database.
+
+        Any number of rows can be selected; they are deleted together, after
+        a confirmation when there are more than one.
         """
-        selected_items = self.student_table.selectedItems()
-        if selected_items:
-            selected_row = selected_items[0].row()
-            email_item = self.student_table.item(selected_row, 2)
-            email = email_item.text()
-            cursor = self.parent.db.connection.cursor()
+        records = selected_records(self.student_table)
+        if records:
+            if len(records) > 1 and QMessageBox.question(
+                    self, "Delete", f"Delete the {len(records)} selected students?") != QMessageBox.Yes:
+                return
             try:
-                cursor.execute('DELETE FROM Students WHERE email = ?', (email,))
-                self.parent.db.connection.commit()
-                QMessageBox.information(self, "Success", "Student record deleted.")
+                deleted = delete_records(self.parent.db.connection, 'Students', records)
+                QMessageBox.information(self, "Success", "Student record deleted." if deleted == 1
+                                        else f"{deleted} student records deleted.")
+                self.load_students()
+            except ConflictError as e:
+                QMessageBox.warning(self, "Conflict", f"{str(e)} The table has been reloaded.")
                 self.load_students()
             except sqlite3.Error as e:
                 QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
@@ -563,6 +657,12 @@ class InstructorPage(QWidget):
         form_layout.addWidget(instructor_id_label, 3, 0)
         form_layout.addWidget(self.instructor_id_entry, 3, 1)
 
+        # Maximum teaching load used by auto-assignment (optional)
+        max_courses_label = QLabel("Max Courses (optional):")
+        self.max_courses_entry = QLineEdit()
+        form_layout.addWidget(max_courses_label, 4, 0)
+        form_layout.addWidget(self.max_courses_entry, 4, 1)
+
         # Add form layout to main layout
         layout.addLayout(form_layout)
 
@@ -601,6 +701,14 @@ class InstructorPage(QWidget):
         self.assign_instructor_button.clicked.connect(self.assign_instructor_to_course)
         assign_layout.addWidget(self.assign_instructor_button, 2, 0, 1, 2)
 
+        # Automatic assignment of every unassigned course from the instructors' ranked preferences
+        self.import_preferences_button = QPushButton("Import Teaching Preferences...")
+        self.import_preferences_button.clicked.connect(self.import_preferences)
+        assign_layout.addWidget(self.import_preferences_button, 3, 0)
+        self.auto_assign_button = QPushButton("Auto-Assign Unassigned Courses")
+        self.auto_assign_button.clicked.connect(self.auto_assign_courses)
+        assign_layout.addWidget(self.auto_assign_button, 3, 1)
+
         # Add assignment layout to main layout
         layout.addLayout(assign_layout)
 
@@ -634,6 +742,14 @@ class InstructorPage(QWidget):
             return
         instructor_email = self.instructor_email_entry.text()
         instructor_id = self.instructor_id_entry.text()
+        max_courses_text = self.max_courses_entry.text().strip()
+        try:
+            max_courses = int(max_courses_text) if max_courses_text else None
+            if max_courses is not None and max_courses < 0:
+                raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Input", "Max courses must be a whole number, or empty for no limit.")
+            return
 
         # Validation
         if not instructor_name or not instructor_email or not instructor_id:
@@ -646,9 +762,9 @@ class InstructorPage(QWidget):
             # Insert into the database
             cursor = self.parent.db.connection.cursor()
             cursor.execute('''
-                INSERT INTO Instructors (name, age, email, instructor_id)
-                VALUES (?, ?, ?, ?)
-            ''', (instructor.name, instructor.age, instructor.email, instructor.instructor_id))
+                INSERT INTO Instructors (name, age, email, instructor_id, max_courses)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (instructor.name, instructor.age, instructor.email, instructor.instructor_id, max_courses))
             self.parent.db.connection.commit()
             QMessageBox.information(self, "Success", f"Instructor {instructor.name} added.")
             # Refresh the instructor table
@@ -658,6 +774,7 @@ class InstructorPage(QWidget):
             self.instructor_age_entry.clear()
             self.instructor_email_entry.clear()
             self.instructor_id_entry.clear()
+            self.max_courses_entry.clear()
         except sqlite3.IntegrityError as e:
             QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
         except ValueError as e:
@@ -667,26 +784,62 @@ class InstructorPage(QWidget):
         """
         Loads instructor data from the database into the table.
         """
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('SELECT name, age, email, instructor_id FROM Instructors')
-        instructors = cursor.fetchall()
+        # New instructors of other registrars are added only while every instructor is listed
+        self.showing_all = True
+        self.show_instructors(iter_instructors(self.parent.db.connection))
+
+    def refresh_table(self):
+        """
+        Runs again the listing or the search the table shows.
+        """
+        if self.showing_all:
+            self.load_instructors()
+        else:
+            self.search_instructor_table()
+
+    def show_instructors(self, instructors):
+        """
+        Fills the instructor table, remembering the id and version of each row.
+
+        Args:
+            instructors (iterable): Instructor rows whose last two columns are the id and version.
+        """
         self.instructor_table.setRowCount(0)
         for row_data in instructors:
             row_number = self.instructor_table.rowCount()
             self.instructor_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.instructor_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+            self.set_instructor_row(row_number, row_data)
+
+    def set_instructor_row(self, row_number, row_data):
+        """
+        Fills one row of the instructor table.
+
+        Args:
+            row_number (int): The row of the table.
+            row_data (tuple): An instructor row whose last two columns are the id and version.
+        """
+        for column_number, data in enumerate(row_data[:-2]):
+            self.instructor_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        # The version lets deletes detect changes made by other registrars
+        self.instructor_table.item(row_number, 0).setData(Qt.UserRole, tuple(row_data[-2:]))
+
+    def patch_instructors(self, rows):
+        """
+        Updates the instructor table with the instructors other registrars changed.
+
+        Args:
+            rows (dict): The current InstructorRow of each changed id, or None
+                for a deleted instructor.
+        """
+        patch_rows(self.instructor_table, rows, self.showing_all, self.set_instructor_row)
 
     def update_course_dropdown(self):
         """
         Updates the course dropdown with the latest courses.
         """
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('SELECT course_name FROM Courses')
-        courses = cursor.fetchall()
-        course_names = [course[0] for course in courses]
         self.course_dropdown.clear()
-        self.course_dropdown.addItems(course_names)
+        for course_name in iter_course_names(self.parent.db.connection):
+            self.course_dropdown.addItem(course_name)
 
     def assign_instructor_to_course(self):
         """
@@ -707,57 +860,99 @@ class InstructorPage(QWidget):
 
         instructor_id = instructor[0]
 
-        # Get course ID based on course name
-        cursor.execute('SELECT id FROM Courses WHERE course_name = ?', (course_name,))
+        # Get course ID and the version the assignment applies to based on course name
+        cursor.execute('SELECT id, version FROM Courses WHERE course_name = ?', (course_name,))
         course = cursor.fetchone()
 
         if course is None:
             QMessageBox.warning(self, "Error", "Course not found.")
             return
 
-        course_id = course[0]
+        course_id, version = course
 
         try:
-            # Update the course to set the instructor ID
-            cursor.execute('UPDATE Courses SET instructor_id = ? WHERE id = ?', (instructor_id, course_id))
-            self.parent.db.connection.commit()
-            QMessageBox.information(self, "Success", "Instructor assigned to course.")
-            self.instructor_email_entry2.clear()
+            # Rejected if it clashes with the instructor's other courses
+            clashes = assign_instructor(self.parent.db.connection, instructor_id, course_id, version)
+        except ConflictError as e:
+            QMessageBox.warning(self, "Conflict", str(e))
+            return
         except sqlite3.Error as e:
             QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+        if clashes:
+            QMessageBox.warning(self, "Error", "The course meeting times clash with the instructor's other courses.")
+            return
+        QMessageBox.information(self, "Success", "Instructor assigned to course.")
+        self.instructor_email_entry2.clear()
+
+    def import_preferences(self):
+        """
+        Records teaching preferences read from a CSV file of (instructor, course, rank) rows.
+        """
+        file_name, _ = QFileDialog.getOpenFileName(self, "Import Teaching Preferences", "", "CSV Files (*.csv)")
+        if not file_name:
+            return
+        try:
+            rows = read_preferences_csv(file_name)
+            unknown = set_preferences(self.parent.db.connection, rows)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+        message = f"{len(rows) - len(unknown)} preferences recorded."
+        if unknown:
+            message += f" {len(unknown)} rows name an unknown instructor or course, e.g. {unknown[0][0]}, {unknown[0][1]}."
+        QMessageBox.information(self, "Teaching Preferences", message)
+
+    def auto_assign_courses(self):
+        """
+        Gives every course without an instructor to an instructor who ranked it, balancing teaching loads.
+        """
+        try:
+            applied = auto_assign(self.parent.db.connection)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+        left = self.parent.db.connection.execute('''
+            SELECT COUNT(*) FROM Courses c WHERE NOT EXISTS (SELECT 1 FROM Instructors t WHERE t.id = c.instructor_id)
+        ''').fetchone()[0]
+        QMessageBox.information(
+            self, "Auto-Assign", f"{len(applied)} courses assigned. {left} courses are still without an instructor."
+        )
 
     def search_instructor_table(self):
         """
         Searches for instructors based on the query and updates the table.
+
+        Names containing the query come first, then names within a few
+        typing mistakes of it. A search repeated with no instructor changed
+        in between is shown from memory.
         """
-        query = self.instructor_search_entry.text().lower()
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('''
-            SELECT name, age, email, instructor_id FROM Instructors
-            WHERE LOWER(name) LIKE ? OR LOWER(instructor_id) LIKE ?
-        ''', ('%' + query + '%', '%' + query + '%'))
-        instructors = cursor.fetchall()
-        self.instructor_table.setRowCount(0)
-        for row_data in instructors:
-            row_number = self.instructor_table.rowCount()
-            self.instructor_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.instructor_table.setItem(row_number, column_number, QTableWidgetItem(str(data)))
+        query = normalize_search(self.instructor_search_entry.text())
+        connection = self.parent.db.connection
+        self.showing_all = False
+        self.show_instructors(self.parent.search_cache.search(
+            connection, ('Instructors',), ('instructors', query),
+            lambda: iter_instructors(connection, query, fuzzy=True)))
 
     def delete_instructor_record(self):
         """
-        Deletes the selected instructor record from the database.
+        Deletes the selected instructor records from the database.
+
+        Any number of rows can be selected; they are deleted together, after
+        a confirmation when there are more than one.
         """
-        selected_items = self.instructor_table.selectedItems()
-        if selected_items:
-            selected_row = selected_items[0].row()
-            email_item = self.instructor_table.item(selected_row, 2)
-            email = email_item.text()
-            cursor = self.parent.db.connection.cursor()
+        records = selected_records(self.instructor_table)
+        if records:
+            if len(records) > 1 and QMessageBox.question(
+                    self, "Delete", f"Delete the {len(records)} selected instructors?") != QMessageBox.Yes:
+                return
             try:
-                cursor.execute('DELETE FROM Instructors WHERE email = ?', (email,))
-                self.parent.db.connection.commit()
-                QMessageBox.information(self, "Success", "Instructor record deleted.")
+                deleted = delete_records(self.parent.db.connection, 'Instructors', records)
+                QMessageBox.information(self, "Success", "Instructor record deleted." if deleted == 1
+                                        else f"{deleted} instructor records deleted.")
+                self.load_instructors()
+            except ConflictError as e:
+                QMessageBox.warning(self, "Conflict", f"{str(e)} The table has been reloaded.")
                 self.load_instructors()
             except sqlite3.Error as e:
                 QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
@@ -805,6 +1000,24 @@ class CoursePage(QWidget):
         form_layout.addWidget(course_name_label, 1, 0)
         form_layout.addWidget(self.course_name_entry, 1, 1)
 
+        # Course Capacity
+        course_capacity_label = QLabel("Capacity (blank for unlimited):")
+        self.course_capacity_entry = QLineEdit()
+        form_layout.addWidget(course_capacity_label, 2, 0)
+        form_layout.addWidget(self.course_capacity_entry, 2, 1)
+
+        # Course Meeting Times
+        course_slots_label = QLabel("Meeting Times (e.g. Mon/Wed 09:00-10:15):")
+        self.course_slots_entry = QLineEdit()
+        form_layout.addWidget(course_slots_label, 3, 0)
+        form_layout.addWidget(self.course_slots_entry, 3, 1)
+
+        # Course Term
+        course_term_label = QLabel("Term (e.g. 2025-3 for fall 2025, blank for none):")
+        self.course_term_entry = QLineEdit()
+        form_layout.addWidget(course_term_label, 4, 0)
+        form_layout.addWidget(self.course_term_entry, 4, 1)
+
         # Add form layout to main layout
         layout.addLayout(form_layout)
 
@@ -837,13 +1050,41 @@ class CoursePage(QWidget):
         self.register_student_button.clicked.connect(self.register_course)
         register_layout.addWidget(self.register_student_button, 2, 0, 1, 2)
 
+        # Drop Student Button
+        self.drop_student_button = QPushButton("Drop Student from Course")
+        self.drop_student_button.clicked.connect(self.drop_course)
+        register_layout.addWidget(self.drop_student_button, 3, 0, 1, 2)
+
+        # Bulk Registration Button
+        self.bulk_register_button = QPushButton("Bulk Register Students...")
+        self.bulk_register_button.clicked.connect(self.open_bulk_registration)
+        register_layout.addWidget(self.bulk_register_button, 4, 0, 1, 2)
+
+        # Set Capacity of the selected course
+        set_capacity_label = QLabel("New Capacity:")
+        self.set_capacity_entry = QLineEdit()
+        self.set_capacity_button = QPushButton("Set Capacity of Selected Course")
+        self.set_capacity_button.clicked.connect(self.change_capacity)
+        register_layout.addWidget(set_capacity_label, 5, 0)
+        register_layout.addWidget(self.set_capacity_entry, 5, 1)
+        register_layout.addWidget(self.set_capacity_button, 6, 0, 1, 2)
+
+        # Set Meeting Times of the selected course
+        set_slots_label = QLabel("New Meeting Times:")
+        self.set_slots_entry = QLineEdit()
+        self.set_slots_button = QPushButton("Set Meeting Times of Selected Course")
+        self.set_slots_button.clicked.connect(self.change_meeting_times)
+        register_layout.addWidget(set_slots_label, 7, 0)
+        register_layout.addWidget(self.set_slots_entry, 7, 1)
+        register_layout.addWidget(self.set_slots_button, 8, 0, 1, 2)
+
         # Add registration layout to main layout
         layout.addLayout(register_layout)
 
         # Course Table
         self.course_table = QTableWidget()
-        self.course_table.setColumnCount(3)
-        self.course_table.setHorizontalHeaderLabels(["Course Name", "Course ID", "Instructor"])
+        self.course_table.setColumnCount(6)
+        self.course_table.setHorizontalHeaderLabels(["Course Name", "Course ID", "Instructor", "Seats", "Waitlist", "Schedule"])
         layout.addWidget(self.course_table)
 
         # Search bar and buttons
@@ -870,6 +1111,11 @@ class CoursePage(QWidget):
         # Get input values
         course_id = self.course_id_entry.text()
         course_name = self.course_name_entry.text()
+        try:
+            capacity = int(self.course_capacity_entry.text()) if self.course_capacity_entry.text() else None
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Input", "Capacity must be an integer.")
+            return
 
         # Validation
         if not course_id or not course_name:
@@ -878,13 +1124,16 @@ class CoursePage(QWidget):
 
         try:
             # Create a Course object
-            course = Course(course_id, course_name)
+            course = Course(course_id, course_name, capacity=capacity,
+                            time_slots=parse_slots(self.course_slots_entry.text()),
+                            term=self.course_term_entry.text().strip())
             # Insert into the database
             cursor = self.parent.db.connection.cursor()
             cursor.execute('''
-                INSERT INTO Courses (course_id, course_name)
-                VALUES (?, ?)
-            ''', (course.course_id, course.course_name))
+                INSERT INTO Courses (course_id, course_name, capacity, term)
+                VALUES (?, ?, ?, ?)
+            ''', (course.course_id, course.course_name, course.capacity, course.term))
+            set_course_slots(self.parent.db.connection, cursor.lastrowid, course.time_slots)
             self.parent.db.connection.commit()
             QMessageBox.information(self, "Success", f"Course {course.course_name} added.")
             # Refresh the course table
@@ -892,41 +1141,92 @@ class CoursePage(QWidget):
             # Clear input fields
             self.course_id_entry.clear()
             self.course_name_entry.clear()
+            self.course_capacity_entry.clear()
+            self.course_slots_entry.clear()
+            self.course_term_entry.clear()
             # Update course dropdowns in other pages
             self.parent.instructor_page.update_course_dropdown()
         except sqlite3.IntegrityError as e:
             QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
 
     def load_courses(self):
         """
         Loads course data from the database into the table.
         """
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('''
-            SELECT c.course_name, c.course_id, i.name FROM Courses c
-            LEFT JOIN Instructors i ON c.instructor_id = i.id
-        ''')
-        courses = cursor.fetchall()
-        self.course_table.setRowCount(0)
-        for row_data in courses:
-            row_number = self.course_table.rowCount()
-            self.course_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.course_table.setItem(row_number, column_number, QTableWidgetItem(str(data) if data else ''))
+        # New courses of other registrars are added only while every course is listed
+        self.showing_all = True
+        self.show_courses(iter_courses(self.parent.db.connection))
 
         # Update course dropdowns
         self.update_course_dropdown()
 
+    def show_courses(self, courses):
+        """
+        Fills the course table, adding the meeting times of each course.
+
+        The meeting times are read a batch of shown courses at a time, so a
+        search only reads those of the courses it found.
+
+        Args:
+            courses (iterable): Course rows whose last two columns are ``Courses.id`` and its version.
+        """
+        self.course_table.setRowCount(0)
+        courses = iter(courses)
+        while True:
+            batch = list(islice(courses, BATCH_SIZE))
+            if not batch:
+                break
+            schedules = schedule_map(self.parent.db.connection, [row_data[-2] for row_data in batch])
+            for row_data in batch:
+                row_number = self.course_table.rowCount()
+                self.course_table.insertRow(row_number)
+                self.set_course_row(row_number, row_data, schedules.get(row_data[-2]))
+
+    def set_course_row(self, row_number, row_data, schedule):
+        """
+        Fills one row of the course table.
+
+        Args:
+            row_number (int): The row of the table.
+            row_data (tuple): A course row whose last two columns are ``Courses.id`` and its version.
+            schedule (str): The formatted meeting times, or None.
+        """
+        row_id, version = row_data[-2:]
+        for column_number, data in enumerate(row_data[:-2] + (schedule,)):
+            self.course_table.setItem(row_number, column_number, QTableWidgetItem(str(data) if data else ''))
+        # The version lets deletes detect changes made by other registrars
+        self.course_table.item(row_number, 0).setData(Qt.UserRole, (row_id, version))
+
+    def patch_courses(self, rows, schedules):
+        """
+        Updates the course table with the courses other registrars changed.
+
+        Args:
+            rows (dict): The current CourseRow of each changed ``Courses.id``,
+                or None for a deleted course.
+            schedules (dict): The formatted meeting times of the changed courses.
+        """
+        patch_rows(self.course_table, rows, self.showing_all,
+                   lambda row_number, row: self.set_course_row(row_number, row, schedules.get(row.id)))
+
+    def refresh_table(self):
+        """
+        Runs again the listing or the search the table shows.
+        """
+        if self.showing_all:
+            self.load_courses()
+        else:
+            self.search_course_table()
+
     def update_course_dropdown(self):
         """
         Updates the course dropdown with the latest courses.
         """
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('SELECT course_name FROM Courses')
-        courses = cursor.fetchall()
-        course_names = [course[0] for course in courses]
         self.course_dropdown.clear()
-        self.course_dropdown.addItems(course_names)
+        for course_name in iter_course_names(self.parent.db.connection):
+            self.course_dropdown.addItem(course_name)
 
     def register_course(self):
         """
@@ -958,56 +1258,273 @@ class CoursePage(QWidget):
         course_id = course[0]
 
         try:
-            # Insert into the Registrations table
-            cursor.execute('''
-                INSERT INTO Registrations (student_id, course_id)
-                VALUES (?, ?)
-            ''', (student_id, course_id))
-            self.parent.db.connection.commit()
+            # Register, or waitlist the student if the course is full
+            status = register(self.parent.db.connection, student_id, course_id)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+
+        if status == REGISTERED:
             QMessageBox.information(self, "Success", "Student registered to course.")
             self.student_email_entry.clear()
-        except sqlite3.IntegrityError as e:
+        elif status == WAITLISTED:
+            position = waitlist_position(self.parent.db.connection, student_id, course_id)
+            QMessageBox.information(self, "Waitlisted", f"Course is full. Student is number {position} on the waitlist.")
+            self.student_email_entry.clear()
+        elif status == ALREADY_WAITLISTED:
+            QMessageBox.warning(self, "Error", "Student is already on the waitlist for this course.")
+        elif status == SCHEDULE_CONFLICT:
+            QMessageBox.warning(self, "Error", "The course meeting times clash with the student's other courses.")
+        else:
             QMessageBox.warning(self, "Error", "Student is already registered to this course.")
+        self.load_courses()
+
+    def drop_course(self):
+        """
+        Drops a student from the selected course and promotes the next waitlisted student.
+        """
+        # Get input values
+        student_email = self.student_email_entry.text()
+        course_name = self.course_dropdown.currentText()
+
+        cursor = self.parent.db.connection.cursor()
+        cursor.execute('SELECT id FROM Students WHERE email = ?', (student_email,))
+        student = cursor.fetchone()
+        if student is None:
+            QMessageBox.warning(self, "Error", "Student not found.")
+            return
+
+        cursor.execute('SELECT id FROM Courses WHERE course_name = ?', (course_name,))
+        course = cursor.fetchone()
+        if course is None:
+            QMessageBox.warning(self, "Error", "Course not found.")
+            return
+
+        try:
+            removed, promoted = drop(self.parent.db.connection, student[0], course[0])
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+
+        if not removed:
+            QMessageBox.warning(self, "Error", "Student is not registered or waitlisted for this course.")
+            return
+        message = "Student dropped from course."
+        if promoted:
+            message += f" {len(promoted)} waitlisted student(s) got a seat."
+        QMessageBox.information(self, "Success", message)
+        self.student_email_entry.clear()
+        self.load_courses()
+
+    def change_capacity(self):
+        """
+        Changes the capacity of the selected course, promoting waitlisted students into new seats.
+        """
+        course_name = self.course_dropdown.currentText()
+        try:
+            capacity = int(self.set_capacity_entry.text()) if self.set_capacity_entry.text() else None
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Input", "Capacity must be an integer.")
+            return
+        if capacity is not None and capacity < 0:
+            QMessageBox.warning(self, "Invalid Input", "Capacity must be a non-negative integer.")
+            return
+
+        cursor = self.parent.db.connection.cursor()
+        cursor.execute('SELECT id FROM Courses WHERE course_name = ?', (course_name,))
+        course = cursor.fetchone()
+        if course is None:
+            QMessageBox.warning(self, "Error", "Course not found.")
+            return
+
+        try:
+            promoted = set_capacity(self.parent.db.connection, course[0], capacity)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+
+        QMessageBox.information(self, "Success", f"Capacity updated. {len(promoted)} waitlisted student(s) got a seat.")
+        self.set_capacity_entry.clear()
+        self.load_courses()
+
+    def change_meeting_times(self):
+        """
+        Replaces the meeting times of the selected course.
+        """
+        course_name = self.course_dropdown.currentText()
+        try:
+            slots = parse_slots(self.set_slots_entry.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Input", str(e))
+            return
+
+        cursor = self.parent.db.connection.cursor()
+        cursor.execute('SELECT id FROM Courses WHERE course_name = ?', (course_name,))
+        course = cursor.fetchone()
+        if course is None:
+            QMessageBox.warning(self, "Error", "Course not found.")
+            return
+
+        try:
+            # Refused if the new times clash with a registered student's or the instructor's schedule
+            set_course_slots(self.parent.db.connection, course[0], slots)
+            self.parent.db.connection.commit()
+        except (ValueError, sqlite3.Error) as e:
+            self.parent.db.connection.rollback()
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+
+        QMessageBox.information(self, "Success", f"Meeting times set to {format_slots(slots) or 'none'}.")
+        self.set_slots_entry.clear()
+        self.load_courses()
+
+    def open_bulk_registration(self):
+        """
+        Opens the bulk registration dialog.
+        """
+        dialog = BulkRegistrationDialog(self.parent)
+        dialog.exec_()
 
     def search_course_table(self):
         """
         Searches for courses based on the query and updates the table.
+
+        A search repeated with no course, instructor or waitlist changed in
+        between is shown from memory.
         """
-        query = self.course_search_entry.text().lower()
-        cursor = self.parent.db.connection.cursor()
-        cursor.execute('''
-            SELECT c.course_name, c.course_id, i.name FROM Courses c
-            LEFT JOIN Instructors i ON c.instructor_id = i.id
-            WHERE LOWER(c.course_name) LIKE ? OR LOWER(c.course_id) LIKE ? OR LOWER(i.name) LIKE ?
-        ''', ('%' + query + '%', '%' + query + '%', '%' + query + '%'))
-        courses = cursor.fetchall()
-        self.course_table.setRowCount(0)
-        for row_data in courses:
-            row_number = self.course_table.rowCount()
-            self.course_table.insertRow(row_number)
-            for column_number, data in enumerate(row_data):
-                self.course_table.setItem(row_number, column_number, QTableWidgetItem(str(data) if data else ''))
+        query = normalize_search(self.course_search_entry.text())
+        connection = self.parent.db.connection
+        self.showing_all = False
+        self.show_courses(self.parent.search_cache.search(
+            connection, ('Courses', 'Instructors', 'Waitlist'), ('courses', query),
+            lambda: iter_courses(connection, query)))
 
     def delete_course_record(self):
         """
-        Deletes the selected course record from the database.
+        Deletes the selected course records from the database.
+
+        Any number of rows can be selected; they are deleted together, after
+        a confirmation when there are more than one.
         """
-        selected_items = self.course_table.selectedItems()
-        if selected_items:
-            selected_row = selected_items[0].row()
-            course_id_item = self.course_table.item(selected_row, 1)
-            course_id = course_id_item.text()
-            cursor = self.parent.db.connection.cursor()
+        records = selected_records(self.course_table)
+        if records:
+            if len(records) > 1 and QMessageBox.question(
+                    self, "Delete", f"Delete the {len(records)} selected courses?") != QMessageBox.Yes:
+                return
             try:
-                cursor.execute('DELETE FROM Courses WHERE course_id = ?', (course_id,))
-                self.parent.db.connection.commit()
-                QMessageBox.information(self, "Success", "Course record deleted.")
+                deleted = delete_records(self.parent.db.connection, 'Courses', records)
+                QMessageBox.information(self, "Success", "Course record deleted." if deleted == 1
+                                        else f"{deleted} course records deleted.")
                 self.load_courses()
                 # Update course dropdowns in other pages
                 self.parent.instructor_page.update_course_dropdown()
+            except ConflictError as e:
+                QMessageBox.warning(self, "Conflict", f"{str(e)} The table has been reloaded.")
+                self.load_courses()
             except sqlite3.Error as e:
                 QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
 
+# Bulk Registration Dialog
+class BulkRegistrationDialog(QDialog):
+    """
+    Dialog for registering many students into many courses at once.
+    """
+    def __init__(self, parent):
+        """
+        Initializes the bulk registration dialog.
+
+        Args:
+            parent (QMainWindow): Reference to the main window.
+        """
+        super().__init__(parent)
+        self.parent = parent
+        self.setWindowTitle("Bulk Registration")
+        self.resize(700, 600)
+        self.init_ui()
+
+    def init_ui(self):
+        """
+        Sets up the UI components for the bulk registration dialog.
+        """
+        layout = QVBoxLayout(self)
+
+        # Pasted students and courses side by side
+        input_layout = QGridLayout()
+        input_layout.addWidget(QLabel("Students (ID or email, one per line):"), 0, 0)
+        self.students_entry = QPlainTextEdit()
+        input_layout.addWidget(self.students_entry, 1, 0)
+        input_layout.addWidget(QLabel("Courses (ID or name, one per line):"), 0, 1)
+        self.courses_entry = QPlainTextEdit()
+        input_layout.addWidget(self.courses_entry, 1, 1)
+        layout.addLayout(input_layout)
+
+        # Action buttons
+        button_layout = QHBoxLayout()
+        self.register_button = QPushButton("Register All")
+        self.register_button.clicked.connect(self.register_pasted)
+        self.import_button = QPushButton("Import Pairs from CSV...")
+        self.import_button.clicked.connect(self.register_from_csv)
+        button_layout.addWidget(self.register_button)
+        button_layout.addWidget(self.import_button)
+        layout.addLayout(button_layout)
+
+        # Per-pair outcome report
+        self.summary_label = QLabel("")
+        layout.addWidget(self.summary_label)
+        self.report_table = QTableWidget()
+        self.report_table.setColumnCount(3)
+        self.report_table.setHorizontalHeaderLabels(["Student", "Course", "Outcome"])
+        layout.addWidget(self.report_table)
+
+    def register_pasted(self):
+        """
+        Registers every pasted student into every pasted course.
+        """
+        students = parse_keys(self.students_entry.toPlainText())
+        courses = parse_keys(self.courses_entry.toPlainText())
+        if not students or not courses:
+            QMessageBox.warning(self, "Invalid Input", "Please enter at least one student and one course.")
+            return
+        self.run_registration([(student, course) for student in students for course in courses])
+
+    def register_from_csv(self):
+        """
+        Registers the (student, course) pairs listed in a CSV file chosen by the user.
+        """
+        options = QFileDialog.Options()
+        fileName, _ = QFileDialog.getOpenFileName(
+            self, "Import Registrations", "",
+            "CSV Files (*.csv);;All Files (*)", options=options
+        )
+        if fileName:
+            try:
+                pairs = read_pairs_csv(fileName)
+            except (OSError, UnicodeDecodeError) as e:
+                QMessageBox.warning(self, "Import Failed", f"An error occurred: {str(e)}")
+                return
+            self.run_registration(pairs)
+
+    def run_registration(self, pairs):
+        """
+        Runs the bulk registration and shows the outcome of every pair.
+
+        Args:
+            pairs (list): (student, course) tuples to register.
+        """
+        try:
+            outcomes = register_pairs(self.parent.db.connection, pairs)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            return
+
+        self.parent.course_page.load_courses()
+        counts = summarize(outcomes)
+        self.summary_label.setText(", ".join(f"{count} {status}" for status, count in counts.items()))
+        self.report_table.setRowCount(len(outcomes))
+        for row_number, outcome in enumerate(outcomes):
+            for column_number, data in enumerate(outcome):
+                self.report_table.setItem(row_number, column_number, QTableWidgetItem(data))
+
 # Main entry point
 if __name__ == '__main__':
     # Create the application
@@ -0,0 +1,10 @@
+"""
+Data layer of the School Management System.
+
+This package holds everything that talks to the SQLite database without
+depending on a GUI toolkit, so it can be shared by the PyQt front-end
+(``pyqtCode.py``) and the Tkinter front-end (``tkinter_files/tkinter_doc.py``).
+"""
+from school.database import Database
+
+__all__ = ['Database']
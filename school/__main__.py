@@ -0,0 +1,8 @@
+"""
+Entry point of ``python -m school``.
+"""
+import sys
+
+from school.cli import main
+
+sys.exit(main())
@@ -0,0 +1,485 @@
+"""
+Archival of past terms and soft-deleted records.
+
+The hot tables (``Students``, ``Instructors``, ``Courses``,
+``Registrations``) should only hold what registrars work with today, so
+every scan of them stays fast however many years the school has been
+running. Two kinds of rows leave them:
+
+* courses of past terms, with their registrations, moved by archive();
+* soft-deleted students, instructors and courses, which ``delete_record``
+  first moves to the ``Deleted<table>`` tables of the main database.
+
+archive() moves both, in batches, into one SQLite file per term next to the
+main database (``school.2025-3.archive.db`` for fall 2025), attaching each
+file while it is written. Every row lives in exactly one place at a time,
+so history() can attach the archives and present ``All<table>`` views that
+``UNION ALL`` the hot, deleted and archived rows without duplicates; queries
+that do not ask for history never touch the archives.
+
+Terms are written ``YYYY-N`` with N = 1 for spring, 2 for summer and 3 for
+fall, so they sort in calendar order.
+"""
+import contextlib
+import datetime
+import glob
+import os
+import re
+import sqlite3
+
+from school.concurrency import retry_on_busy
+from school.database import ARCHIVED_COLUMNS, Database
+
+# Courses and registrations moved per transaction
+BATCH_SIZE = 5000
+
+# A term code such as 2025-3
+TERM_PATTERN = re.compile(r'\d{4}-[123]$')
+
+# First month of each term
+TERM_STARTS = ((9, 3), (6, 2), (1, 1))
+
+# Source of the hot and the soft-deleted rows in the history views; archived rows give their term
+HOT, DELETED = 'current', 'deleted'
+
+
+def check_term(term):
+    """
+    Checks that a term code is well formed.
+
+    Args:
+        term (str): The term, such as '2025-3'.
+
+    Returns:
+        str: The term.
+
+    Raises:
+        ValueError: If the term is not written YYYY-N with N from 1 to 3.
+    """
+    if not TERM_PATTERN.match(term or ''):
+        raise ValueError(f"Term '{term}' must be written YYYY-N, with N 1 for spring, 2 for summer or 3 for fall.")
+    return term
+
+
+def term_of(timestamp):
+    """
+    Returns the term a date falls in.
+
+    Args:
+        timestamp (str): An ISO date or SQLite timestamp, such as '2025-10-02 14:00:00'.
+
+    Returns:
+        str: The term code.
+    """
+    year, month = int(timestamp[:4]), int(timestamp[5:7])
+    for first_month, number in TERM_STARTS:
+        if month >= first_month:
+            return f'{year}-{number}'
+
+
+def current_term(today=None):
+    """
+    Returns the term of today's date.
+
+    Args:
+        today (datetime.date, optional): The date to use instead of today.
+
+    Returns:
+        str: The term code.
+    """
+    return term_of((today or datetime.date.today()).isoformat())
+
+
+def archive_file(connection, term):
+    """
+    Returns the path of the archive file of a term.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        term (str): The term code.
+
+    Returns:
+        str: ``<database>.<term>.archive.db`` next to the main database.
+
+    Raises:
+        ValueError: If the main database is not a file.
+    """
+    path = _main_file(connection)
+    return f'{os.path.splitext(path)[0]}.{check_term(term)}.archive.db'
+
+
+def archived_terms(connection):
+    """
+    Lists the terms that have an archive file.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+
+    Returns:
+        list: The term codes in calendar order.
+    """
+    prefix = os.path.splitext(_main_file(connection))[0]
+    terms = (name[len(prefix) + 1:-len('.archive.db')] for name in glob.glob(f'{glob.escape(prefix)}.*.archive.db'))
+    return sorted(term for term in terms if TERM_PATTERN.match(term))
+
+
+def attach(connection, term, prefix='archive'):
+    """
+    Attaches the archive file of a term, creating its tables if needed.
+
+    Must be called outside a transaction, as SQLite only attaches between them.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        term (str): The term code.
+        prefix (str): The start of the schema name, so that different users
+            of the archives can attach the same file side by side.
+
+    Returns:
+        str: The schema name of the archive.
+    """
+    schema = f"{prefix}_{term.replace('-', '_')}"
+    connection.execute('ATTACH DATABASE ? AS ' + schema, (archive_file(connection, term),))
+    cursor = connection.cursor()
+    for table, columns in ARCHIVED_COLUMNS.items():
+        Database.create_archived_table(cursor, f'{schema}.{table}', columns)
+    connection.commit()
+    return schema
+
+
+def archive(connection, before=None, inactive=False, batch_size=BATCH_SIZE, progress=None):
+    """
+    Moves past terms and soft-deleted records out of the hot tables.
+
+    Courses of terms before ``before`` move to the archive of their term
+    together with their registrations; their waitlists and meeting times are
+    dropped. Soft-deleted rows move to the archive of the term they were
+    deleted in. Each batch is one transaction over the main database and
+    the archive file, so the move is atomic and an interrupted run leaves
+    nothing half-moved.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        before (str, optional): The first term to keep hot, defaults to the
+            current term.
+        inactive (bool): Also archive the students and instructors left
+            without any course or registration in the hot tables whose
+            last courses were archived, such as graduated students.
+        batch_size (int): Rows moved per transaction, roughly.
+        progress (callable, optional): Called as progress(term, table, moved)
+            after every batch.
+
+    Returns:
+        dict: Number of rows moved per (term, table).
+    """
+    before = check_term(before or current_term())
+    connection.create_function('term_of', 1, term_of, deterministic=True)
+    moved = {}
+
+    def count(term, table, rows):
+        moved[(term, table)] = moved.get((term, table), 0) + rows
+        if progress:
+            progress(term, table, rows)
+
+    terms = [term for (term,) in connection.execute(
+        'SELECT DISTINCT term FROM Courses WHERE term < ? ORDER BY term', (before,))]
+    for term in terms:
+        with _attached(connection, term) as schema:
+            while True:
+                rows = _archive_courses(connection, schema, term, batch_size, inactive)
+                if not rows:
+                    break
+                for table, number in rows.items():
+                    count(term, table, number)
+
+    # Soft-deleted rows go to the term they were deleted in, children before parents
+    for table in ('Registrations', 'Courses', 'Students', 'Instructors'):
+        term_expression = 'COALESCE(term, term_of(deleted_at))' if table == 'Courses' else 'term_of(deleted_at)'
+        terms = [term for (term,) in connection.execute(
+            f'SELECT DISTINCT {term_expression} FROM Deleted{table} ORDER BY 1')]
+        for term in terms:
+            with _attached(connection, term) as schema:
+                while True:
+                    rows = _archive_deleted(connection, schema, table, term_expression, term, batch_size)
+                    if not rows:
+                        break
+                    count(term, table, rows)
+    return moved
+
+
+@retry_on_busy
+def clear(connection):
+    """
+    Soft-deletes every student, instructor, course and registration in one transaction.
+
+    Waitlists, meeting times and teaching preferences are dropped.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+
+    Returns:
+        int: Number of students, instructors and courses deleted.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        deleted = 0
+        cursor.execute('DELETE FROM Waitlist')
+        cursor.execute('DELETE FROM CourseSlots')
+        cursor.execute('DELETE FROM TeachingPreferences')
+        for table in ('Registrations', 'Courses', 'Students', 'Instructors'):
+            columns = _columns(table)
+            cursor.execute(f'''
+                INSERT INTO Deleted{table} ({columns})
+                SELECT {columns.replace('deleted_at', 'CURRENT_TIMESTAMP')} FROM {table}
+            ''')
+            if table != 'Registrations':
+                deleted += cursor.rowcount
+            cursor.execute(f'DELETE FROM {table}')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return deleted
+
+
+@contextlib.contextmanager
+def history(connection, terms=None):
+    """
+    Attaches archives and creates views over the hot, deleted and archived rows.
+
+    Inside the with block the temporary views ``AllStudents``,
+    ``AllInstructors``, ``AllCourses`` and ``AllRegistrations`` have the
+    columns of ARCHIVED_COLUMNS plus ``source``: 'current' for hot rows,
+    'deleted' for soft-deleted rows not archived yet, or the term of the
+    archive holding the row. Rows keep their ``id`` when they move, so the
+    views join on ids as the hot tables do.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        terms (iterable, optional): The archived terms to include, defaults to all.
+
+    Yields:
+        list: The terms whose archives are attached.
+
+    Raises:
+        ValueError: If more archives are asked for than SQLite can attach at once.
+    """
+    terms = sorted(terms) if terms is not None else archived_terms(connection)
+    limit = connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(terms) > limit:
+        raise ValueError(f'{len(terms)} archives cannot be attached at once (the limit is {limit}); '
+                         f'choose the terms to include.')
+    schemas = []
+    try:
+        for term in terms:
+            schemas.append((term, attach(connection, term)))
+        for table, columns in ARCHIVED_COLUMNS.items():
+            names = _columns(table)
+            hot_names = names.replace('deleted_at', 'NULL AS deleted_at')
+            selects = [f"SELECT {hot_names}, '{HOT}' AS source FROM main.{table}",
+                       f"SELECT {names}, '{DELETED}' FROM main.Deleted{table}"]
+            selects += [f"SELECT {names}, '{term}' FROM {schema}.{table}" for term, schema in schemas]
+            connection.execute(f'DROP VIEW IF EXISTS temp.All{table}')
+            connection.execute(f'CREATE TEMP VIEW All{table} AS {" UNION ALL ".join(selects)}')
+        yield terms
+    finally:
+        for table in ARCHIVED_COLUMNS:
+            connection.execute(f'DROP VIEW IF EXISTS temp.All{table}')
+        for _, schema in schemas:
+            connection.execute(f'DETACH DATABASE {schema}')
+
+
+def transcript(connection, student_id, terms=None):
+    """
+    Returns every course a student has taken, across the hot tables and the archives.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        student_id (str): The student ID.
+        terms (iterable, optional): The archived terms to include, defaults to all.
+
+    Returns:
+        list: (term, course ID, course name, instructor name, source) rows,
+            oldest term first.
+    """
+    with history(connection, terms):
+        return connection.execute('''
+            SELECT c.term, c.course_id, c.course_name, i.name, r.source
+            FROM AllStudents s
+            JOIN AllRegistrations r ON r.student_id = s.id
+            JOIN AllCourses c ON c.id = r.course_id
+            LEFT JOIN AllInstructors i ON i.id = c.instructor_id
+            WHERE s.student_id = ?
+            ORDER BY c.term IS NULL, c.term, c.course_id
+        ''', (student_id,)).fetchall()
+
+
+@retry_on_busy
+def _archive_courses(connection, schema, term, batch_size, inactive):
+    """
+    Moves the next batch of courses of a past term into its archive.
+
+    Courses are taken in id order until about batch_size registrations are
+    covered, using the running ``enrolled`` counts, and at least one course
+    is always taken.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        schema (str): The schema name of the attached archive.
+        term (str): The term being archived.
+        batch_size (int): Registrations per batch, roughly.
+        inactive (bool): Also move the people left without hot courses.
+
+    Returns:
+        dict: Rows moved per table, empty when the term has no more courses.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+        cursor.execute('DELETE FROM archive_batch')
+        cursor.execute('''
+            INSERT INTO archive_batch
+            SELECT id FROM (
+                SELECT id, enrolled, SUM(enrolled + 1) OVER (ORDER BY id) AS running
+                FROM Courses WHERE term = ?
+            )
+            WHERE running - enrolled - 1 < ?
+        ''', (term, batch_size))
+        if cursor.rowcount == 0:
+            connection.rollback()
+            return {}
+        moved = {'Courses': cursor.rowcount}
+
+        # Remember the people of the batch before their links are gone
+        if inactive:
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS archive_people (kind TEXT, id INTEGER, PRIMARY KEY (kind, id))')
+            cursor.execute('DELETE FROM archive_people')
+            cursor.execute('''
+                INSERT OR IGNORE INTO archive_people
+                SELECT 'Students', student_id FROM Registrations WHERE course_id IN (SELECT id FROM archive_batch)
+                UNION ALL
+                SELECT 'Instructors', instructor_id FROM Courses
+                WHERE id IN (SELECT id FROM archive_batch) AND instructor_id IS NOT NULL
+            ''')
+
+        registrations = _columns('Registrations')
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {schema}.Registrations ({registrations})
+            SELECT {registrations.replace('deleted_at', 'NULL')} FROM Registrations
+            WHERE course_id IN (SELECT id FROM archive_batch)
+        ''')
+        moved['Registrations'] = cursor.rowcount
+        courses = _columns('Courses')
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {schema}.Courses ({courses})
+            SELECT {courses.replace('deleted_at', 'NULL')} FROM Courses WHERE id IN (SELECT id FROM archive_batch)
+        ''')
+        for table in ('Registrations', 'Waitlist', 'CourseSlots'):
+            cursor.execute(f'DELETE FROM {table} WHERE course_id IN (SELECT id FROM archive_batch)')
+        cursor.execute('DELETE FROM Courses WHERE id IN (SELECT id FROM archive_batch)')
+
+        if inactive:
+            for table, column, links in (('Students', 'student_id', ('Registrations', 'Waitlist')),
+                                         ('Instructors', 'instructor_id', ('Courses',))):
+                columns = _columns(table)
+                unlinked = ' AND '.join(f'NOT EXISTS (SELECT 1 FROM {link} l WHERE l.{column} = {table}.id)'
+                                        for link in links)
+                condition = f"id IN (SELECT id FROM archive_people WHERE kind = '{table}') AND {unlinked}"
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO {schema}.{table} ({columns})
+                    SELECT {columns.replace('deleted_at', 'NULL')} FROM {table} WHERE {condition}
+                ''')
+                moved[table] = cursor.rowcount
+                cursor.execute(f'DELETE FROM {table} WHERE {condition}')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return moved
+
+
+@retry_on_busy
+def _archive_deleted(connection, schema, table, term_expression, term, batch_size):
+    """
+    Moves the next batch of soft-deleted rows of one term into its archive.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        schema (str): The schema name of the attached archive.
+        table (str): The hot table name; rows come from ``Deleted<table>``.
+        term_expression (str): The SQL giving the term of a deleted row.
+        term (str): The term being archived.
+        batch_size (int): Rows per batch.
+
+    Returns:
+        int: Rows moved, 0 when the term has no more deleted rows.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        columns = _columns(table)
+        condition = f'id IN (SELECT id FROM Deleted{table} WHERE {term_expression} = ? ORDER BY id LIMIT ?)'
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {schema}.{table} ({columns})
+            SELECT {columns} FROM Deleted{table} WHERE {condition}
+        ''', (term, batch_size))
+        moved = cursor.rowcount
+        cursor.execute(f'DELETE FROM Deleted{table} WHERE {condition}', (term, batch_size))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return moved
+
+
+@contextlib.contextmanager
+def _attached(connection, term):
+    """
+    Attaches the archive of a term for the duration of a with block.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        term (str): The term code.
+
+    Yields:
+        str: The schema name of the archive.
+    """
+    schema = attach(connection, term)
+    try:
+        yield schema
+    finally:
+        connection.execute(f'DETACH DATABASE {schema}')
+
+
+def _columns(table):
+    """
+    Returns the column list of an archived table.
+
+    Args:
+        table (str): The table name.
+
+    Returns:
+        str: The comma-separated column names.
+    """
+    return ', '.join(column.split()[0] for column in ARCHIVED_COLUMNS[table])
+
+
+def _main_file(connection):
+    """
+    Returns the path of the main database file.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+
+    Returns:
+        str: The path.
+
+    Raises:
+        ValueError: If the main database is in memory or temporary.
+    """
+    for _, name, path in connection.execute('PRAGMA database_list'):
+        if name == 'main' and path:
+            return path
+    raise ValueError('Archives need a database stored in a file.')
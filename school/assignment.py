@@ -0,0 +1,572 @@
+"""
+Automatic assignment of instructors to the courses that have none.
+
+Instructors rank the courses they would like to teach in the
+``TeachingPreferences`` table and may set a maximum teaching load in
+``Instructors.max_courses``. The assignment is solved as a minimum-cost flow:
+
+    source -> course (1 unit) -> instructor (cost of the preference rank)
+           -> sink (one arc per extra course, each dearer than the last)
+
+Because every additional course of an instructor costs more than the one
+before, the cheapest flow spreads courses evenly instead of loading the most
+popular instructors first, and among all the ways of staffing as many courses
+as possible it picks the one with the best preferences and balance. The
+network is sparse (one arc per preference), and the solver augments along all
+shortest paths of a phase at once, so thousands of courses take seconds.
+
+A course whose meeting times clash with another course of the same
+instructor is not given to that instructor. Clashes with courses already
+taught are excluded up front. When two new assignments clash, the worse
+ranked pair is excluded and the whole plan solved again, a few times at
+most; after that, every assignment that fits is kept and only the courses
+that lost their instructor are planned again, on a much smaller network.
+"""
+import csv
+import heapq
+from collections import deque, namedtuple
+
+from school.concurrency import retry_on_busy
+from school.records import versioned_write
+from school.schedule import SlotIndex, TimeSlot, instructor_conflicts
+
+# Cost of each step down an instructor's preference list, and of each course
+# added to a teaching load; together they trade first choices against balance
+RANK_COST = 1
+LOAD_COST = 1
+
+# Times the whole plan is solved again without the pairs that clashed, before
+# the remaining clashes are settled by planning only the courses involved
+CLASH_ROUNDS = 5
+
+# One course given to one instructor, with the instructor's rank for it
+Assignment = namedtuple('Assignment', ['course', 'instructor', 'rank'])
+
+_INFINITY = float('inf')
+
+
+def read_preferences_csv(file_name):
+    """
+    Reads (instructor, course, rank) rows from a CSV file.
+
+    The first three columns of every row are used. A first row whose first
+    cell mentions "instructor" is treated as a header and skipped.
+
+    Args:
+        file_name (str): Path of the CSV file.
+
+    Returns:
+        list: The (instructor, course, rank) rows in file order.
+
+    Raises:
+        ValueError: If a rank is not a positive whole number.
+    """
+    rows = []
+    with open(file_name, newline='') as csvfile:
+        for line_number, row in enumerate(csv.reader(csvfile)):
+            if len(row) < 3:
+                continue
+            if line_number == 0 and 'instructor' in row[0].lower():
+                continue
+            try:
+                rank = int(row[2])
+            except ValueError:
+                rank = 0
+            if rank < 1:
+                raise ValueError(f"Invalid rank '{row[2]}' on line {line_number + 1}; use 1 for a first choice.")
+            rows.append((row[0].strip(), row[1].strip(), rank))
+    return rows
+
+
+@retry_on_busy
+def set_preferences(connection, rows):
+    """
+    Records the teaching preferences of instructors.
+
+    A preference replaces any earlier rank the instructor gave the same
+    course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        rows (list): (instructor, course, rank) tuples of instructor ID or
+            email, course ID or course name, and the rank (1 for a first choice).
+
+    Returns:
+        list: The rows whose instructor or course was not found.
+    """
+    instructors = {}
+    for row_id, instructor_id, email in connection.execute('SELECT id, instructor_id, email FROM Instructors'):
+        instructors[instructor_id] = instructors[email] = row_id
+    courses = {}
+    for row_id, course_id, course_name in connection.execute('SELECT id, course_id, course_name FROM Courses'):
+        courses.setdefault(course_name, row_id)
+        courses[course_id] = row_id
+
+    unknown = []
+    found = []
+    for instructor, course, rank in rows:
+        if instructor in instructors and course in courses:
+            found.append((instructors[instructor], courses[course], rank))
+        else:
+            unknown.append((instructor, course, rank))
+
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.executemany(
+            'INSERT OR REPLACE INTO TeachingPreferences (instructor_id, course_id, rank) VALUES (?, ?, ?)', found
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return unknown
+
+
+def plan_assignments(connection, term=None):
+    """
+    Computes a balanced assignment of instructors to unassigned courses.
+
+    A course is unassigned when it has no instructor or its instructor was
+    deleted. Only instructors who ranked a course are considered for it, and
+    nobody is given more than their ``max_courses`` (no limit when NULL),
+    counting the courses they already teach. Nothing is written; pass the
+    result to apply_assignments.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        term (str, optional): Only assign the courses of this term, and
+            count only this term's courses towards teaching loads.
+
+    Returns:
+        list: The Assignment tuples, sorted by course.
+    """
+    in_term = 'AND c.term = :term' if term else ''
+    candidates = connection.execute(f'''
+        SELECT p.course_id, p.instructor_id, p.rank
+        FROM TeachingPreferences p
+        JOIN Courses c ON c.id = p.course_id
+        JOIN Instructors i ON i.id = p.instructor_id
+        WHERE NOT EXISTS (SELECT 1 FROM Instructors t WHERE t.id = c.instructor_id) {in_term}
+    ''', {'term': term}).fetchall()
+    if not candidates:
+        return []
+
+    # Current load and limit of every instructor who ranked an unassigned course
+    instructors = {}
+    for instructor, limit, load in connection.execute(f'''
+        SELECT i.id, i.max_courses, COUNT(c.id)
+        FROM Instructors i LEFT JOIN Courses c ON c.instructor_id = i.id {in_term}
+        WHERE i.id IN (SELECT instructor_id FROM TeachingPreferences)
+        GROUP BY i.id
+    ''', {'term': term}):
+        instructors[instructor] = (limit, load)
+
+    # Meeting times of the candidate courses, and of the courses the candidates already teach
+    candidate_courses = {course for course, _, _ in candidates}
+    slots = {}
+    taught = []
+    for course, instructor, day, start, end in connection.execute(f'''
+        SELECT s.course_id, t.id, s.day, s.start_minute, s.end_minute
+        FROM CourseSlots s
+        JOIN Courses c ON c.id = s.course_id
+        LEFT JOIN Instructors t ON t.id = c.instructor_id
+        WHERE 1 {in_term}
+    ''', {'term': term}):
+        slot = TimeSlot(day, start, end)
+        if course in candidate_courses:
+            slots.setdefault(course, []).append(slot)
+        elif instructor in instructors:
+            taught.append((instructor, slot, course))
+
+    assignments = []
+    forbidden = set()
+    rounds = 0
+    while True:
+        # Instructors cannot take a course that clashes with one they already teach
+        index = _slot_index(taught)
+        candidates = [
+            (course, instructor, rank) for course, instructor, rank in candidates
+            if not any(index.conflicts(instructor, slot) for slot in slots.get(course, ()))
+        ]
+        planned = _solve([candidate for candidate in candidates if candidate[:2] not in forbidden], instructors)
+        clashes = _new_clashes(planned, slots, taught)
+        if not clashes:
+            return sorted(assignments + planned)
+        rounds += 1
+        if rounds < CLASH_ROUNDS:
+            # Exclude the clashing pairs and solve the whole plan again
+            forbidden.update(clashes)
+            continue
+        # Keep the courses that fit and plan again for the ones that lost their instructor
+        for assignment in planned:
+            if (assignment.course, assignment.instructor) in clashes:
+                continue
+            assignments.append(assignment)
+            limit, load = instructors[assignment.instructor]
+            instructors[assignment.instructor] = (limit, load + 1)
+            taught.extend((assignment.instructor, slot, assignment.course) for slot in slots.get(assignment.course, ()))
+        assigned = {assignment.course for assignment in assignments}
+        forbidden.update(clashes)
+        candidates = [candidate for candidate in candidates if candidate[0] not in assigned]
+
+
+@retry_on_busy
+def apply_assignments(connection, assignments):
+    """
+    Writes planned assignments in one transaction.
+
+    Courses that were given an instructor since the plan was made, or whose
+    planned instructor was deleted meanwhile, are skipped.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        assignments (list): Assignment tuples from plan_assignments.
+
+    Returns:
+        list: The Assignment tuples that were applied.
+    """
+    applied = []
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for assignment in assignments:
+            cursor.execute('''
+                UPDATE Courses SET instructor_id = :instructor
+                WHERE id = :course
+                  AND NOT EXISTS (SELECT 1 FROM Instructors t WHERE t.id = Courses.instructor_id)
+                  AND EXISTS (SELECT 1 FROM Instructors t WHERE t.id = :instructor)
+            ''', assignment._asdict())
+            if cursor.rowcount:
+                applied.append(assignment)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return applied
+
+
+@retry_on_busy
+def assign_instructor(connection, instructor, course, version):
+    """
+    Gives a course to an instructor if it still has the given version and fits their schedule.
+
+    The clash check and the update run in one ``BEGIN IMMEDIATE``
+    transaction, so no other registrar can give the instructor a clashing
+    course in between.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        instructor (int): The ``Instructors.id`` of the instructor.
+        course (int): The ``Courses.id`` of the course.
+        version (int): The version of the course the caller read.
+
+    Returns:
+        list: The ``Courses.id`` of the instructor's courses that clash with
+            it; empty if the course was assigned.
+
+    Raises:
+        ConflictError: If the course was changed or deleted since it was read.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        clashes = instructor_conflicts(connection, instructor, course)
+        if not clashes:
+            versioned_write(cursor, 'Courses', course, version,
+                            'UPDATE Courses SET instructor_id = ?, version = version + 1 WHERE id = ? AND version = ?',
+                            (instructor, course, version))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return clashes
+
+
+def auto_assign(connection, term=None):
+    """
+    Plans and applies a balanced assignment of instructors to unassigned courses.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        term (str, optional): Only assign the courses of this term.
+
+    Returns:
+        list: The Assignment tuples that were applied.
+    """
+    return apply_assignments(connection, plan_assignments(connection, term))
+
+
+class MinCostFlow:
+    """
+    A flow network solved for a maximum flow of minimum cost.
+
+    Arcs are stored in parallel lists, each followed by its reverse arc, so
+    arc ``a`` and its residual ``a ^ 1`` are found without lookups. Costs
+    must not be negative.
+    """
+    def __init__(self, nodes):
+        """
+        Initializes a network without arcs.
+
+        Args:
+            nodes (int): The number of nodes, numbered from 0.
+        """
+        self.arcs = [[] for _ in range(nodes)]
+        self.head = []
+        self.capacity = []
+        self.cost = []
+
+    def add_arc(self, tail, head, capacity, cost):
+        """
+        Adds an arc and its residual.
+
+        Args:
+            tail (int): The node the arc leaves.
+            head (int): The node the arc enters.
+            capacity (int): The most flow it carries.
+            cost (int): The cost per unit of flow.
+
+        Returns:
+            int: The arc number, to read its flow back with flow().
+        """
+        arc = len(self.head)
+        self.arcs[tail].append(arc)
+        self.arcs[head].append(arc + 1)
+        self.head += [head, tail]
+        self.capacity += [capacity, 0]
+        self.cost += [cost, -cost]
+        return arc
+
+    def flow(self, arc):
+        """
+        Returns the flow on an arc after solve().
+
+        Args:
+            arc (int): The arc number returned by add_arc.
+
+        Returns:
+            int: The flow.
+        """
+        return self.capacity[arc + 1]
+
+    def solve(self, source, sink):
+        """
+        Sends as much flow as possible from source to sink at minimum cost.
+
+        Primal-dual: each phase finds shortest distances with Dijkstra on
+        reduced costs, then saturates every shortest path at once with
+        blocking flows, as Dinic's algorithm does. The number of phases is
+        bounded by the number of distinct path costs, which is small here.
+
+        Args:
+            source (int): The source node.
+            sink (int): The sink node.
+
+        Returns:
+            tuple: The total flow and its cost.
+        """
+        potential = [0] * len(self.arcs)
+        total_flow = total_cost = 0
+        while True:
+            distance = self._distances(source, sink, potential)
+            if distance[sink] == _INFINITY:
+                return total_flow, total_cost
+            bound = distance[sink]
+            for node, value in enumerate(distance):
+                potential[node] += min(value, bound)
+            while True:
+                level = self._levels(source, sink, potential)
+                if level[sink] < 0:
+                    break
+                flow, cost = self._blocking_flow(source, sink, potential, level)
+                total_flow += flow
+                total_cost += cost
+
+    def _distances(self, source, sink, potential):
+        """
+        Runs Dijkstra on reduced costs, stopping once the sink is settled.
+
+        Args:
+            source (int): The source node.
+            sink (int): The sink node.
+            potential (list): The node potentials.
+
+        Returns:
+            list: Tentative distances; infinite for nodes not reached.
+        """
+        arcs, head, capacity, cost = self.arcs, self.head, self.capacity, self.cost
+        distance = [_INFINITY] * len(arcs)
+        distance[source] = 0
+        queue = [(0, source)]
+        while queue:
+            reached, node = heapq.heappop(queue)
+            if reached > distance[node]:
+                continue
+            if node == sink:
+                break
+            base = reached + potential[node]
+            for arc in arcs[node]:
+                if capacity[arc] > 0:
+                    other = head[arc]
+                    value = base + cost[arc] - potential[other]
+                    if value < distance[other]:
+                        distance[other] = value
+                        heapq.heappush(queue, (value, other))
+        return distance
+
+    def _levels(self, source, sink, potential):
+        """
+        Numbers the nodes by breadth-first search over admissible arcs.
+
+        Args:
+            source (int): The source node.
+            sink (int): The sink node.
+            potential (list): The node potentials.
+
+        Returns:
+            list: The level of every node; -1 where not reached.
+        """
+        arcs, head, capacity, cost = self.arcs, self.head, self.capacity, self.cost
+        level = [-1] * len(arcs)
+        level[source] = 0
+        queue = deque([source])
+        while queue and level[sink] < 0:
+            node = queue.popleft()
+            base = potential[node]
+            following = level[node] + 1
+            for arc in arcs[node]:
+                other = head[arc]
+                # Admissible: capacity left and zero reduced cost, so on a shortest path
+                if level[other] < 0 and capacity[arc] > 0 and cost[arc] + base == potential[other]:
+                    level[other] = following
+                    queue.append(other)
+        return level
+
+    def _blocking_flow(self, source, sink, potential, level):
+        """
+        Augments along admissible paths that go one level deeper at each step.
+
+        Args:
+            source (int): The source node.
+            sink (int): The sink node.
+            potential (list): The node potentials.
+            level (list): The levels from _levels.
+
+        Returns:
+            tuple: The flow sent and its cost.
+        """
+        arcs, head, capacity, cost = self.arcs, self.head, self.capacity, self.cost
+        # Next arc to try at each node; arcs that led nowhere are not tried again
+        pointer = [0] * len(arcs)
+        total_flow = total_cost = 0
+        path = []
+        node = source
+        while True:
+            if node == sink:
+                pushed = min(capacity[arc] for arc in path)
+                for arc in path:
+                    capacity[arc] -= pushed
+                    capacity[arc ^ 1] += pushed
+                    total_cost += pushed * cost[arc]
+                total_flow += pushed
+                path.clear()
+                node = source
+                continue
+            leaving = arcs[node]
+            base = potential[node]
+            following = level[node] + 1
+            position = pointer[node]
+            while position < len(leaving):
+                arc = leaving[position]
+                other = head[arc]
+                if level[other] == following and capacity[arc] > 0 and cost[arc] + base == potential[other]:
+                    break
+                position += 1
+            pointer[node] = position
+            if position == len(leaving):
+                # Dead end: step back and skip the arc that led here
+                if not path:
+                    return total_flow, total_cost
+                level[node] = -1
+                node = head[path.pop() ^ 1]
+                pointer[node] += 1
+                continue
+            path.append(arc)
+            node = head[arc]
+
+
+def _solve(candidates, instructors):
+    """
+    Builds and solves the flow network of one planning round.
+
+    Args:
+        candidates (list): Allowed (course, instructor, rank) tuples.
+        instructors (dict): (max_courses, current load) keyed by ``Instructors.id``.
+
+    Returns:
+        list: The Assignment tuples of the cheapest maximum flow, sorted by course.
+    """
+    courses = sorted({course for course, _, _ in candidates})
+    course_nodes = {course: 2 + number for number, course in enumerate(courses)}
+    ranked = {}
+    for _, instructor, _ in candidates:
+        ranked[instructor] = ranked.get(instructor, 0) + 1
+    instructor_nodes = {instructor: 2 + len(courses) + number for number, instructor in enumerate(sorted(ranked))}
+    source, sink = 0, 1
+    network = MinCostFlow(2 + len(courses) + len(instructor_nodes))
+
+    for course, node in course_nodes.items():
+        network.add_arc(source, node, 1, 0)
+    choices = {}
+    for course, instructor, rank in candidates:
+        arc = network.add_arc(course_nodes[course], instructor_nodes[instructor], 1, RANK_COST * rank)
+        choices[arc] = Assignment(course, instructor, rank)
+    for instructor, node in instructor_nodes.items():
+        limit, load = instructors[instructor]
+        # No instructor can take more courses than they ranked
+        room = ranked[instructor] if limit is None else min(ranked[instructor], limit - load)
+        for extra in range(1, room + 1):
+            network.add_arc(node, sink, 1, LOAD_COST * (load + extra))
+
+    network.solve(source, sink)
+    return sorted(assignment for arc, assignment in choices.items() if network.flow(arc))
+
+
+def _new_clashes(assignments, slots, taught):
+    """
+    Finds the planned courses that clash with another course of their instructor.
+
+    Assignments are checked best preference first, so of two clashing
+    courses the better ranked one is kept.
+
+    Args:
+        assignments (list): The planned Assignment tuples.
+        slots (dict): Meeting times of the candidate courses, keyed by ``Courses.id``.
+        taught (list): (instructor, slot, course) tuples of the courses already taught.
+
+    Returns:
+        set: The (course, instructor) pairs to exclude.
+    """
+    index = _slot_index(taught)
+    clashes = set()
+    for assignment in sorted(assignments, key=lambda assignment: (assignment.rank, assignment.course)):
+        if index.try_add_course(assignment.instructor, slots.get(assignment.course, []), assignment.course):
+            clashes.add((assignment.course, assignment.instructor))
+    return clashes
+
+
+def _slot_index(taught):
+    """
+    Builds a slot index of the courses instructors already teach.
+
+    Args:
+        taught (list): (instructor, slot, course) tuples.
+
+    Returns:
+        SlotIndex: The index keyed by ``Instructors.id``.
+    """
+    index = SlotIndex()
+    for instructor, slot, course in taught:
+        index.add(instructor, slot, course)
+    return index
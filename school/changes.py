@@ -0,0 +1,253 @@
+"""
+Consumer API of the change log.
+
+Triggers created by ``Database.create_tables`` append every insert, update
+and delete of ``Students``, ``Instructors``, ``Courses``,
+``Registrations`` and ``Waitlist`` to the ``ChangeLog`` table, each with a sequence number
+that only grows. Downstream consumers (caches, search indexes, the reporting
+warehouse) read the log in batches from where they stopped instead of
+re-reading whole tables::
+
+    token = load_token()
+    for batch in tail(connection, token):
+        apply(batch.changes)
+        save_token(batch.token)
+
+The token is the sequence number of the last change a consumer has seen. A
+new consumer loads the tables once and starts from latest_token(). Old entries can be pruned with prune(); a consumer whose token points into
+the pruned part gets a ChangeLogGap and has to reload from the tables.
+
+ChangeWatcher follows the log from a background thread for the apps, so a
+registrar sees the changes made by the others without reloading.
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from school.concurrency import connect
+from school.queries import changed_rows
+
+# One logged change; data holds the new row (or the deleted row) as a dict
+Change = namedtuple('Change', ['seq', 'table', 'operation', 'row_id', 'data', 'changed_at'])
+
+# A batch of changes and the token to resume after it
+ChangeBatch = namedtuple('ChangeBatch', ['changes', 'token'])
+
+# Changes read per query
+BATCH_SIZE = 500
+
+# Seconds between two looks of a ChangeWatcher at the database
+WATCH_INTERVAL = 1.0
+
+# Rows changed at once above which a ChangeWatcher asks for a reload instead
+MAX_PATCHED_ROWS = 1000
+
+
+class ChangeLogGap(Exception):
+    """
+    Raised when changes after a token have already been pruned from the log.
+    """
+
+
+def latest_token(connection):
+    """
+    Returns the token of the newest change, to start following from now on.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Returns:
+        int: The sequence number of the newest change, 0 if none were logged.
+    """
+    row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return row[0] if row else 0
+
+
+def read_changes(connection, token=0, limit=BATCH_SIZE, tables=None):
+    """
+    Reads the changes logged after a token.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        token (int): The sequence number of the last change already seen.
+        limit (int): Maximum number of changes to read.
+        tables (iterable, optional): Only return changes of these tables.
+
+    Returns:
+        ChangeBatch: The changes in sequence order and the token after them.
+    """
+    # Read the gap check and the changes from the same snapshot
+    own_transaction = not connection.in_transaction
+    if own_transaction:
+        connection.execute('BEGIN')
+    try:
+        oldest = connection.execute('SELECT MIN(seq) FROM ChangeLog').fetchone()[0]
+        if oldest is None:
+            oldest = latest_token(connection) + 1
+        # Sequence numbers have no holes, so a jump past the token means the entries were pruned
+        if token < oldest - 1:
+            raise ChangeLogGap(f'Changes {token + 1} to {oldest - 1} were pruned; reload from the tables.')
+        rows = connection.execute('''
+            SELECT seq, table_name, operation, row_id, data, changed_at FROM ChangeLog
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        ''', (token, limit)).fetchall()
+    finally:
+        # End the read transaction so the writers are not held up between batches
+        if own_transaction:
+            connection.commit()
+
+    # The token moves past filtered-out changes too, so they are not read again
+    if rows:
+        token = rows[-1][0]
+    changes = [Change(seq, table, operation, row_id, json.loads(data), changed_at)
+               for seq, table, operation, row_id, data, changed_at in rows
+               if tables is None or table in tables]
+    return ChangeBatch(changes, token)
+
+
+def tail(connection, token=0, batch_size=BATCH_SIZE, tables=None, follow=False, poll_interval=1.0):
+    """
+    Streams the change log in batches.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        token (int): The sequence number of the last change already seen.
+        batch_size (int): Maximum number of changes per batch.
+        tables (iterable, optional): Only return changes of these tables.
+        follow (bool): Keep waiting for new changes instead of stopping at the end.
+        poll_interval (float): Seconds between checks for new changes when following.
+
+    Yields:
+        ChangeBatch: Non-empty batches of changes with the token after each.
+    """
+    while True:
+        batch = read_changes(connection, token, batch_size, tables)
+        if batch.token == token:
+            if not follow:
+                return
+            time.sleep(poll_interval)
+            continue
+        token = batch.token
+        if batch.changes:
+            yield batch
+
+
+def prune(connection, token):
+    """
+    Deletes the changes up to a token that every consumer has processed.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        token (int): The sequence number of the last change to delete.
+
+    Returns:
+        int: The number of changes deleted.
+    """
+    cursor = connection.execute('DELETE FROM ChangeLog WHERE seq <= ?', (token,))
+    connection.commit()
+    return cursor.rowcount
+
+
+class ChangeWatcher(threading.Thread):
+    """
+    Watches a database for the commits of other connections from a background thread.
+
+    Every ``interval`` seconds the thread reads ``PRAGMA data_version`` on
+    its own connection. The value only moves when another connection
+    commits, so an idle database costs one cheap call per look and no read
+    of any table. When it moves, the changes logged since the last look are
+    read, and the ``id`` of the rows that changed are handed to ``fetch``,
+    still in the thread. What it returns is put on the ``updates`` queue,
+    which the GUI thread empties with a timer to patch the rows it shows.
+    None is put instead when the rows cannot be patched one by one, because
+    the log was pruned past the watcher or too many rows changed at once;
+    the tables shown should then be reloaded.
+
+    Rows are grouped by the table the apps show them in: a registration or
+    waitlist entry changes the enrolled or waitlisted count of its course,
+    and an instructor the courses they teach.
+
+    Args:
+        db_name (str): The database file.
+        fetch (callable): Called in the thread as ``fetch(connection, changed)``,
+            where changed maps 'Students', 'Instructors' or 'Courses' to the
+            set of ids that changed; school.queries.changed_rows by default.
+        token (int, optional): The last change already shown, defaults to the
+            newest one when the thread starts.
+        interval (float): Seconds between two looks.
+    """
+
+    def __init__(self, db_name, fetch=changed_rows, token=None, interval=WATCH_INTERVAL):
+        super().__init__(name='ChangeWatcher', daemon=True)
+        self.db_name = db_name
+        self.fetch = fetch
+        self.token = token
+        self.interval = interval
+        self.updates = queue.Queue()
+        self.stopped = threading.Event()
+
+    def run(self):
+        """
+        Looks at the database until stop() is called.
+        """
+        connection = connect(self.db_name)
+        try:
+            if self.token is None:
+                self.token = latest_token(connection)
+            version = None
+            while not self.stopped.wait(self.interval):
+                try:
+                    current = connection.execute('PRAGMA data_version').fetchone()[0]
+                    if current != version:
+                        version = current
+                        self.look(connection)
+                except sqlite3.OperationalError:
+                    # The database is busy or locked for a moment; look again next time
+                    version = None
+        finally:
+            connection.close()
+
+    def look(self, connection):
+        """
+        Reads the changes logged since the last look and queues the rows that changed.
+
+        Args:
+            connection (sqlite3.Connection): The thread's connection.
+        """
+        changed = {'Students': set(), 'Instructors': set(), 'Courses': set()}
+        instructors = set()
+        try:
+            while True:
+                batch = read_changes(connection, self.token)
+                if batch.token == self.token:
+                    break
+                self.token = batch.token
+                for change in batch.changes:
+                    if change.table in ('Registrations', 'Waitlist'):
+                        changed['Courses'].add(change.data['course_id'])
+                    else:
+                        changed[change.table].add(change.row_id)
+                        if change.table == 'Instructors':
+                            instructors.add(change.row_id)
+        except ChangeLogGap:
+            self.token = latest_token(connection)
+            self.updates.put(None)
+            return
+        if instructors:
+            changed['Courses'].update(course for (course,) in connection.execute(
+                'SELECT id FROM Courses WHERE instructor_id IN (SELECT value FROM json_each(?))',
+                (json.dumps(list(instructors)),)))
+        total = sum(map(len, changed.values()))
+        if total > MAX_PATCHED_ROWS:
+            self.updates.put(None)
+        elif total:
+            self.updates.put(self.fetch(connection, {table: ids for table, ids in changed.items() if ids}))
+
+    def stop(self):
+        """
+        Asks the thread to close its connection and end.
+        """
+        self.stopped.set()
@@ -0,0 +1,962 @@
+"""
+Command-line administration of the school database.
+
+Runs the same data layer as the GUIs without importing PyQt or Tkinter, so
+it starts quickly and can be driven by scheduled jobs::
+
+    python -m school --db school.db import students.csv --jobs 4
+    python -m school export --output school.csv
+    python -m school export --format json --kind student --output students.json
+    python -m school register --students S1,S2 --courses EECE338
+    python -m school register --pairs pairs.csv
+    python -m school search ann --kind students
+    python -m school search "mohamad hadad" --fuzzy
+    python -m school backup nightly.db
+    python -m school diff departmental.db
+    python -m school merge departmental.db --prefer newer
+    python -m school changes --since 0 --follow
+    python -m school --db school_management.db migrate
+    python -m school archive --before 2025-3 --inactive
+    python -m school history S1001
+    python -m school split --default-term 2024-3
+    python -m school shards
+    python -m school registrations 2024-3 --course EECE230
+    python -m school report rosters --format html --output-dir rosters/
+    python -m school assign --preferences preferences.csv --term 2025-3
+    python -m school --db big.db generate --students 1000000 --seed 7 --json-dir big/
+    python -m school check --repair
+    python -m school vacuum
+    python -m school stats
+
+Results are written to standard output as they are produced, as CSV where
+they are tabular; progress and problems go to standard error. The exit
+status is 1 when some input was rejected, so a job can tell that it needs
+attention.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from school.database import Database
+
+# Records validated and imported per transaction
+CHUNK_SIZE = 5000
+
+# search --kind -> (table, columns shown, columns matched)
+SEARCHES = {
+    'students': ('Students', ('student_id', 'name', 'age', 'email'), ('name', 'student_id', 'email')),
+    'instructors': ('Instructors', ('instructor_id', 'name', 'age', 'email'), ('name', 'instructor_id', 'email')),
+    'courses': ('Courses', ('course_id', 'course_name', 'capacity', 'enrolled'), ('course_name', 'course_id')),
+}
+
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of at most size items.
+
+    Args:
+        iterable (iterable): The items.
+        size (int): The chunk size.
+
+    Yields:
+        list: The next chunk.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validated_chunks(records, jobs, chunk_size):
+    """
+    Validates records chunk by chunk, on several processes if asked.
+
+    At most two chunks per process are in flight, so memory stays bounded
+    however large the input is, and chunks come back in file order.
+
+    Args:
+        records (iterable): The Record tuples.
+        jobs (int): Number of validating processes; 1 validates in this process.
+        chunk_size (int): Records per chunk.
+
+    Yields:
+        tuple: (chunk, errors) with the records and their validation errors.
+    """
+    from school.exchange import validate_records
+    chunks = chunked(records, chunk_size)
+    if jobs <= 1:
+        for chunk in chunks:
+            yield chunk, validate_records(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(validate_records, chunk)))
+            if len(pending) >= jobs * 2:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def import_chunks(connection, records, jobs, chunk_size):
+    """
+    Validates records on several processes and imports them chunk by chunk.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        records (iterable): The Record tuples.
+        jobs (int): Number of validating processes.
+        chunk_size (int): Records per chunk and transaction.
+
+    Yields:
+        tuple: Per chunk: the import counts, (record, error message) for the
+            invalid and for the rejected records, and the last line read.
+    """
+    from school.exchange import import_records
+    for chunk, errors in validated_chunks(records, jobs, chunk_size):
+        bad = {record.line for record, _ in errors}
+        counts, rejected = import_records(connection, [record for record in chunk if record.line not in bad])
+        yield counts, errors, rejected, chunk[-1].line
+
+
+def import_file(connection, file_name, jobs, chunk_size):
+    """
+    Imports a CSV export or a SchoolStructs JSON file.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        file_name (str): Path of the .csv or .json file.
+        jobs (int): Number of worker processes.
+        chunk_size (int): Records per chunk and transaction for JSON files.
+
+    Yields:
+        tuple: Per chunk: the import counts, (record, error message) for the
+            invalid and for the rejected records, and the last line read.
+    """
+    from school.importer import import_csv
+    from school.roster_file import RosterFile
+    if file_name.lower().endswith('.json'):
+        # Mapped and indexed, so a multi-GB archive is never held in memory
+        with RosterFile(file_name) as roster:
+            yield from import_chunks(connection, roster, jobs, chunk_size)
+    else:
+        # CSV exports are split into byte ranges parsed by the worker processes themselves
+        yield from import_csv(connection, file_name, jobs)
+
+
+def command_import(db, args, out):
+    """
+    Imports students, instructors and courses from CSV exports or SchoolStructs JSON files.
+
+    Invalid and rejected records are written to the output as they are found.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    writer = csv.writer(out)
+    writer.writerow(['File', 'Line', 'Type', 'ID', 'Error'])
+    totals = {'added': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0, 'rejected': 0}
+    for file_name in args.files:
+        for counts, errors, rejected, lines in import_file(db.connection, file_name, args.jobs, args.chunk_size):
+            for record, error in errors + rejected:
+                writer.writerow([file_name, record.line, record.kind, record.key, error])
+            out.flush()
+            for status, count in counts.items():
+                totals[status] += count
+            totals['invalid'] += len(errors)
+            totals['rejected'] += len(rejected)
+            print(f'{file_name}: {lines} lines read', file=sys.stderr)
+    print(', '.join(f'{count} {status}' for status, count in totals.items()), file=sys.stderr)
+    return 1 if totals['invalid'] or totals['rejected'] else 0
+
+
+def command_export(db, args, out):
+    """
+    Exports the database as the Tkinter app's CSV or as SchoolStructs JSON.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream, used when no output file is given.
+
+    Returns:
+        int: The exit status.
+    """
+    from school.exchange import export_csv, export_json
+    file = open(args.output, 'w', newline='') if args.output else out
+    try:
+        if args.format == 'json':
+            count = export_json(db.connection, args.kind.title(), file)
+        else:
+            count = export_csv(db.connection, file)
+    finally:
+        if args.output:
+            file.close()
+    print(f'{count} records exported', file=sys.stderr)
+    return 0
+
+
+def command_register(db, args, out):
+    """
+    Registers students into courses and writes one outcome per pair.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school.registration import parse_keys, read_pairs_csv, register_pairs, summarize
+    pairs = []
+    for file_name in args.pairs or []:
+        pairs.extend(read_pairs_csv(file_name))
+    students, courses = parse_keys(args.students or ''), parse_keys(args.courses or '')
+    pairs.extend((student, course) for student in students for course in courses)
+    if not pairs:
+        print('Nothing to register: give --pairs or both --students and --courses.', file=sys.stderr)
+        return 2
+
+    outcomes = register_pairs(db.connection, pairs)
+    writer = csv.writer(out)
+    writer.writerow(['Student', 'Course', 'Status'])
+    writer.writerows(outcomes)
+    counts = summarize(outcomes)
+    print(', '.join(f'{count} {status}' for status, count in counts.items()), file=sys.stderr)
+    return 1 if any(status.startswith('unknown') for status in counts) else 0
+
+
+def command_search(db, args, out):
+    """
+    Writes the students, instructors or courses matching a text.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import fuzzy
+    table, shown, matched = SEARCHES[args.kind]
+    if args.fuzzy:
+        writer = csv.writer(out)
+        writer.writerow(shown + ('mistakes',))
+        for match in fuzzy.search(db.connection, args.text, (table,), args.limit or 50):
+            row = db.connection.execute(f"SELECT {', '.join(shown)} FROM {table} WHERE id = ?",
+                                        (match.row_id,)).fetchone()
+            if row:
+                writer.writerow(row + (match.distance,))
+        return 0
+    pattern = f'%{args.text.lower()}%'
+    where = ' OR '.join(f'LOWER({column}) LIKE ?' for column in matched)
+    limit = f' LIMIT {int(args.limit)}' if args.limit else ''
+    cursor = db.connection.execute(
+        f"SELECT {', '.join(shown)} FROM {table} WHERE {where} ORDER BY id{limit}", (pattern,) * len(matched)
+    )
+    writer = csv.writer(out)
+    writer.writerow(shown)
+    # Rows are written as SQLite produces them instead of being fetched all at once
+    for row in cursor:
+        writer.writerow(row)
+    return 0
+
+
+def command_backup(db, args, out):
+    """
+    Copies the database to another file while other users keep working.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    def progress(status, remaining, total):
+        print(f'{total - remaining}/{total} pages copied', file=sys.stderr)
+
+    destination = sqlite3.connect(args.destination)
+    try:
+        # Copying in steps lets other connections write between them
+        db.connection.backup(destination, pages=args.pages, progress=progress)
+    finally:
+        destination.close()
+    print(f'Backed up to {args.destination}', file=out)
+    return 0
+
+
+def command_vacuum(db, args, out):
+    """
+    Rebuilds the database file to reclaim the space of deleted rows.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    before = os.path.getsize(args.db)
+    db.connection.execute('VACUUM')
+    after = os.path.getsize(args.db)
+    print(f'{args.db}: {before} -> {after} bytes', file=out)
+    return 0
+
+
+def command_diff(db, args, out):
+    """
+    Writes the rows that merging another database into this one would change.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import sync
+    other = _open_other(args.other)
+    if other is None:
+        return 2
+    try:
+        sync.prepare(db.connection)
+        writer = csv.writer(out)
+        writer.writerow(['Table', 'Change', 'Key', args.other, args.db])
+        for change in sync.diff(other, db.connection):
+            writer.writerow([change.table, change.kind, '/'.join(change.key),
+                             _contents(change.source), _contents(change.target)])
+    finally:
+        other.close()
+    return 0
+
+
+def command_merge(db, args, out):
+    """
+    Applies the differences of another database to this one.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import sync
+    other = _open_other(args.other)
+    if other is None:
+        return 2
+    try:
+        sync.prepare(db.connection)
+        applied = sync.merge(other, db.connection, args.prefer, args.mirror)
+    finally:
+        other.close()
+    writer = csv.writer(out)
+    writer.writerow(['Table', 'Change', 'Rows'])
+    writer.writerows((table, kind, count) for (table, kind), count in applied.items())
+    return 0
+
+
+def _open_other(file_name):
+    """
+    Opens the database compared with by diff and merge, which are never allowed to change it.
+
+    The file is opened read-only and not migrated, so it must already be at
+    the schema version of this program.
+
+    Args:
+        file_name (str): The other database.
+
+    Returns:
+        sqlite3.Connection: The read-only connection, or None after an
+            error was printed.
+    """
+    from school.concurrency import connect
+    from school.migrations import SCHEMA_VERSION, schema_version
+
+    if not os.path.exists(file_name):
+        print(f'{file_name} does not exist.', file=sys.stderr)
+        return None
+    connection = connect(file_name, read_only=True)
+    version = schema_version(connection)
+    if version != SCHEMA_VERSION:
+        connection.close()
+        print(f'{file_name} has schema version {version}, not {SCHEMA_VERSION}; upgrade it first with '
+              f'"python -m school --db {file_name} migrate".', file=sys.stderr)
+        return None
+    return connection
+
+
+def _contents(values):
+    """
+    Formats the contents of one side of a row difference.
+
+    Args:
+        values (tuple): The contents, or None if the row is missing on that side.
+
+    Returns:
+        str: The values separated by " | ", "(missing)" or "(present)".
+    """
+    if values is None:
+        return '(missing)'
+    return ' | '.join('' if value is None else str(value) for value in values) or '(present)'
+
+
+def command_changes(db, args, out):
+    """
+    Streams the change log as one JSON object per line.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import changes
+    token = args.since
+    try:
+        for batch in changes.tail(db.connection, token, args.batch or changes.BATCH_SIZE, args.table, args.follow):
+            for change in batch.changes:
+                out.write(json.dumps(change._asdict()) + '\n')
+            out.flush()
+            token = batch.token
+    except changes.ChangeLogGap as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    # The token to pass to --since next time
+    print(f'token {token}', file=sys.stderr)
+    return 0
+
+
+def command_prune_changes(db, args, out):
+    """
+    Deletes change log entries that every consumer has processed.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import changes
+    print(f'{changes.prune(db.connection, args.token)} changes pruned', file=out)
+    return 0
+
+
+def command_migrate(db, args, out):
+    """
+    Reports the schema version after opening (and so upgrading) the database.
+
+    Rows of the Tkinter layout that could not be converted are listed, and
+    make the exit status 1.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import migrations
+    print(f'{args.db}: schema version {migrations.schema_version(db.connection)}', file=out)
+    leftovers = migrations.leftover_rows(db.connection)
+    for table, count in leftovers.items():
+        print(f'{count} rows of {table} could not be converted and were kept', file=sys.stderr)
+    return 1 if leftovers else 0
+
+
+def command_archive(db, args, out):
+    """
+    Moves past terms and soft-deleted records into the per-term archive files.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import archive
+    def progress(term, table, rows):
+        print(f'{term}: moved {rows} {table.lower()}', file=sys.stderr)
+
+    moved = archive.archive(db.connection, args.before, args.inactive, args.batch_size or archive.BATCH_SIZE, progress)
+    writer = csv.writer(out)
+    writer.writerow(['Term', 'Table', 'Rows', 'File'])
+    for (term, table), rows in sorted(moved.items()):
+        writer.writerow([term, table, rows, archive.archive_file(db.connection, term)])
+    return 0
+
+
+def command_history(db, args, out):
+    """
+    Writes every course a student has taken, including archived terms.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status, 1 if the student has no courses on record.
+    """
+    from school import archive
+    rows = archive.transcript(db.connection, args.student, args.term)
+    writer = csv.writer(out)
+    writer.writerow(['Term', 'Course ID', 'Course', 'Instructor', 'Source'])
+    writer.writerows(rows)
+    return 0 if rows else 1
+
+
+def command_split(db, args, out):
+    """
+    Splits the registrations of past terms into one shard file per term.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status, 1 if some courses still have no term.
+    """
+    from school import archive, shards
+    def progress(term, table, rows):
+        if term is None:
+            print(f'gave a term to {rows} courses', file=sys.stderr)
+        else:
+            print(f'{term}: moved {rows} {table.lower()}', file=sys.stderr)
+
+    moved = shards.split(db.connection, args.before, args.default_term, args.batch_size or archive.BATCH_SIZE,
+                         progress)
+    writer = csv.writer(out)
+    writer.writerow(['Term', 'Table', 'Rows', 'File'])
+    for (term, table), rows in sorted(moved.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+        writer.writerow([term or '', table, rows, archive.archive_file(db.connection, term) if term else ''])
+    undated = db.connection.execute('SELECT COUNT(*) FROM Courses WHERE term IS NULL').fetchone()[0]
+    if undated:
+        print(f'{undated} courses have no term and stay in the main database; '
+              f'give them one with --default-term', file=sys.stderr)
+        return 1
+    return 0
+
+
+def command_shards(db, args, out):
+    """
+    Writes where the registrations of every term live.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import shards
+    writer = csv.writer(out)
+    writer.writerow(['Term', 'Location', 'Courses', 'Registrations'])
+    for shard in shards.layout(db.connection):
+        writer.writerow([shard.term or '', shard.location, shard.courses, shard.registrations or 0])
+    return 0
+
+
+def command_registrations(db, args, out):
+    """
+    Writes the registrations of a term, wherever its shard is.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import shards
+    writer = csv.writer(out)
+    writer.writerow(['Term', 'Course ID', 'Course', 'Student ID', 'Student', 'Source'])
+    with shards.ShardRouter(db.connection) as router:
+        writer.writerows(router.registrations(args.term, args.course, args.student))
+    return 0
+
+
+def command_report(db, args, out):
+    """
+    Writes the roster of every course or the course list of every student.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import reports
+    generate = reports.rosters if args.kind == reports.ROSTERS else reports.transcripts
+    if args.output_dir:
+        count = reports.write_report_files(generate(db.connection), args.format, args.output_dir)
+        print(f'Wrote {count} {args.kind} to {args.output_dir}', file=sys.stderr)
+    else:
+        reports.write_reports(generate(db.connection), args.format, out)
+    return 0
+
+
+def command_assign(db, args, out):
+    """
+    Gives the unassigned courses to instructors who ranked them, balancing teaching loads.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import assignment
+    term = args.term
+    unknown = []
+    for file_name in args.preferences or []:
+        unknown.extend(assignment.set_preferences(db.connection, assignment.read_preferences_csv(file_name)))
+    for instructor, course, rank in unknown:
+        print(f'Unknown instructor or course in preference: {instructor}, {course}, {rank}', file=sys.stderr)
+
+    planned = assignment.plan_assignments(db.connection, term)
+    if not args.dry_run:
+        planned = assignment.apply_assignments(db.connection, planned)
+    courses = dict(db.connection.execute('SELECT id, course_id FROM Courses'))
+    instructors = dict(db.connection.execute('SELECT id, instructor_id FROM Instructors'))
+    writer = csv.writer(out)
+    writer.writerow(['Course', 'Instructor', 'Rank'])
+    for course, instructor, rank in planned:
+        writer.writerow([courses[course], instructors[instructor], rank])
+    left = db.connection.execute(f'''
+        SELECT COUNT(*) FROM Courses c
+        WHERE NOT EXISTS (SELECT 1 FROM Instructors t WHERE t.id = c.instructor_id) {'AND c.term = ?' if term else ''}
+    ''', (term,) if term else ()).fetchone()[0]
+    print(f"{len(planned)} courses {'would be ' if args.dry_run else ''}assigned, "
+          f"{left - (len(planned) if args.dry_run else 0)} left without an instructor", file=sys.stderr)
+    return 1 if unknown else 0
+
+
+def command_generate(db, args, out):
+    """
+    Fills an empty database with a synthetic school for load testing.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    from school import synthetic
+    from school.exchange import COURSE, INSTRUCTOR, STUDENT, export_json
+    def progress(table, done, total):
+        print(f'{table}: {done}/{total} rows', file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        inserted = synthetic.generate(db.connection, args.students, args.instructors, args.courses, args.seed,
+                                      args.terms, args.batch_size or synthetic.BATCH_SIZE, progress)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - start
+    writer = csv.writer(out)
+    writer.writerow(['Table', 'Rows'])
+    writer.writerows(inserted.items())
+    rows = sum(inserted.values())
+    print(f'{rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9) * 60:,.0f} rows/minute)', file=sys.stderr)
+
+    if args.json_dir:
+        os.makedirs(args.json_dir, exist_ok=True)
+        for kind in (STUDENT, INSTRUCTOR, COURSE):
+            file_name = os.path.join(args.json_dir, f'{kind.lower()}s.json')
+            with open(file_name, 'w') as file:
+                export_json(db.connection, kind, file)
+            print(f'wrote {file_name}', file=sys.stderr)
+    return 0
+
+
+def command_check(db, args, out):
+    """
+    Checks the database for orphaned, duplicate and invalid rows, and repairs them on request.
+
+    The check runs in short slices with pauses in between, so other users
+    keep working meanwhile; an interrupted check carries on where it stopped.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status, 1 if problems were left unrepaired.
+    """
+    from school import integrity
+    if args.restart:
+        integrity.restart(db.connection)
+    resumed = integrity.position(db.connection)
+    if resumed:
+        print(f'Resuming at {resumed[0]}, after row {resumed[1]}', file=sys.stderr)
+    writer = csv.writer(out)
+    writer.writerow(['Check', 'Table', 'Row', 'Problem', 'Repaired'])
+    counts = {'found': 0, 'repaired': 0}
+    try:
+        slice_seconds = integrity.SLICE_SECONDS if args.slice_ms is None else args.slice_ms / 1000
+        pause_seconds = integrity.PAUSE_SECONDS if args.pause_ms is None else args.pause_ms / 1000
+        for problem in integrity.run(db.connection, args.repair, slice_seconds, pause_seconds,
+                                     args.batch_size or integrity.BATCH_SIZE):
+            writer.writerow([problem.check, problem.table, problem.row_id, problem.detail,
+                             'yes' if problem.repaired else 'no'])
+            counts['found'] += 1
+            counts['repaired'] += problem.repaired
+    except KeyboardInterrupt:
+        print('Stopped; run the command again to carry on.', file=sys.stderr)
+        return 1
+    print(f"{counts['found']} problems found, {counts['repaired']} repaired", file=sys.stderr)
+    return 1 if counts['found'] > counts['repaired'] else 0
+
+
+def command_stats(db, args, out):
+    """
+    Writes row counts and storage figures of the database.
+
+    Args:
+        db (Database): The open database.
+        args (argparse.Namespace): The parsed arguments.
+        out: The output stream.
+
+    Returns:
+        int: The exit status.
+    """
+    connection = db.connection
+    writer = csv.writer(out)
+    writer.writerow(['Statistic', 'Value'])
+    for table in ('Students', 'Instructors', 'Courses', 'Registrations', 'Waitlist'):
+        writer.writerow([table.lower(), connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]])
+    writer.writerow(['full courses', connection.execute(
+        'SELECT COUNT(*) FROM Courses WHERE capacity IS NOT NULL AND enrolled >= capacity'
+    ).fetchone()[0]])
+    page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+    writer.writerow(['file bytes', connection.execute('PRAGMA page_count').fetchone()[0] * page_size])
+    writer.writerow(['free bytes', connection.execute('PRAGMA freelist_count').fetchone()[0] * page_size])
+    return 0
+
+
+def build_parser():
+    """
+    Builds the argument parser of the command line.
+
+    The modules behind a subcommand are only imported when it runs, so the
+    parser takes no defaults or choices from them: options left out are
+    None and the command falls back to the module's default.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog='python -m school', description='Administer the school database.')
+    parser.add_argument('--db', default='school.db', help='database file (default: school.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_import = commands.add_parser('import', help='import CSV exports or SchoolStructs JSON files')
+    parser_import.add_argument('files', nargs='+', help='.csv or .json files')
+    parser_import.add_argument('--jobs', type=int, default=1, help='processes validating records (default: 1)')
+    parser_import.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                               help=f'records per transaction in JSON files (default: {CHUNK_SIZE})')
+    parser_import.set_defaults(handler=command_import)
+
+    parser_export = commands.add_parser('export', help='export the database')
+    parser_export.add_argument('--output', help='file to write (default: standard output)')
+    parser_export.add_argument('--format', choices=('csv', 'json'), default='csv')
+    parser_export.add_argument('--kind', choices=('student', 'instructor', 'course'),
+                               default='student', help='records written by --format json')
+    parser_export.set_defaults(handler=command_export)
+
+    parser_register = commands.add_parser('register', help='register students into courses')
+    parser_register.add_argument('--students', help='student IDs or emails, comma separated')
+    parser_register.add_argument('--courses', help='course IDs or names, comma separated')
+    parser_register.add_argument('--pairs', action='append', help='CSV file of (student, course) rows')
+    parser_register.set_defaults(handler=command_register)
+
+    parser_search = commands.add_parser('search', help='search by name, ID or email')
+    parser_search.add_argument('text')
+    parser_search.add_argument('--kind', choices=tuple(SEARCHES), default='students')
+    parser_search.add_argument('--limit', type=int)
+    parser_search.add_argument('--fuzzy', action='store_true',
+                               help='match names despite typing mistakes, closest first (default limit 50)')
+    parser_search.set_defaults(handler=command_search)
+
+    parser_backup = commands.add_parser('backup', help='copy the database to another file')
+    parser_backup.add_argument('destination')
+    parser_backup.add_argument('--pages', type=int, default=1024, help='pages copied per step (default: 1024)')
+    parser_backup.set_defaults(handler=command_backup)
+
+    parser_diff = commands.add_parser('diff', help='list the rows that merging another database would change')
+    parser_diff.add_argument('other', help='database to compare with, such as a departmental copy')
+    parser_diff.set_defaults(handler=command_diff)
+
+    parser_merge = commands.add_parser('merge', help='apply the changes of another database')
+    parser_merge.add_argument('other', help='database to take the changes from')
+    parser_merge.add_argument('--prefer', choices=('source', 'newer'), default='source',
+                              help='for rows changed on both sides, take the other database\'s row (source, the default) '
+                                   'or the one changed last according to the change logs (newer)')
+    parser_merge.add_argument('--mirror', action='store_true', help='also delete rows missing from the other database')
+    parser_merge.set_defaults(handler=command_merge)
+
+    parser_changes = commands.add_parser('changes', help='stream the change log as JSON lines')
+    parser_changes.add_argument('--since', type=int, default=0, help='token printed by the previous run (default: 0)')
+    parser_changes.add_argument('--table', action='append', help='only changes of this table (repeatable)')
+    parser_changes.add_argument('--batch', type=int, help='changes read per query')
+    parser_changes.add_argument('--follow', action='store_true', help='keep waiting for new changes')
+    parser_changes.set_defaults(handler=command_changes)
+
+    parser_prune = commands.add_parser('prune-changes', help='delete change log entries up to a token')
+    parser_prune.add_argument('token', type=int)
+    parser_prune.set_defaults(handler=command_prune_changes)
+
+    parser_archive = commands.add_parser('archive', help='move past terms and deleted records to archive files')
+    parser_archive.add_argument('--before', help='first term to keep, as YYYY-N (default: the current term)')
+    parser_archive.add_argument('--inactive', action='store_true',
+                                help='also archive students and instructors left without current courses')
+    parser_archive.add_argument('--batch-size', type=int, help='rows moved per transaction')
+    parser_archive.set_defaults(handler=command_archive)
+
+    parser_history = commands.add_parser('history', help="list a student's courses, including archived terms")
+    parser_history.add_argument('student', help='student ID')
+    parser_history.add_argument('--term', action='append', help='only search this archived term (repeatable)')
+    parser_history.set_defaults(handler=command_history)
+
+    parser_split = commands.add_parser('split', help='move the registrations of past terms to one file per term')
+    parser_split.add_argument('--before', type=_term,
+                              help='first term to keep in the main database, as YYYY-N (default: the current term)')
+    parser_split.add_argument('--default-term', type=_term,
+                              help='term of courses without one that the change log cannot date')
+    parser_split.add_argument('--batch-size', type=int, help='rows moved per transaction')
+    parser_split.set_defaults(handler=command_split)
+
+    commands.add_parser('shards', help='show where the registrations of each term live').set_defaults(
+        handler=command_shards)
+
+    parser_registrations = commands.add_parser('registrations', help='list the registrations of a term')
+    parser_registrations.add_argument('term', type=_term, help='the term, as YYYY-N')
+    parser_registrations.add_argument('--course', help='only this course ID')
+    parser_registrations.add_argument('--student', help='only this student ID')
+    parser_registrations.set_defaults(handler=command_registrations)
+
+    parser_report = commands.add_parser('report', help='write course rosters or student transcripts')
+    parser_report.add_argument('kind', choices=('rosters', 'transcripts'))
+    parser_report.add_argument('--format', choices=('csv', 'html', 'txt'), default='csv')
+    parser_report.add_argument('--output-dir', help='write one file per course or student here '
+                                                    '(default: all to standard output)')
+    parser_report.set_defaults(handler=command_report)
+
+    parser_assign = commands.add_parser('assign', help='give unassigned courses to instructors who ranked them')
+    parser_assign.add_argument('--preferences', action='append',
+                               help='CSV file of (instructor, course, rank) rows to record first')
+    parser_assign.add_argument('--term', type=_term, help='only assign the courses of this term, as YYYY-N')
+    parser_assign.add_argument('--dry-run', action='store_true', help='show the assignment without saving it')
+    parser_assign.set_defaults(handler=command_assign)
+
+    parser_generate = commands.add_parser('generate', help='fill an empty database with a synthetic school')
+    parser_generate.add_argument('--students', type=int, default=1000)
+    parser_generate.add_argument('--instructors', type=int, default=50)
+    parser_generate.add_argument('--courses', type=int, default=200)
+    parser_generate.add_argument('--seed', type=int, default=0, help='the same seed gives the same school')
+    parser_generate.add_argument('--terms', type=int, default=1,
+                                 help='spread the courses over this many terms, ending with the current one')
+    parser_generate.add_argument('--batch-size', type=int, help='rows inserted per transaction')
+    parser_generate.add_argument('--json-dir', help='also write students.json, instructors.json and courses.json '
+                                                    'in the SchoolStructs format here')
+    parser_generate.set_defaults(handler=command_generate)
+
+    parser_check = commands.add_parser('check', help='find orphaned, duplicate and invalid rows')
+    parser_check.add_argument('--repair', action='store_true', help='repair what can be repaired')
+    parser_check.add_argument('--restart', action='store_true', help='start over instead of resuming')
+    parser_check.add_argument('--slice-ms', type=float, help='milliseconds of work between pauses')
+    parser_check.add_argument('--pause-ms', type=float,
+                              help='milliseconds to leave the database to others between slices')
+    parser_check.add_argument('--batch-size', type=int, help='rows looked at per transaction')
+    parser_check.set_defaults(handler=command_check)
+
+    commands.add_parser('migrate', help='upgrade the database to the current schema').set_defaults(handler=command_migrate)
+    commands.add_parser('vacuum', help='reclaim unused space').set_defaults(handler=command_vacuum)
+    commands.add_parser('stats', help='show row counts and file size').set_defaults(handler=command_stats)
+    return parser
+
+
+def _term(text):
+    """
+    Checks a term given on the command line.
+
+    Args:
+        text (str): The term, as YYYY-N.
+
+    Returns:
+        str: The term.
+
+    Raises:
+        ValueError: If the term is not of the form YYYY-N.
+    """
+    from school.archive import check_term
+    return check_term(text)
+
+
+def main(argv=None):
+    """
+    Runs the command line.
+
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv.
+
+    Returns:
+        int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+
+    def progress(table, done, total):
+        print(f'Converting {table}: {done}/{total} rows', file=sys.stderr)
+
+    # Opening a database written by an older version upgrades it first
+    db = Database(args.db, progress=progress)
+    try:
+        return args.handler(db, args, sys.stdout)
+    except BrokenPipeError:
+        # The reader of our output (for example `head`) went away
+        return 0
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+"""
+Helpers for several app instances sharing one database file.
+
+Every connection waits on a busy timeout before SQLite reports
+``database is locked``, and write operations are retried with exponential
+backoff when that still happens. Lost updates are prevented with optimistic
+concurrency control: rows carry a ``version`` column and updates or deletes
+only apply to the version the user was looking at.
+"""
+import functools
+import os
+import random
+import sqlite3
+import time
+from urllib.parse import quote
+
+# How long a connection waits for another writer before giving up, in seconds
+BUSY_TIMEOUT = 5.0
+
+
+class ConflictError(Exception):
+    """
+    Raised when a row was changed or deleted by someone else since it was read.
+    """
+
+
+def connect(db_name, timeout=BUSY_TIMEOUT, read_only=False):
+    """
+    Opens a connection configured for shared access.
+
+    The rollback journal is kept instead of WAL because WAL does not work
+    when the database sits on a network share. Foreign keys are enforced, so
+    deleting a row carries out the ``ON DELETE`` actions of the schema.
+
+    Args:
+        db_name (str): The name of the database file.
+        timeout (float): Seconds to wait on a locked database.
+        read_only (bool): Open the file so that nothing can write to it; it
+            must exist.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    if read_only:
+        connection = sqlite3.connect(f'file:{quote(os.path.abspath(db_name))}?mode=ro', timeout=timeout, uri=True)
+    else:
+        connection = sqlite3.connect(db_name, timeout=timeout)
+    connection.execute(f'PRAGMA busy_timeout = {int(timeout * 1000)}')
+    connection.execute('PRAGMA foreign_keys = ON')
+    return connection
+
+
+def is_busy_error(error):
+    """
+    Checks whether an error means another connection holds the lock.
+
+    Args:
+        error (Exception): The error raised by sqlite3.
+
+    Returns:
+        bool: True for "database is locked" and "database is busy" errors.
+    """
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def retry_on_busy(function=None, attempts=6, base_delay=0.05, max_delay=2.0):
+    """
+    Retries a database operation with exponential backoff while the database is locked.
+
+    The wrapped operation must roll back its own transaction before raising,
+    as every write function of the data layer does. Can be used as
+    ``@retry_on_busy`` or ``@retry_on_busy(attempts=...)``.
+
+    Args:
+        function (callable, optional): The operation to wrap.
+        attempts (int): Maximum number of tries.
+        base_delay (float): Delay before the first retry, in seconds.
+        max_delay (float): Upper bound of a single delay, in seconds.
+
+    Returns:
+        callable: The wrapped operation, or a decorator if no function was given.
+    """
+    def decorator(operation):
+        @functools.wraps(operation)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return operation(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not is_busy_error(e) or attempt == attempts - 1:
+                        raise
+                # Full jitter keeps competing instances from retrying in lockstep
+                time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+        return wrapper
+
+    if function is not None:
+        return decorator(function)
+    return decorator
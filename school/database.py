@@ -0,0 +1,594 @@
+from school import migrations
+from school.concurrency import connect
+from school.registration import register_many
+
+# Columns whose changes bump the row version used for optimistic concurrency control
+VERSIONED_COLUMNS = {
+    'Students': ('name', 'age', 'email', 'student_id'),
+    'Instructors': ('name', 'age', 'email', 'instructor_id'),
+    'Courses': ('course_id', 'course_name', 'instructor_id', 'capacity'),
+}
+
+# Columns recorded in the change log for every insert, update and delete
+CHANGE_LOG_COLUMNS = {
+    'Students': ('id', 'name', 'age', 'email', 'student_id', 'version'),
+    'Instructors': ('id', 'name', 'age', 'email', 'instructor_id', 'version'),
+    'Courses': ('id', 'course_id', 'course_name', 'instructor_id', 'capacity', 'version'),
+    'Registrations': ('id', 'student_id', 'course_id'),
+    'Waitlist': ('id', 'student_id', 'course_id'),
+}
+
+# Rows of the "View All" directory: sort order and type of each table, then
+# the columns shown as ID, Name, Age and Email (None where a table has none)
+DIRECTORY_SOURCES = {
+    'Students': (0, 'Student', ('student_id', 'name', 'age', 'email')),
+    'Instructors': (1, 'Instructor', ('instructor_id', 'name', 'age', 'email')),
+    'Courses': (2, 'Course', ('course_id', 'course_name', None, None)),
+}
+
+# Tables whose every write bumps their counter in TableVersions, so cached
+# search results (school.queries.SearchCache) know when they are out of date
+COUNTED_TABLES = ('Students', 'Instructors', 'Courses', 'Waitlist')
+
+# Tables whose rows school.sync compares between two databases, keeping a
+# digest of every row that triggers mark out of date when it is written
+SYNCED_TABLES = ('Instructors', 'Students', 'Courses', 'Registrations')
+
+# Writes that change what another synced row looks like to the sync: the
+# table and column written (None for every write), the synced table affected
+# and a SELECT of the affected ids over the NEW or OLD row named {row}
+SYNC_DEPENDENCIES = (
+    # A course is compared with its meeting times
+    ('CourseSlots', None, 'Courses', 'SELECT {row}.course_id'),
+    # Courses name their instructor, and registrations their student and course, by natural key
+    ('Instructors', 'instructor_id', 'Courses', 'SELECT id FROM Courses WHERE instructor_id = {row}.id'),
+    ('Students', 'student_id', 'Registrations', 'SELECT id FROM Registrations WHERE student_id = {row}.id'),
+    ('Courses', 'course_id', 'Registrations', 'SELECT id FROM Registrations WHERE course_id = {row}.id'),
+)
+
+# Longest name, in characters, whose every word goes into the fuzzy search index
+MAX_NAME_LENGTH = 200
+
+# Splits Directory names into lower-case words for the fuzzy search index: a
+# word starts after every space that is not followed by another space. {names}
+# selects the kind, row_id and name, with a space put in front of the name.
+NAME_WORDS = '''
+    SELECT substr(n.name, p.position, instr(substr(n.name, p.position) || ' ', ' ') - 1), n.kind, n.row_id
+    FROM ({names}) n JOIN CharacterPositions p ON p.position <= length(n.name)
+    WHERE substr(n.name, p.position - 1, 1) = ' ' AND substr(n.name, p.position, 1) <> ' '
+'''
+
+# Layout of soft-deleted and archived rows: the Deleted<table> tables of the
+# main database and the tables of the per-term archive files share it
+ARCHIVED_COLUMNS = {
+    'Students': ('id INTEGER PRIMARY KEY', 'name TEXT NOT NULL', 'age INTEGER NOT NULL', 'email TEXT NOT NULL',
+                 'student_id TEXT NOT NULL', 'version INTEGER NOT NULL', 'deleted_at TEXT'),
+    'Instructors': ('id INTEGER PRIMARY KEY', 'name TEXT NOT NULL', 'age INTEGER NOT NULL', 'email TEXT NOT NULL',
+                    'instructor_id TEXT NOT NULL', 'version INTEGER NOT NULL', 'deleted_at TEXT'),
+    'Courses': ('id INTEGER PRIMARY KEY', 'course_id TEXT NOT NULL', 'course_name TEXT NOT NULL',
+                'instructor_id INTEGER', 'capacity INTEGER', 'term TEXT', 'version INTEGER NOT NULL',
+                'deleted_at TEXT'),
+    'Registrations': ('id INTEGER PRIMARY KEY', 'student_id INTEGER NOT NULL', 'course_id INTEGER NOT NULL',
+                      'deleted_at TEXT'),
+}
+
+# Database initialization and operations
+class Database:
+    """
+    Handles the database operations for the School Management System.
+    """
+    def __init__(self, db_name='school.db', progress=None):
+        """
+        Initializes the Database object, creates tables if they don't exist
+        and upgrades databases written by older versions of the apps.
+
+        Args:
+            db_name (str): The name of the database file.
+            progress (callable, optional): Called as progress(table, done, total)
+                while an older database is converted.
+        """
+        # Connect to the SQLite database (or create it if it doesn't exist),
+        # waiting on other app instances instead of failing straight away
+        self.connection = connect(db_name)
+        # Kept for the threads that open connections of their own to the same file
+        self.db_name = db_name
+        # Create the necessary tables
+        self.create_tables()
+        # Convert the data of older layouts into them
+        migrations.migrate(self.connection, progress=progress)
+
+    def create_tables(self):
+        """
+        Creates the necessary tables in the database if they do not already exist.
+        """
+        # A database of the Tkinter layout keeps its tables under other names until they are converted
+        migrations.set_aside_tkinter_tables(self.connection)
+
+        # Create a cursor object to execute SQL commands
+        cursor = self.connection.cursor()
+
+        # Create Students table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Students (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                student_id TEXT UNIQUE NOT NULL
+            )
+        ''')
+
+        # Create Instructors table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Instructors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                instructor_id TEXT UNIQUE NOT NULL
+            )
+        ''')
+
+        # Create Courses table. Deleting a student or course deletes the rows that
+        # point at it (registrations, waitlist entries, meeting times, teaching
+        # preferences); deleting an instructor leaves their courses unassigned.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Courses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                course_id TEXT UNIQUE NOT NULL,
+                course_name TEXT NOT NULL,
+                instructor_id INTEGER,
+                FOREIGN KEY (instructor_id) REFERENCES Instructors(id) ON DELETE SET NULL
+            )
+        ''')
+
+        # Courses are looked up by name from the dropdowns and bulk registration
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_name ON Courses(course_name)')
+
+        # Create Registrations table (for many-to-many relationship between Students and Courses)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Registrations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                FOREIGN KEY (student_id) REFERENCES Students(id) ON DELETE CASCADE,
+                FOREIGN KEY (course_id) REFERENCES Courses(id) ON DELETE CASCADE,
+                UNIQUE(student_id, course_id)
+            )
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_registrations_course ON Registrations(course_id)')
+
+        # Course capacity (NULL means unlimited) and a running count of registered students
+        self.add_column(cursor, 'Courses', 'capacity', 'INTEGER CHECK(capacity >= 0)')
+        if self.add_column(cursor, 'Courses', 'enrolled', 'INTEGER NOT NULL DEFAULT 0'):
+            cursor.execute('''
+                UPDATE Courses SET enrolled = (
+                    SELECT COUNT(*) FROM Registrations r WHERE r.course_id = Courses.id
+                )
+            ''')
+
+        # Keep the enrolled count in step with Registrations so capacity checks are O(1)
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS registrations_enrolled_insert
+            AFTER INSERT ON Registrations
+            BEGIN
+                UPDATE Courses SET enrolled = enrolled + 1 WHERE id = NEW.course_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS registrations_enrolled_delete
+            AFTER DELETE ON Registrations
+            BEGIN
+                UPDATE Courses SET enrolled = enrolled - 1 WHERE id = OLD.course_id;
+            END
+        ''')
+
+        # Create Waitlist table; the AUTOINCREMENT id orders students first come, first served
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Waitlist (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                requested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (student_id) REFERENCES Students(id) ON DELETE CASCADE,
+                FOREIGN KEY (course_id) REFERENCES Courses(id) ON DELETE CASCADE,
+                UNIQUE(student_id, course_id)
+            )
+        ''')
+        # Finding the head of a course's waitlist is a single index seek
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_waitlist_course ON Waitlist(course_id, id)')
+
+        # Create CourseSlots table holding the weekly meeting times of each course
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS CourseSlots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                course_id INTEGER NOT NULL,
+                day INTEGER NOT NULL CHECK(day BETWEEN 0 AND 6),
+                start_minute INTEGER NOT NULL,
+                end_minute INTEGER NOT NULL,
+                FOREIGN KEY (course_id) REFERENCES Courses(id) ON DELETE CASCADE,
+                CHECK(start_minute < end_minute)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courseslots_course ON CourseSlots(course_id, day, start_minute)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_instructor ON Courses(instructor_id)')
+
+        # Teaching load limit of an instructor (NULL means no limit) and the courses
+        # they would like to teach, rank 1 being their first choice, for auto-assignment
+        self.add_column(cursor, 'Instructors', 'max_courses', 'INTEGER CHECK(max_courses >= 0)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS TeachingPreferences (
+                instructor_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                rank INTEGER NOT NULL CHECK(rank >= 1),
+                PRIMARY KEY (instructor_id, course_id),
+                FOREIGN KEY (instructor_id) REFERENCES Instructors(id) ON DELETE CASCADE,
+                FOREIGN KEY (course_id) REFERENCES Courses(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_preferences_course ON TeachingPreferences(course_id)')
+
+        # Row versions: any writer that changes a row without bumping its version gets it bumped by a trigger
+        for table, columns in VERSIONED_COLUMNS.items():
+            self.add_column(cursor, table, 'version', 'INTEGER NOT NULL DEFAULT 1')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_bump
+                AFTER UPDATE OF {', '.join(columns)} ON {table}
+                WHEN NEW.version = OLD.version
+                BEGIN
+                    UPDATE {table} SET version = version + 1 WHERE id = NEW.id;
+                END
+            ''')
+
+        # Term of a course as "YYYY-N" (1 spring, 2 summer, 3 fall); NULL for courses outside the term calendar
+        self.add_column(cursor, 'Courses', 'term', "TEXT CHECK(term GLOB '[0-9][0-9][0-9][0-9]-[123]')")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_term ON Courses(term)')
+
+        # Soft-deleted rows leave the hot tables for these until they are archived by term
+        for table, columns in ARCHIVED_COLUMNS.items():
+            self.create_archived_table(cursor, f'Deleted{table}', columns)
+
+        # Change data capture: an append-only log of every change, in commit order.
+        # AUTOINCREMENT guarantees that sequence numbers only grow, even after pruning.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ChangeLog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                operation TEXT NOT NULL CHECK(operation IN ('insert', 'update', 'delete')),
+                row_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # The last change of a row, which merges with --prefer newer compare
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_changelog_row ON ChangeLog(table_name, row_id)')
+        for table, columns in CHANGE_LOG_COLUMNS.items():
+            self.create_change_triggers(cursor, table, columns)
+
+        # Materialized "View All": students, instructors and courses in one table,
+        # clustered in display order and kept current by triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Directory (
+                kind INTEGER NOT NULL,
+                row_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                age INTEGER,
+                email TEXT,
+                PRIMARY KEY (kind, row_id)
+            ) WITHOUT ROWID
+        ''')
+        for table, (kind, label, columns) in DIRECTORY_SOURCES.items():
+            self.create_directory_triggers(cursor, table, kind, label, columns)
+
+        # Fuzzy name search: every word of every directory name, and the trigrams
+        # of each distinct word, so misspellings are matched against the few
+        # thousand distinct words instead of every name
+        cursor.execute('CREATE TABLE IF NOT EXISTS CharacterPositions (position INTEGER PRIMARY KEY)')
+        if cursor.execute('SELECT COUNT(*) FROM CharacterPositions').fetchone()[0] < MAX_NAME_LENGTH + 1:
+            cursor.executemany('INSERT OR IGNORE INTO CharacterPositions (position) VALUES (?)',
+                               ((position,) for position in range(1, MAX_NAME_LENGTH + 2)))
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS NameWords (
+                word TEXT NOT NULL,
+                kind INTEGER NOT NULL,
+                row_id INTEGER NOT NULL,
+                PRIMARY KEY (word, kind, row_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_namewords_row ON NameWords(kind, row_id)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS WordGrams (
+                gram TEXT NOT NULL,
+                word TEXT NOT NULL,
+                PRIMARY KEY (gram, word)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_wordgrams_word ON WordGrams(word)')
+        self.create_name_index_triggers(cursor)
+
+        # Where the integrity check in progress stopped (school.integrity), so it resumes there
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS IntegrityProgress (
+                id INTEGER PRIMARY KEY CHECK(id = 1),
+                check_name TEXT NOT NULL,
+                last_id INTEGER NOT NULL
+            )
+        ''')
+
+        # Write counter of each table that searches read, bumped by triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS TableVersions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        for table in COUNTED_TABLES:
+            cursor.execute('INSERT OR IGNORE INTO TableVersions (table_name) VALUES (?)', (table,))
+            self.create_version_triggers(cursor, table)
+
+        # Digests of the synced rows, one per row and XORed together per bucket
+        # (bucket -1 holding the whole table), so school.sync can compare two
+        # databases without reading the rows that did not change
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS SyncRows (
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                digest INTEGER NOT NULL,
+                PRIMARY KEY (table_name, row_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_syncrows_bucket ON SyncRows(table_name, bucket)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS SyncBuckets (
+                table_name TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                digest INTEGER NOT NULL,
+                PRIMARY KEY (table_name, bucket)
+            ) WITHOUT ROWID
+        ''')
+        # Rows written since their digests were last brought up to date. Appended
+        # to without looking for the row first, which keeps the triggers cheap;
+        # a row written several times is simply hashed once per batch
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS SyncPending (
+                seq INTEGER PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL
+            )
+        ''')
+        self.create_sync_triggers(cursor)
+
+        # Commit the changes to the database
+        self.connection.commit()
+
+    def add_column(self, cursor, table, column, definition):
+        """
+        Adds a column to an existing table if it is missing.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+            table (str): The table name.
+            column (str): The column name.
+            definition (str): The column type and constraints.
+
+        Returns:
+            bool: True if the column was added.
+        """
+        columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+        if column in columns:
+            return False
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+
+    @staticmethod
+    def create_archived_table(cursor, table, columns):
+        """
+        Creates a table of soft-deleted or archived rows if it does not exist.
+
+        Archived registrations are looked up by student for transcripts and
+        by course for the rosters of a term, so they get an index on
+        ``student_id`` and one on ``course_id``.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+            table (str): The table name, optionally qualified with a schema.
+            columns (tuple): The column definitions, from ARCHIVED_COLUMNS.
+        """
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(columns)})')
+        if table.endswith('Registrations'):
+            schema, _, name = table.rpartition('.')
+            prefix = f'{schema}.idx_{name.lower()}' if schema else f'idx_{name.lower()}'
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {prefix}_student ON {name}(student_id)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {prefix}_course ON {name}(course_id)')
+
+    def create_change_triggers(self, cursor, table, columns):
+        """
+        Creates the triggers that append the changes of a table to the change log.
+
+        Updates of versioned tables are logged only when the version changes,
+        which happens exactly once per update whether the writer bumped it or
+        the version trigger did, so each update is logged once with its final
+        values.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+            table (str): The table name.
+            columns (tuple): The columns recorded with each change.
+        """
+        for operation, row, condition in (
+            ('insert', 'NEW', ''),
+            ('update', 'NEW', 'WHEN NEW.version <> OLD.version' if table in VERSIONED_COLUMNS else ''),
+            ('delete', 'OLD', ''),
+        ):
+            data = ', '.join(f"'{column}', {row}.{column}" for column in columns)
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table.lower()}_changelog_{operation}
+                AFTER {operation.upper()} ON {table}
+                {condition}
+                BEGIN
+                    INSERT INTO ChangeLog (table_name, operation, row_id, data)
+                    VALUES ('{table}', '{operation}', {row}.id, json_object({data}));
+                END
+            ''')
+
+    def create_sync_triggers(self, cursor):
+        """
+        Creates the triggers that queue written rows for new sync digests.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+        """
+        for table in SYNCED_TABLES:
+            for operation, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table.lower()}_sync_{operation}
+                    AFTER {operation.upper()} ON {table}
+                    BEGIN
+                        INSERT INTO SyncPending (table_name, row_id) VALUES ('{table}', {row}.id);
+                    END
+                ''')
+        for table, column, synced, ids in SYNC_DEPENDENCIES:
+            operations = (('update', 'NEW'),) if column else (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD'))
+            for operation, row in operations:
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table.lower()}_sync_{synced.lower()}_{operation}
+                    AFTER {operation.upper()}{f' OF {column}' if column else ''} ON {table}
+                    BEGIN
+                        INSERT INTO SyncPending (table_name, row_id) SELECT '{synced}', * FROM ({ids.format(row=row)});
+                    END
+                ''')
+
+    def create_version_triggers(self, cursor, table):
+        """
+        Creates the triggers that bump the write counter of a table in TableVersions.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+            table (str): The table name.
+        """
+        for operation in ('insert', 'update', 'delete'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_{operation}
+                AFTER {operation.upper()} ON {table}
+                BEGIN
+                    UPDATE TableVersions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+    def create_directory_triggers(self, cursor, table, kind, label, columns):
+        """
+        Creates the triggers that mirror the changes of a table into the directory.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+            table (str): The table name.
+            kind (int): The sort order of the table's rows in the directory.
+            label (str): The type shown for its rows.
+            columns (tuple): The columns shown as ID, Name, Age and Email.
+        """
+        values = ', '.join(f'NEW.{column}' if column else 'NULL' for column in columns)
+        assignments = ', '.join(f'{target} = NEW.{column}' for target, column
+                                in zip(('record_id', 'name', 'age', 'email'), columns) if column)
+        watched = ', '.join(column for column in columns if column)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table.lower()}_directory_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT OR REPLACE INTO Directory (kind, row_id, type, record_id, name, age, email)
+                VALUES ({kind}, NEW.id, '{label}', {values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table.lower()}_directory_update
+            AFTER UPDATE OF {watched} ON {table}
+            BEGIN
+                UPDATE Directory SET {assignments} WHERE kind = {kind} AND row_id = NEW.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table.lower()}_directory_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM Directory WHERE kind = {kind} AND row_id = OLD.id;
+            END
+        ''')
+
+    def create_name_index_triggers(self, cursor):
+        """
+        Creates the triggers that keep the fuzzy search index in step with the directory.
+
+        A directory name is split into NameWords; the first time a word is
+        seen, its trigrams (of the word with a space on either side) go into
+        WordGrams, and they are removed with the last name using the word.
+
+        Args:
+            cursor (sqlite3.Cursor): The cursor to execute with.
+        """
+        new_words = NAME_WORDS.format(
+            names="SELECT NEW.kind AS kind, NEW.row_id AS row_id, ' ' || lower(NEW.name) AS name"
+        )
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS directory_words_insert
+            AFTER INSERT ON Directory
+            BEGIN
+                DELETE FROM NameWords WHERE kind = NEW.kind AND row_id = NEW.row_id;
+                INSERT OR IGNORE INTO NameWords (word, kind, row_id) {new_words};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS directory_words_update
+            AFTER UPDATE OF name ON Directory
+            WHEN lower(NEW.name) <> lower(OLD.name)
+            BEGIN
+                DELETE FROM NameWords WHERE kind = OLD.kind AND row_id = OLD.row_id;
+                INSERT OR IGNORE INTO NameWords (word, kind, row_id) {new_words};
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS directory_words_delete
+            AFTER DELETE ON Directory
+            BEGIN
+                DELETE FROM NameWords WHERE kind = OLD.kind AND row_id = OLD.row_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS namewords_grams_insert
+            AFTER INSERT ON NameWords
+            WHEN NOT EXISTS (SELECT 1 FROM WordGrams WHERE word = NEW.word)
+            BEGIN
+                INSERT OR IGNORE INTO WordGrams (gram, word)
+                SELECT substr(' ' || NEW.word || ' ', position, 3), NEW.word
+                FROM CharacterPositions WHERE position <= length(NEW.word);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS namewords_grams_delete
+            AFTER DELETE ON NameWords
+            WHEN NOT EXISTS (SELECT 1 FROM NameWords WHERE word = OLD.word)
+            BEGIN
+                DELETE FROM WordGrams WHERE word = OLD.word;
+            END
+        ''')
+
+    def bulk_register(self, students, courses):
+        """
+        Registers every given student into every given course in one transaction.
+
+        Args:
+            students (list): Student IDs or emails.
+            courses (list): Course IDs or course names.
+
+        Returns:
+            list: One RegistrationOutcome per (student, course) pair.
+        """
+        return register_many(self.connection, students, courses)
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
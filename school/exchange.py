@@ -0,0 +1,505 @@
+"""
+Import and export of students, instructors and courses.
+
+Two file formats are understood:
+
+* the CSV written by the Tkinter app's Export button, with the columns
+  ``Type, ID, Name, Age, Email`` and one row per student, instructor or course;
+* the JSON written by ``SchoolStructs`` ``save_to_file``, an object of
+  ``person_1``/``course_1``... entries as produced by ``to_dict``.
+
+Files are read as a stream of Record tuples so a large export never has to
+fit in memory, validated with the same rules as the GUIs, and written with
+upserts keyed on the student, instructor or course ID, so importing the
+same file twice changes nothing.
+"""
+import csv
+import json
+import os
+import sqlite3
+from collections import namedtuple
+
+from school.concurrency import retry_on_busy
+from school.database import CHANGE_LOG_COLUMNS, DIRECTORY_SOURCES, NAME_WORDS
+from school.queries import iter_directory
+from school.validation import validate_age, validate_email
+
+# Header of the CSV export, as written by the Tkinter app
+EXPORT_HEADER = ['Type', 'ID', 'Name', 'Age', 'Email']
+
+STUDENT = 'Student'
+INSTRUCTOR = 'Instructor'
+COURSE = 'Course'
+
+# Record type -> (table, natural key column) for the two kinds of people
+PEOPLE = {
+    STUDENT: ('Students', 'student_id'),
+    INSTRUCTOR: ('Instructors', 'instructor_id'),
+}
+
+# Triggers that keep the change log, the sync queue, the write counters, the
+# directory and its name index in step with the imported tables row by row;
+# import_batch() drops them while it writes and updates those tables in bulk
+DERIVED_TRIGGERS = [
+    f'{table.lower()}_{purpose}_{operation}'
+    for table in DIRECTORY_SOURCES
+    for purpose in ('changelog', 'sync', 'version', 'directory')
+    for operation in ('insert', 'update')
+] + ['directory_words_insert', 'directory_words_update', 'namewords_grams_insert', 'namewords_grams_delete']
+
+# One student, instructor or course read from a file; line is its position in the file
+Record = namedtuple('Record', ['kind', 'key', 'name', 'age', 'email', 'line'])
+
+
+def read_records(file_name):
+    """
+    Reads the records of a CSV export or a SchoolStructs JSON file.
+
+    The format is chosen from the file extension.
+
+    Args:
+        file_name (str): Path of the file.
+
+    Returns:
+        iterator: The Record tuples in file order.
+    """
+    if os.path.splitext(file_name)[1].lower() == '.json':
+        return read_json_records(file_name)
+    return read_csv_records(file_name)
+
+
+def read_csv_records(file_name):
+    """
+    Reads the records of a CSV export one row at a time.
+
+    Args:
+        file_name (str): Path of the CSV file.
+
+    Yields:
+        Record: One record per data row; the header row is skipped.
+    """
+    with open(file_name, newline='') as csvfile:
+        for line, row in enumerate(csv.reader(csvfile), start=1):
+            if not row or (line == 1 and row[:2] == EXPORT_HEADER[:2]):
+                continue
+            yield csv_record(row, line)
+
+
+def csv_record(row, line):
+    """
+    Builds a Record from a row of the CSV export.
+
+    Args:
+        row (list): The cells of the row.
+        line (int): The line number of the row.
+
+    Returns:
+        Record: The record; a non-numeric age is kept as text so validation reports it.
+    """
+    kind, key, name, age, email = (row + [''] * len(EXPORT_HEADER))[:len(EXPORT_HEADER)]
+    age = age.strip()
+    return Record(kind.strip().title(), key.strip(), name.strip(),
+                  int(age) if age.isdigit() else age or None, email.strip() or None, line)
+
+
+def read_json_records(file_name):
+    """
+    Reads the records of a file written by SchoolStructs ``save_to_file``.
+
+    Both the multi-object layout (``{"person_1": {...}, ...}``) and a single
+    saved object are accepted. The record type is taken from the ID field
+    present in each object.
+
+    Args:
+        file_name (str): Path of the JSON file.
+
+    Yields:
+        Record: One record per object in file order.
+    """
+    with open(file_name) as file:
+        data = json.load(file)
+    objects = [data] if any(field in data for field in ('student_id', 'instructor_id', 'course_id')) \
+        else data.values()
+    for line, item in enumerate(objects, start=1):
+        yield json_record(item, line)
+
+
+def json_record(item, line):
+    """
+    Builds a Record from a SchoolStructs ``to_dict`` object.
+
+    Args:
+        item (dict): The object.
+        line (int): The position of the object in the file.
+
+    Returns:
+        Record: The record.
+    """
+    if 'course_id' in item:
+        return Record(COURSE, str(item['course_id']), item.get('course_name'), None, None, line)
+    kind = STUDENT if 'student_id' in item else INSTRUCTOR
+    key = item.get('student_id', item.get('instructor_id'))
+    return Record(kind, str(key) if key is not None else '', item.get('name'), item.get('age'),
+                  item.get('email'), line)
+
+
+def validate_records(records):
+    """
+    Checks records with the same rules as the GUIs.
+
+    Args:
+        records (list): The Record tuples to check.
+
+    Returns:
+        list: (record, error message) for every invalid record.
+    """
+    errors = []
+    for record in records:
+        error = record_error(record)
+        if error:
+            errors.append((record, error))
+    return errors
+
+
+def record_error(record):
+    """
+    Returns why a record is invalid.
+
+    Args:
+        record (Record): The record to check.
+
+    Returns:
+        str: The error message, or None if the record is valid.
+    """
+    if record.kind not in PEOPLE and record.kind != COURSE:
+        return f'Unknown record type "{record.kind}".'
+    if not record.key:
+        return 'The ID is missing.'
+    if not record.name:
+        return 'The name is missing.'
+    if record.kind == COURSE:
+        return None
+    if not validate_age(record.age):
+        return 'Age must be a non-negative integer.'
+    if not isinstance(record.email, str) or not validate_email(record.email):
+        return 'Invalid email format.'
+    return None
+
+
+def import_records(connection, records):
+    """
+    Adds new records and updates changed ones in one transaction.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        records (iterable): Valid Record tuples.
+
+    Returns:
+        tuple: The result of import_batch().
+    """
+    return import_batch(connection, group_records(records))
+
+
+def group_records(records):
+    """
+    Groups records by type into the compact batch taken by import_batch().
+
+    Args:
+        records (iterable): Record tuples.
+
+    Returns:
+        dict: Record type -> list of plain (key, name, age, email, line) tuples.
+    """
+    batch = {}
+    for record in records:
+        batch.setdefault(record.kind, []).append(record[1:])
+    return batch
+
+
+@retry_on_busy
+def import_batch(connection, batch):
+    """
+    Adds new records and updates changed ones in one transaction.
+
+    Records are matched on their student, instructor or course ID. Rows that
+    are already identical are left alone, so their version does not change.
+    Each kind of record is written with one ``executemany``; only if that
+    hits a clash with another row (for example an email already used by a
+    different student) are its records replayed one at a time, so the clashing
+    ones can be reported and the rest still imported. The tables derived from
+    the imported ones are brought up to date once for the whole batch instead
+    of by their triggers for every row.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch (dict): Record type -> list of (key, name, age, email, line)
+            tuples of valid records, as built by group_records().
+
+    Returns:
+        tuple: Counts of added, updated and unchanged records, and the list of
+            (record, error message) for rejected ones.
+    """
+    counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+    rejected = []
+    cursor = connection.cursor()
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS import_keys (key TEXT PRIMARY KEY) WITHOUT ROWID')
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS import_changes '
+                   '(table_name TEXT, operation TEXT, row_id INTEGER, data TEXT)')
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS import_rows '
+                   '(kind INTEGER, row_id INTEGER, PRIMARY KEY (kind, row_id)) WITHOUT ROWID')
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS import_words (word TEXT PRIMARY KEY) WITHOUT ROWID')
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        suspended = _suspend_derived_triggers(cursor)
+        for kind, rows in batch.items():
+            table, column = PEOPLE.get(kind, ('Courses', 'course_id'))
+            statement, width = _upsert(kind)
+            # Count the new keys with one join instead of a lookup per record
+            cursor.execute('DELETE FROM import_keys')
+            cursor.executemany('INSERT OR IGNORE INTO import_keys VALUES (?)', ((row[0],) for row in rows))
+            cursor.execute(f'''
+                SELECT COUNT(*) FROM import_keys k
+                WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{column} = k.key)
+            ''')
+            added = cursor.fetchone()[0]
+
+            cursor.execute('SAVEPOINT import_group')
+            try:
+                cursor.executemany(statement, (row[:width] for row in rows))
+                changed = cursor.rowcount
+            except sqlite3.IntegrityError:
+                cursor.execute('ROLLBACK TO import_group')
+                added = changed = 0
+                for row in rows:
+                    existed = cursor.execute(f'SELECT 1 FROM {table} WHERE {column} = ?', row[:1]).fetchone()
+                    try:
+                        cursor.execute(statement, row[:width])
+                    except sqlite3.IntegrityError as e:
+                        rejected.append((Record(kind, *row), str(e)))
+                        continue
+                    added += existed is None
+                    changed += cursor.rowcount
+            cursor.execute('RELEASE import_group')
+
+            counts['added'] += added
+            counts['updated'] += changed - added
+            counts['unchanged'] += len(rows) - changed
+        counts['unchanged'] -= len(rejected)
+        _update_derived_tables(cursor)
+        for sql in suspended:
+            cursor.execute(sql)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return counts, rejected
+
+
+def _suspend_derived_triggers(cursor):
+    """
+    Drops the triggers that maintain derived tables row by row during an import.
+
+    Must run inside the import's transaction, so other connections never see
+    the triggers missing. In their place, temporary triggers note each
+    change of an imported table in ``import_changes``, as the change log
+    would record it, and _update_derived_tables() brings the derived tables
+    up to date from those notes with a few set-based statements, the way
+    the migrations filled them.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor of the import's transaction.
+
+    Returns:
+        list: The definitions of the dropped triggers, to be executed again
+            before the transaction commits.
+    """
+    suspended = []
+    for name, sql in cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN (SELECT value FROM json_each(?))",
+        (json.dumps(DERIVED_TRIGGERS),)
+    ).fetchall():
+        cursor.execute(f'DROP TRIGGER {name}')
+        suspended.append(sql)
+    cursor.execute('DELETE FROM import_changes')
+    for table in DIRECTORY_SOURCES:
+        data = ', '.join(f"'{column}', NEW.{column}" for column in CHANGE_LOG_COLUMNS[table])
+        for operation, condition in (('insert', ''), ('update', 'WHEN NEW.version <> OLD.version')):
+            cursor.execute(f'''
+                CREATE TEMP TRIGGER import_{table.lower()}_{operation}
+                AFTER {operation.upper()} ON main.{table}
+                {condition}
+                BEGIN
+                    INSERT INTO import_changes (table_name, operation, row_id, data)
+                    VALUES ('{table}', '{operation}', NEW.id, json_object({data}));
+                END
+            ''')
+    return suspended
+
+
+def _update_derived_tables(cursor):
+    """
+    Applies the changes noted during an import to the tables derived from the imported ones.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor of the import's transaction.
+    """
+    for table in DIRECTORY_SOURCES:
+        for operation in ('insert', 'update'):
+            cursor.execute(f'DROP TRIGGER temp.import_{table.lower()}_{operation}')
+
+    cursor.execute('''
+        INSERT INTO ChangeLog (table_name, operation, row_id, data)
+        SELECT table_name, operation, row_id, data FROM import_changes ORDER BY rowid
+    ''')
+    cursor.execute('''
+        INSERT INTO SyncPending (table_name, row_id)
+        SELECT table_name, row_id FROM import_changes ORDER BY rowid
+    ''')
+    cursor.execute('''
+        UPDATE TableVersions
+        SET version = version + (SELECT COUNT(*) FROM import_changes c WHERE c.table_name = TableVersions.table_name)
+        WHERE table_name IN (SELECT table_name FROM import_changes)
+    ''')
+
+    # The directory rows of the changed records, and the words their names used before and after
+    kinds = ' '.join(f"WHEN '{table}' THEN {kind}" for table, (kind, _, _) in DIRECTORY_SOURCES.items())
+    cursor.execute('DELETE FROM import_rows')
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO import_rows (kind, row_id)
+        SELECT CASE table_name {kinds} END, row_id FROM import_changes
+    ''')
+    changed = '(kind, row_id) IN (SELECT kind, row_id FROM import_rows)'
+    for table, (kind, label, columns) in DIRECTORY_SOURCES.items():
+        values = ', '.join(column or 'NULL' for column in columns)
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO Directory (kind, row_id, type, record_id, name, age, email)
+            SELECT {kind}, id, '{label}', {values} FROM {table}
+            WHERE id IN (SELECT row_id FROM import_rows WHERE kind = {kind})
+        ''')
+    cursor.execute('DELETE FROM import_words')
+    cursor.execute(f'INSERT OR IGNORE INTO import_words (word) SELECT word FROM NameWords WHERE {changed}')
+    cursor.execute(f'DELETE FROM NameWords WHERE {changed}')
+    cursor.execute('INSERT OR IGNORE INTO NameWords (word, kind, row_id) ' + NAME_WORDS.format(names=f'''
+        SELECT kind, row_id, ' ' || lower(name) AS name FROM Directory WHERE {changed}
+    '''))
+    cursor.execute(f'INSERT OR IGNORE INTO import_words (word) SELECT word FROM NameWords WHERE {changed}')
+
+    # Trigrams go with the last name using a word and come with the first
+    cursor.execute('''
+        DELETE FROM WordGrams WHERE word IN (
+            SELECT word FROM import_words w WHERE NOT EXISTS (SELECT 1 FROM NameWords n WHERE n.word = w.word)
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO WordGrams (gram, word)
+        SELECT substr(' ' || w.word || ' ', p.position, 3), w.word
+        FROM import_words w JOIN CharacterPositions p ON p.position <= length(w.word)
+        WHERE EXISTS (SELECT 1 FROM NameWords n WHERE n.word = w.word)
+    ''')
+
+
+def _upsert(kind):
+    """
+    Builds the statement that inserts a record or updates its row if it differs.
+
+    Args:
+        kind (str): STUDENT, INSTRUCTOR or COURSE.
+
+    Returns:
+        tuple: The SQL statement, and how many leading fields of a
+            (key, name, age, email, line) tuple it binds.
+    """
+    if kind == COURSE:
+        return '''
+            INSERT INTO Courses (course_id, course_name) VALUES (?1, ?2)
+            ON CONFLICT(course_id) DO UPDATE SET course_name = excluded.course_name
+            WHERE course_name IS NOT excluded.course_name
+        ''', 2
+    table, column = PEOPLE[kind]
+    return f'''
+        INSERT INTO {table} ({column}, name, age, email) VALUES (?1, ?2, ?3, ?4)
+        ON CONFLICT({column}) DO UPDATE SET name = excluded.name, age = excluded.age, email = excluded.email
+        WHERE name IS NOT excluded.name OR age IS NOT excluded.age OR email IS NOT excluded.email
+    ''', 4
+
+
+def export_rows(connection):
+    """
+    Streams every student, instructor and course as CSV export rows.
+
+    The rows come from the ``Directory`` table, which already holds them in
+    this order, so the export is a single scan.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Yields:
+        tuple: (Type, ID, Name, Age, Email) rows, students first.
+    """
+    yield from iter_directory(connection)
+
+
+def export_csv(connection, file):
+    """
+    Writes the CSV export, with the same layout as the Tkinter app's Export button.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        file: A text file opened with ``newline=''``.
+
+    Returns:
+        int: The number of rows written.
+    """
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_HEADER)
+    count = 0
+    for row in export_rows(connection):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def export_json(connection, kind, file):
+    """
+    Writes one kind of record in the SchoolStructs ``save_to_file`` layout.
+
+    Objects are written one at a time, so the output is identical to
+    ``save_to_file`` without building every object first.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        kind (str): STUDENT, INSTRUCTOR or COURSE.
+        file: A text file.
+
+    Returns:
+        int: The number of objects written.
+    """
+    if kind == COURSE:
+        prefix = 'course'
+        rows = connection.execute('''
+            SELECT c.course_id, c.course_name, i.name, i.age, i.email, i.instructor_id
+            FROM Courses c LEFT JOIN Instructors i ON c.instructor_id = i.id
+            ORDER BY c.id
+        ''')
+        objects = ({
+            'course_id': course_id,
+            'course_name': course_name,
+            'instructor': {'name': name, 'age': age, 'email': email, 'instructor_id': instructor_id,
+                           'assigned_courses': []} if instructor_id else None,
+            'enrolled_students': [],
+        } for course_id, course_name, name, age, email, instructor_id in rows)
+    else:
+        prefix = 'person'
+        table, column = PEOPLE[kind]
+        courses_field = 'registered_courses' if kind == STUDENT else 'assigned_courses'
+        rows = connection.execute(f'SELECT name, age, email, {column} FROM {table} ORDER BY id')
+        objects = ({'name': name, 'age': age, 'email': email, column: key, courses_field: []}
+                   for name, age, email, key in rows)
+
+    count = 0
+    file.write('{')
+    for count, item in enumerate(objects, start=1):
+        body = json.dumps(item, indent=4).replace('\n', '\n    ')
+        file.write(f'{"," if count > 1 else ""}\n    "{prefix}_{count}": {body}')
+    file.write('\n}' if count else '}')
+    return count
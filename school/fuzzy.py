@@ -0,0 +1,215 @@
+"""
+Typo-tolerant search of student, instructor and course names.
+
+Names are split into words, and the distinct words are indexed by their
+trigrams (three-letter pieces of the word with a space on either side) in
+the ``WordGrams`` table, which triggers keep current as the directory
+changes. A misspelt word shares most of its trigrams with the intended one,
+so the trigram index yields a short list of candidate words, ranked by the
+number of trigrams they share, without looking at any name. The exact edit
+distance is only computed for those candidates, and the people and courses
+using the words that are close enough are then read from ``NameWords``.
+
+Because the index holds each distinct word once, its size follows the number
+of different first and last names rather than the number of people, and a
+search takes a few milliseconds however large the school is.
+"""
+from collections import namedtuple
+
+from school.database import DIRECTORY_SOURCES
+
+# Candidate words whose edit distance is computed for each word of a search
+CANDIDATE_WORDS = 200
+
+# One search result: the table and id of the row, and the number of typing
+# mistakes (edits) between the search and the name
+Match = namedtuple('Match', ['table', 'row_id', 'distance'])
+
+# SQLite's lower() only changes ASCII letters, so searches are lowered the same way
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+_TABLES = {kind: table for table, (kind, _, _) in DIRECTORY_SOURCES.items()}
+
+
+def words(text):
+    """
+    Splits a name or a search into words the way the index does.
+
+    Args:
+        text (str): The name or search.
+
+    Returns:
+        list: The lower-case words.
+    """
+    return [word for word in text.translate(_ASCII_LOWER).split(' ') if word]
+
+
+def trigrams(word):
+    """
+    Returns the trigrams of a word, as stored in the ``WordGrams`` table.
+
+    Args:
+        word (str): A lower-case word.
+
+    Returns:
+        set: The three-character pieces of the word padded with spaces.
+    """
+    padded = f' {word} '
+    return {padded[position:position + 3] for position in range(len(word))}
+
+
+def max_edits(word):
+    """
+    Returns how many typing mistakes are tolerated in a word.
+
+    Args:
+        word (str): The searched word.
+
+    Returns:
+        int: 0 for words of up to 3 letters, 1 up to 5 letters, 2 otherwise.
+    """
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(first, second, limit):
+    """
+    Computes the Levenshtein distance between two words, up to a limit.
+
+    Only the diagonal band of width 2 * limit + 1 is filled, and the
+    computation stops as soon as every entry of a row exceeds the limit.
+
+    Args:
+        first (str): One word.
+        second (str): The other word.
+        limit (int): The largest distance of interest.
+
+    Returns:
+        int: The distance, or limit + 1 if it is larger than the limit.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    previous = [column if column <= limit else too_far for column in range(len(second) + 1)]
+    for row, letter in enumerate(first, start=1):
+        low, high = max(1, row - limit), min(len(second), row + limit)
+        current = [too_far] * (len(second) + 1)
+        current[0] = row if row <= limit else too_far
+        for column in range(low, high + 1):
+            cost = previous[column - 1] + (letter != second[column - 1])
+            current[column] = min(cost, previous[column] + 1, current[column - 1] + 1, too_far)
+        if min(current[low - 1:high + 1]) > limit:
+            return too_far
+        previous = current
+    return previous[len(second)]
+
+
+def similar_words(connection, word, edits=None):
+    """
+    Finds the indexed words within a few typing mistakes of a word.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        word (str): A lower-case word.
+        edits (int, optional): The mistakes tolerated; max_edits(word) by default.
+
+    Returns:
+        dict: The edit distance of each close word, keyed by word.
+    """
+    if edits is None:
+        edits = max_edits(word)
+    grams = trigrams(word)
+    # Every edit changes at most three trigrams, so a close word shares at least this many
+    shared = max(1, len(grams) - 3 * edits)
+    candidates = connection.execute(f'''
+        SELECT word FROM WordGrams
+        WHERE gram IN ({', '.join('?' * len(grams))})
+        GROUP BY word
+        HAVING COUNT(*) >= ? AND length(word) BETWEEN ? AND ?
+        ORDER BY COUNT(*) DESC
+        LIMIT ?
+    ''', (*grams, shared, len(word) - edits, len(word) + edits, CANDIDATE_WORDS))
+    close = {}
+    for (candidate,) in candidates:
+        distance = edit_distance(word, candidate, edits)
+        if distance <= edits:
+            close[candidate] = distance
+    return close
+
+
+def search(connection, text, tables=None, limit=50):
+    """
+    Finds the students, instructors or courses whose name is close to a search.
+
+    Every word of the search must be close to a word of the name, in any
+    order, so "mohamad ali" finds "Ali Mohammed". Results are ranked by the
+    total number of typing mistakes.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        text (str): The search, one or more words of a name.
+        tables (iterable, optional): 'Students', 'Instructors' and/or
+            'Courses'; all of them by default.
+        limit (int): Maximum number of results.
+
+    Returns:
+        list: Match tuples, closest first, then in directory order.
+    """
+    searched = list(dict.fromkeys(words(text)))
+    if not searched:
+        return []
+    kinds = sorted(DIRECTORY_SOURCES[table][0] for table in (tables or DIRECTORY_SOURCES))
+    in_kinds = ', '.join(str(kind) for kind in kinds)
+    close = [similar_words(connection, word) for word in searched]
+    if not all(close):
+        return []
+
+    if len(searched) == 1:
+        # Read the rows of the exact words first, then those one mistake away, and so on up to the limit
+        matches = {}
+        for distance in sorted(set(close[0].values())):
+            tier = [word for word, found in close[0].items() if found == distance]
+            for kind, row_id in connection.execute(f'''
+                SELECT DISTINCT kind, row_id FROM NameWords
+                WHERE word IN ({', '.join('?' * len(tier))}) AND kind IN ({in_kinds})
+                ORDER BY kind, row_id LIMIT ?
+            ''', (*tier, limit)):
+                matches.setdefault((kind, row_id), Match(_TABLES[kind], row_id, distance))
+            if len(matches) >= limit:
+                break
+        return list(matches.values())[:limit]
+
+    # Widen one mistake per word at a time: once every word may be d mistakes
+    # off, all names with d mistakes in total have been seen, so the search
+    # can stop as soon as there are enough of those
+    rows = [{} for _ in searched]
+    widest = max(max(found.values()) for found in close)
+    for allowed in range(widest + 1):
+        for number, found in enumerate(close):
+            tier = [word for word, distance in found.items() if distance == allowed]
+            if not tier:
+                continue
+            fetched = connection.execute(f'''
+                SELECT kind, row_id FROM NameWords
+                WHERE word IN ({', '.join('?' * len(tier))}) AND kind IN ({in_kinds})
+            ''', tier).fetchall()
+            # Built in bulk, keeping the smaller distances found in earlier rounds
+            best = dict.fromkeys(fetched, allowed)
+            best.update(rows[number])
+            rows[number] = best
+        first, *others = sorted(rows, key=len)
+        scored = []
+        for key, distance in first.items():
+            total = distance
+            for other in others:
+                if key not in other:
+                    break
+                total += other[key]
+            else:
+                if total <= allowed or allowed == widest:
+                    scored.append((total, key))
+        if len(scored) >= limit:
+            break
+    scored.sort()
+    return [Match(_TABLES[kind], row_id, total) for total, (kind, row_id) in scored[:limit]]
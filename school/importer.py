@@ -0,0 +1,153 @@
+"""
+Parallel import of large CSV exports.
+
+Parsing a row and checking it with ``school.validation`` is pure Python and
+makes up about half the cost of a sequential import, all of it on one core.
+The pipeline here splits the file into byte ranges that end on line breaks,
+lets a pool of worker processes parse, validate and normalize one range
+each, and sends back only compact batches of plain tuples. The calling
+process is the single writer: it imports the batches in file order, one
+transaction per range, so the database sees exactly the same writes as a
+sequential import.
+
+Rows are assumed not to contain line breaks inside quoted fields, which
+holds for the files written by the Tkinter app's Export button.
+"""
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from school.exchange import EXPORT_HEADER, csv_record, import_batch, record_error
+
+# Bytes parsed by a worker per task; each range is imported in one transaction
+RANGE_BYTES = 4 * 1024 * 1024
+
+
+def byte_ranges(file_name, range_bytes=RANGE_BYTES):
+    """
+    Splits a file into byte ranges that start and end on line boundaries.
+
+    Args:
+        file_name (str): Path of the file.
+        range_bytes (int): Approximate size of each range.
+
+    Returns:
+        list: (start, end) offsets covering the whole file.
+    """
+    size = os.path.getsize(file_name)
+    ranges = []
+    with open(file_name, 'rb') as file:
+        start = 0
+        while start < size:
+            # Move the cut forward to just after the next line break
+            file.seek(min(start + range_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(file_name, start, end):
+    """
+    Parses, validates and normalizes the CSV rows in a byte range.
+
+    This runs in a worker process. Line numbers are relative to the range;
+    the writer adds the lines of the ranges before it.
+
+    Args:
+        file_name (str): Path of the CSV file.
+        start (int): Offset of the first byte of the range.
+        end (int): Offset just past the last byte of the range.
+
+    Returns:
+        tuple: The valid records as a batch for import_batch(), (record,
+            error message) for the invalid ones, and the number of lines in
+            the range.
+    """
+    with open(file_name, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+
+    batch, errors = {}, []
+    reader = csv.reader(io.StringIO(text, newline=''))
+    for row in reader:
+        if not row or (start == 0 and reader.line_num == 1 and row[:2] == EXPORT_HEADER[:2]):
+            continue
+        record = csv_record(row, reader.line_num)
+        error = record_error(record)
+        if error:
+            errors.append((record, error))
+        else:
+            # Plain tuples pickle several times faster than Records
+            batch.setdefault(record.kind, []).append(record[1:])
+    return batch, errors, text.count('\n')
+
+
+def import_csv(connection, file_name, jobs=1, range_bytes=RANGE_BYTES):
+    """
+    Imports a CSV export, parsing and validating it on several processes.
+
+    At most two ranges per process are in flight, so memory stays bounded
+    however large the file is.
+
+    Args:
+        connection (sqlite3.Connection): The connection of the single writer.
+        file_name (str): Path of the CSV file.
+        jobs (int): Number of worker processes; 1 parses in this process.
+        range_bytes (int): Approximate size of each byte range.
+
+    Yields:
+        tuple: Per range, in file order: the import counts, (record, error
+            message) for the invalid and for the rejected records, with line
+            numbers in the whole file, and the number of lines read so far.
+    """
+    ranges = byte_ranges(file_name, range_bytes)
+    lines = 0
+    for batch, errors, line_count in parsed_ranges(file_name, ranges, jobs):
+        counts, rejected = import_batch(connection, batch)
+        errors, rejected = _shift_lines(errors, lines), _shift_lines(rejected, lines)
+        lines += line_count
+        yield counts, errors, rejected, lines
+
+
+def _shift_lines(problems, lines):
+    """
+    Turns line numbers relative to a range into line numbers in the whole file.
+
+    Args:
+        problems (list): (record, error message) pairs.
+        lines (int): Number of lines before the range.
+
+    Returns:
+        list: The pairs with shifted line numbers.
+    """
+    return [(record._replace(line=record.line + lines), error) for record, error in problems]
+
+
+def parsed_ranges(file_name, ranges, jobs):
+    """
+    Parses byte ranges in order, on a process pool if jobs is above 1.
+
+    Args:
+        file_name (str): Path of the CSV file.
+        ranges (list): The (start, end) byte ranges.
+        jobs (int): Number of worker processes.
+
+    Yields:
+        tuple: The result of parse_range() for each range, in file order.
+    """
+    if jobs <= 1:
+        for start, end in ranges:
+            yield parse_range(file_name, start, end)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(executor.submit(parse_range, file_name, start, end))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,400 @@
+"""
+Integrity checks of the school database, with optional repair.
+
+Older versions of the apps ran without foreign keys enforced and deleted
+students, instructors and courses without touching the rows that point at
+them, so a database can hold registrations of students who no longer exist,
+courses taught by an unknown instructor, waitlist entries of students who
+are already registered, enrolled counts that drifted from the registrations,
+and people with an invalid email or age. Students and instructors whose
+courses meet at the same time are listed as well.
+
+check() looks for them a batch of rows at a time, each batch in its own
+short transaction, for at most a time slice, and remembers in the
+``IntegrityProgress`` table where it stopped, so the next call, even from
+another process, carries on from there. run() keeps calling it with pauses
+in between, so a check of a large database runs alongside the registrars
+without holding the write lock for more than a few milliseconds at a time.
+
+With ``repair``, what can be repaired is repaired in the same transaction
+as it is found: rows pointing at a missing row are removed (registrations of
+soft-deleted people and courses go to ``DeletedRegistrations``, as
+``delete_record`` would have done), unknown instructors are unset, enrolled
+counts recomputed, and emails and ages fixed when the fix is unambiguous.
+"""
+import time
+from collections import namedtuple
+
+from school.concurrency import retry_on_busy
+from school.registration import promote_waitlist
+from school.schedule import term_clashes
+from school.validation import validate_age, validate_email
+
+# Rows looked at per transaction
+BATCH_SIZE = 1000
+
+# Seconds check() runs for, and run() waits between two calls
+SLICE_SECONDS = 0.05
+PAUSE_SECONDS = 0.05
+
+# A problem found; repaired tells whether it was fixed
+Problem = namedtuple('Problem', ['check', 'table', 'row_id', 'detail', 'repaired'])
+
+
+def check(connection, repair=False, seconds=SLICE_SECONDS, batch_size=BATCH_SIZE):
+    """
+    Runs the checks for one time slice, from where the last slice stopped.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        repair (bool): Repair what can be repaired.
+        seconds (float): Stop starting new batches after this long.
+        batch_size (int): Rows looked at per transaction.
+
+    Returns:
+        tuple: The Problem tuples found, and True if the pass over the whole
+            database is complete; the next slice then starts a new pass.
+    """
+    deadline = time.monotonic() + seconds
+    problems = []
+    while True:
+        found, finished = _check_batch(connection, repair, batch_size)
+        problems.extend(found)
+        if finished or time.monotonic() >= deadline:
+            return problems, finished
+
+
+def run(connection, repair=False, seconds=SLICE_SECONDS, pause=PAUSE_SECONDS, batch_size=BATCH_SIZE):
+    """
+    Checks the whole database in time slices, pausing between them.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        repair (bool): Repair what can be repaired.
+        seconds (float): Length of a slice.
+        pause (float): Seconds to wait between slices.
+        batch_size (int): Rows looked at per transaction.
+
+    Yields:
+        Problem: Each problem as it is found.
+    """
+    while True:
+        problems, finished = check(connection, repair, seconds, batch_size)
+        yield from problems
+        if finished:
+            return
+        time.sleep(pause)
+
+
+def position(connection):
+    """
+    Returns where the current pass stopped.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Returns:
+        tuple: The name of the check in progress and the last row id it
+            looked at, or None if no pass is in progress.
+    """
+    return connection.execute('SELECT check_name, last_id FROM IntegrityProgress').fetchone()
+
+
+def restart(connection):
+    """
+    Forgets the pass in progress, so the next check() starts from the beginning.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+    """
+    connection.execute('DELETE FROM IntegrityProgress')
+    connection.commit()
+
+
+@retry_on_busy
+def _check_batch(connection, repair, batch_size):
+    """
+    Runs the current check over the next batch of rows and saves the position.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        repair (bool): Repair what can be repaired.
+        batch_size (int): Rows looked at.
+
+    Returns:
+        tuple: The Problem tuples found, and True if the pass is complete.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        saved = cursor.execute('SELECT check_name, last_id FROM IntegrityProgress').fetchone()
+        index, after = (_CHECK_INDEX[saved[0]], saved[1]) if saved and saved[0] in _CHECK_INDEX else (0, 0)
+        name, table, find = CHECKS[index]
+        high = cursor.execute(f'SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)',
+                              (after, batch_size)).fetchone()[0]
+        problems = []
+        if high is None:
+            # This check is done; the next batch starts the next one
+            index, high = index + 1, 0
+        else:
+            problems = [Problem(name, table, row_id, detail, repaired)
+                        for row_id, detail, repaired in find(cursor, after, high, repair)]
+        finished = index == len(CHECKS)
+        if finished:
+            cursor.execute('DELETE FROM IntegrityProgress')
+        else:
+            cursor.execute('INSERT OR REPLACE INTO IntegrityProgress (id, check_name, last_id) VALUES (1, ?, ?)',
+                           (CHECKS[index][0], high))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return problems, finished
+
+
+def _orphan_registrations(cursor, low, high, repair):
+    """
+    Finds registrations whose student or course is missing.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        low (int): Rows after this id are looked at...
+        high (int): ...up to this id.
+        repair (bool): Remove the registrations found.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    rows = cursor.execute('''
+        SELECT r.id, r.student_id, r.course_id, s.id IS NULL, c.id IS NULL,
+               EXISTS (SELECT 1 FROM DeletedStudents d WHERE d.id = r.student_id)
+               OR EXISTS (SELECT 1 FROM DeletedCourses d WHERE d.id = r.course_id)
+        FROM Registrations r
+        LEFT JOIN Students s ON s.id = r.student_id
+        LEFT JOIN Courses c ON c.id = r.course_id
+        WHERE r.id > ? AND r.id <= ? AND (s.id IS NULL OR c.id IS NULL)
+    ''', (low, high)).fetchall()
+    found = []
+    for row_id, student, course, no_student, no_course, deleted in rows:
+        missing = ' and '.join(([f'student {student}'] if no_student else []) +
+                               ([f'course {course}'] if no_course else []))
+        found.append((row_id, f'{missing} missing', repair))
+        if not repair:
+            continue
+        if deleted:
+            # Kept for history, as delete_record does with the registrations of a deleted record
+            cursor.execute('''
+                INSERT INTO DeletedRegistrations (id, student_id, course_id, deleted_at)
+                SELECT id, student_id, course_id, CURRENT_TIMESTAMP FROM Registrations WHERE id = ?
+            ''', (row_id,))
+        cursor.execute('DELETE FROM Registrations WHERE id = ?', (row_id,))
+        if not no_course:
+            promote_waitlist(cursor, course)
+    return found
+
+
+def _orphan_waitlist(cursor, low, high, repair):
+    """
+    Finds waitlist entries whose student or course is missing.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        low (int): Rows after this id are looked at...
+        high (int): ...up to this id.
+        repair (bool): Remove the entries found.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    return _delete_found(cursor, 'Waitlist', repair, '''
+        SELECT w.id, CASE WHEN NOT EXISTS (SELECT 1 FROM Students s WHERE s.id = w.student_id)
+                          THEN 'student ' || w.student_id ELSE 'course ' || w.course_id END || ' missing'
+        FROM Waitlist w
+        WHERE w.id > ? AND w.id <= ?
+          AND (NOT EXISTS (SELECT 1 FROM Students s WHERE s.id = w.student_id)
+               OR NOT EXISTS (SELECT 1 FROM Courses c WHERE c.id = w.course_id))
+    ''', (low, high))
+
+
+def _duplicate_waitlist(cursor, low, high, repair):
+    """
+    Finds waitlist entries of students already registered in the course.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        low (int): Rows after this id are looked at...
+        high (int): ...up to this id.
+        repair (bool): Remove the entries found.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    return _delete_found(cursor, 'Waitlist', repair, '''
+        SELECT w.id, 'student ' || w.student_id || ' already registered in course ' || w.course_id
+        FROM Waitlist w
+        JOIN Registrations r ON r.student_id = w.student_id AND r.course_id = w.course_id
+        WHERE w.id > ? AND w.id <= ?
+    ''', (low, high))
+
+
+def _orphan_slots(cursor, low, high, repair):
+    """
+    Finds meeting times of missing courses.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        low (int): Rows after this id are looked at...
+        high (int): ...up to this id.
+        repair (bool): Remove the meeting times found.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    return _delete_found(cursor, 'CourseSlots', repair, '''
+        SELECT t.id, 'course ' || t.course_id || ' missing'
+        FROM CourseSlots t
+        WHERE t.id > ? AND t.id <= ? AND NOT EXISTS (SELECT 1 FROM Courses c WHERE c.id = t.course_id)
+    ''', (low, high))
+
+
+def _unknown_instructors(cursor, low, high, repair):
+    """
+    Finds courses whose instructor is missing.
+
+    Deleting an instructor now leaves their courses unassigned; courses of
+    instructors deleted before that still point at them.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        low (int): Rows after this id are looked at...
+        high (int): ...up to this id.
+        repair (bool): Leave the courses found without an instructor.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    rows = cursor.execute('''
+        SELECT c.id, c.instructor_id FROM Courses c
+        WHERE c.id > ? AND c.id <= ? AND c.instructor_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM Instructors i WHERE i.id = c.instructor_id)
+    ''', (low, high)).fetchall()
+    if repair:
+        cursor.executemany('UPDATE Courses SET instructor_id = NULL WHERE id = ?', ((row_id,) for row_id, _ in rows))
+    return [(row_id, f'instructor {instructor} missing', repair) for row_id, instructor in rows]
+
+
+def _enrolled_counts(cursor, low, high, repair):
+    """
+    Finds courses whose enrolled count differs from their registrations.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        low (int): Rows after this id are looked at...
+        high (int): ...up to this id.
+        repair (bool): Recompute the counts found, and fill freed seats
+            from the waitlist.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    rows = cursor.execute('''
+        SELECT id, enrolled, counted FROM (
+            SELECT c.id, c.enrolled, (SELECT COUNT(*) FROM Registrations r WHERE r.course_id = c.id) AS counted
+            FROM Courses c WHERE c.id > ? AND c.id <= ?
+        ) WHERE enrolled <> counted
+    ''', (low, high)).fetchall()
+    for row_id, _, counted in rows if repair else ():
+        cursor.execute('UPDATE Courses SET enrolled = ? WHERE id = ?', (counted, row_id))
+        promote_waitlist(cursor, row_id)
+    return [(row_id, f'enrolled is {enrolled} but {counted} registered', repair) for row_id, enrolled, counted in rows]
+
+
+def _people_checks(table):
+    """
+    Makes the check of the emails and ages of students or instructors.
+
+    Args:
+        table (str): 'Students' or 'Instructors'.
+
+    Returns:
+        callable: The check.
+    """
+    def find(cursor, low, high, repair):
+        found = []
+        rows = cursor.execute(f'SELECT id, email, age FROM {table} WHERE id > ? AND id <= ?', (low, high)).fetchall()
+        emails = [(row_id, email, validate_email(email)) for row_id, email, _ in rows]
+        fixes = {row_id: email.strip() for row_id, email, valid in emails
+                 if not valid and isinstance(email, str) and validate_email(email.strip())}
+        for (row_id, email, valid), (_, _, age) in zip(emails, rows):
+            if not valid:
+                # Stray spaces are the one mistake with an unambiguous fix
+                fixed = fixes.get(row_id)
+                fixable = fixed is not None and not cursor.execute(
+                    f'SELECT 1 FROM {table} WHERE email = ?', (fixed,)).fetchone()
+                if repair and fixable:
+                    cursor.execute(f'UPDATE {table} SET email = ? WHERE id = ?', (fixed, row_id))
+                found.append((row_id, f'invalid email {email!r}', repair and fixable))
+            if not validate_age(age):
+                # An age stored as text, as older imports did, is converted
+                fixable = isinstance(age, str) and age.strip().isdigit()
+                if repair and fixable:
+                    cursor.execute(f'UPDATE {table} SET age = ? WHERE id = ?', (int(age), row_id))
+                found.append((row_id, f'invalid age {age!r}', repair and fixable))
+        return found
+    return find
+
+
+def _schedule_clashes(kind):
+    """
+    Makes the check of the meeting times of students or instructors.
+
+    Clashes are listed but never repaired: which course has to give way is
+    the registrar's decision.
+
+    Args:
+        kind (str): 'students' or 'instructors', as term_clashes() keys them.
+
+    Returns:
+        callable: The check.
+    """
+    def find(cursor, low, high, repair):
+        return [(clash.entity, f'courses {clash.course} and {clash.other_course} meet at the same time', False)
+                for clash in term_clashes(cursor.connection, low, high, (kind,))[kind]]
+    return find
+
+
+def _delete_found(cursor, table, repair, query, params):
+    """
+    Runs a query finding bad rows of a table, and deletes them when repairing.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the batch's transaction.
+        table (str): The table the rows are in.
+        repair (bool): Delete the rows found.
+        query (str): Selects the id and a description of every bad row.
+        params (tuple): The query parameters.
+
+    Returns:
+        list: (row id, detail, repaired) tuples.
+    """
+    rows = cursor.execute(query, params).fetchall()
+    if repair:
+        cursor.executemany(f'DELETE FROM {table} WHERE id = ?', ((row_id,) for row_id, _ in rows))
+    return [(row_id, detail, repair) for row_id, detail in rows]
+
+
+# The checks in the order a pass runs them: name, table scanned and function
+CHECKS = (
+    ('orphan registration', 'Registrations', _orphan_registrations),
+    ('orphan waitlist entry', 'Waitlist', _orphan_waitlist),
+    ('duplicate waitlist entry', 'Waitlist', _duplicate_waitlist),
+    ('orphan meeting time', 'CourseSlots', _orphan_slots),
+    ('unknown instructor', 'Courses', _unknown_instructors),
+    ('enrolled count', 'Courses', _enrolled_counts),
+    ('invalid student', 'Students', _people_checks('Students')),
+    ('invalid instructor', 'Instructors', _people_checks('Instructors')),
+    ('student schedule clash', 'Students', _schedule_clashes('students')),
+    ('instructor schedule clash', 'Instructors', _schedule_clashes('instructors')),
+)
+
+_CHECK_INDEX = {name: index for index, (name, _, _) in enumerate(CHECKS)}
@@ -0,0 +1,617 @@
+"""
+Versioned schema migrations.
+
+The Tkinter app used to create its own layout (``students(student_id TEXT
+PRIMARY KEY, ...)`` and a ``registrations`` table without keys) while the
+PyQt app used the surrogate-key layout of ``Database.create_tables``. Both
+apps now share that canonical layout, and this module upgrades existing
+files to it.
+
+The schema version is kept in ``PRAGMA user_version``. Each migration in
+MIGRATIONS raises it by one, and a database is only ever moved forward.
+Data is converted in batches, each in its own short transaction, so other
+app instances can keep reading and writing the database while a large file
+is upgraded, and an interrupted upgrade resumes where it stopped.
+"""
+import re
+from collections import namedtuple
+
+from school.concurrency import retry_on_busy
+
+# Rows converted per transaction
+BATCH_SIZE = 5000
+
+# Tables of the Tkinter layout and the names they are kept under while their rows are converted
+TKINTER_TABLES = {
+    'students': 'TkinterStudents',
+    'instructors': 'TkinterInstructors',
+    'courses': 'TkinterCourses',
+    'registrations': 'TkinterRegistrations',
+}
+
+# How the rows of one Tkinter table are converted: the copy into the
+# canonical table, and the test that a row made it there. Both run over a
+# rowid range given as two parameters.
+Conversion = namedtuple('Conversion', ['source', 'target', 'copy', 'converted'])
+
+# In dependency order: instructors before the courses they teach, people and courses before registrations
+CONVERSIONS = (
+    Conversion('TkinterInstructors', 'Instructors', '''
+        INSERT OR IGNORE INTO Instructors (name, age, email, instructor_id)
+        SELECT name, age, email, instructor_id FROM TkinterInstructors
+        WHERE rowid > ? AND rowid <= ? ORDER BY rowid
+    ''', '''
+        EXISTS (SELECT 1 FROM Instructors i WHERE i.instructor_id = TkinterInstructors.instructor_id)
+    '''),
+    Conversion('TkinterStudents', 'Students', '''
+        INSERT OR IGNORE INTO Students (name, age, email, student_id)
+        SELECT name, age, email, student_id FROM TkinterStudents
+        WHERE rowid > ? AND rowid <= ? ORDER BY rowid
+    ''', '''
+        EXISTS (SELECT 1 FROM Students s WHERE s.student_id = TkinterStudents.student_id)
+    '''),
+    Conversion('TkinterCourses', 'Courses', '''
+        INSERT OR IGNORE INTO Courses (course_id, course_name, instructor_id)
+        SELECT t.course_id, t.course_name, i.id
+        FROM TkinterCourses t LEFT JOIN Instructors i ON i.instructor_id = t.instructor_id
+        WHERE t.rowid > ? AND t.rowid <= ? ORDER BY t.rowid
+    ''', '''
+        EXISTS (SELECT 1 FROM Courses c WHERE c.course_id = TkinterCourses.course_id)
+    '''),
+    Conversion('TkinterRegistrations', 'Registrations', '''
+        INSERT OR IGNORE INTO Registrations (student_id, course_id)
+        SELECT s.id, c.id
+        FROM TkinterRegistrations t
+        JOIN Students s ON s.student_id = t.student_id
+        JOIN Courses c ON c.course_id = t.course_id
+        WHERE t.rowid > ? AND t.rowid <= ? ORDER BY t.rowid
+    ''', '''
+        EXISTS (
+            SELECT 1 FROM Registrations r
+            JOIN Students s ON s.id = r.student_id
+            JOIN Courses c ON c.id = r.course_id
+            WHERE s.student_id = TkinterRegistrations.student_id
+              AND c.course_id = TkinterRegistrations.course_id
+        )
+    '''),
+)
+
+
+# ON DELETE action of each foreign key, by child table and parent table, as
+# Database.create_tables declares them; older files are rebuilt to match
+DELETE_ACTIONS = {
+    'Courses': {'Instructors': 'SET NULL'},
+    'Registrations': {'Students': 'CASCADE', 'Courses': 'CASCADE'},
+    'Waitlist': {'Students': 'CASCADE', 'Courses': 'CASCADE'},
+    'CourseSlots': {'Courses': 'CASCADE'},
+    'TeachingPreferences': {'Instructors': 'CASCADE', 'Courses': 'CASCADE'},
+}
+
+# Columns identifying a row of the tables above, for those without an ``id``;
+# a rebuild copies them in batches of the first column
+REBUILD_KEYS = {
+    'TeachingPreferences': ('instructor_id', 'course_id'),
+}
+
+
+class SchemaVersionError(Exception):
+    """
+    Raised when a database was upgraded by a newer version of the apps.
+    """
+
+
+def schema_version(connection):
+    """
+    Returns the schema version of a database.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Returns:
+        int: The version, 0 for a database that was never migrated.
+    """
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+@retry_on_busy
+def set_aside_tkinter_tables(connection):
+    """
+    Renames the tables of the Tkinter layout so the canonical ones can be created.
+
+    SQLite table names ignore case, so the Tkinter ``students`` table would
+    otherwise stand in for ``Students``. Renaming is instant whatever the
+    size of the tables; their rows are converted later by
+    convert_tkinter_tables. Must run before ``Database.create_tables``.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Returns:
+        bool: True if the database had the Tkinter layout.
+    """
+    if schema_version(connection) > 0:
+        return False
+    cursor = connection.cursor()
+    # Check again under the write lock in case another instance got here first
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(students)')]
+        is_tkinter = bool(columns) and 'id' not in columns
+        if is_tkinter:
+            for table, legacy in TKINTER_TABLES.items():
+                if _table_exists(connection, table):
+                    cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return is_tkinter
+
+
+def convert_tkinter_tables(connection, batch_size=BATCH_SIZE, progress=None):
+    """
+    Moves the rows of the renamed Tkinter tables into the canonical tables.
+
+    Each batch is copied and then deleted from its Tkinter table in one
+    transaction, so a conversion that is interrupted picks up with the rows
+    that are left. Text instructor, student and course IDs are resolved to
+    the new integer keys. Rows that cannot be converted, such as a second
+    student with the same email, stay in their Tkinter table for the
+    administrator to fix; tables that were converted completely are dropped.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Rows converted per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+    """
+    for conversion in CONVERSIONS:
+        if not _table_exists(connection, conversion.source):
+            continue
+        total = connection.execute(f'SELECT COUNT(*) FROM {conversion.source}').fetchone()[0]
+        done = 0
+        last = 0
+        while True:
+            last, moved = _convert_batch(connection, conversion, last, batch_size)
+            if last is None:
+                break
+            done += moved
+            if progress:
+                progress(conversion.target, done, total)
+        if not connection.execute(f'SELECT 1 FROM {conversion.source} LIMIT 1').fetchone():
+            connection.execute(f'DROP TABLE {conversion.source}')
+            connection.commit()
+
+
+def leftover_rows(connection):
+    """
+    Counts the rows of the Tkinter layout that could not be converted.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Returns:
+        dict: Number of rows left in each Tkinter table that still exists.
+    """
+    return {
+        conversion.source: connection.execute(f'SELECT COUNT(*) FROM {conversion.source}').fetchone()[0]
+        for conversion in CONVERSIONS if _table_exists(connection, conversion.source)
+    }
+
+
+def fill_directory(connection, batch_size=BATCH_SIZE, progress=None):
+    """
+    Copies the existing students, instructors and courses into the directory.
+
+    The directory triggers keep it current from the moment they are
+    created; this fills in the rows written before that. Rows already there
+    are left alone, so other instances can keep writing meanwhile.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Rows copied per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+    """
+    # Imported here because the schema module runs the migrations
+    from school.database import DIRECTORY_SOURCES
+
+    for table, (kind, label, columns) in DIRECTORY_SOURCES.items():
+        values = ', '.join(column or 'NULL' for column in columns)
+        copy = f'''
+            INSERT OR IGNORE INTO Directory (kind, row_id, type, record_id, name, age, email)
+            SELECT {kind}, id, '{label}', {values} FROM {table}
+            WHERE id > ? AND id <= ?
+        '''
+        total = connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        done = 0
+        last = 0
+        while True:
+            last, copied = _copy_batch(connection, table, copy, last, batch_size)
+            if last is None:
+                break
+            done += copied
+            if progress:
+                progress('Directory', done, total)
+
+
+def fill_name_index(connection, batch_size=BATCH_SIZE, progress=None):
+    """
+    Indexes the words of the existing directory names for fuzzy search.
+
+    The index triggers keep it current from the moment they are created;
+    this adds the names written before that.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Names indexed per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+    """
+    # Imported here because the schema module runs the migrations
+    from school.database import DIRECTORY_SOURCES, NAME_WORDS
+
+    for table, (kind, _, _) in DIRECTORY_SOURCES.items():
+        copy = 'INSERT OR IGNORE INTO NameWords (word, kind, row_id) ' + NAME_WORDS.format(names=f'''
+            SELECT kind, row_id, ' ' || lower(name) AS name FROM Directory
+            WHERE kind = {kind} AND row_id > ? AND row_id <= ?
+        ''')
+        total = connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        done = 0
+        last = 0
+        while True:
+            last, copied = _copy_batch(connection, table, copy, last, batch_size)
+            if last is None:
+                break
+            done += copied
+            if progress:
+                progress('NameWords', done, total)
+
+
+def declare_cascades(connection, batch_size=BATCH_SIZE, progress=None):
+    """
+    Gives the foreign keys of an older database their ON DELETE actions.
+
+    SQLite cannot change the constraints of a table, so each table whose
+    foreign keys lack them is rebuilt: created anew under a temporary name
+    from its own definition, filled a batch at a time, and swapped in, with
+    its indexes and triggers recreated and its AUTOINCREMENT counter kept,
+    so ids are never reused. While it is filled, triggers on the old table
+    copy every write of the other instances into the new one, and an
+    interrupted rebuild carries on where it stopped. Rows that already
+    point at a missing row are copied as they are; ``check --repair``
+    removes them.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Rows copied per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+    """
+    for table, actions in DELETE_ACTIONS.items():
+        declared = {parent: action for _, _, parent, _, _, _, action, _
+                    in connection.execute(f'PRAGMA foreign_key_list({table})')}
+        if all(declared.get(parent) == action for parent, action in actions.items()):
+            continue
+        _rebuild_table(connection, table, actions, batch_size, progress)
+
+
+def queue_sync_digests(connection, batch_size=BATCH_SIZE, progress=None):
+    """
+    Queues the existing rows of the synced tables for their first sync digests.
+
+    The sync triggers queue every row written from the moment they are
+    created; this adds the rows written before that, so the next diff or
+    merge hashes each of them once.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Rows queued per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+    """
+    # Imported here because the schema module runs the migrations
+    from school.database import SYNCED_TABLES
+
+    for table in SYNCED_TABLES:
+        copy = f'''
+            INSERT INTO SyncPending (table_name, row_id)
+            SELECT '{table}', id FROM {table} WHERE id > ? AND id <= ?
+        '''
+        total = connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        done = 0
+        last = 0
+        while True:
+            last, copied = _copy_batch(connection, table, copy, last, batch_size)
+            if last is None:
+                break
+            done += copied
+            if progress:
+                progress('SyncPending', done, total)
+
+
+# (version, description, migration) in the order they are applied; each
+# migration is called as migration(connection, batch_size, progress)
+MIGRATIONS = (
+    (1, 'convert the Tkinter layout to the canonical schema', convert_tkinter_tables),
+    (2, 'fill the View All directory', fill_directory),
+    (3, 'index the directory names for fuzzy search', fill_name_index),
+    (4, 'cascade deletes through the foreign keys', declare_cascades),
+    (5, 'queue the existing rows for the sync digests', queue_sync_digests),
+)
+
+# The version of a database that is fully up to date
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(connection, batch_size=BATCH_SIZE, progress=None):
+    """
+    Applies the migrations a database has not had yet.
+
+    Called by ``Database`` after the canonical tables were created, so every
+    database is brought up to date when it is opened. The version is raised
+    after each migration, so a migration that fails is tried again next time.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Rows converted per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            while rows are converted.
+
+    Returns:
+        int: The schema version of the database.
+
+    Raises:
+        SchemaVersionError: If the database is newer than this code.
+    """
+    version = schema_version(connection)
+    if version > SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f'The database has schema version {version}, but this program only knows up to {SCHEMA_VERSION}.'
+        )
+    for target, _, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        migration(connection, batch_size, progress)
+        _set_version(connection, target)
+        version = target
+    return version
+
+
+@retry_on_busy
+def _convert_batch(connection, conversion, after, batch_size):
+    """
+    Converts the next batch of rows of one Tkinter table.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        conversion (Conversion): The table being converted.
+        after (int): The rowid after which the batch starts.
+        batch_size (int): Rows in the batch.
+
+    Returns:
+        tuple: The last rowid of the batch, None when the table has no more
+            rows, and the number of rows moved.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        last = cursor.execute(f'''
+            SELECT MAX(rowid) FROM (
+                SELECT rowid FROM {conversion.source} WHERE rowid > ? ORDER BY rowid LIMIT ?
+            )
+        ''', (after, batch_size)).fetchone()[0]
+        moved = 0
+        if last is not None:
+            cursor.execute(conversion.copy, (after, last))
+            cursor.execute(f'''
+                DELETE FROM {conversion.source}
+                WHERE rowid > ? AND rowid <= ? AND {conversion.converted}
+            ''', (after, last))
+            moved = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return last, moved
+
+
+@retry_on_busy
+def _copy_batch(connection, table, copy, after, batch_size, column='id'):
+    """
+    Runs a copy statement over the next batch of ids of a table.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table whose ids are batched.
+        copy (str): The statement, taking the first and last id of the batch
+            (exclusive and inclusive).
+        after (int): The id after which the batch starts.
+        batch_size (int): Rows in the batch.
+        column (str): The indexed column batched on; a batch takes every row
+            of its last value, so it can cover more rows if it is not unique.
+
+    Returns:
+        tuple: The last id of the batch, None when the table has no more
+            rows, and the number of rows the batch covered.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        last, count = cursor.execute(f'''
+            SELECT MAX({column}), COUNT(*) FROM (
+                SELECT {column} FROM {table} WHERE {column} > ? ORDER BY {column} LIMIT ?
+            )
+        ''', (after, batch_size)).fetchone()
+        if last is not None:
+            cursor.execute(copy, (after, last))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return last, count
+
+
+def _rebuild_table(connection, table, actions, batch_size, progress):
+    """
+    Rebuilds a table with the given ON DELETE actions on its foreign keys.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table.
+        actions (dict): Parent table -> ON DELETE action.
+        batch_size (int): Rows copied per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+    """
+    keys = REBUILD_KEYS.get(table, ('id',))
+    rebuilt = f'{table}_rebuilt'
+    # Foreign keys can only be switched outside a transaction; while they are
+    # off, rows pointing at a missing row can be copied, and dropping the old
+    # table does not cascade into its children
+    connection.execute('PRAGMA foreign_keys = OFF')
+    try:
+        _start_rebuild(connection, table, rebuilt, actions, keys)
+        matched = ' AND '.join(f'r.{key} = t.{key}' for key in keys)
+        copy = f'''
+            INSERT INTO {rebuilt} SELECT * FROM {table} t
+            WHERE t.{keys[0]} > ? AND t.{keys[0]} <= ?
+              AND NOT EXISTS (SELECT 1 FROM {rebuilt} r WHERE {matched})
+        '''
+        total = connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        done = 0
+        # Not 0: rows pointing at a missing row may hold any value
+        last = float('-inf')
+        while True:
+            last, copied = _copy_batch(connection, table, copy, last, batch_size, keys[0])
+            if last is None:
+                break
+            done += copied
+            if progress:
+                progress(table, done, total)
+        _swap_rebuilt(connection, table, rebuilt)
+    finally:
+        connection.execute('PRAGMA foreign_keys = ON')
+
+
+@retry_on_busy
+def _start_rebuild(connection, table, rebuilt, actions, keys):
+    """
+    Creates the new table of a rebuild and the triggers keeping it in step with the old one.
+
+    Both are left in place by an interrupted rebuild, which then carries on
+    with the rows not copied yet.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table being rebuilt.
+        rebuilt (str): The name of the new table.
+        actions (dict): Parent table -> ON DELETE action.
+        keys (tuple): The columns identifying a row.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        if not _table_exists(connection, rebuilt):
+            definition = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                        (table,)).fetchone()[0]
+
+            def with_action(match):
+                reference, parent = match.group(1), match.group(2)
+                return f'{reference} ON DELETE {actions[parent]}' if parent in actions else match.group(0)
+
+            definition = re.sub(r'(REFERENCES\s+(\w+)\s*\(\s*\w+\s*\))'
+                                r'(\s+ON\s+DELETE\s+(?:SET\s+NULL|SET\s+DEFAULT|CASCADE|RESTRICT|NO\s+ACTION))?',
+                                with_action, definition, flags=re.IGNORECASE)
+            cursor.execute(re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {rebuilt}', definition))
+
+        def row(ref):
+            return ' AND '.join(f'{key} = {ref}.{key}' for key in keys)
+
+        # Plain statements only: the conflict clause of the write that fires a
+        # trigger overrides those inside it
+        copy = f'INSERT INTO {rebuilt} SELECT * FROM {table} WHERE {row("NEW")};'
+        mirrors = {
+            'insert': ('INSERT', f'DELETE FROM {rebuilt} WHERE {row("NEW")}; {copy}'),
+            'update': ('UPDATE', f'DELETE FROM {rebuilt} WHERE {row("OLD")}; {copy}'),
+            'delete': ('DELETE', f'DELETE FROM {rebuilt} WHERE {row("OLD")};'),
+        }
+        for name, (event, body) in mirrors.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {rebuilt}_mirror_{name} '
+                           f'AFTER {event} ON {table} BEGIN {body} END')
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+@retry_on_busy
+def _swap_rebuilt(connection, table, rebuilt):
+    """
+    Replaces a table by its filled rebuild, with the indexes and triggers of the old one.
+
+    The indexes are built again inside this transaction, which holds the
+    write lock for as long as that takes.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table being rebuilt.
+        rebuilt (str): The name of the new table.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        dependents = [sql for name, sql in cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+            "AND sql IS NOT NULL", (table,)) if not name.startswith(f'{rebuilt}_mirror_')]
+        sequence = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+        cursor.execute(f'DROP TABLE {table}')
+        # Triggers of other tables name this one; the legacy rename leaves them
+        # alone instead of failing on the table that was just dropped
+        cursor.execute('PRAGMA legacy_alter_table = ON')
+        cursor.execute(f'ALTER TABLE {rebuilt} RENAME TO {table}')
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+        for sql in dependents:
+            cursor.execute(sql)
+        # The old counter stays even if the rows with the highest ids were
+        # deleted, so their ids are never handed out again
+        counters = [seq for (seq,) in cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))]
+        if sequence:
+            counters.append(sequence[0])
+        if counters:
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, max(counters)))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.execute('PRAGMA legacy_alter_table = OFF')
+
+
+@retry_on_busy
+def _set_version(connection, version):
+    """
+    Records the schema version of a database.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        version (int): The new version.
+    """
+    connection.execute(f'PRAGMA user_version = {int(version)}')
+    connection.commit()
+
+
+def _table_exists(connection, table):
+    """
+    Checks whether a table exists.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table name.
+
+    Returns:
+        bool: True if it exists.
+    """
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (table,)).fetchone() is not None
@@ -0,0 +1,339 @@
+"""
+Streaming reads of students, instructors and courses for the apps' tables.
+
+Every function here is a generator over ``fetchmany``: rows are read from
+SQLite ``batch`` at a time and handed out as light named tuples, so walking
+a whole table holds one batch in memory however large the table is. The
+callers decide what to keep; a GUI table keeps its rows, an export writes
+them out and forgets them.
+
+The apps run the same few searches over and over; SearchCache keeps the
+rows of recent ones in memory until a table they read is written to.
+"""
+import json
+from collections import OrderedDict, namedtuple
+
+from school.fuzzy import search as fuzzy_search
+
+# Rows read from SQLite at a time
+BATCH_SIZE = 500
+
+# Searches kept by a SearchCache, and rows kept in all of them together
+MAX_CACHED_SEARCHES = 64
+MAX_CACHED_ROWS = 100_000
+
+# One row of each table as the apps show it, ending with the id and version
+# that updates and deletes need
+StudentRow = namedtuple('StudentRow', ['name', 'age', 'email', 'student_id', 'id', 'version'])
+InstructorRow = namedtuple('InstructorRow', ['name', 'age', 'email', 'instructor_id', 'id', 'version'])
+CourseRow = namedtuple('CourseRow', ['course_name', 'course_id', 'instructor', 'enrolled', 'waitlisted', 'id', 'version'])
+
+# One row of the "View All" listing and the CSV export
+DirectoryRow = namedtuple('DirectoryRow', ['type', 'record_id', 'name', 'age', 'email'])
+
+# The query, row type and ID column of students and instructors
+_PEOPLE = {
+    'Students': ('SELECT name, age, email, student_id, id, version FROM Students', StudentRow, 'student_id'),
+    'Instructors': ('SELECT name, age, email, instructor_id, id, version FROM Instructors', InstructorRow,
+                    'instructor_id'),
+}
+
+# Courses with their instructor's name, "enrolled/capacity" and waitlist length
+COURSE_QUERY = '''
+    SELECT c.course_name, c.course_id, i.name,
+           CASE WHEN c.capacity IS NULL THEN c.enrolled ELSE c.enrolled || '/' || c.capacity END,
+           (SELECT COUNT(*) FROM Waitlist w WHERE w.course_id = c.id), c.id, c.version
+    FROM Courses c
+    LEFT JOIN Instructors i ON c.instructor_id = i.id
+'''
+
+
+def iter_rows(connection, query, params=(), row_type=None, batch=BATCH_SIZE):
+    """
+    Runs a query and yields its rows, reading them a batch at a time.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        query (str): The SELECT statement.
+        params (tuple): The values of its placeholders.
+        row_type (type, optional): A namedtuple class the rows are made into;
+            plain tuples by default.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        tuple: One row at a time.
+    """
+    cursor = connection.execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            if row_type is None:
+                yield from rows
+            else:
+                yield from map(row_type._make, rows)
+    finally:
+        # A consumer that stops early releases the statement straight away
+        cursor.close()
+
+
+def iter_students(connection, search=None, fuzzy=False, batch=BATCH_SIZE):
+    """
+    Yields the students, or those matching a search.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        search (str, optional): Text contained in the name or student ID.
+        fuzzy (bool): Follow the matches with names within a few typing
+            mistakes of the search, closest first.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        StudentRow: One student at a time.
+    """
+    return _iter_people(connection, 'Students', search, fuzzy, batch)
+
+
+def iter_instructors(connection, search=None, fuzzy=False, batch=BATCH_SIZE):
+    """
+    Yields the instructors, or those matching a search.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        search (str, optional): Text contained in the name or instructor ID.
+        fuzzy (bool): Follow the matches with names within a few typing
+            mistakes of the search, closest first.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        InstructorRow: One instructor at a time.
+    """
+    return _iter_people(connection, 'Instructors', search, fuzzy, batch)
+
+
+def iter_courses(connection, search=None, batch=BATCH_SIZE):
+    """
+    Yields the courses, or those matching a search.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        search (str, optional): Text contained in the course name, course ID
+            or instructor's name.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        CourseRow: One course at a time.
+    """
+    if search is None:
+        return iter_rows(connection, COURSE_QUERY, (), CourseRow, batch)
+    pattern = f'%{search.lower()}%'
+    return iter_rows(
+        connection,
+        COURSE_QUERY + ' WHERE LOWER(c.course_name) LIKE ? OR LOWER(c.course_id) LIKE ? OR LOWER(i.name) LIKE ?',
+        (pattern, pattern, pattern), CourseRow, batch
+    )
+
+
+def iter_course_names(connection, batch=BATCH_SIZE):
+    """
+    Yields the name of every course, for the course dropdowns.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        str: One course name at a time.
+    """
+    for (name,) in iter_rows(connection, 'SELECT course_name FROM Courses', batch=batch):
+        yield name
+
+
+def iter_directory(connection, batch=BATCH_SIZE):
+    """
+    Yields every student, instructor and course as the "View All" tab lists them.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        DirectoryRow: One record at a time, students first.
+    """
+    return iter_rows(connection, 'SELECT type, record_id, name, age, email FROM Directory ORDER BY kind, row_id',
+                     (), DirectoryRow, batch)
+
+
+def changed_rows(connection, changed):
+    """
+    Reads rows of the apps' tables by ``id``, as the tables show them.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        changed (dict): Sets of ids keyed by 'Students', 'Instructors' or 'Courses'.
+
+    Returns:
+        dict: For each table, the StudentRow, InstructorRow or CourseRow of
+            every id, or None for an id that no longer has a row.
+    """
+    rows = {}
+    for table, ids in changed.items():
+        if table == 'Courses':
+            query, row_type, column = COURSE_QUERY, CourseRow, 'c.id'
+        else:
+            (query, row_type, _), column = _PEOPLE[table], 'id'
+        found = dict.fromkeys(ids)
+        for row in iter_rows(connection, f'{query} WHERE {column} IN (SELECT value FROM json_each(?))',
+                             (json.dumps(list(ids)),), row_type):
+            found[row.id] = row
+        rows[table] = found
+    return rows
+
+
+def _iter_people(connection, table, search, fuzzy, batch):
+    """
+    Yields the students or instructors, or those matching a search.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): 'Students' or 'Instructors'.
+        search (str, optional): Text contained in the name or ID.
+        fuzzy (bool): Follow the matches with misspelt names.
+        batch (int): Rows read from SQLite at a time.
+
+    Yields:
+        tuple: StudentRow or InstructorRow tuples.
+    """
+    query, row_type, key = _PEOPLE[table]
+    if search is None:
+        yield from iter_rows(connection, query, (), row_type, batch)
+        return
+    pattern = f'%{search.lower()}%'
+    contains = f'(LOWER(name) LIKE ?1 OR LOWER({key}) LIKE ?1)'
+    yield from iter_rows(connection, f'{query} WHERE {contains}', (pattern,), row_type, batch)
+    if not fuzzy:
+        return
+    # Misspelt names that the LIKE above did not already return, so no set
+    # of the rows shown so far has to be kept
+    for match in fuzzy_search(connection, search, (table,)):
+        row = connection.execute(f'{query} WHERE id = ?2 AND NOT {contains}', (pattern, match.row_id)).fetchone()
+        if row:
+            yield row_type._make(row)
+
+
+def normalize_search(text):
+    """
+    Puts a search in the one form it is run and cached under.
+
+    Args:
+        text (str): The search as typed.
+
+    Returns:
+        str: The search in lower case, without leading, trailing or repeated spaces.
+    """
+    return ' '.join(text.split()).lower()
+
+
+class SearchCache:
+    """
+    Keeps the rows of recent searches in memory, dropping the least recently used first.
+
+    Each result is stored with the write counters, from the TableVersions
+    table, of the tables it was read from, and is only handed out again
+    while they are unchanged, so it is never stale. The counters themselves
+    are only read again after something was written: ``PRAGMA data_version``
+    moves when another connection commits and ``total_changes`` when this
+    one writes, so repeating a search with nothing written in between reads
+    no table at all.
+
+    Results are bounded in number and in total rows; a result larger than
+    the row bound is streamed as usual and not kept.
+
+    Args:
+        max_searches (int): Results kept at most.
+        max_rows (int): Rows kept at most, over all the results.
+    """
+
+    def __init__(self, max_searches=MAX_CACHED_SEARCHES, max_rows=MAX_CACHED_ROWS):
+        self.max_searches = max_searches
+        self.max_rows = max_rows
+        # Write counters and rows of each search, least recently used first
+        self.results = OrderedDict()
+        self.rows = 0
+        # The connection, data_version and total_changes the counters were read at
+        self.state = None
+        self.versions = {}
+
+    def search(self, connection, tables, key, run):
+        """
+        Yields the rows of a search, from memory if nothing it reads was written since it last ran.
+
+        Args:
+            connection (sqlite3.Connection): An open database connection.
+            tables (tuple): The tables the search reads.
+            key (tuple): The search, normalized with normalize_search().
+            run (callable): Runs the search in SQLite, returning an iterator
+                over its rows.
+
+        Yields:
+            tuple: One row at a time.
+        """
+        versions = self.table_versions(connection, tables)
+        result = self.results.get(key)
+        if result is not None and result[0] == versions:
+            self.results.move_to_end(key)
+            yield from result[1]
+            return
+        rows = []
+        for row in run():
+            if rows is not None:
+                rows.append(row)
+                if len(rows) > self.max_rows:
+                    rows = None
+            yield row
+        # Only whole results are kept: a consumer that stops early never gets here
+        if rows is not None:
+            self.store(key, versions, rows)
+
+    def table_versions(self, connection, tables):
+        """
+        Returns the write counters of tables, reading them only if something was written.
+
+        Args:
+            connection (sqlite3.Connection): An open database connection.
+            tables (tuple): The table names.
+
+        Returns:
+            tuple: The counter of each table.
+        """
+        state = (connection, connection.execute('PRAGMA data_version').fetchone()[0], connection.total_changes)
+        if state != self.state:
+            self.versions = dict(connection.execute('SELECT table_name, version FROM TableVersions'))
+            self.state = state
+        return tuple(self.versions.get(table) for table in tables)
+
+    def store(self, key, versions, rows):
+        """
+        Keeps the rows of a search, dropping the least recently used ones beyond the bounds.
+
+        Args:
+            key (tuple): The normalized search.
+            versions (tuple): The write counters the rows were read at.
+            rows (list): The rows.
+        """
+        if key in self.results:
+            self.rows -= len(self.results.pop(key)[1])
+        self.results[key] = (versions, rows)
+        self.rows += len(rows)
+        while len(self.results) > self.max_searches or self.rows > self.max_rows:
+            _, (_, dropped) = self.results.popitem(last=False)
+            self.rows -= len(dropped)
+
+    def clear(self):
+        """
+        Forgets every result.
+        """
+        self.results.clear()
+        self.rows = 0
+        self.state = None
@@ -0,0 +1,526 @@
+"""
+Bulk registration of many students into many courses.
+
+Students are given by student ID or email and courses by course ID or course
+name, exactly as a registrar would paste them. All keys are resolved with
+set-based queries against a temporary table and the registrations are
+inserted with a single ``INSERT OR IGNORE`` inside one transaction, so a whole
+cohort costs a handful of statements instead of three round trips and a
+commit per pair.
+"""
+import contextlib
+import csv
+import re
+from collections import namedtuple
+
+from school.concurrency import retry_on_busy
+from school.schedule import SlotIndex, TimeSlot, student_conflicts
+
+# Outcome statuses reported for each (student, course) pair
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+ALREADY_REGISTERED = 'already registered'
+ALREADY_WAITLISTED = 'already waitlisted'
+SCHEDULE_CONFLICT = 'schedule conflict'
+UNKNOWN_STUDENT = 'unknown student'
+UNKNOWN_COURSE = 'unknown course'
+
+RegistrationOutcome = namedtuple('RegistrationOutcome', ['student', 'course', 'status'])
+
+
+def parse_keys(text):
+    """
+    Splits pasted text into a list of keys.
+
+    Keys are separated by new lines, commas or semicolons. Blank entries are
+    dropped and duplicates are removed while keeping the original order.
+
+    Args:
+        text (str): The pasted text.
+
+    Returns:
+        list: The keys found in the text.
+    """
+    keys = (key.strip() for key in re.split(r'[\n,;]', text))
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def read_pairs_csv(file_name):
+    """
+    Reads (student, course) pairs from a CSV file.
+
+    The first two columns of every row are used. A first row whose first cell
+    mentions "student" is treated as a header and skipped.
+
+    Args:
+        file_name (str): Path of the CSV file.
+
+    Returns:
+        list: The (student, course) pairs in file order.
+    """
+    pairs = []
+    with open(file_name, newline='') as csvfile:
+        for line_number, row in enumerate(csv.reader(csvfile)):
+            if len(row) < 2:
+                continue
+            if line_number == 0 and 'student' in row[0].lower():
+                continue
+            pairs.append((row[0], row[1]))
+    return pairs
+
+
+def register_many(connection, students, courses):
+    """
+    Registers every student into every course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        students (list): Student IDs or emails.
+        courses (list): Course IDs or course names.
+
+    Returns:
+        list: One RegistrationOutcome per (student, course) pair.
+    """
+    return register_pairs(connection, [(student, course) for student in students for course in courses])
+
+
+@retry_on_busy
+def register_pairs(connection, pairs):
+    """
+    Registers each (student, course) pair in a single transaction.
+
+    When courses have a capacity, the pairs that do not fit are put on the
+    course waitlist in input order. Pairs whose meeting times clash with the student's other
+    courses, including ones registered earlier in the same batch, are rejected; a course the
+    student is only waitlisted for does not count, as with register().
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        pairs (list): (student, course) tuples of student ID or email and
+            course ID or course name.
+
+    Returns:
+        list: One RegistrationOutcome per distinct pair, in input order.
+    """
+    pairs = list(dict.fromkeys((str(student).strip(), str(course).strip()) for student, course in pairs))
+    if not pairs:
+        return []
+
+    has_waitlist = _has_column(connection, 'Courses', 'capacity')
+    has_slots = _has_column(connection, 'CourseSlots', 'day')
+
+    # Take the write lock up front so the checks and the inserts see the same data
+    with _write_transaction(connection) as cursor:
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS bulk_pairs (
+                seq INTEGER PRIMARY KEY,
+                student_key TEXT NOT NULL,
+                course_key TEXT NOT NULL,
+                student_ref,
+                course_ref,
+                first_seq INTEGER,
+                status TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS temp.bulk_pairs_refs ON bulk_pairs(student_ref, course_ref, seq)')
+        cursor.execute('DELETE FROM bulk_pairs')
+        cursor.executemany(
+            'INSERT INTO bulk_pairs (seq, student_key, course_key) VALUES (?, ?, ?)',
+            ((seq, student, course) for seq, (student, course) in enumerate(pairs))
+        )
+
+        # Resolve every key with indexed lookups: ID first, then email / course name
+        cursor.execute('''
+            UPDATE bulk_pairs SET
+                student_ref = COALESCE(
+                    (SELECT id FROM Students WHERE student_id = bulk_pairs.student_key),
+                    (SELECT id FROM Students WHERE email = bulk_pairs.student_key)
+                ),
+                course_ref = COALESCE(
+                    (SELECT id FROM Courses WHERE course_id = bulk_pairs.course_key),
+                    (SELECT id FROM Courses WHERE course_name = bulk_pairs.course_key
+                     ORDER BY rowid LIMIT 1)
+                )
+        ''')
+        cursor.execute('''
+            UPDATE bulk_pairs SET status = CASE
+                WHEN student_ref IS NULL THEN ?
+                WHEN course_ref IS NULL THEN ?
+            END
+        ''', (UNKNOWN_STUDENT, UNKNOWN_COURSE))
+
+        # The same student may have been given by both ID and email; only the first pair counts
+        cursor.execute('''
+            UPDATE bulk_pairs SET first_seq = (
+                SELECT MIN(b.seq) FROM bulk_pairs b
+                WHERE b.student_ref = bulk_pairs.student_ref AND b.course_ref = bulk_pairs.course_ref
+            )
+            WHERE status IS NULL
+        ''')
+
+        cursor.execute('''
+            UPDATE bulk_pairs SET status = ?
+            WHERE status IS NULL AND EXISTS (
+                SELECT 1 FROM Registrations r
+                WHERE r.student_id = bulk_pairs.student_ref AND r.course_id = bulk_pairs.course_ref
+            )
+        ''', (ALREADY_REGISTERED,))
+
+        if has_waitlist:
+            cursor.execute('''
+                UPDATE bulk_pairs SET status = ?
+                WHERE status IS NULL AND EXISTS (
+                    SELECT 1 FROM Waitlist w
+                    WHERE w.student_id = bulk_pairs.student_ref AND w.course_id = bulk_pairs.course_ref
+                )
+            ''', (ALREADY_WAITLISTED,))
+
+        if has_slots:
+            _mark_schedule_conflicts(cursor, has_waitlist)
+
+        if has_waitlist:
+            # Fill the free seats of each course in input order and waitlist the rest; the
+            # schedule check has already done so for the courses it saw
+            cursor.execute('''
+                WITH ranked AS (
+                    SELECT b.seq, c.capacity - c.enrolled AS free_seats,
+                           ROW_NUMBER() OVER (PARTITION BY b.course_ref ORDER BY b.seq) AS seat
+                    FROM bulk_pairs b JOIN Courses c ON c.id = b.course_ref
+                    WHERE b.status IS NULL AND b.seq = b.first_seq AND c.capacity IS NOT NULL
+                )
+                UPDATE bulk_pairs SET status = ?
+                WHERE seq IN (SELECT seq FROM ranked WHERE seat > free_seats)
+            ''', (WAITLISTED,))
+
+        cursor.execute('''
+            UPDATE bulk_pairs SET status = ? WHERE status IS NULL AND seq = first_seq
+        ''', (REGISTERED,))
+
+        # Only first pairs are inserted; OR IGNORE guards against UNIQUE(student_id, course_id) all the same
+        cursor.execute('''
+            INSERT OR IGNORE INTO Registrations (student_id, course_id)
+            SELECT student_ref, course_ref FROM bulk_pairs WHERE status = ? ORDER BY seq
+        ''', (REGISTERED,))
+        if has_waitlist:
+            cursor.execute('''
+                INSERT OR IGNORE INTO Waitlist (student_id, course_id)
+                SELECT student_ref, course_ref FROM bulk_pairs WHERE status = ? ORDER BY seq
+            ''', (WAITLISTED,))
+
+        # Repeated pairs report what happened to their first occurrence
+        cursor.execute('''
+            UPDATE bulk_pairs SET status = (
+                SELECT CASE b.status WHEN ? THEN ? WHEN ? THEN ? ELSE b.status END
+                FROM bulk_pairs b WHERE b.seq = bulk_pairs.first_seq
+            )
+            WHERE status IS NULL
+        ''', (REGISTERED, ALREADY_REGISTERED, WAITLISTED, ALREADY_WAITLISTED))
+
+        cursor.execute('SELECT student_key, course_key, status FROM bulk_pairs ORDER BY seq')
+        outcomes = [RegistrationOutcome(*row) for row in cursor]
+
+        cursor.execute('DELETE FROM bulk_pairs')
+    return outcomes
+
+
+@retry_on_busy
+def register(connection, student, course):
+    """
+    Registers one student into one course, or waitlists them if it is full.
+
+    The capacity check and the insert run in one ``BEGIN IMMEDIATE``
+    transaction, so several app instances sharing the database file can never
+    fill the same seat twice.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        student (int): The ``Students.id`` of the student.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        str: REGISTERED, WAITLISTED, ALREADY_REGISTERED, ALREADY_WAITLISTED
+            or SCHEDULE_CONFLICT.
+    """
+    with _write_transaction(connection) as cursor:
+        return enroll(cursor, student, course)
+
+
+@retry_on_busy
+def drop(connection, student, course):
+    """
+    Removes a student from a course or from its waitlist.
+
+    If a seat is freed, the head of the waitlist is promoted in the same
+    transaction.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        student (int): The ``Students.id`` of the student.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        tuple: (removed, promoted) where removed is True if the student was
+            registered or waitlisted and promoted lists the ``Students.id``
+            of the students who got a seat.
+    """
+    with _write_transaction(connection) as cursor:
+        return unenroll(cursor, student, course)
+
+
+def enroll(cursor, student, course):
+    """
+    Registers or waitlists a student inside the caller's write transaction.
+
+    This is the body of register() for callers that batch several writes in
+    one transaction, such as the HTTP server's writer.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside an open write transaction.
+        student (int): The ``Students.id`` of the student.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        str: REGISTERED, WAITLISTED, ALREADY_REGISTERED, ALREADY_WAITLISTED
+            or SCHEDULE_CONFLICT.
+    """
+    cursor.execute('SELECT 1 FROM Registrations WHERE student_id = ? AND course_id = ?', (student, course))
+    if cursor.fetchone():
+        return ALREADY_REGISTERED
+    cursor.execute('SELECT 1 FROM Waitlist WHERE student_id = ? AND course_id = ?', (student, course))
+    if cursor.fetchone():
+        return ALREADY_WAITLISTED
+    if student_conflicts(cursor.connection, student, course):
+        return SCHEDULE_CONFLICT
+    cursor.execute('SELECT capacity, enrolled FROM Courses WHERE id = ?', (course,))
+    capacity, enrolled = cursor.fetchone()
+    if capacity is None or enrolled < capacity:
+        cursor.execute('INSERT INTO Registrations (student_id, course_id) VALUES (?, ?)', (student, course))
+        return REGISTERED
+    cursor.execute('INSERT INTO Waitlist (student_id, course_id) VALUES (?, ?)', (student, course))
+    return WAITLISTED
+
+
+def unenroll(cursor, student, course):
+    """
+    Drops a student and promotes the waitlist inside the caller's write transaction.
+
+    This is the body of drop() for callers that batch several writes in one
+    transaction.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside an open write transaction.
+        student (int): The ``Students.id`` of the student.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        tuple: (removed, promoted) as returned by drop().
+    """
+    cursor.execute('DELETE FROM Registrations WHERE student_id = ? AND course_id = ?', (student, course))
+    if cursor.rowcount:
+        return True, promote_waitlist(cursor, course)
+    cursor.execute('DELETE FROM Waitlist WHERE student_id = ? AND course_id = ?', (student, course))
+    return cursor.rowcount > 0, []
+
+
+@retry_on_busy
+def set_capacity(connection, course, capacity):
+    """
+    Changes the capacity of a course and promotes waitlisted students into new seats.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        course (int): The ``Courses.id`` of the course.
+        capacity (int): The new capacity, or None for unlimited.
+
+    Returns:
+        list: The ``Students.id`` of the students who got a seat.
+    """
+    with _write_transaction(connection) as cursor:
+        cursor.execute('UPDATE Courses SET capacity = ? WHERE id = ?', (capacity, course))
+        return promote_waitlist(cursor, course)
+
+
+def waitlist_position(connection, student, course):
+    """
+    Returns the 1-based position of a student on a course waitlist.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        student (int): The ``Students.id`` of the student.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        int: The position, or None if the student is not waitlisted.
+    """
+    row = connection.execute(
+        'SELECT id FROM Waitlist WHERE student_id = ? AND course_id = ?', (student, course)
+    ).fetchone()
+    if row is None:
+        return None
+    return connection.execute(
+        'SELECT COUNT(*) FROM Waitlist WHERE course_id = ? AND id <= ?', (course, row[0])
+    ).fetchone()[0]
+
+
+@contextlib.contextmanager
+def _write_transaction(connection):
+    """
+    Runs the with block in a write transaction, or in a savepoint of the caller's.
+
+    Without an open transaction, one is started with ``BEGIN IMMEDIATE`` and
+    committed when the block ends, or rolled back if it raises. Inside a
+    transaction the caller opened, the block runs in a savepoint that is
+    released or rolled back instead, so the caller's own work is neither
+    committed nor undone here.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Yields:
+        sqlite3.Cursor: A cursor inside the transaction.
+    """
+    cursor = connection.cursor()
+    if connection.in_transaction:
+        cursor.execute('SAVEPOINT registration')
+        try:
+            yield cursor
+        except Exception:
+            cursor.execute('ROLLBACK TO registration')
+            cursor.execute('RELEASE registration')
+            raise
+        cursor.execute('RELEASE registration')
+        return
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        yield cursor
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def _mark_schedule_conflicts(cursor, has_waitlist):
+    """
+    Marks the pending bulk pairs whose course clashes with the student's schedule.
+
+    The slots of every student and course in the batch are loaded with two
+    queries into a SlotIndex, then the pairs are decided in input order as
+    register() would decide them one at a time: a clash is refused, a full
+    course waitlists the student, and only the courses that give the
+    student a seat join their schedule for the pairs after them.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the bulk registration transaction.
+        has_waitlist (bool): Whether courses have a capacity.
+    """
+    slots = {}
+    for course, day, start, end in cursor.execute('''
+        SELECT course_id, day, start_minute, end_minute FROM CourseSlots
+        WHERE course_id IN (SELECT course_ref FROM bulk_pairs WHERE status IS NULL)
+    '''):
+        slots.setdefault(course, []).append(TimeSlot(day, start, end))
+    if not slots:
+        return
+
+    index = SlotIndex()
+    for student, day, start, end, course in cursor.execute('''
+        SELECT r.student_id, s.day, s.start_minute, s.end_minute, s.course_id
+        FROM Registrations r JOIN CourseSlots s ON s.course_id = r.course_id
+        WHERE r.student_id IN (SELECT student_ref FROM bulk_pairs WHERE status IS NULL)
+    '''):
+        index.add(student, TimeSlot(day, start, end), course)
+
+    # Free seats of the courses with a capacity
+    seats = {}
+    if has_waitlist:
+        seats = dict(cursor.execute('''
+            SELECT id, capacity - enrolled FROM Courses
+            WHERE capacity IS NOT NULL AND id IN (SELECT course_ref FROM bulk_pairs WHERE status IS NULL)
+        '''))
+
+    pending = cursor.execute('''
+        SELECT seq, student_ref, course_ref FROM bulk_pairs
+        WHERE status IS NULL AND seq = first_seq ORDER BY seq
+    ''').fetchall()
+    decided = []
+    for seq, student, course in pending:
+        if index.course_conflicts(student, slots.get(course, ()), course):
+            decided.append((SCHEDULE_CONFLICT, seq))
+        elif seats.get(course, 1) <= 0:
+            # Waitlisted here, so the pairs of the other courses do not clash with it
+            decided.append((WAITLISTED, seq))
+        else:
+            if course in seats:
+                seats[course] -= 1
+            for slot in slots.get(course, ()):
+                index.add(student, slot, course)
+    cursor.executemany('UPDATE bulk_pairs SET status = ? WHERE seq = ?', decided)
+
+
+def promote_waitlist(cursor, course):
+    """
+    Moves waitlisted students into the free seats of a course.
+
+    Each promotion is an index seek on ``Waitlist(course_id, id)``, so the
+    cost does not grow with the length of the waitlist. Students whose
+    schedule now clashes with the course keep their place and are skipped.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside an open write transaction.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        list: The ``Students.id`` of the promoted students.
+    """
+    promoted = []
+    last_seen = 0
+    while True:
+        cursor.execute('SELECT capacity, enrolled FROM Courses WHERE id = ?', (course,))
+        row = cursor.fetchone()
+        if row is None or (row[0] is not None and row[1] >= row[0]):
+            break
+        cursor.execute(
+            'SELECT id, student_id FROM Waitlist WHERE course_id = ? AND id > ? ORDER BY id LIMIT 1',
+            (course, last_seen)
+        )
+        head = cursor.fetchone()
+        if head is None:
+            break
+        last_seen = head[0]
+        if student_conflicts(cursor.connection, head[1], course):
+            continue
+        cursor.execute('DELETE FROM Waitlist WHERE id = ?', (head[0],))
+        cursor.execute('INSERT OR IGNORE INTO Registrations (student_id, course_id) VALUES (?, ?)', (head[1], course))
+        promoted.append(head[1])
+    return promoted
+
+
+def summarize(outcomes):
+    """
+    Counts the outcomes of a bulk registration by status.
+
+    Args:
+        outcomes (list): RegistrationOutcome objects.
+
+    Returns:
+        dict: Number of pairs for each status.
+    """
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome.status] = counts.get(outcome.status, 0) + 1
+    return counts
+
+
+def _has_column(connection, table, column):
+    """
+    Checks whether a table has the given column.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table name.
+        column (str): The column name.
+
+    Returns:
+        bool: True if the column exists.
+    """
+    return any(row[1] == column for row in connection.execute(f'PRAGMA table_info({table})'))
@@ -0,0 +1,175 @@
+"""
+Course rosters and student transcripts for end-of-term distribution.
+
+Each report kind is produced by one ordered join over the whole database,
+grouped in Python as the rows arrive, instead of one query per course or
+student. The join follows the existing indexes, so SQLite streams it without
+sorting, and only one group (one course's students, or one student's
+courses) is held in memory at a time however many reports are written.
+
+Reports can be written as CSV, HTML or plain text, either one file per
+course or student, or all into one stream.
+"""
+import csv
+import html
+import io
+import os
+import re
+from collections import namedtuple
+from itertools import groupby
+from operator import itemgetter
+
+# Report kinds
+ROSTERS = 'rosters'
+TRANSCRIPTS = 'transcripts'
+
+# Output formats and the file extension of each
+FORMATS = {'csv': '.csv', 'html': '.html', 'txt': '.txt'}
+
+# One report: a title, the column headings, and its rows
+Report = namedtuple('Report', ['key', 'title', 'headings', 'rows'])
+
+# Characters that are not safe in a file name
+UNSAFE_NAME = re.compile(r'[^\w.-]')
+
+# Courses in course ID order with their registrations in signup order;
+# the order is that of the Courses(course_id) and Registrations(course_id)
+# indexes, so no sort is needed
+ROSTER_QUERY = '''
+    SELECT c.course_id, c.course_name, c.term, i.name, s.student_id, s.name, s.email
+    FROM Courses c
+    LEFT JOIN Instructors i ON i.id = c.instructor_id
+    LEFT JOIN Registrations r ON r.course_id = c.id
+    LEFT JOIN Students s ON s.id = r.student_id
+    ORDER BY c.course_id, r.id
+'''
+
+# Students in student ID order with their courses, following the
+# Students(student_id) and Registrations(student_id, course_id) indexes
+TRANSCRIPT_QUERY = '''
+    SELECT s.student_id, s.name, s.email, c.term, c.course_id, c.course_name, i.name
+    FROM Students s
+    LEFT JOIN Registrations r ON r.student_id = s.id
+    LEFT JOIN Courses c ON c.id = r.course_id
+    LEFT JOIN Instructors i ON i.id = c.instructor_id
+    ORDER BY s.student_id, r.course_id
+'''
+
+
+def rosters(connection):
+    """
+    Streams the roster of every course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Yields:
+        Report: One per course, its students sorted by name.
+    """
+    for (course_id, course_name, term, instructor), rows in groupby(connection.execute(ROSTER_QUERY),
+                                                                    key=itemgetter(0, 1, 2, 3)):
+        students = sorted((row[4:] for row in rows if row[4] is not None), key=lambda row: (row[1], row[0]))
+        title = f'{course_id} {course_name}'
+        if term:
+            title += f' ({term})'
+        title += f' - instructor: {instructor or "unassigned"} - {len(students)} students'
+        yield Report(course_id, title, ('Student ID', 'Name', 'Email'), students)
+
+
+def transcripts(connection):
+    """
+    Streams the course list of every student.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+
+    Yields:
+        Report: One per student, the courses sorted by term and course ID.
+    """
+    for (student_id, name, email), rows in groupby(connection.execute(TRANSCRIPT_QUERY), key=itemgetter(0, 1, 2)):
+        courses = sorted((row[3:] for row in rows if row[4] is not None),
+                         key=lambda row: (row[0] is None, row[0] or '', row[1]))
+        title = f'{student_id} {name} <{email}> - {len(courses)} courses'
+        yield Report(student_id, title, ('Term', 'Course ID', 'Course', 'Instructor'), courses)
+
+
+def render(report, output_format, file):
+    """
+    Writes one report.
+
+    Args:
+        report (Report): The report.
+        output_format (str): 'csv', 'html' or 'txt'.
+        file: A text file; CSV needs it opened with ``newline=''``.
+    """
+    if output_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow([report.title])
+        writer.writerow(report.headings)
+        writer.writerows(report.rows)
+    elif output_format == 'html':
+        file.write(f'<h2>{html.escape(report.title)}</h2>\n<table>\n<tr>')
+        file.write(''.join(f'<th>{html.escape(heading)}</th>' for heading in report.headings))
+        file.write('</tr>\n')
+        for row in report.rows:
+            cells = ''.join(f'<td>{html.escape(str(value) if value is not None else "")}</td>' for value in row)
+            file.write(f'<tr>{cells}</tr>\n')
+        file.write('</table>\n')
+    elif output_format == 'txt':
+        rows = [[str(value) if value is not None else '' for value in row] for row in report.rows]
+        widths = [max([len(heading)] + [len(row[column]) for row in rows])
+                  for column, heading in enumerate(report.headings)]
+        file.write(report.title + '\n\n')
+        for row in [list(report.headings), ['-' * width for width in widths]] + rows:
+            file.write('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() + '\n')
+    else:
+        raise ValueError(f"Unknown report format '{output_format}'.")
+
+
+def write_reports(reports, output_format, file):
+    """
+    Writes a stream of reports one after the other into one file.
+
+    Args:
+        reports (iterable): Report objects, such as rosters(connection).
+        output_format (str): 'csv', 'html' or 'txt'.
+        file: A text file; CSV needs it opened with ``newline=''``.
+
+    Returns:
+        int: The number of reports written.
+    """
+    count = 0
+    for report in reports:
+        if count:
+            file.write('\n')
+        render(report, output_format, file)
+        count += 1
+    return count
+
+
+def write_report_files(reports, output_format, directory):
+    """
+    Writes each report of a stream to its own file.
+
+    Files are named after the course or student ID, with characters that
+    are not safe in file names replaced by underscores.
+
+    Args:
+        reports (iterable): Report objects, such as rosters(connection).
+        output_format (str): 'csv', 'html' or 'txt'.
+        directory (str): The directory to write to; it is created if needed.
+
+    Returns:
+        int: The number of files written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for report in reports:
+        # Render into memory first, so a failing report leaves no partial file behind
+        buffer = io.StringIO(newline='')
+        render(report, output_format, buffer)
+        name = os.path.join(directory, UNSAFE_NAME.sub('_', report.key) + FORMATS[output_format])
+        with open(name, 'w', newline='', encoding='utf-8') as file:
+            file.write(buffer.getvalue())
+        count += 1
+    return count
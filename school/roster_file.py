@@ -0,0 +1,312 @@
+"""
+Memory-mapped reader for large export files.
+
+Reads the CSV written by the Tkinter app's Export button and the JSON
+written by ``SchoolStructs`` ``save_to_file`` without loading them into
+Python strings. The file is mapped with ``mmap`` and scanned once for the
+byte span of every record; the spans are kept in a sidecar index file
+(``<file>.idx``) so later opens are instant and any record can be read by
+its number. Only the record being read is decoded, so memory use does not
+grow with the size of the file.
+"""
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+from array import array
+
+from school.exchange import EXPORT_HEADER, csv_record, json_record
+
+# Sidecar index: magic, size and mtime of the indexed file, record count,
+# then (start, end, line) per record as unsigned 64-bit integers
+INDEX_MAGIC = b'SCHIDX1\0'
+INDEX_HEADER = struct.Struct('<8sQqQ')
+INDEX_FIELDS = 3
+
+# Entries written per flush while building an index
+INDEX_BUFFER = 65536
+
+# Top-level entry of a file written with indent=4, such as "person_12": {
+INDENTED_ENTRY = re.compile(rb'\n {4}"(?:person|course)_\d+": ')
+# Strings and brackets, the only JSON tokens that matter to find object spans
+JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+# Start of a file holding several saved objects, and of one holding none
+ENTRIES_START = re.compile(rb'\s*\{\s*"(?:person|course)_\d+"\s*:')
+EMPTY_OBJECT = re.compile(rb'\s*\{\s*\}')
+
+
+class RosterFile:
+    """
+    Random access to the records of a CSV export or a SchoolStructs JSON file.
+    """
+    def __init__(self, file_name, index_name=None):
+        """
+        Maps the file and loads its index, building it if missing or stale.
+
+        Args:
+            file_name (str): Path of the .csv or .json file.
+            index_name (str, optional): Path of the sidecar index, defaults to
+                ``<file_name>.idx``.
+        """
+        self.file_name = file_name
+        self.is_json = os.path.splitext(file_name)[1].lower() == '.json'
+        self.file = open(file_name, 'rb')
+        stat = os.fstat(self.file.fileno())
+        # An empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        self.view = memoryview(self.map)
+
+        self.index_name = index_name or f'{file_name}.idx'
+        if not self._index_is_current(stat):
+            self.index_name = self._build_index(stat)
+        self.index_file = open(self.index_name, 'rb')
+        self.index_map = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = INDEX_HEADER.unpack_from(self.index_map)[3]
+        self.spans = memoryview(self.index_map)[INDEX_HEADER.size:].cast('Q')
+
+    def __len__(self):
+        """
+        Returns the number of records.
+
+        Returns:
+            int: The record count.
+        """
+        return self.count
+
+    def __getitem__(self, number):
+        """
+        Reads one record by its number.
+
+        Args:
+            number (int): The record number, from 0.
+
+        Returns:
+            Record: The decoded record.
+        """
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError('record number out of range')
+        start, end, line = self.spans[number * INDEX_FIELDS:(number + 1) * INDEX_FIELDS]
+        return self._decode(self.view[start:end], line)
+
+    def __iter__(self):
+        """
+        Reads the records in file order.
+
+        Yields:
+            Record: The decoded records.
+        """
+        for number in range(self.count):
+            yield self[number]
+
+    def span(self, number):
+        """
+        Returns the byte span of a record.
+
+        Args:
+            number (int): The record number, from 0.
+
+        Returns:
+            tuple: The (start, end) byte offsets of the record in the file.
+        """
+        start, end, _ = self.spans[number * INDEX_FIELDS:(number + 1) * INDEX_FIELDS]
+        return start, end
+
+    def raw(self, number):
+        """
+        Returns the undecoded bytes of a record without copying them.
+
+        Args:
+            number (int): The record number, from 0.
+
+        Returns:
+            memoryview: A view of the record in the mapped file.
+        """
+        start, end = self.span(number)
+        return self.view[start:end]
+
+    def close(self):
+        """
+        Unmaps the file and its index.
+        """
+        self.spans.release()
+        self.view.release()
+        self.index_map.close()
+        self.index_file.close()
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        """
+        Returns the reader for use in a with statement.
+
+        Returns:
+            RosterFile: This reader.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the reader at the end of a with statement.
+        """
+        self.close()
+
+    def _decode(self, data, line):
+        """
+        Decodes the bytes of one record.
+
+        Args:
+            data (memoryview): The record bytes.
+            line (int): The line number (CSV) or position (JSON) of the record.
+
+        Returns:
+            Record: The record.
+        """
+        if self.is_json:
+            return json_record(json.loads(bytes(data)), line)
+        return csv_record(next(csv.reader([str(data, 'utf-8')])), line)
+
+    def _index_is_current(self, stat):
+        """
+        Checks that the sidecar index exists and matches the file.
+
+        Args:
+            stat (os.stat_result): The status of the mapped file.
+
+        Returns:
+            bool: True if the index can be used.
+        """
+        try:
+            with open(self.index_name, 'rb') as index:
+                header = index.read(INDEX_HEADER.size)
+        except OSError:
+            return False
+        if len(header) < INDEX_HEADER.size:
+            return False
+        magic, size, mtime, _ = INDEX_HEADER.unpack(header)
+        return magic == INDEX_MAGIC and size == stat.st_size and mtime == stat.st_mtime_ns
+
+    def _build_index(self, stat):
+        """
+        Scans the file once and writes the span of every record to the index.
+
+        If the sidecar cannot be written next to the file (for example on a
+        read-only archive), the index goes to a temporary file instead.
+
+        Args:
+            stat (os.stat_result): The status of the mapped file.
+
+        Returns:
+            str: The path of the index that was written.
+        """
+        try:
+            index = open(self.index_name, 'wb')
+        except OSError:
+            descriptor, name = tempfile.mkstemp(suffix='.idx')
+            index = os.fdopen(descriptor, 'wb')
+            self.index_name = name
+        with index:
+            index.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0, 0))
+            buffer = array('Q')
+            count = 0
+            spans = scan_json(self.map) if self.is_json else scan_csv(self.map)
+            for start, end, line in spans:
+                buffer.extend((start, end, line))
+                count += 1
+                if len(buffer) >= INDEX_BUFFER * INDEX_FIELDS:
+                    buffer.tofile(index)
+                    del buffer[:]
+            buffer.tofile(index)
+            # The header is written last so an interrupted build is never trusted
+            index.seek(0)
+            index.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, count))
+        return self.index_name
+
+
+def scan_csv(data):
+    """
+    Finds the span of every data row of a CSV export.
+
+    Rows are assumed not to contain line breaks inside quoted fields, which
+    holds for the files written by the Tkinter app's Export button.
+
+    Args:
+        data (mmap.mmap): The mapped file.
+
+    Yields:
+        tuple: (start, end, line) for every non-empty row except the header;
+            end excludes the line break.
+    """
+    header = ','.join(EXPORT_HEADER[:2]).encode()
+    size = len(data)
+    start = 0
+    line = 0
+    while start < size:
+        line += 1
+        end = data.find(b'\n', start)
+        if end < 0:
+            end = size
+        stop = end - 1 if end > start and data[end - 1:end] == b'\r' else end
+        if stop > start and not (line == 1 and data[start:start + len(header)] == header):
+            yield start, stop, line
+        start = end + 1
+
+
+def scan_json(data):
+    """
+    Finds the span of every object of a SchoolStructs JSON file.
+
+    Files written by ``save_to_file`` are indented, so their entries are
+    found with one regular expression scan. Other layouts fall back to a
+    scan of the strings and brackets, and a file holding a single saved
+    object yields that object.
+
+    Args:
+        data (mmap.mmap): The mapped file.
+
+    Yields:
+        tuple: (start, end, position) of every object, position counting from 1.
+    """
+    if not ENTRIES_START.match(data):
+        if not EMPTY_OBJECT.match(data):
+            stripped = data[:64].lstrip()
+            if stripped:
+                yield len(data[:64]) - len(stripped), data.rfind(b'}') + 1, 1
+        return
+
+    if data[:2] == b'{\n':
+        # Each entry is yielded once the next one is found, so only one match is held
+        previous = None
+        position = 0
+        for match in INDENTED_ENTRY.finditer(data):
+            if previous is not None:
+                # An entry ends at the last closing brace before the next entry
+                position += 1
+                yield previous.end(), data.rfind(b'}', previous.end(), match.start()) + 1, position
+            previous = match
+        if previous is not None:
+            # The last entry ends at the last closing brace before the file's own
+            yield previous.end(), data.rfind(b'}', previous.end(), data.rfind(b'}')) + 1, position + 1
+            return
+
+    depth = 0
+    position = 0
+    start = None
+    for token in JSON_TOKEN.finditer(data):
+        bracket = data[token.start():token.start() + 1]
+        if bracket == b'"':
+            continue
+        if bracket in (b'{', b'['):
+            if depth == 1:
+                start = token.start()
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                position += 1
+                yield start, token.end(), position
@@ -0,0 +1,419 @@
+"""
+Course meeting times and schedule clash detection.
+
+Meeting times are stored in the ``CourseSlots`` table as a weekday and a
+start/end minute. Clashes are found with SlotIndex, per-entity slot lists
+sorted by start: a person's slots are read in order with one query, and each
+slot of the new course is then two binary searches instead of a comparison
+with all of theirs. Batches that place many courses keep one index for the
+whole batch. Checking a whole term, as ``check`` does, or new meeting times
+against every registered student, is a single ordered query and a sweep, so
+it stays near-linear in the number of registrations.
+"""
+import heapq
+import json
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MINUTES_PER_DAY = 24 * 60
+
+# The largest id SQLite hands out, the default end of an id range
+MAX_ID = 2 ** 63 - 1
+
+TimeSlot = namedtuple('TimeSlot', ['day', 'start', 'end'])
+Clash = namedtuple('Clash', ['entity', 'course', 'other_course'])
+
+_SLOT_PATTERN = re.compile(r'^([A-Za-z/]+)\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$')
+
+# The slots of the students and instructors in a range of ids, in week
+# minutes, sorted by person and start
+_ENTITY_SLOTS = {
+    'students': '''
+        SELECT r.student_id, s.day * ?1 + s.start_minute, s.day * ?1 + s.end_minute, s.course_id
+        FROM Registrations r JOIN CourseSlots s ON s.course_id = r.course_id
+        WHERE r.student_id > ?2 AND r.student_id <= ?3
+        ORDER BY 1, 2
+    ''',
+    'instructors': '''
+        SELECT c.instructor_id, s.day * ?1 + s.start_minute, s.day * ?1 + s.end_minute, s.course_id
+        FROM Courses c JOIN CourseSlots s ON s.course_id = c.id
+        WHERE c.instructor_id > ?2 AND c.instructor_id <= ?3
+        ORDER BY 1, 2
+    ''',
+}
+
+
+def parse_slots(text):
+    """
+    Parses meeting times such as ``"Mon/Wed 09:00-10:15, Fri 13:00-14:00"``.
+
+    Args:
+        text (str): Comma or semicolon separated meeting times.
+
+    Returns:
+        list: The TimeSlot objects, sorted by day and start time.
+
+    Raises:
+        ValueError: If a meeting time cannot be understood, or two of them overlap.
+    """
+    slots = []
+    for part in re.split(r'[,;]', text):
+        part = part.strip()
+        if not part:
+            continue
+        match = _SLOT_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Invalid meeting time '{part}'. Use e.g. 'Mon/Wed 09:00-10:15'.")
+        days, start_hour, start_minute, end_hour, end_minute = match.groups()
+        start = int(start_hour) * 60 + int(start_minute)
+        end = int(end_hour) * 60 + int(end_minute)
+        if not start < end <= MINUTES_PER_DAY:
+            raise ValueError(f"Invalid meeting time '{part}': the end must be after the start.")
+        for day in days.split('/'):
+            day = day.strip().capitalize()[:3]
+            if day not in DAYS:
+                raise ValueError(f"Invalid day '{day}' in meeting time '{part}'.")
+            slots.append(TimeSlot(DAYS.index(day), start, end))
+    slots = sorted(set(slots))
+    check_overlaps(slots)
+    return slots
+
+
+def check_overlaps(slots):
+    """
+    Checks that the meeting times of one course do not overlap each other.
+
+    Args:
+        slots (list): TimeSlot objects sorted by day and start time.
+
+    Raises:
+        ValueError: If two of the meeting times overlap.
+    """
+    for previous, slot in zip(slots, slots[1:]):
+        if slot.day == previous.day and slot.start < previous.end:
+            raise ValueError(f"The meeting times '{format_slots([previous])}' and '{format_slots([slot])}' overlap.")
+
+
+def format_slots(slots):
+    """
+    Formats meeting times back into the text accepted by parse_slots.
+
+    Args:
+        slots (list): TimeSlot objects.
+
+    Returns:
+        str: The meeting times, grouping days that share the same hours.
+    """
+    by_hours = {}
+    for slot in sorted(slots):
+        by_hours.setdefault((slot.start, slot.end), []).append(DAYS[slot.day])
+    return ', '.join(
+        f"{'/'.join(days)} {start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+        for (start, end), days in by_hours.items()
+    )
+
+
+class SlotIndex:
+    """
+    Sorted per-entity interval lists for clash detection.
+
+    Each entity (a student or an instructor) maps to parallel lists of slot
+    starts, ends and course keys in week minutes, kept sorted by start, and
+    the running maximum of the ends. The running maximum is sorted even when
+    slots overlap, so a lookup is two binary searches that bound the slots
+    which can overlap, and only those are compared.
+    """
+    def __init__(self):
+        """
+        Initializes an empty index.
+        """
+        self.entities = {}
+
+    def add(self, entity, slot, course):
+        """
+        Adds a slot to an entity's schedule.
+
+        Args:
+            entity: The student or instructor key.
+            slot (TimeSlot): The meeting time.
+            course: The course the slot belongs to.
+        """
+        starts, ends, courses, latest_ends = self.entities.setdefault(entity, ([], [], [], []))
+        start, end = _week_minutes(slot)
+        position = bisect_right(starts, start)
+        starts.insert(position, start)
+        ends.insert(position, end)
+        courses.insert(position, course)
+        latest_ends.insert(position, end)
+        for i in range(position, len(ends)):
+            latest_ends[i] = max(latest_ends[i - 1], ends[i]) if i else ends[i]
+
+    def conflicts(self, entity, slot):
+        """
+        Finds the courses of an entity that overlap a slot.
+
+        Args:
+            entity: The student or instructor key.
+            slot (TimeSlot): The meeting time to check.
+
+        Returns:
+            list: The keys of the clashing courses.
+        """
+        if entity not in self.entities:
+            return []
+        starts, ends, courses, latest_ends = self.entities[entity]
+        start, end = _week_minutes(slot)
+        # Every slot before first ends by our start, every slot from last on
+        # starts at or after our end; those in between overlap us if they end
+        # after our start
+        first = bisect_right(latest_ends, start)
+        last = bisect_left(starts, end)
+        return [courses[i] for i in range(first, last) if ends[i] > start]
+
+    def course_conflicts(self, entity, slots, course):
+        """
+        Finds the courses of an entity that clash with the slots of a course.
+
+        Args:
+            entity: The student or instructor key.
+            slots (list): The TimeSlot objects of the course.
+            course: The course key.
+
+        Returns:
+            list: The keys of the clashing courses.
+        """
+        clashes = []
+        for slot in slots:
+            for other in self.conflicts(entity, slot):
+                if other != course and other not in clashes:
+                    clashes.append(other)
+        return clashes
+
+    def try_add_course(self, entity, slots, course):
+        """
+        Adds all slots of a course to an entity unless one of them clashes.
+
+        Args:
+            entity: The student or instructor key.
+            slots (list): The TimeSlot objects of the course.
+            course: The course key.
+
+        Returns:
+            list: The keys of the clashing courses; empty if the course was added.
+        """
+        clashes = self.course_conflicts(entity, slots, course)
+        if not clashes:
+            for slot in slots:
+                self.add(entity, slot, course)
+        return clashes
+
+
+def set_course_slots(connection, course, slots):
+    """
+    Replaces the meeting times of a course inside the caller's transaction.
+
+    The new times are checked against the other courses of every student
+    registered in the course and of its instructor after they are written,
+    while the transaction holds the write lock. On a clash the caller must
+    roll back.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        course (int): The ``Courses.id`` of the course.
+        slots (list): The new TimeSlot objects.
+
+    Raises:
+        ValueError: If the meeting times overlap each other or clash with
+            the schedule of a student or the instructor of the course.
+    """
+    check_overlaps(sorted(slots))
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM CourseSlots WHERE course_id = ?', (course,))
+    cursor.executemany(
+        'INSERT INTO CourseSlots (course_id, day, start_minute, end_minute) VALUES (?, ?, ?, ?)',
+        ((course, slot.day, slot.start, slot.end) for slot in slots)
+    )
+    if not slots:
+        return
+    # One sweep over the schedules of the registered students
+    clashes = _sweep(cursor.execute('''
+        SELECT m.student_id, s.day * ?1 + s.start_minute, s.day * ?1 + s.end_minute, s.course_id
+        FROM Registrations r
+        JOIN Registrations m ON m.student_id = r.student_id
+        JOIN CourseSlots s ON s.course_id = m.course_id
+        WHERE r.course_id = ?2
+        ORDER BY 1, 2
+    ''', (MINUTES_PER_DAY, course)))
+    students = len({clash.entity for clash in clashes if course in (clash.course, clash.other_course)})
+    if students:
+        raise ValueError(f"The meeting times clash with the other courses of {students} registered student(s).")
+    instructor = cursor.execute('SELECT instructor_id FROM Courses WHERE id = ?', (course,)).fetchone()
+    if instructor and instructor[0] is not None and instructor_conflicts(connection, instructor[0], course):
+        raise ValueError("The meeting times clash with the instructor's other courses.")
+
+
+def course_slots(connection, course):
+    """
+    Returns the meeting times of a course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        course (int): The ``Courses.id`` of the course.
+
+    Returns:
+        list: The TimeSlot objects of the course.
+    """
+    return [TimeSlot(*row) for row in connection.execute(
+        'SELECT day, start_minute, end_minute FROM CourseSlots WHERE course_id = ? ORDER BY day, start_minute',
+        (course,)
+    )]
+
+
+def schedule_map(connection, courses):
+    """
+    Returns the formatted meeting times of the given courses that have some.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        courses (iterable): The ``Courses.id`` of the courses.
+
+    Returns:
+        dict: Formatted meeting times keyed by ``Courses.id``.
+    """
+    slots = {}
+    for course, day, start, end in connection.execute(
+        'SELECT course_id, day, start_minute, end_minute FROM CourseSlots '
+        'WHERE course_id IN (SELECT value FROM json_each(?)) ORDER BY course_id, day, start_minute',
+        (json.dumps(list(courses)),)
+    ):
+        slots.setdefault(course, []).append(TimeSlot(day, start, end))
+    return {course: format_slots(entries) for course, entries in slots.items()}
+
+
+def student_conflicts(connection, student, course):
+    """
+    Finds the registered courses of a student that clash with a course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        student (int): The ``Students.id`` of the student.
+        course (int): The ``Courses.id`` of the course to check.
+
+    Returns:
+        list: The ``Courses.id`` of the clashing courses.
+    """
+    return _conflicts(connection, course, '''
+        SELECT s.day, s.start_minute, s.end_minute, s.course_id
+        FROM Registrations r JOIN CourseSlots s ON s.course_id = r.course_id
+        WHERE r.student_id = ? AND r.course_id != ?
+    ''', (student, course))
+
+
+def instructor_conflicts(connection, instructor, course):
+    """
+    Finds the courses taught by an instructor that clash with a course.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        instructor (int): The ``Instructors.id`` of the instructor.
+        course (int): The ``Courses.id`` of the course to check.
+
+    Returns:
+        list: The ``Courses.id`` of the clashing courses.
+    """
+    return _conflicts(connection, course, '''
+        SELECT s.day, s.start_minute, s.end_minute, s.course_id
+        FROM Courses c JOIN CourseSlots s ON s.course_id = c.id
+        WHERE c.instructor_id = ? AND c.id != ?
+    ''', (instructor, course))
+
+
+def _conflicts(connection, course, query, params):
+    """
+    Checks the slots of a course against a person's schedule in a SlotIndex.
+
+    The person's slots are read with one query, sorted by SQLite, so
+    building the index only appends; each slot of the course is then two
+    binary searches instead of a comparison with every slot of the person.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        course (int): The ``Courses.id`` of the course to check.
+        query (str): Selects the day, start, end and course of the person's
+            other slots.
+        params (tuple): The query parameters.
+
+    Returns:
+        list: The ``Courses.id`` of the clashing courses.
+    """
+    slots = course_slots(connection, course)
+    if not slots:
+        return []
+    index = SlotIndex()
+    for day, start, end, other in connection.execute(f'{query} ORDER BY s.day, s.start_minute', params):
+        index.add(None, TimeSlot(day, start, end), other)
+    return index.course_conflicts(None, slots, course)
+
+
+def term_clashes(connection, after=0, last=MAX_ID, kinds=tuple(_ENTITY_SLOTS)):
+    """
+    Finds every schedule clash of the students and instructors in a range of ids.
+
+    Slots are streamed in (entity, start) order and swept once while keeping
+    a heap of the slots still open, ordered by end. Slots that end by the
+    next start leave the heap, and every slot left in it overlaps the next
+    one, so the cost is the sort done by SQLite plus one pass and the
+    clashes found.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        after (int): Students and instructors after this id are checked...
+        last (int): ...up to this id; all of them by default.
+        kinds (tuple): 'students', 'instructors' or both.
+
+    Returns:
+        dict: Lists of Clash tuples under the keys 'students' (entity is a
+            ``Students.id``) and 'instructors' (entity is an ``Instructors.id``).
+    """
+    return {kind: _sweep(connection.execute(_ENTITY_SLOTS[kind], (MINUTES_PER_DAY, after, last))) for kind in kinds}
+
+
+def _sweep(rows):
+    """
+    Sweeps (entity, start, end, course) rows sorted by entity and start.
+
+    Args:
+        rows (iterable): The sorted rows.
+
+    Returns:
+        list: The Clash tuples found, one per pair of clashing courses of an entity.
+    """
+    clashes = []
+    current, open_slots, seen = None, [], set()
+    for entity, start, end, course in rows:
+        if entity != current:
+            current, open_slots, seen = entity, [], set()
+        # A slot that ended by this start cannot overlap it or any later one
+        while open_slots and open_slots[0][0] <= start:
+            heapq.heappop(open_slots)
+        for _, other in open_slots:
+            if other != course and (other, course) not in seen:
+                seen.add((other, course))
+                clashes.append(Clash(entity, other, course))
+        heapq.heappush(open_slots, (end, course))
+    return clashes
+
+
+def _week_minutes(slot):
+    """
+    Converts a slot to minutes since the start of the week.
+
+    Args:
+        slot (TimeSlot): The meeting time.
+
+    Returns:
+        tuple: The (start, end) minutes.
+    """
+    return slot.day * MINUTES_PER_DAY + slot.start, slot.day * MINUTES_PER_DAY + slot.end
@@ -0,0 +1,1038 @@
+"""
+Headless HTTP/JSON service over the school database.
+
+Exposes students, instructors, courses and registrations without a GUI so
+other systems (such as the student portal) can query and change enrollments
+programmatically. Run it next to the GUI launchers with::
+
+    python -m school.server --db school.db --port 8080
+
+Requests are served by asyncio. Reads run on a pool of read-only
+connections, one per worker thread, so slow queries never block the event
+loop. All writes go through a single writer thread that drains the pending
+writes and applies them together in one transaction, each in its own
+savepoint, which keeps the file lock short under load.
+
+Endpoints (keys are the student, instructor and course IDs used in the GUIs)::
+
+    GET    /students?q=&limit=&offset=     GET    /students/<student_id>
+    POST   /students                       PUT    /students/<student_id>
+    DELETE /students/<student_id>?version=
+    (the same for /instructors and /courses)
+    GET    /registrations?student=&course=
+    POST   /registrations                  {"student": ..., "course": ...}
+    POST   /registrations/bulk             {"students": [...], "courses": [...]} or {"pairs": [[s, c], ...]}
+    DELETE /registrations?student=&course=
+    GET    /health
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from school.archive import check_term
+from school.concurrency import ConflictError, connect, is_busy_error, retry_on_busy
+from school.database import Database
+from school.records import soft_delete, versioned_write
+from school.registration import (
+    enroll, promote_waitlist, register_many, register_pairs, summarize, unenroll
+)
+from school.schedule import course_slots, format_slots, parse_slots, set_course_slots
+from school.validation import validate_age, validate_email
+
+# URL resource -> (table, natural key column) for the two kinds of people
+PEOPLE = {
+    'students': ('Students', 'student_id'),
+    'instructors': ('Instructors', 'instructor_id'),
+}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Largest request body read, in bytes
+MAX_BODY = 16 * 1024 * 1024
+
+_log = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """
+    Raised by request handlers to answer with an error status.
+    """
+    def __init__(self, status, message):
+        """
+        Initializes the error.
+
+        Args:
+            status (int): The HTTP status code.
+            message (str): The error message sent to the client.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Read handlers: run on a read-pool thread with that thread's connection
+
+def list_people(connection, table, key, query, limit, offset):
+    """
+    Lists students or instructors whose name or ID contains the query.
+
+    Args:
+        connection (sqlite3.Connection): A read connection.
+        table (str): 'Students' or 'Instructors'.
+        key (str): The natural key column.
+        query (str): Case-insensitive search text, empty for all.
+        limit (int): Maximum number of rows.
+        offset (int): Number of rows to skip.
+
+    Returns:
+        list: The matching rows as dictionaries.
+    """
+    pattern = f'%{query.lower()}%'
+    rows = connection.execute(f'''
+        SELECT {key}, name, age, email, version FROM {table}
+        WHERE LOWER(name) LIKE ? OR LOWER({key}) LIKE ?
+        ORDER BY id LIMIT ? OFFSET ?
+    ''', (pattern, pattern, limit, offset))
+    return [dict(row) for row in rows]
+
+
+def get_person(connection, table, key, value):
+    """
+    Returns one student or instructor by natural key.
+
+    Args:
+        connection (sqlite3.Connection): A read connection.
+        table (str): 'Students' or 'Instructors'.
+        key (str): The natural key column.
+        value (str): The student or instructor ID.
+
+    Returns:
+        dict: The row.
+    """
+    row = connection.execute(
+        f'SELECT {key}, name, age, email, version FROM {table} WHERE {key} = ?', (value,)
+    ).fetchone()
+    if row is None:
+        raise HTTPError(404, f'{table[:-1]} {value} not found.')
+    return dict(row)
+
+
+def list_courses(connection, query, limit, offset):
+    """
+    Lists courses whose name, ID or instructor contains the query.
+
+    Args:
+        connection (sqlite3.Connection): A read connection.
+        query (str): Case-insensitive search text, empty for all.
+        limit (int): Maximum number of rows.
+        offset (int): Number of rows to skip.
+
+    Returns:
+        list: The matching rows as dictionaries.
+    """
+    pattern = f'%{query.lower()}%'
+    rows = connection.execute('''
+        SELECT c.course_id, c.course_name, i.instructor_id, i.name AS instructor,
+               c.capacity, c.enrolled, c.term, c.version
+        FROM Courses c LEFT JOIN Instructors i ON c.instructor_id = i.id
+        WHERE LOWER(c.course_name) LIKE ? OR LOWER(c.course_id) LIKE ? OR LOWER(i.name) LIKE ?
+        ORDER BY c.id LIMIT ? OFFSET ?
+    ''', (pattern, pattern, pattern, limit, offset))
+    return [dict(row) for row in rows]
+
+
+def get_course(connection, course_id):
+    """
+    Returns one course with its meeting times and waitlist length.
+
+    Args:
+        connection (sqlite3.Connection): A read connection.
+        course_id (str): The course ID.
+
+    Returns:
+        dict: The course.
+    """
+    row = connection.execute('''
+        SELECT c.id, c.course_id, c.course_name, i.instructor_id, i.name AS instructor,
+               c.capacity, c.enrolled, c.term, c.version,
+               (SELECT COUNT(*) FROM Waitlist w WHERE w.course_id = c.id) AS waitlisted
+        FROM Courses c LEFT JOIN Instructors i ON c.instructor_id = i.id
+        WHERE c.course_id = ?
+    ''', (course_id,)).fetchone()
+    if row is None:
+        raise HTTPError(404, f'Course {course_id} not found.')
+    course = dict(row)
+    course['meeting_times'] = format_slots(course_slots(connection, course.pop('id')))
+    return course
+
+
+def list_registrations(connection, student, course, limit, offset):
+    """
+    Lists registrations, optionally for one student and/or one course.
+
+    Args:
+        connection (sqlite3.Connection): A read connection.
+        student (str): A student ID, or None for all students.
+        course (str): A course ID, or None for all courses.
+        limit (int): Maximum number of rows.
+        offset (int): Number of rows to skip.
+
+    Returns:
+        list: The registrations as dictionaries.
+    """
+    conditions, params = [], []
+    if student:
+        conditions.append('s.student_id = ?')
+        params.append(student)
+    if course:
+        conditions.append('c.course_id = ?')
+        params.append(course)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = connection.execute(f'''
+        SELECT s.student_id, s.name AS student_name, c.course_id, c.course_name
+        FROM Registrations r
+        JOIN Students s ON s.id = r.student_id
+        JOIN Courses c ON c.id = r.course_id
+        {where}
+        ORDER BY r.id LIMIT ? OFFSET ?
+    ''', params + [limit, offset])
+    return [dict(row) for row in rows]
+
+
+# Write handlers: run on the writer thread inside the batch transaction
+
+def create_person(cursor, table, key, body):
+    """
+    Inserts a student or instructor.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        table (str): 'Students' or 'Instructors'.
+        key (str): The natural key column.
+        body (dict): name, age, email and the natural key.
+
+    Returns:
+        dict: The created row.
+    """
+    name, age, email = _person_fields(body)
+    value = _text(body, key, required=True)
+    cursor.execute(
+        f'INSERT INTO {table} (name, age, email, {key}) VALUES (?, ?, ?, ?)', (name, age, email, value)
+    )
+    return {key: value, 'name': name, 'age': age, 'email': email, 'version': 1}
+
+
+def update_person(cursor, table, key, value, body):
+    """
+    Updates a student or instructor if it still has the given version.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        table (str): 'Students' or 'Instructors'.
+        key (str): The natural key column.
+        value (str): The student or instructor ID.
+        body (dict): name, age, email and the version that was read.
+
+    Returns:
+        dict: The updated row.
+    """
+    name, age, email = _person_fields(body)
+    row_id = _row_id(cursor, table, key, value)
+    version = _version(body.get('version'))
+    versioned_write(cursor, table, row_id, version,
+                    f'UPDATE {table} SET name = ?, age = ?, email = ?, version = version + 1 '
+                    f'WHERE id = ? AND version = ?',
+                    (name, age, email, row_id, version))
+    return {key: value, 'name': name, 'age': age, 'email': email, 'version': version + 1}
+
+
+def delete_row(cursor, table, key, value, version):
+    """
+    Soft-deletes a student, instructor or course, checking the version when given.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        table (str): 'Students', 'Instructors' or 'Courses'.
+        key (str): The natural key column.
+        value (str): The natural key.
+        version (str): The version that was read, or None to delete unconditionally.
+
+    Returns:
+        dict: The deleted key.
+    """
+    row_id = _row_id(cursor, table, key, value)
+    soft_delete(cursor, table, row_id, None if version is None else _version(version))
+    return {key: value, 'deleted': True}
+
+
+def create_course(cursor, body):
+    """
+    Inserts a course.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        body (dict): course_id, course_name and optionally capacity,
+            instructor_id, meeting_times and term.
+
+    Returns:
+        dict: The created course.
+    """
+    course_id, course_name = _text(body, 'course_id'), _text(body, 'course_name')
+    if not course_id or not course_name:
+        raise HTTPError(400, 'course_id and course_name are required.')
+    capacity = _capacity(body.get('capacity'))
+    slots = parse_slots(_text(body, 'meeting_times') or '')
+    term = _text(body, 'term')
+    term = check_term(term) if term else None
+    instructor = _text(body, 'instructor_id')
+    instructor_ref = _row_id(cursor, 'Instructors', 'instructor_id', instructor) if instructor else None
+    cursor.execute(
+        'INSERT INTO Courses (course_id, course_name, capacity, instructor_id, term) VALUES (?, ?, ?, ?, ?)',
+        (course_id, course_name, capacity, instructor_ref, term)
+    )
+    set_course_slots(cursor.connection, cursor.lastrowid, slots)
+    return {'course_id': course_id, 'course_name': course_name, 'capacity': capacity,
+            'instructor_id': instructor, 'meeting_times': format_slots(slots), 'term': term, 'version': 1}
+
+
+def update_course(cursor, course_id, body):
+    """
+    Renames a course and/or changes its capacity if it still has the given version.
+
+    Raising the capacity promotes waitlisted students in the same transaction.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        course_id (str): The course ID.
+        body (dict): course_name and/or capacity, and the version that was read.
+
+    Returns:
+        dict: The new version and the promoted student IDs.
+    """
+    row_id = _row_id(cursor, 'Courses', 'course_id', course_id)
+    version = _version(body.get('version'))
+    assignments, params = [], []
+    course_name = _text(body, 'course_name')
+    if course_name:
+        assignments.append('course_name = ?')
+        params.append(course_name)
+    if 'capacity' in body:
+        assignments.append('capacity = ?')
+        params.append(_capacity(body['capacity']))
+    if not assignments:
+        raise HTTPError(400, 'Nothing to update: give course_name and/or capacity.')
+    versioned_write(cursor, 'Courses', row_id, version,
+                    f"UPDATE Courses SET {', '.join(assignments)}, version = version + 1 "
+                    f"WHERE id = ? AND version = ?",
+                    tuple(params) + (row_id, version))
+    promoted = promote_waitlist(cursor, row_id)
+    return {'course_id': course_id, 'version': version + 1, 'promoted': _student_keys(cursor, promoted)}
+
+
+def register_student(cursor, body):
+    """
+    Registers a student into a course, or waitlists them if it is full.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        body (dict): student (ID or email) and course (ID or name).
+
+    Returns:
+        dict: The registration status.
+    """
+    student_key, course_key = _text(body, 'student'), _text(body, 'course')
+    student, course = _resolve_pair(cursor, student_key, course_key)
+    return {'student': student_key, 'course': course_key, 'status': enroll(cursor, student, course)}
+
+
+def drop_student(cursor, student_key, course_key):
+    """
+    Drops a student from a course or its waitlist and promotes the waitlist.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the write transaction.
+        student_key (str): Student ID or email.
+        course_key (str): Course ID or name.
+
+    Returns:
+        dict: Whether the student was removed and who got the freed seat.
+    """
+    student, course = _resolve_pair(cursor, student_key, course_key)
+    removed, promoted = unenroll(cursor, student, course)
+    if not removed:
+        raise HTTPError(404, 'Student is not registered or waitlisted for this course.')
+    return {'student': student_key, 'course': course_key, 'removed': True,
+            'promoted': _student_keys(cursor, promoted)}
+
+
+def bulk_register(connection, body):
+    """
+    Runs a bulk registration; it manages its own transaction.
+
+    Args:
+        connection (sqlite3.Connection): The writer connection.
+        body (dict): Either students and courses lists, or a pairs list.
+
+    Returns:
+        dict: The per-pair outcomes and their summary.
+    """
+    if 'pairs' in body:
+        pairs = body['pairs']
+        if not isinstance(pairs, list) or not all(
+                isinstance(pair, list) and len(pair) == 2 and all(isinstance(key, (str, int)) for key in pair)
+                for pair in pairs):
+            raise HTTPError(400, 'pairs must be a list of [student, course] pairs.')
+        outcomes = register_pairs(connection, pairs)
+    else:
+        outcomes = register_many(connection, _keys(body, 'students'), _keys(body, 'courses'))
+    return {'summary': summarize(outcomes), 'outcomes': [outcome._asdict() for outcome in outcomes]}
+
+
+def _person_fields(body):
+    """
+    Validates the name, age and email of a student or instructor.
+
+    Args:
+        body (dict): The request body.
+
+    Returns:
+        tuple: The (name, age, email) values.
+    """
+    name, age, email = _text(body, 'name', required=True), body.get('age'), body.get('email')
+    if not validate_age(age):
+        raise HTTPError(400, 'Age must be a non-negative integer.')
+    if not isinstance(email, str) or not validate_email(email):
+        raise HTTPError(400, 'Invalid email format.')
+    return name, age, email
+
+
+def _text(body, name, required=False):
+    """
+    Reads a text field of a request body.
+
+    Args:
+        body (dict): The request body.
+        name (str): The field.
+        required (bool): Whether the field must be given and not empty.
+
+    Returns:
+        str: The text, or None or '' when an optional field is not given.
+    """
+    value = body.get(name)
+    if value is not None and not isinstance(value, str):
+        raise HTTPError(400, f'{name} must be a string.')
+    if required and not value:
+        raise HTTPError(400, f'{name} is required.')
+    return value
+
+
+def _keys(body, name):
+    """
+    Reads a list of student or course keys from a request body.
+
+    Args:
+        body (dict): The request body.
+        name (str): The field.
+
+    Returns:
+        list: The keys, empty when the field is not given.
+    """
+    keys = body.get(name) or []
+    if not isinstance(keys, list) or not all(isinstance(key, (str, int)) for key in keys):
+        raise HTTPError(400, f'{name} must be a list of IDs.')
+    return keys
+
+
+def _version(value):
+    """
+    Parses the version a client read.
+
+    Args:
+        value: The version from the body or query string.
+
+    Returns:
+        int: The version.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, 'A numeric version is required for updates.')
+
+
+def _capacity(value):
+    """
+    Parses a course capacity, None meaning unlimited.
+
+    Args:
+        value: The capacity from the request body.
+
+    Returns:
+        int: The capacity, or None.
+    """
+    if value is None:
+        return None
+    if not validate_age(value):
+        raise HTTPError(400, 'Capacity must be a non-negative integer.')
+    return value
+
+
+def _row_id(cursor, table, key, value):
+    """
+    Looks up the ``id`` of a row by natural key.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor to execute with.
+        table (str): The table name.
+        key (str): The natural key column.
+        value (str): The natural key.
+
+    Returns:
+        int: The row ``id``.
+    """
+    row = cursor.execute(f'SELECT id FROM {table} WHERE {key} = ?', (value,)).fetchone()
+    if row is None:
+        raise HTTPError(404, f'{table[:-1]} {value} not found.')
+    return row[0]
+
+
+def _resolve_pair(cursor, student_key, course_key):
+    """
+    Resolves a student (ID or email) and a course (ID or name) to row ids.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor to execute with.
+        student_key (str): Student ID or email.
+        course_key (str): Course ID or name.
+
+    Returns:
+        tuple: The ``Students.id`` and ``Courses.id``.
+    """
+    if not student_key or not course_key:
+        raise HTTPError(400, 'student and course are required.')
+    student = cursor.execute(
+        'SELECT id FROM Students WHERE student_id = ? UNION ALL SELECT id FROM Students WHERE email = ? LIMIT 1',
+        (student_key, student_key)
+    ).fetchone()
+    if student is None:
+        raise HTTPError(404, f'Student {student_key} not found.')
+    course = cursor.execute(
+        'SELECT id FROM Courses WHERE course_id = ? UNION ALL SELECT id FROM Courses WHERE course_name = ? LIMIT 1',
+        (course_key, course_key)
+    ).fetchone()
+    if course is None:
+        raise HTTPError(404, f'Course {course_key} not found.')
+    return student[0], course[0]
+
+
+def _student_keys(cursor, row_ids):
+    """
+    Maps ``Students.id`` values to student IDs.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor to execute with.
+        row_ids (list): The row ids.
+
+    Returns:
+        list: The student IDs in the same order.
+    """
+    return [cursor.execute('SELECT student_id FROM Students WHERE id = ?', (row_id,)).fetchone()[0]
+            for row_id in row_ids]
+
+
+class ReadPool:
+    """
+    A fixed set of read-only connections, one per worker thread.
+    """
+    def __init__(self, db_name, size):
+        """
+        Initializes the pool.
+
+        Args:
+            db_name (str): The database file.
+            size (int): Number of reader threads and connections.
+        """
+        self.db_name = db_name
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='school-read',
+                                           initializer=self._open)
+
+    def _open(self):
+        """
+        Opens the read-only connection of the current worker thread.
+        """
+        connection = connect(self.db_name)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA query_only = ON')
+        self.local.connection = connection
+
+    def _call(self, handler, args):
+        """
+        Runs a read handler with this thread's connection.
+
+        Args:
+            handler (callable): The read handler.
+            args (tuple): Arguments after the connection.
+
+        Returns:
+            The handler's result.
+        """
+        return handler(self.local.connection, *args)
+
+    async def run(self, handler, *args):
+        """
+        Runs a read handler on the pool.
+
+        Args:
+            handler (callable): The read handler.
+            *args: Arguments after the connection.
+
+        Returns:
+            The handler's result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, handler, args)
+
+    def close(self):
+        """
+        Stops the reader threads.
+        """
+        self.executor.shutdown(wait=True)
+
+
+class BatchedWriter:
+    """
+    A single writer that applies queued writes together in one transaction.
+    """
+    def __init__(self, db_name, max_batch=128):
+        """
+        Initializes the writer.
+
+        Args:
+            db_name (str): The database file.
+            max_batch (int): Maximum number of writes per transaction.
+        """
+        self.db_name = db_name
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='school-write')
+        self.connection = None
+        self.task = None
+
+    def start(self):
+        """
+        Starts the task that drains the write queue.
+        """
+        self.task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def submit(self, handler, *args, exclusive=False):
+        """
+        Queues a write and waits for its result.
+
+        Args:
+            handler (callable): A write handler taking a cursor inside the
+                batch transaction, or a connection if exclusive.
+            *args: Arguments after the cursor.
+            exclusive (bool): Run alone because the handler manages its own
+                transaction.
+
+        Returns:
+            The handler's result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((handler, args, exclusive, future))
+        return await future
+
+    async def _drain(self):
+        """
+        Takes every pending write and applies it in as few transactions as possible.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            shared = [job for job in batch if not job[2]]
+            exclusive = [job for job in batch if job[2]]
+            if shared:
+                await self._settle(shared, await self._run(loop, self._apply_batch, shared))
+            for job in exclusive:
+                await self._settle([job], await self._run(loop, self._apply_exclusive, job))
+
+    async def _run(self, loop, function, jobs):
+        """
+        Runs a batch on the writer thread, turning a failed transaction into per-job errors.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The running loop.
+            function (callable): _apply_batch or _apply_exclusive.
+            jobs: The job list or single job passed to the function.
+
+        Returns:
+            list: (ok, value) per job.
+        """
+        try:
+            return await loop.run_in_executor(self.executor, function, jobs)
+        except Exception as e:
+            count = len(jobs) if isinstance(jobs, list) else 1
+            return [(False, e)] * count
+
+    async def _settle(self, jobs, results):
+        """
+        Resolves the futures of finished jobs.
+
+        Args:
+            jobs (list): The jobs.
+            results (list): (ok, value) per job.
+        """
+        for (_, _, _, future), (ok, value) in zip(jobs, results):
+            if future.cancelled():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _writer_connection(self):
+        """
+        Returns the writer connection, opening it on first use.
+
+        Returns:
+            sqlite3.Connection: The writer connection.
+        """
+        if self.connection is None:
+            self.connection = connect(self.db_name)
+        return self.connection
+
+    @retry_on_busy
+    def _begin(self, cursor):
+        """
+        Takes the write lock, retrying while other processes hold it.
+
+        Args:
+            cursor (sqlite3.Cursor): The writer cursor.
+        """
+        cursor.execute('BEGIN IMMEDIATE')
+
+    def _apply_batch(self, jobs):
+        """
+        Applies jobs in one transaction, each inside its own savepoint.
+
+        Args:
+            jobs (list): The queued jobs.
+
+        Returns:
+            list: (ok, value) per job.
+        """
+        connection = self._writer_connection()
+        cursor = connection.cursor()
+        self._begin(cursor)
+        results = []
+        try:
+            for handler, args, _, _ in jobs:
+                cursor.execute('SAVEPOINT job')
+                try:
+                    results.append((True, handler(cursor, *args)))
+                    cursor.execute('RELEASE job')
+                except Exception as e:
+                    # Undo only this job; the rest of the batch still commits
+                    cursor.execute('ROLLBACK TO job')
+                    cursor.execute('RELEASE job')
+                    results.append((False, e))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        return results
+
+    def _apply_exclusive(self, job):
+        """
+        Runs a job that manages its own transaction.
+
+        Args:
+            job (tuple): The queued job.
+
+        Returns:
+            list: A single (ok, value) result.
+        """
+        handler, args, _, _ = job
+        try:
+            return [(True, handler(self._writer_connection(), *args))]
+        except Exception as e:
+            return [(False, e)]
+
+    async def close(self):
+        """
+        Stops the drain task and closes the writer connection.
+        """
+        if self.task is not None:
+            self.task.cancel()
+        loop = asyncio.get_running_loop()
+        if self.connection is not None:
+            await loop.run_in_executor(self.executor, self.connection.close)
+        self.executor.shutdown(wait=True)
+
+
+class SchoolServer:
+    """
+    The HTTP/JSON front of the read pool and the batched writer.
+    """
+    def __init__(self, db_name, readers=4):
+        """
+        Initializes the server and makes sure the schema exists.
+
+        Args:
+            db_name (str): The database file.
+            readers (int): Number of pooled read connections.
+        """
+        Database(db_name).close()
+        self.reads = ReadPool(db_name, readers)
+        self.writes = BatchedWriter(db_name)
+
+    async def serve(self, host, port):
+        """
+        Serves requests until cancelled.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The TCP port.
+        """
+        self.writes.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f'Serving the school database on http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.writes.close()
+            self.reads.close()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the requests of one keep-alive connection.
+
+        Args:
+            reader (asyncio.StreamReader): The request stream.
+            writer (asyncio.StreamWriter): The response stream.
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 431, {'error': 'Request headers too large.'}, False)
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.split(' ')
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'Malformed request.'}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': 'Request body too large.'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                connection_header = headers.get('connection', '').lower()
+                keep_alive = connection_header == 'keep-alive' or (
+                    version == 'HTTP/1.1' and connection_header != 'close'
+                )
+                status, payload = await self.dispatch(method.upper(), target, body)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        """
+        Writes a JSON response.
+
+        Args:
+            writer (asyncio.StreamWriter): The response stream.
+            status (int): The HTTP status code.
+            payload: The JSON-serializable body.
+            keep_alive (bool): Whether the connection stays open.
+        """
+        data = json.dumps(payload).encode()
+        head = (
+            f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(data)}\r\n'
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        """
+        Routes a request and turns errors into HTTP statuses.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The request target (path and query string).
+            body (bytes): The request body.
+
+        Returns:
+            tuple: The (status, payload) to send back.
+        """
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            try:
+                data = json.loads(body) if body else {}
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise HTTPError(400, 'The request body must be JSON.')
+            if not isinstance(data, dict):
+                raise HTTPError(400, 'The request body must be a JSON object.')
+            return await self.route(method, parts, query, data)
+        except HTTPError as e:
+            return e.status, {'error': e.message}
+        except ConflictError as e:
+            return 409, {'error': str(e)}
+        except sqlite3.IntegrityError as e:
+            return 409, {'error': str(e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except sqlite3.OperationalError as e:
+            if is_busy_error(e):
+                return 503, {'error': 'The database is busy, please retry.'}
+            return 500, {'error': str(e)}
+        except Exception:
+            # A bug in a handler still gets an answer, and the connection stays usable
+            _log.exception('Error handling %s %s', method, target)
+            return 500, {'error': 'Internal server error.'}
+
+    async def route(self, method, parts, query, data):
+        """
+        Calls the handler of a request.
+
+        Args:
+            method (str): The HTTP method.
+            parts (list): The decoded path segments.
+            query (dict): The query string parameters.
+            data (dict): The decoded JSON body.
+
+        Returns:
+            tuple: The (status, payload) to send back.
+        """
+        if parts == ['health']:
+            return 200, {'status': 'ok'}
+        if not parts or len(parts) > 2:
+            raise HTTPError(404, 'Not found.')
+
+        resource = parts[0]
+        key = parts[1] if len(parts) == 2 else None
+        limit, offset = _paging(query)
+
+        if resource in PEOPLE:
+            table, column = PEOPLE[resource]
+            if key is None and method == 'GET':
+                items = await self.reads.run(list_people, table, column, query.get('q', ''), limit, offset)
+                return 200, {'items': items, 'count': len(items)}
+            if key is None and method == 'POST':
+                return 201, await self.writes.submit(create_person, table, column, data)
+            if key is not None and method == 'GET':
+                return 200, await self.reads.run(get_person, table, column, key)
+            if key is not None and method in ('PUT', 'PATCH'):
+                return 200, await self.writes.submit(update_person, table, column, key, data)
+            if key is not None and method == 'DELETE':
+                return 200, await self.writes.submit(delete_row, table, column, key, query.get('version'))
+
+        elif resource == 'courses':
+            if key is None and method == 'GET':
+                items = await self.reads.run(list_courses, query.get('q', ''), limit, offset)
+                return 200, {'items': items, 'count': len(items)}
+            if key is None and method == 'POST':
+                return 201, await self.writes.submit(create_course, data)
+            if key is not None and method == 'GET':
+                return 200, await self.reads.run(get_course, key)
+            if key is not None and method in ('PUT', 'PATCH'):
+                return 200, await self.writes.submit(update_course, key, data)
+            if key is not None and method == 'DELETE':
+                return 200, await self.writes.submit(delete_row, 'Courses', 'course_id', key, query.get('version'))
+
+        elif resource == 'registrations':
+            if key is None and method == 'GET':
+                items = await self.reads.run(
+                    list_registrations, query.get('student'), query.get('course'), limit, offset
+                )
+                return 200, {'items': items, 'count': len(items)}
+            if key is None and method == 'POST':
+                return 200, await self.writes.submit(register_student, data)
+            if key is None and method == 'DELETE':
+                return 200, await self.writes.submit(drop_student, query.get('student'), query.get('course'))
+            if key == 'bulk' and method == 'POST':
+                return 200, await self.writes.submit(bulk_register, data, exclusive=True)
+
+        else:
+            raise HTTPError(404, 'Not found.')
+        raise HTTPError(405, f'{method} is not allowed here.')
+
+
+def _paging(query):
+    """
+    Reads the limit and offset query parameters.
+
+    Args:
+        query (dict): The query string parameters.
+
+    Returns:
+        tuple: The (limit, offset) values, the limit clamped to 1..MAX_LIMIT.
+    """
+    try:
+        limit = int(query.get('limit', DEFAULT_LIMIT))
+        offset = int(query.get('offset', 0))
+    except ValueError:
+        raise HTTPError(400, 'limit and offset must be integers.')
+    if offset < 0:
+        raise HTTPError(400, 'offset must not be negative.')
+    # SQLite reads a negative LIMIT as no limit at all
+    return min(max(limit, 1), MAX_LIMIT), offset
+
+
+def main(argv=None):
+    """
+    Parses the command line and runs the server.
+
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description='Serve the school database over HTTP/JSON.')
+    parser.add_argument('--db', default='school.db', help='database file (default: school.db)')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='TCP port (default: 8080)')
+    parser.add_argument('--readers', type=int, default=4, help='pooled read connections (default: 4)')
+    args = parser.parse_args(argv)
+
+    server = SchoolServer(args.db, args.readers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+# Headless entry point, alongside the GUI launchers
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Term shards of the registrations, and the routing of queries to them.
+
+Registrations are sharded by term. The main database is the hot shard: it
+holds the terms in progress and to come, where students register, the
+triggers keep capacities and waitlists, and ``UNIQUE(student_id, course_id)``
+is checked, so its B-trees only hold the registrations of those terms and
+stay in the page cache. Every past term is a shard of its own, the
+``<database>.<term>.archive.db`` file that school.archive moves it into.
+split() turns an existing single-file database into this layout.
+
+ShardRouter answers per-term questions wherever the term lives. It attaches
+the file of a term with ``ATTACH`` the first time the term is asked for and
+keeps the most recently used files attached, up to a bound, so a run of
+queries over the same few terms opens each file once. A term in the middle
+of being split has rows in both places; the router reads both, so answers
+are the same before, during and after a split.
+"""
+import sqlite3
+from collections import OrderedDict, namedtuple
+
+from school import archive
+from school.concurrency import retry_on_busy
+from school.queries import BATCH_SIZE, iter_rows
+
+# Shard files kept attached by a router; SQLite attaches at most 10 by default
+MAX_ATTACHED = 4
+
+# Courses given a term per transaction by split()
+TERM_BATCH = 5000
+
+# Where the registrations of a term live: 'main' for the hot shard, or the shard file
+Shard = namedtuple('Shard', ['term', 'location', 'courses', 'registrations'])
+
+# One registration of a term, with the shard it was read from
+RegistrationRow = namedtuple('RegistrationRow',
+                             ['term', 'course_id', 'course_name', 'student_id', 'student_name', 'source'])
+
+# Registrations of a term in the hot shard
+_HOT_QUERY = '''
+    SELECT c.term, c.course_id, c.course_name, s.student_id, s.name, 'main'
+    FROM main.Courses c
+    JOIN main.Registrations r ON r.course_id = c.id
+    LEFT JOIN main.Students s ON s.id = r.student_id
+    WHERE c.term = :term {filters}
+'''
+
+# Registrations of a term in its shard file. Students keep their id wherever
+# they are, so a student is found in the hot tables, among the soft-deleted
+# ones or in the shard; soft-deleted courses and registrations are left out.
+_SHARD_QUERY = '''
+    SELECT c.term, c.course_id, c.course_name,
+           COALESCE(s.student_id, hot.student_id, gone.student_id), COALESCE(s.name, hot.name, gone.name), :term
+    FROM {schema}.Courses c
+    JOIN {schema}.Registrations r ON r.course_id = c.id AND r.deleted_at IS NULL
+    LEFT JOIN {schema}.Students s ON s.id = r.student_id
+    LEFT JOIN main.Students hot ON hot.id = r.student_id
+    LEFT JOIN main.DeletedStudents gone ON gone.id = r.student_id
+    WHERE c.term = :term AND c.deleted_at IS NULL {filters}
+'''
+
+
+class ShardRouter:
+    """
+    Routes per-term registration queries to the hot shard and the term's file.
+
+    Use it in a with block, or call close(), to detach the files. Files are
+    attached between transactions, so the router's queries must not run
+    inside a transaction of the same connection.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        max_attached (int): Shard files kept attached at once.
+    """
+
+    def __init__(self, connection, max_attached=MAX_ATTACHED):
+        self.connection = connection
+        self.max_attached = max(1, min(max_attached, connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - 1))
+        # Schema name of each attached term, least recently used first
+        self.attached = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Detaches every shard file.
+        """
+        while self.attached:
+            _, schema = self.attached.popitem(last=False)
+            self.connection.execute(f'DETACH DATABASE {schema}')
+
+    def shard(self, term):
+        """
+        Returns the schema of a term's shard file, attaching it if needed.
+
+        Args:
+            term (str): The term code.
+
+        Returns:
+            str: The schema name, or None if the term has no shard file.
+        """
+        archive.check_term(term)
+        if term in self.attached:
+            self.attached.move_to_end(term)
+            return self.attached[term]
+        if term not in archive.archived_terms(self.connection):
+            return None
+        if len(self.attached) >= self.max_attached:
+            _, schema = self.attached.popitem(last=False)
+            self.connection.execute(f'DETACH DATABASE {schema}')
+        self.attached[term] = archive.attach(self.connection, term, prefix='shard')
+        return self.attached[term]
+
+    def registrations(self, term, course_id=None, student_id=None, batch=BATCH_SIZE):
+        """
+        Yields the registrations of a term, optionally of one course or one student.
+
+        Args:
+            term (str): The term code.
+            course_id (str, optional): Only this course ID.
+            student_id (str, optional): Only this student ID.
+            batch (int): Rows read from SQLite at a time.
+
+        Yields:
+            RegistrationRow: Hot registrations first, then those of the shard file.
+        """
+        sql, params = self._query(term, course_id, student_id)
+        return iter_rows(self.connection, sql, params, RegistrationRow, batch)
+
+    def count(self, term, course_id=None, student_id=None):
+        """
+        Counts the registrations of a term, optionally of one course or one student.
+
+        Args:
+            term (str): The term code.
+            course_id (str, optional): Only this course ID.
+            student_id (str, optional): Only this student ID.
+
+        Returns:
+            int: The number of registrations.
+        """
+        sql, params = self._query(term, course_id, student_id)
+        return self.connection.execute(f'SELECT COUNT(*) FROM ({sql})', params).fetchone()[0]
+
+    def _query(self, term, course_id, student_id):
+        """
+        Builds the query over every place the registrations of a term may be.
+
+        Args:
+            term (str): The term code.
+            course_id (str, optional): Only this course ID.
+            student_id (str, optional): Only this student ID.
+
+        Returns:
+            tuple: The SQL and its named parameters.
+        """
+        params = {'term': term, 'course': course_id, 'student': student_id}
+        hot_filters = ''
+        if course_id is not None:
+            hot_filters += ' AND c.course_id = :course'
+        if student_id is not None:
+            hot_filters += ' AND s.student_id = :student'
+        selects = [_HOT_QUERY.format(filters=hot_filters)]
+
+        schema = self.shard(term)
+        if schema is not None:
+            shard_filters = ''
+            if course_id is not None:
+                shard_filters += ' AND c.course_id = :course'
+            if student_id is not None:
+                # Through the student's id, which the shard's registrations are indexed on
+                shard_filters += f'''
+                    AND r.student_id IN (SELECT id FROM main.Students WHERE student_id = :student
+                                         UNION ALL SELECT id FROM main.DeletedStudents WHERE student_id = :student
+                                         UNION ALL SELECT id FROM {schema}.Students WHERE student_id = :student)'''
+            selects.append(_SHARD_QUERY.format(schema=schema, filters=shard_filters))
+        return ' UNION ALL '.join(selects), params
+
+
+def layout(connection):
+    """
+    Describes where the registrations of every term live.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+
+    Returns:
+        list: Shard tuples in term order, the hot terms with location 'main';
+            a term being split appears in both places. Courses without a
+            term are listed with term None.
+    """
+    shards = [Shard(term, 'main', courses, registrations) for term, courses, registrations in connection.execute('''
+        SELECT term, COUNT(*), SUM(enrolled) FROM Courses GROUP BY term ORDER BY term
+    ''')]
+    for term in archive.archived_terms(connection):
+        schema = archive.attach(connection, term, prefix='layout')
+        try:
+            courses, registrations = connection.execute(f'''
+                SELECT COUNT(*), (SELECT COUNT(*) FROM {schema}.Registrations r
+                                  JOIN {schema}.Courses c ON c.id = r.course_id
+                                  WHERE c.term = :term AND c.deleted_at IS NULL AND r.deleted_at IS NULL)
+                FROM {schema}.Courses WHERE term = :term AND deleted_at IS NULL
+            ''', {'term': term}).fetchone()
+        finally:
+            connection.execute(f'DETACH DATABASE {schema}')
+        if courses:
+            shards.append(Shard(term, archive.archive_file(connection, term), courses, registrations))
+    shards.sort(key=lambda shard: (shard.term is not None, shard.term or ''))
+    return shards
+
+
+def split(connection, before=None, default_term=None, batch_size=archive.BATCH_SIZE, progress=None):
+    """
+    Splits a single-file database into term shards.
+
+    Courses that have no term are first given the term they were created in,
+    according to the change log, or ``default_term`` when the log no longer
+    has them; courses that still have no term stay in the hot shard. Every
+    term before ``before`` is then moved into its own file, in batches, by
+    school.archive, together with the soft-deleted records. Running it again
+    carries on where an interrupted run stopped.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database.
+        before (str, optional): The first term to keep hot, defaults to the
+            current term.
+        default_term (str, optional): The term of courses the change log
+            does not date.
+        batch_size (int): Rows moved per transaction, roughly.
+        progress (callable, optional): Called as progress(term, table, moved)
+            after every batch; the term is None while courses are dated.
+
+    Returns:
+        dict: Number of rows moved per (term, table), and the number of
+            courses dated under (None, 'Courses').
+    """
+    if default_term is not None:
+        archive.check_term(default_term)
+    connection.create_function('term_of', 1, archive.term_of, deterministic=True)
+    dated, last = 0, 0
+    while True:
+        last, count = _date_courses(connection, last, default_term, min(batch_size, TERM_BATCH))
+        if last is None:
+            break
+        dated += count
+        if progress and count:
+            progress(None, 'Courses', count)
+    moved = archive.archive(connection, before, batch_size=batch_size, progress=progress)
+    if dated:
+        moved[(None, 'Courses')] = dated
+    return moved
+
+
+@retry_on_busy
+def _date_courses(connection, after, default_term, batch_size):
+    """
+    Gives the next batch of courses without a term the term they were created in.
+
+    Args:
+        connection (sqlite3.Connection): A connection to the main database,
+            with the ``term_of`` SQL function.
+        after (int): The last ``Courses.id`` already looked at.
+        default_term (str, optional): The term of courses the change log
+            does not date.
+        batch_size (int): Courses per transaction.
+
+    Returns:
+        tuple: The last ``Courses.id`` looked at, or None when there are no
+            more, and the number of courses given a term.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS dating_batch (id INTEGER PRIMARY KEY, created TEXT)')
+        cursor.execute('DELETE FROM dating_batch')
+        cursor.execute('INSERT INTO dating_batch (id) SELECT id FROM Courses WHERE term IS NULL AND id > ? ORDER BY id LIMIT ?',
+                       (after, batch_size))
+        last = cursor.execute('SELECT MAX(id) FROM dating_batch').fetchone()[0]
+        if last is None:
+            connection.rollback()
+            return None, 0
+        # When each course of the batch was first logged, in one scan of the log
+        cursor.execute('''
+            INSERT INTO dating_batch (id, created)
+            SELECT row_id, MIN(changed_at) FROM ChangeLog
+            WHERE table_name = 'Courses' AND operation = 'insert' AND row_id IN (SELECT id FROM dating_batch)
+            GROUP BY row_id
+            ON CONFLICT(id) DO UPDATE SET created = excluded.created
+        ''')
+        cursor.execute('''
+            UPDATE Courses SET term = COALESCE((SELECT term_of(created) FROM dating_batch d WHERE d.id = Courses.id AND created IS NOT NULL), ?)
+            WHERE id IN (SELECT id FROM dating_batch)
+        ''', (default_term,))
+        dated = connection.execute('SELECT COUNT(*) FROM Courses WHERE id IN (SELECT id FROM dating_batch) '
+                                   'AND term IS NOT NULL').fetchone()[0]
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return last, dated
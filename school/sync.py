@@ -0,0 +1,537 @@
+"""
+Diff and merge of two school databases.
+
+A departmental copy made with "Backup Database" drifts away from the
+central database as both are edited. This module finds the differences and
+applies them from one database to the other without copying whole tables.
+
+Rows are matched on their natural keys (student, instructor and course IDs,
+and the pair of them for registrations) because the ``id`` values of rows
+added separately on each side collide. Each side hashes its rows into a
+fixed number of buckets by key and combines the row digests of every bucket,
+a two-level Merkle tree: a table whose root digest matches is skipped, and
+otherwise only the rows of the buckets whose digests differ are fetched,
+compared and written.
+
+The tree is kept in the database (``SyncRows`` and ``SyncBuckets``) rather
+than rebuilt for every diff. Triggers queue every row written in
+``SyncPending``, and prepare() hashes only the queued rows, moving their old
+digests out of their buckets and the new ones in, so the cost of a diff or
+merge grows with the changes since the last one and not with the tables.
+diff() never writes: the rows still queued in a database, such as another
+department's file opened read-only, are hashed in memory on top of its tree.
+"""
+import hashlib
+import json
+import sqlite3
+from collections import namedtuple
+
+from school.concurrency import retry_on_busy
+from school.records import soft_delete
+from school.registration import REGISTERED, enroll, promote_waitlist, unenroll
+from school.schedule import TimeSlot, set_course_slots
+
+# Buckets per table; each is a leaf of the Merkle tree
+BUCKETS = 4096
+
+# The bucket holding the digest of the whole table, the root of the tree
+ROOT = -1
+
+# Queued rows hashed per transaction by prepare()
+BATCH_SIZE = 5000
+
+# A table as seen by the sync: its natural key column, and the key and
+# content expressions over a FROM clause naming the table ``t``
+TableSpec = namedtuple('TableSpec', ['table', 'column', 'keys', 'columns', 'source'])
+
+SPECS = (
+    TableSpec('Instructors', 'instructor_id', ('t.instructor_id',), ('t.name', 't.age', 't.email'), 'Instructors t'),
+    TableSpec('Students', 'student_id', ('t.student_id',), ('t.name', 't.age', 't.email'), 'Students t'),
+    TableSpec(
+        'Courses', 'course_id', ('t.course_id',),
+        ('t.course_name', 't.capacity', 'i.instructor_id', 't.term',
+         # Meeting times as "day:start-end" in a fixed order, so equal schedules hash equally
+         "(SELECT group_concat(slot, ' ') FROM (SELECT day || ':' || start_minute || '-' || end_minute AS slot "
+         'FROM CourseSlots s WHERE s.course_id = t.id ORDER BY day, start_minute))'),
+        'Courses t LEFT JOIN Instructors i ON i.id = t.instructor_id'
+    ),
+    TableSpec(
+        'Registrations', None, ('s.student_id', 'c.course_id'), (),
+        'Registrations t JOIN Students s ON s.id = t.student_id JOIN Courses c ON c.id = t.course_id'
+    ),
+)
+
+# Kinds of row differences
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+# How a changed row is resolved when merging
+PREFER_SOURCE = 'source'
+PREFER_NEWER = 'newer'
+
+# One differing row: key and contents as tuples, None on the side that lacks the row
+RowChange = namedtuple('RowChange', ['table', 'kind', 'key', 'source', 'target'])
+
+# The queued rows of a table hashed in memory: their ids, the bucket and
+# digest of each that still exists, and the XOR change of each bucket
+Pending = namedtuple('Pending', ['ids', 'rows', 'changes'])
+
+
+def digest(*values):
+    """
+    Returns a 63-bit digest of a row.
+
+    Args:
+        *values: The key and content values of the row.
+
+    Returns:
+        int: The digest, small enough to be a SQLite integer.
+    """
+    return int.from_bytes(hashlib.blake2b(repr(values).encode(), digest_size=8).digest(), 'big') >> 1
+
+
+def prepare(connection, batch_size=BATCH_SIZE):
+    """
+    Brings the sync digests of a database up to date.
+
+    Only the rows queued since the last call are read and hashed, a batch
+    per transaction, so other users can keep writing meanwhile. The first
+    call on an upgraded database hashes every row once.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Queued rows hashed per transaction.
+
+    Returns:
+        int: The number of rows hashed.
+    """
+    hashed = 0
+    while True:
+        count = _prepare_batch(connection, batch_size)
+        if not count:
+            return hashed
+        hashed += count
+
+
+@retry_on_busy
+def _prepare_batch(connection, batch_size):
+    """
+    Hashes one batch of queued rows in its own transaction.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        batch_size (int): Queued rows hashed.
+
+    Returns:
+        int: The number of rows hashed, 0 when none were queued.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        count = update_digests(cursor, batch_size)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return count
+
+
+def update_digests(cursor, batch_size):
+    """
+    Hashes a batch of queued rows inside the caller's write transaction.
+
+    The old digest of each row is XORed out of its bucket and the table
+    root, and the new one, if the row still exists, XORed in. A row queued
+    again after it was hashed is hashed again, which changes nothing.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside a write transaction.
+        batch_size (int): Queued rows hashed at most.
+
+    Returns:
+        int: The number of rows hashed.
+    """
+    queued, last = {}, None
+    for last, table, row_id in cursor.execute('SELECT seq, table_name, row_id FROM SyncPending ORDER BY seq LIMIT ?',
+                                              (batch_size,)):
+        queued.setdefault(table, set()).add(row_id)
+    for table, ids in queued.items():
+        selected = json.dumps(list(ids))
+        rows, changes = _rehash(cursor, table, ids)
+        cursor.execute('DELETE FROM SyncRows WHERE table_name = ? AND row_id IN (SELECT value FROM json_each(?))',
+                       (table, selected))
+        cursor.executemany('INSERT INTO SyncRows (table_name, row_id, bucket, digest) VALUES (?, ?, ?, ?)',
+                           ((table, row_id, bucket, value) for row_id, (bucket, value) in rows.items()))
+        for bucket, change in changes.items():
+            if change:
+                _xor_bucket(cursor, table, bucket, change)
+    if last is None:
+        return 0
+    cursor.execute('DELETE FROM SyncPending WHERE seq <= ?', (last,))
+    return sum(len(ids) for ids in queued.values())
+
+
+def pending_digests(connection):
+    """
+    Hashes the rows queued in a database in memory, without writing to it.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection, which
+            may be read-only.
+
+    Returns:
+        dict: A Pending tuple for every table with queued rows.
+    """
+    queued = {}
+    for table, row_id in connection.execute('SELECT table_name, row_id FROM SyncPending'):
+        queued.setdefault(table, set()).add(row_id)
+    return {table: Pending(ids, *_rehash(connection, table, ids)) for table, ids in queued.items()}
+
+
+def _rehash(connection, table, ids):
+    """
+    Hashes queued rows of a table and works out how the digests of their buckets change.
+
+    Args:
+        connection: The sqlite3 connection or cursor to read with.
+        table (str): The table.
+        ids (set): The ``id`` of the queued rows.
+
+    Returns:
+        tuple: The (bucket, digest) of every queued row that still exists,
+            keyed by ``id``, and the XOR change of every bucket, ROOT
+            included, that moving the old digests out and the new ones in
+            makes.
+    """
+    spec, selected = _SPEC[table], json.dumps(list(ids))
+    width = len(spec.keys)
+    rows = {}
+    for row in connection.execute(f"SELECT t.id, {', '.join(spec.keys + spec.columns)} FROM {spec.source} "
+                                  f"WHERE t.id IN (SELECT value FROM json_each(?))", (selected,)):
+        rows[row[0]] = (digest(*row[1:1 + width]) % BUCKETS, digest(*row[1:]))
+    old = connection.execute('SELECT bucket, digest FROM SyncRows WHERE table_name = ? AND row_id IN '
+                             '(SELECT value FROM json_each(?))', (table, selected)).fetchall()
+    changes = {}
+    for bucket, value in old + list(rows.values()):
+        changes[bucket] = changes.get(bucket, 0) ^ value
+        changes[ROOT] = changes.get(ROOT, 0) ^ value
+    return rows, changes
+
+
+def _xor_bucket(cursor, table, bucket, change):
+    """
+    XORs a change into the digest of a bucket, dropping buckets left empty.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside a write transaction.
+        table (str): The table.
+        bucket (int): The bucket number, or ROOT.
+        change (int): The digests moved in or out of the bucket, XORed together.
+    """
+    row = cursor.execute('SELECT digest FROM SyncBuckets WHERE table_name = ? AND bucket = ?',
+                         (table, bucket)).fetchone()
+    value = (row[0] if row else 0) ^ change
+    if value:
+        cursor.execute('INSERT OR REPLACE INTO SyncBuckets (table_name, bucket, digest) VALUES (?, ?, ?)',
+                       (table, bucket, value))
+    else:
+        cursor.execute('DELETE FROM SyncBuckets WHERE table_name = ? AND bucket = ?', (table, bucket))
+
+
+def root_digest(connection, spec, pending=None):
+    """
+    Returns the digest of a whole table.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        spec (TableSpec): The table.
+        pending (Pending, optional): The table's queued rows, hashed with
+            pending_digests(); None if prepare() left none.
+
+    Returns:
+        int: The XOR of the digests of all its rows, 0 for an empty table.
+    """
+    row = connection.execute('SELECT digest FROM SyncBuckets WHERE table_name = ? AND bucket = ?',
+                             (spec.table, ROOT)).fetchone()
+    return (row[0] if row else 0) ^ (pending.changes.get(ROOT, 0) if pending else 0)
+
+
+def bucket_digests(connection, spec, pending=None):
+    """
+    Returns the leaf digests of a table.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        spec (TableSpec): The table.
+        pending (Pending, optional): The table's queued rows, hashed with
+            pending_digests().
+
+    Returns:
+        dict: Bucket number -> digest of the rows in it; empty buckets are left out.
+    """
+    leaves = dict(connection.execute('SELECT bucket, digest FROM SyncBuckets WHERE table_name = ? AND bucket >= 0',
+                                     (spec.table,)))
+    for bucket, change in pending.changes.items() if pending else ():
+        if bucket != ROOT:
+            leaves[bucket] = leaves.get(bucket, 0) ^ change
+    return {bucket: value for bucket, value in leaves.items() if value}
+
+
+def bucket_rows(connection, spec, buckets, pending=None):
+    """
+    Fetches the rows of some buckets of a table.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        spec (TableSpec): The table.
+        buckets (list): The bucket numbers.
+        pending (Pending, optional): The table's queued rows, hashed with
+            pending_digests(); their stored buckets are out of date.
+
+    Returns:
+        dict: Key tuple -> content tuple for every row in those buckets.
+    """
+    width = len(spec.keys)
+    selected = set(buckets)
+    queued = pending.ids if pending else set()
+    moved = [row_id for row_id, (bucket, _) in pending.rows.items() if bucket in selected] if pending else []
+    rows = connection.execute(
+        f"SELECT t.id, {', '.join(spec.keys + spec.columns)} FROM {spec.source} "
+        f"WHERE t.id IN (SELECT row_id FROM SyncRows WHERE table_name = ? "
+        f"AND bucket IN (SELECT value FROM json_each(?)) UNION ALL SELECT value FROM json_each(?))",
+        (spec.table, json.dumps(list(buckets)), json.dumps(moved))
+    )
+    return {row[1:1 + width]: row[1 + width:] for row in rows
+            if row[0] not in queued or pending.rows[row[0]][0] in selected}
+
+
+def diff(source, target):
+    """
+    Lists the rows that differ between two databases.
+
+    Neither database is written; rows queued since a database was last
+    prepared are hashed in memory, so running prepare() first only saves
+    that work.
+
+    Args:
+        source (sqlite3.Connection): The database changes are taken from.
+        target (sqlite3.Connection): The database they would be applied to.
+
+    Yields:
+        RowChange: Every differing row, table by table.
+    """
+    source_pending, target_pending = pending_digests(source), pending_digests(target)
+    for spec in SPECS:
+        theirs_queued, ours_queued = source_pending.get(spec.table), target_pending.get(spec.table)
+        # Root of the tree: identical tables need no further work
+        if root_digest(source, spec, theirs_queued) == root_digest(target, spec, ours_queued):
+            continue
+        source_leaves = bucket_digests(source, spec, theirs_queued)
+        target_leaves = bucket_digests(target, spec, ours_queued)
+        buckets = sorted(bucket for bucket in source_leaves.keys() | target_leaves.keys()
+                         if source_leaves.get(bucket) != target_leaves.get(bucket))
+        source_rows = bucket_rows(source, spec, buckets, theirs_queued)
+        target_rows = bucket_rows(target, spec, buckets, ours_queued)
+        for key in sorted(source_rows.keys() | target_rows.keys(), key=repr):
+            theirs, ours = source_rows.get(key), target_rows.get(key)
+            if ours is None:
+                yield RowChange(spec.table, ADDED, key, theirs, None)
+            elif theirs is None:
+                yield RowChange(spec.table, REMOVED, key, None, ours)
+            elif theirs != ours:
+                yield RowChange(spec.table, CHANGED, key, theirs, ours)
+
+
+@retry_on_busy
+def merge(source, target, prefer=PREFER_SOURCE, mirror=False):
+    """
+    Applies the differences of source to target in one transaction.
+
+    Rows only in source are added. Changed rows take the source contents, or
+    with PREFER_NEWER those of the side whose change log records the later
+    change (source wins ties, and a row whose changes were pruned from the
+    log counts as the older). Rows only in target are kept unless mirror is
+    set, in which case they are deleted as the apps delete them, making
+    target equal to source.
+
+    Registrations are added the way register() adds them: a student whose
+    meeting times clash is not registered, and one who finds the course full
+    is waitlisted. Such pairs are counted under their outcome, such as
+    ('Registrations', 'waitlisted'), instead of as added.
+
+    Args:
+        source (sqlite3.Connection): The database changes are taken from,
+            which is only read.
+        target (sqlite3.Connection): The database changed.
+        prefer (str): PREFER_SOURCE or PREFER_NEWER.
+        mirror (bool): Delete rows that are missing from source.
+
+    Returns:
+        dict: (table, kind) -> number of rows applied, or for registrations
+            that were not added, (table, outcome) -> number of pairs.
+    """
+    applied = {}
+    cursor = target.cursor()
+    # Lock the target first so nobody changes it between the diff and the writes,
+    # and take in what was written since it was prepared
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        while update_digests(cursor, BATCH_SIZE):
+            pass
+        changes = list(diff(source, target))
+        # Parents before children when adding, children before parents when deleting
+        for change in changes:
+            if change.kind == REMOVED:
+                continue
+            if change.kind == CHANGED and prefer == PREFER_NEWER and \
+                    (_changed_at(target, change) or '') > (_changed_at(source, change) or ''):
+                continue
+            kind = _APPLY[change.table](cursor, change.key, change.source) or change.kind
+            applied[change.table, kind] = applied.get((change.table, kind), 0) + 1
+        if mirror:
+            for change in reversed(changes):
+                if change.kind == REMOVED:
+                    _delete(cursor, change.table, change.key)
+                    applied[change.table, change.kind] = applied.get((change.table, change.kind), 0) + 1
+        target.commit()
+    except Exception:
+        target.rollback()
+        raise
+    return applied
+
+
+def _changed_at(connection, change):
+    """
+    Returns when a changed row was last written, according to the change log.
+
+    Row versions cannot be compared across databases: they count the edits
+    made in each file since the copy, not when they were made.
+
+    Args:
+        connection (sqlite3.Connection): The database to look in.
+        change (RowChange): The changed row of a logged table.
+
+    Returns:
+        str: The UTC time of the last logged change, or None if the log has
+            none left.
+    """
+    spec = _SPEC[change.table]
+    return connection.execute(f'''
+        SELECT MAX(l.changed_at) FROM {change.table} t
+        JOIN ChangeLog l ON l.table_name = ? AND l.row_id = t.id
+        WHERE t.{spec.column} = ?
+    ''', (change.table,) + change.key).fetchone()[0]
+
+
+def _apply_person(table, column):
+    """
+    Builds the function that writes a student or instructor.
+
+    Args:
+        table (str): 'Students' or 'Instructors'.
+        column (str): The natural key column.
+
+    Returns:
+        callable: A function of (cursor, key, contents).
+    """
+    def apply(cursor, key, contents):
+        cursor.execute(f'''
+            INSERT INTO {table} ({column}, name, age, email) VALUES (?, ?, ?, ?)
+            ON CONFLICT({column}) DO UPDATE SET name = excluded.name, age = excluded.age, email = excluded.email
+        ''', key + contents)
+    return apply
+
+
+def _apply_course(cursor, key, contents):
+    """
+    Writes a course, its instructor and its meeting times.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the merge transaction.
+        key (tuple): The course ID.
+        contents (tuple): Name, capacity, instructor ID, term and meeting times.
+    """
+    course_name, capacity, instructor, term, slots = contents
+    instructor_ref = _row_id(cursor, 'Instructors', 'instructor_id', instructor) if instructor else None
+    cursor.execute('''
+        INSERT INTO Courses (course_id, course_name, capacity, instructor_id, term) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(course_id) DO UPDATE SET course_name = excluded.course_name,
+            capacity = excluded.capacity, instructor_id = excluded.instructor_id, term = excluded.term
+    ''', (key[0], course_name, capacity, instructor_ref, term))
+    course = _row_id(cursor, 'Courses', 'course_id', key[0])
+    set_course_slots(cursor.connection, course, [
+        TimeSlot(int(day), int(start), int(end))
+        for day, times in (slot.split(':') for slot in (slots or '').split())
+        for start, end in [times.split('-')]
+    ])
+    # A larger capacity gives seats to the waitlist, as set_capacity() does
+    promote_waitlist(cursor, course)
+
+
+def _apply_registration(cursor, key, contents):
+    """
+    Registers a student with the capacity and schedule checks of register().
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the merge transaction.
+        key (tuple): The student ID and the course ID.
+        contents (tuple): Unused; registrations have no other columns.
+
+    Returns:
+        str: None if the student was registered, else the outcome, such as
+            WAITLISTED or SCHEDULE_CONFLICT.
+    """
+    student = _row_id(cursor, 'Students', 'student_id', key[0])
+    course = _row_id(cursor, 'Courses', 'course_id', key[1])
+    outcome = enroll(cursor, student, course)
+    return None if outcome == REGISTERED else outcome
+
+
+def _delete(cursor, table, key):
+    """
+    Deletes a row that is missing from the source, as the apps delete it.
+
+    Students, instructors and courses are soft-deleted into their Deleted
+    tables with their registrations, and a dropped registration gives its
+    seat to the waitlist.
+
+    Args:
+        cursor (sqlite3.Cursor): A cursor inside the merge transaction.
+        table (str): The table.
+        key (tuple): The natural key.
+    """
+    if table == 'Registrations':
+        student = _row_id(cursor, 'Students', 'student_id', key[0])
+        course = _row_id(cursor, 'Courses', 'course_id', key[1])
+        unenroll(cursor, student, course)
+        return
+    soft_delete(cursor, table, _row_id(cursor, table, _SPEC[table].column, key[0]))
+
+
+def _row_id(cursor, table, column, value):
+    """
+    Looks up the ``id`` of a row by natural key.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor to execute with.
+        table (str): The table name.
+        column (str): The natural key column.
+        value (str): The natural key.
+
+    Returns:
+        int: The row ``id``.
+    """
+    row = cursor.execute(f'SELECT id FROM {table} WHERE {column} = ?', (value,)).fetchone()
+    if row is None:
+        raise sqlite3.IntegrityError(f'{table[:-1]} {value} does not exist in the target database.')
+    return row[0]
+
+
+_SPEC = {spec.table: spec for spec in SPECS}
+_APPLY = {
+    'Instructors': _apply_person('Instructors', 'instructor_id'),
+    'Students': _apply_person('Students', 'student_id'),
+    'Courses': _apply_course,
+    'Registrations': _apply_registration,
+}
@@ -0,0 +1,226 @@
+"""
+Synthetic schools of any size, for load and scale testing.
+
+generate() fills an empty database with students, instructors, courses and
+registrations made up from a seeded random generator, so the same seed and
+sizes always give the same school. The data looks like a real registrar's:
+
+* names are drawn from lists of first and last names, and every email is
+  made of the name and a number, so it is unique and passes
+  ``validate_email``; ages pass ``validate_age``;
+* course popularity follows a Zipf law: a few courses are taken by a large
+  share of the students and most by a handful, as in the cohort-wide
+  required courses of a real school;
+* instructors are assigned to courses by a Zipf law as well, so teaching
+  loads range from one course to many.
+
+Rows are written with ``executemany`` a batch per transaction, through the
+same tables and triggers as the apps, so the directory, the fuzzy search
+index, the change log and the enrolled counts are all filled in. The
+SchoolStructs JSON of a generated school is written by
+school.exchange.export_json.
+"""
+import bisect
+import itertools
+import random
+
+from school import archive
+from school.concurrency import retry_on_busy
+
+# Rows inserted per transaction
+BATCH_SIZE = 10000
+
+# Zipf exponent of course popularity and of instructor loads
+ZIPF_EXPONENT = 1.0
+
+# Courses a student registers in, inclusive
+COURSES_PER_STUDENT = (3, 6)
+
+STUDENT_AGES = (17, 30)
+INSTRUCTOR_AGES = (28, 70)
+
+FIRST_NAMES = (
+    'Ahmad', 'Ali', 'Amal', 'Ana', 'Bassel', 'Carla', 'Charbel', 'Chris', 'Dana', 'David', 'Elie', 'Emma',
+    'Fadi', 'Farah', 'Georges', 'Hadi', 'Hana', 'Hassan', 'Jad', 'Joe', 'Joelle', 'Karim', 'Katherine',
+    'Khaled', 'Lara', 'Layla', 'Lea', 'Maria', 'Marc', 'Maya', 'Mohamad', 'Mohammed', 'Mona', 'Nadim',
+    'Nadine', 'Nour', 'Omar', 'Paul', 'Rami', 'Rania', 'Rita', 'Sami', 'Samir', 'Sara', 'Tarek', 'Taline',
+    'Tony', 'Yara', 'Youssef', 'Zeina',
+)
+LAST_NAMES = (
+    'Abboud', 'Aoun', 'Azar', 'Bitar', 'Chamoun', 'Charaf', 'Chehade', 'Daher', 'Farah', 'Fares', 'Ghosn',
+    'Haddad', 'Hadad', 'Haidar', 'Hajj', 'Hamdan', 'Harb', 'Issa', 'Jaber', 'Karam', 'Khalil', 'Khoury',
+    'Makki', 'Mansour', 'Moussa', 'Nader', 'Najjar', 'Nasr', 'Rizk', 'Saab', 'Saad', 'Saleh', 'Salem',
+    'Sayegh', 'Smith', 'Tabet', 'Wehbe', 'Younes', 'Zein', 'Zoghbi',
+)
+
+# Course ID prefixes, and the subjects course names are made of
+DEPARTMENTS = ('EECE', 'CMPS', 'MATH', 'PHYS', 'CHEM', 'BIOL', 'ECON', 'ENGL', 'ARAB', 'MECH', 'CIVE', 'PSYC')
+SUBJECTS = (
+    'Circuits', 'Signals and Systems', 'Algorithms', 'Data Structures', 'Calculus', 'Linear Algebra',
+    'Mechanics', 'Electromagnetism', 'Organic Chemistry', 'Genetics', 'Microeconomics', 'Academic Writing',
+    'Literature', 'Thermodynamics', 'Structures', 'Cognition', 'Databases', 'Operating Systems',
+    'Probability', 'Statistics', 'Networks', 'Machine Learning', 'Fluid Mechanics', 'Cell Biology',
+)
+LEVELS = ('Introduction to', 'Topics in', 'Advanced', 'Applied', 'Foundations of', 'Seminar in')
+
+
+def generate(connection, students, instructors, courses, seed=0, terms=1, batch_size=BATCH_SIZE, progress=None):
+    """
+    Fills an empty database with a synthetic school.
+
+    Args:
+        connection (sqlite3.Connection): A connection to a database with no
+            students, instructors or courses.
+        students (int): Number of students.
+        instructors (int): Number of instructors.
+        courses (int): Number of courses.
+        seed (int): Seed of the random generator; the same seed and sizes
+            give the same school.
+        terms (int): Courses are spread evenly over this many terms, ending
+            with the current one; 0 leaves them without a term.
+        batch_size (int): Rows inserted per transaction.
+        progress (callable, optional): Called as progress(table, done, total)
+            after every batch.
+
+    Returns:
+        dict: Number of rows inserted per table.
+
+    Raises:
+        ValueError: If the database already has students, instructors or courses.
+    """
+    for table in ('Students', 'Instructors', 'Courses'):
+        if connection.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+            raise ValueError(f'The database already has {table.lower()}; generate into an empty one.')
+    rng = random.Random(seed)
+    term_codes = _terms(archive.current_term(), terms)
+
+    def people(kind, count, ages):
+        for number in range(1, count + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f'{first}.{last}{number}@school.edu'.lower()
+            yield f'{first} {last}', rng.randint(*ages), email, f'{kind}{number:07d}'
+
+    def course_rows(instructor_ids):
+        cumulative = _zipf_weights(len(instructor_ids), rng)
+        for number in range(courses):
+            department = DEPARTMENTS[number % len(DEPARTMENTS)]
+            name = f'{rng.choice(LEVELS)} {rng.choice(SUBJECTS)}'
+            instructor = _pick(instructor_ids, cumulative, rng) if instructor_ids else None
+            term = term_codes[number * len(term_codes) // courses] if term_codes else None
+            yield f'{department}{200 + number // len(DEPARTMENTS)}', name, instructor, term
+
+    def registration_rows(student_ids, course_ids):
+        cumulative = _zipf_weights(len(course_ids), rng)
+        for student in student_ids:
+            chosen = set()
+            count = min(rng.randint(*COURSES_PER_STUDENT), len(course_ids))
+            while len(chosen) < count:
+                chosen.add(_pick(course_ids, cumulative, rng))
+            for course in sorted(chosen):
+                yield student, course
+
+    inserted = {}
+
+    def insert(table, sql, rows, total):
+        ids, done = [], 0
+        for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+            first, last = _insert_batch(connection, table, sql, batch)
+            ids.extend(range(first, last + 1))
+            done += len(batch)
+            if progress:
+                progress(table, done, max(done, total))
+        inserted[table] = done
+        return ids
+
+    student_ids = insert('Students', 'INSERT INTO Students (name, age, email, student_id) VALUES (?, ?, ?, ?)',
+                         people('S', students, STUDENT_AGES), students)
+    instructor_ids = insert('Instructors',
+                            'INSERT INTO Instructors (name, age, email, instructor_id) VALUES (?, ?, ?, ?)',
+                            people('I', instructors, INSTRUCTOR_AGES), instructors)
+    course_ids = insert('Courses', 'INSERT INTO Courses (course_id, course_name, instructor_id, term) '
+                                   'VALUES (?, ?, ?, ?)',
+                        course_rows(instructor_ids), courses)
+    if course_ids:
+        # The total is an estimate: students take a random number of courses
+        insert('Registrations', 'INSERT INTO Registrations (student_id, course_id) VALUES (?, ?)',
+               registration_rows(student_ids, course_ids), students * sum(COURSES_PER_STUDENT) // 2)
+    return inserted
+
+
+@retry_on_busy
+def _insert_batch(connection, table, sql, rows):
+    """
+    Inserts a batch of rows in one transaction.
+
+    Args:
+        connection (sqlite3.Connection): An open database connection.
+        table (str): The table the rows go into.
+        sql (str): The INSERT statement.
+        rows (list): The values of each row.
+
+    Returns:
+        tuple: The first and last id given to the rows, which are consecutive
+            since no one else writes during the transaction.
+    """
+    cursor = connection.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.executemany(sql, rows)
+        last = cursor.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return last - len(rows) + 1, last
+
+
+def _zipf_weights(count, rng):
+    """
+    Returns cumulative Zipf weights over items in a random order of popularity.
+
+    Args:
+        count (int): Number of items.
+        rng (random.Random): The random generator.
+
+    Returns:
+        list: The cumulative weight of each item, for _pick().
+    """
+    weights = [1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)]
+    # The most popular item is any of them, not always the first one inserted
+    rng.shuffle(weights)
+    return list(itertools.accumulate(weights))
+
+
+def _pick(items, cumulative, rng):
+    """
+    Picks one item according to cumulative weights.
+
+    Args:
+        items (list): The items.
+        cumulative (list): Their cumulative weights, from _zipf_weights().
+        rng (random.Random): The random generator.
+
+    Returns:
+        The picked item.
+    """
+    index = bisect.bisect_right(cumulative, rng.random() * cumulative[-1])
+    return items[min(index, len(items) - 1)]
+
+
+def _terms(last, count):
+    """
+    Returns consecutive terms ending with a given one.
+
+    Args:
+        last (str): The last term code.
+        count (int): Number of terms.
+
+    Returns:
+        list: The term codes, oldest first.
+    """
+    year, number = int(last[:4]), int(last[5])
+    codes = []
+    for _ in range(count):
+        codes.append(f'{year}-{number}')
+        year, number = (year, number - 1) if number > 1 else (year - 1, 3)
+    return codes[::-1]
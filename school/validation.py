@@ -0,0 +1,37 @@
+"""
+The rules a student's or instructor's email and age must follow.
+
+They are the rules of ``SchoolStructs``, which the GUIs check records with,
+kept in the package so the command line, the HTTP server and the import,
+export and integrity checks work without the GUI modules.
+"""
+import re
+
+# What an email address must look like
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$')
+
+
+def validate_email(email):
+    """
+    Checks whether an email address is valid.
+
+    Args:
+        email (str): The email address.
+
+    Returns:
+        bool: True if the address has a valid form.
+    """
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def validate_age(age):
+    """
+    Checks whether an age is a non-negative integer.
+
+    Args:
+        age: The age.
+
+    Returns:
+        bool: True if the age is valid.
+    """
+    return isinstance(age, int) and age >= 0
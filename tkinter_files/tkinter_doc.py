@@ -6,6 +6,21 @@ from tkinter import ttk
 import sqlite3
 from tkinter import messagebox, filedialog
 import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# The shared data layer lives in the school package at the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from school.archive import clear
+from school.changes import ChangeWatcher, latest_token
+from school.database import Database
+from school.queries import SearchCache, iter_directory, iter_rows, normalize_search
+from school.records import delete_records
+from school.registration import REGISTERED, WAITLISTED, parse_keys, read_pairs_csv, register_pairs, summarize
 
 """[Summary]
 :param [ParamName]: [ParamDescription], defaults to [DefaultParamVal]
@@ -17,11 +32,299 @@ import csv
 :rty
 """
 
+class Cancelled(Exception):
+    """This exception is reported for a database job that the user cancelled before it finished."""
+
+
+class DatabaseWorker(threading.Thread):
+    """This is a background thread that does all the database work of the application on its own connection, so that the window keeps repainting during long operations.
+    Jobs run one at a time in the order they were submitted, and their outcomes are put on a result queue that the application reads by polling it with ``after()``.
+
+    :param db_name: the database file to open
+    :type db_name: str
+    """
+
+    def __init__(self, db_name):
+        """Constructor of the worker. The database is opened by the thread itself once it is started, since a connection can only be used by the thread that made it."""
+        super().__init__(name="DatabaseWorker", daemon=True)
+        self.db_name = db_name
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.connection = None
+        # Bumped by cancel(): jobs submitted before it are dropped or interrupted
+        self.generation = 0
+        self.next_job = 0
+
+    def run(self):
+        """This method opens the database, then runs the submitted jobs until stop() is called."""
+        try:
+            db = Database(self.db_name)
+        except Exception as e:
+            db, failure = None, e
+        else:
+            self.connection, failure = db.connection, None
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            job_id, generation, function, args = job
+            if failure is not None:
+                self.results.put((job_id, None, failure))
+                continue
+            if generation != self.generation:
+                # Cancelled while it was waiting its turn
+                self.results.put((job_id, None, Cancelled()))
+                continue
+            try:
+                self.results.put((job_id, function(self.connection, *args), None))
+            except Exception as e:
+                # An interrupted statement leaves the transaction open
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                self.results.put((job_id, None, Cancelled() if generation != self.generation else e))
+
+        if db is not None:
+            db.close()
+
+    def submit(self, function, *args):
+        """This method queues a job for the worker thread.
+
+        :param function: the job, called as ``function(connection, *args)`` in the worker thread
+        :type function: callable
+        :param args: the other arguments of the job
+        :return: the number of the job, which comes back with its outcome on the result queue
+        :rtype: int
+        """
+        self.next_job += 1
+        self.jobs.put((self.next_job, self.generation, function, args))
+        return self.next_job
+
+    def cancel(self):
+        """This method cancels every job submitted so far: the waiting ones are dropped and the SQL statement running now is interrupted. A job that finishes before the interruption reaches it still reports its result."""
+        self.generation += 1
+        if self.connection is not None:
+            # The one sqlite3 call that is safe from another thread
+            self.connection.interrupt()
+
+    def stop(self):
+        """This method asks the worker to close its connection and end once the jobs already queued are done."""
+        self.jobs.put(None)
+
+
+class ProgressiveTable:
+    """This is a table that shows hundreds of thousands of rows without freezing the window.
+    Only a window of rows around the visible ones is inserted into its ttk.Treeview: the scrollbar covers all the rows, and the window slides when the view comes near one of its edges. The rows of a window are inserted in small time-sliced chunks scheduled with ``after_idle()``, after the first screen, which is shown straight away.
+
+    :param parent: the widget that holds the table
+    :type parent: tk.Widget
+    :param options: the options of the ttk.Treeview, such as ``columns`` and ``show``
+    """
+    # Rows in the tree at most, around the visible ones
+    WINDOW_ROWS = 1000
+    # The window slides when the view comes this close to one of its edges
+    MARGIN_ROWS = 100
+    # Rows inserted straight away below the top of the view, enough to fill the screen
+    SCREEN_ROWS = 60
+    # Rows inserted between two looks at the clock
+    CHUNK_ROWS = 50
+    # Seconds spent inserting rows before the window gets to repaint and handle events
+    CHUNK_SECONDS = 0.01
+
+    def __init__(self, parent, **options):
+        """Constructor of the table. The tree is available as the ``tree`` attribute for headings, bindings and selection."""
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, **options)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.on_scrollbar)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', expand=True, fill='both')
+
+        self.rows = []
+        # Whether the rows are a whole table rather than a search, so rows added by other registrars belong in it
+        self.whole = True
+        # Position in self.rows of the first row in the tree, and how many rows of the window the tree holds
+        self.first = 0
+        self.filled = 0
+        self.fill_job = None
+
+    def selected_keys(self):
+        """This method returns the first value, the ID, of every selected row of the tree.
+
+        :return: the IDs, top to bottom
+        :rtype: list
+        """
+        return [self.tree.item(item, "values")[0] for item in self.tree.selection()]
+
+    def pack(self, **options):
+        """This method places the table in its parent with the pack geometry manager.
+
+        :param options: the options of ``pack()``
+        """
+        self.frame.pack(**options)
+
+    def set_rows(self, rows, whole=True):
+        """This method replaces the contents of the table, scrolled to the top.
+
+        :param rows: the rows to show
+        :type rows: list
+        :param whole: whether the rows are a whole table rather than the result of a search, defaults to True
+        :type whole: bool, optional
+        """
+        self.rows = rows
+        self.whole = whole
+        self.show_window(0, 0)
+
+    def patch(self, changed):
+        """This method replaces, removes and adds the rows that changed in the database, keeping the view where it is. The last value of every row is its database id; rows the table does not show yet are added at the end only when it holds a whole table.
+        Rows that were only replaced are updated in the tree in place, so the selection stays; otherwise the window is put back at the same place.
+
+        :param changed: the current row of each changed id, or None for a row that is gone
+        :type changed: dict
+        """
+        # Whether rows were removed or added, which moves the rows after them
+        shown, rows, reshaped = set(), [], False
+        for row in self.rows:
+            if row[-1] not in changed:
+                rows.append(row)
+                continue
+            shown.add(row[-1])
+            if changed[row[-1]] is None:
+                reshaped = True
+            else:
+                rows.append(changed[row[-1]])
+        if self.whole:
+            added = [row for key, row in changed.items() if row is not None and key not in shown]
+            rows.extend(added)
+            reshaped = reshaped or bool(added)
+
+        if not reshaped:
+            for position, item in enumerate(self.tree.get_children(), self.first):
+                if rows[position] is not self.rows[position]:
+                    self.tree.item(item, values=rows[position])
+            self.rows = rows
+            return
+        top = self.first + int(self.tree.yview()[0] * self.filled) if self.filled else 0
+        self.rows = rows
+        first = min(self.first, max(0, len(rows) - self.WINDOW_ROWS))
+        self.show_window(first, max(first, min(top, len(rows) - 1)))
+
+    def show_window(self, first, top):
+        """This method puts a new window of rows in the tree: the rows down to the end of the screen are inserted now and the others in chunks.
+
+        :param first: position of the first row of the window
+        :type first: int
+        :param top: position of the row shown at the top of the view
+        :type top: int
+        """
+        if self.fill_job is not None:
+            self.tree.after_cancel(self.fill_job)
+            self.fill_job = None
+        self.tree.delete(*self.tree.get_children())
+        self.first, self.filled = first, 0
+
+        self.insert_rows(min(top + self.SCREEN_ROWS, self.window_end()))
+        if self.filled:
+            self.tree.yview_moveto((top - first) / self.filled)
+        if self.first + self.filled < self.window_end():
+            self.fill_job = self.tree.after_idle(self.fill_chunk)
+
+    def window_end(self):
+        """This method gives the position after the last row of the current window.
+
+        :return: the end of the window
+        :rtype: int
+        """
+        return min(self.first + self.WINDOW_ROWS, len(self.rows))
+
+    def insert_rows(self, end):
+        """This method appends the next rows of the window to the tree.
+
+        :param end: the position after the last row to insert
+        :type end: int
+        """
+        for row in self.rows[self.first + self.filled:end]:
+            self.tree.insert("", "end", values=row)
+        self.filled = end - self.first
+
+    def fill_chunk(self):
+        """This method inserts rows of the window for a short time, then lets the window repaint before it carries on."""
+        self.fill_job = None
+        deadline = time.perf_counter() + self.CHUNK_SECONDS
+        end = self.window_end()
+        while self.first + self.filled < end and time.perf_counter() < deadline:
+            self.insert_rows(min(self.first + self.filled + self.CHUNK_ROWS, end))
+        if self.first + self.filled < end:
+            self.fill_job = self.tree.after_idle(self.fill_chunk)
+
+    def slide(self, top):
+        """This method centres the window on the rows the user is looking at.
+
+        :param top: position of the row to show at the top of the view
+        :type top: int
+        """
+        first = max(0, min(top - self.WINDOW_ROWS // 2, len(self.rows) - self.WINDOW_ROWS))
+        self.show_window(first, top)
+
+    def on_tree_scroll(self, top, bottom):
+        """This method is told by the tree which part of the window is visible. It moves the scrollbar to the same part of all the rows, and slides the window when the view nears one of its edges.
+
+        :param top: fraction of the window above the view
+        :type top: str
+        :param bottom: fraction of the window above the bottom of the view
+        :type bottom: str
+        """
+        total = len(self.rows)
+        if not self.filled:
+            self.scrollbar.set(0, 1)
+            return
+        top_row = self.first + float(top) * self.filled
+        bottom_row = self.first + float(bottom) * self.filled
+        self.scrollbar.set(top_row / total, bottom_row / total)
+
+        # While the window is still being filled, its bottom edge is not where it will end
+        if self.fill_job is not None:
+            return
+        near_top = self.first > 0 and top_row < self.first + self.MARGIN_ROWS
+        near_bottom = self.window_end() < total and bottom_row > self.window_end() - self.MARGIN_ROWS
+        if near_top or near_bottom:
+            self.slide(int(top_row))
+
+    def on_scrollbar(self, action, amount, unit=None):
+        """This method scrolls the table when the scrollbar is used. A drag to rows outside the window puts a new window around them.
+
+        :param action: 'moveto' or 'scroll'
+        :type action: str
+        :param amount: the fraction of all the rows to move to, or the number of units or pages to scroll
+        :type amount: str
+        :param unit: 'units' or 'pages' when scrolling, defaults to None
+        :type unit: str, optional
+        """
+        if action != 'moveto':
+            self.tree.yview(action, amount, unit)
+            return
+        top = max(0, min(int(float(amount) * len(self.rows)), len(self.rows) - 1))
+        if self.first <= top and top + self.SCREEN_ROWS <= self.first + self.filled:
+            self.tree.yview_moveto((top - self.first) / self.filled)
+        else:
+            self.slide(top)
+
+
 class App(tk.Tk):
     """ This is a Tkinter application for a school management system.
     It uses an SQLite database to store data about the students, courses and instructors.
     It offers a graphical user interface to create, remove, edit the data of this school, and allows to register students to the active courses. 
     """
+    # The rows of the tables. Each ends with the database id, which the tree does not show, so rows changed by other registrars can be found again
+    STUDENT_QUERY = "SELECT student_id, name, age, email, id FROM Students"
+    INSTRUCTOR_QUERY = "SELECT instructor_id, name, age, email, id FROM Instructors"
+    # Courses with the ID of their instructor as typed by the user, rather than the instructor's database key
+    COURSE_QUERY = "SELECT c.course_id, c.course_name, i.instructor_id, c.id FROM Courses c LEFT JOIN Instructors i ON i.id = c.instructor_id"
+    # Milliseconds between two looks at the worker's result queue while jobs are running
+    POLL_INTERVAL = 50
+    # Milliseconds between two looks at the rows the change watcher found changed
+    CHANGE_INTERVAL = 250
+
     def __init__(self):
         """Constructor of the application. This sets the application running."""
         super().__init__()
@@ -34,9 +337,17 @@ class App(tk.Tk):
         self.style.configure("Treeview", rowheight=25)
         self.style.configure("Treeview.Heading", font=("Arial", 12, "bold"))
         
-        self.connection = None
-        self.cursor = None
+        # Jobs sent to the database worker and not yet answered: job number -> (description, on_done, on_error)
+        self.pending = {}
+        self.poll_job = None
+        # Results of recent searches; only the worker thread uses it
+        self.search_cache = SearchCache()
+        self.watcher = None
+        self.change_job = None
         self.make_database()
+        self.create_status_bar()
+        # Queued before the tables are loaded, so no change made after they are read is missed
+        self.run_in_background(latest_token, "Watching for changes...", on_done=self.watch_changes)
 
         self.tabs = ttk.Notebook(self)
         self.tabs.pack(expand=1, fill="both")
@@ -66,49 +377,197 @@ class App(tk.Tk):
 
         self.update_button = None
 
+    def watch_changes(self, token):
+        """This method starts the thread that watches the database for the changes of other registrars, from a change log token on, and the regular look at what it found.
+
+        :param token: the last change already shown in the tables
+        :type token: int
+        """
+        self.watcher = ChangeWatcher(self.worker.db_name, self.fetch_changed, token)
+        self.watcher.start()
+        self.change_job = self.after(self.CHANGE_INTERVAL, self.apply_changes)
+
+    @staticmethod
+    def fetch_changed(connection, changed):
+        """This method reads the rows other registrars changed, as the tables of this application show them, in the thread of the change watcher.
+
+        :param connection: the watcher's database connection
+        :type connection: sqlite3.Connection
+        :param changed: the changed ids, keyed by 'Students', 'Instructors' or 'Courses'
+        :type changed: dict
+        :return: for each table, the current row of every changed id, or None for a row that is gone
+        :rtype: dict
+        """
+        queries = {"Students": (App.STUDENT_QUERY, "id"), "Instructors": (App.INSTRUCTOR_QUERY, "id"),
+                   "Courses": (App.COURSE_QUERY, "c.id")}
+        rows = {}
+        for table, ids in changed.items():
+            query, column = queries[table]
+            found = dict.fromkeys(ids)
+            for row in iter_rows(connection, f"{query} WHERE {column} IN (SELECT value FROM json_each(?))",
+                                 (json.dumps(list(ids)),)):
+                found[row[-1]] = row
+            rows[table] = found
+        return rows
+
+    def apply_changes(self):
+        """This method patches the tables with the rows the change watcher found changed, then looks again later. When the watcher asks for a reload instead, each table runs again the listing or the search it shows."""
+        self.change_job = None
+        tables = {"Students": (self.student_table, self.refresh_student_display, self.search_student),
+                  "Instructors": (self.instructor_table, self.refresh_instructor_display, self.search_instructor),
+                  "Courses": (self.course_table, self.refresh_course_display, self.search_course)}
+        while True:
+            try:
+                update = self.watcher.updates.get_nowait()
+            except queue.Empty:
+                break
+            if update is None:
+                for table, refresh, search in tables.values():
+                    if table.whole:
+                        refresh()
+                    else:
+                        search()
+                continue
+            for name, changed in update.items():
+                tables[name][0].patch(changed)
+        self.change_job = self.after(self.CHANGE_INTERVAL, self.apply_changes)
+
     def make_database(self):
-        """This method constructs the database that this application uses. It simply initializes each table for students, instructors, courses, registrations.
-        """
-        self.connection = sqlite3.connect("school_management.db")
-        self.cursor = self.connection.cursor()
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            student_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            age INTEGER CHECK(age >= 0),
-            email TEXT NOT NULL
-        )
-        ''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS instructors (
-            instructor_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            age INTEGER CHECK(age >= 0),
-            email TEXT NOT NULL
-        )
-        ''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS courses (
-            course_id TEXT PRIMARY KEY,
-            course_name TEXT NOT NULL,
-            instructor_id TEXT,
-            FOREIGN KEY (instructor_id) REFERENCES instructors (instructor_id)
-        )
-        ''')
-
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS registrations (
-            student_id TEXT,
-            course_id TEXT,
-            FOREIGN KEY(student_id) REFERENCES students(student_id),
-            FOREIGN KEY(course_id) REFERENCES courses(course_id)
-        )
-        ''')
-
-        self.connection.commit()
+        """This method starts the background worker that opens and uses the database of this application. The tables for students, instructors, courses and registrations are the same as the PyQt application's; a database made by older versions of this application is converted to them when it is opened.
+        """
+        self.worker = DatabaseWorker("school_management.db")
+        self.worker.start()
+
+    def create_status_bar(self):
+        """This method creates the bar at the bottom of the window that shows which database operation is running, with a progress bar and a button to cancel it."""
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side='bottom', fill='x', padx=5, pady=2)
+
+        self.status = tk.StringVar(value="Ready")
+        ttk.Label(status_frame, textvariable=self.status).pack(side='left')
+
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.cancel_work, state='disabled')
+        self.cancel_button.pack(side='right')
+
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=150)
+        self.progress.pack(side='right', padx=5)
+        self.busy = False
+
+    def run_in_background(self, function, description, *args, on_done=None, on_error=None):
+        """This method sends database work to the worker thread and arranges for its outcome to be handled on the Tk main loop once it is ready.
+
+        :param function: the job, called as ``function(connection, *args)`` in the worker thread
+        :type function: callable
+        :param description: what the job does, shown in the status bar while it runs
+        :type description: str
+        :param args: the other arguments of the job
+        :param on_done: called with the job's result when it succeeds, defaults to None
+        :type on_done: callable, optional
+        :param on_error: called with the exception when the job fails, defaults to showing it in an error messagebox
+        :type on_error: callable, optional
+        """
+        job = self.worker.submit(function, *args)
+        self.pending[job] = (description, on_done, on_error or self.show_error)
+        self.show_progress()
+        if self.poll_job is None:
+            self.poll_job = self.after(self.POLL_INTERVAL, self.poll_results)
+
+    def poll_results(self):
+        """This method hands the outcomes the worker has ready to their callbacks, and checks again later while jobs are still running."""
+        self.poll_job = None
+        while True:
+            try:
+                job, result, error = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            description, on_done, on_error = self.pending.pop(job)
+            if isinstance(error, Cancelled):
+                continue
+            if error is not None:
+                on_error(error)
+            elif on_done is not None:
+                on_done(result)
+
+        self.show_progress()
+        # A callback may have submitted more work, which already scheduled the next look
+        if self.pending and self.poll_job is None:
+            self.poll_job = self.after(self.POLL_INTERVAL, self.poll_results)
+
+    def show_progress(self):
+        """This method updates the status bar: the oldest running job is described and the progress bar moves while the worker is busy."""
+        if self.pending:
+            self.status.set(next(iter(self.pending.values()))[0])
+            if not self.busy:
+                self.progress.start()
+                self.cancel_button.config(state='normal')
+        else:
+            self.status.set("Ready")
+            if self.busy:
+                self.progress.stop()
+                self.cancel_button.config(state='disabled')
+        self.busy = bool(self.pending)
+
+    def cancel_work(self):
+        """This method cancels the running and waiting database jobs. Their results are dropped, and any change they were making is rolled back."""
+        self.worker.cancel()
+        self.status.set("Cancelling...")
+
+    def show_error(self, error):
+        """This method is the default error handler of background jobs: it shows the error in a messagebox.
+
+        :param error: the exception raised by the job
+        :type error: Exception
+        """
+        messagebox.showerror("Error", str(error))
+
+    @staticmethod
+    def fetch_rows(connection, query, params=()):
+        """This method runs a query in the worker thread and returns its rows.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param query: the SELECT statement
+        :type query: str
+        :param params: the values of its placeholders, defaults to ()
+        :type params: tuple, optional
+        :return: the rows
+        :rtype: list
+        """
+        return connection.execute(query, params).fetchall()
+
+    def search_rows(self, connection, tables, query, params):
+        """This method runs a search in the worker thread and returns its rows. A search repeated with none of its tables written to in between is answered from memory.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param tables: the tables the search reads
+        :type tables: tuple
+        :param query: the SELECT statement
+        :type query: str
+        :param params: the values of its placeholders, normalized with ``normalize_search()``
+        :type params: list
+        :return: the rows
+        :rtype: list
+        """
+        return list(self.search_cache.search(connection, tables, (query, tuple(params)),
+                                             lambda: connection.execute(query, params)))
+
+    @staticmethod
+    def write(connection, query, params):
+        """This method runs one INSERT, UPDATE or DELETE statement in the worker thread and commits it.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param query: the statement
+        :type query: str
+        :param params: the values of its placeholders
+        :type params: tuple
+        :return: the number of rows changed
+        :rtype: int
+        """
+        changed = connection.execute(query, params).rowcount
+        connection.commit()
+        return changed
 
     def input_student(self):
         """This method implements the ability of inputting the filled out data of a student in the text boxes into the database as long as they are correct. If the inputs are not valid, an error messagebox appears."""
@@ -121,19 +580,21 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please fill in all fields correctly.")
             return
 
-        try:
-            self.cursor.execute('''
-                INSERT INTO students (student_id, name, age, email)
-                VALUES (?, ?, ?, ?)
-            ''', (student_id, name, int(age), email))
-            self.connection.commit()
+        def added(_):
             messagebox.showinfo("Success", "Student added successfully!")
             self.clear_student_inputs()
             self.refresh_student_display()
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "Student ID already exists!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "Student ID or email already exists!")
+            else:
+                self.show_error(error)
+
+        self.run_in_background(self.write, "Adding the student...", '''
+                INSERT INTO Students (student_id, name, age, email)
+                VALUES (?, ?, ?, ?)
+            ''', (student_id, name, int(age), email), on_done=added, on_error=failed)
 
     def create_student(self):
         """
@@ -164,25 +625,23 @@ class App(tk.Tk):
         search_button = ttk.Button(student_frame, text="Search", command=self.search_student)
         search_button.pack(pady=5)
 
-        self.student_tree = ttk.Treeview(student_frame, columns=("ID", "Name", "Age", "Email"), show='headings')
-        self.student_tree.pack(expand=True, fill='both')
+        self.student_table = ProgressiveTable(student_frame, columns=("ID", "Name", "Age", "Email"), show='headings')
+        self.student_table.pack(expand=True, fill='both')
+        self.student_tree = self.student_table.tree
         self.student_tree.heading("ID", text="Student ID")
         self.student_tree.heading("Name", text="Name")
         self.student_tree.heading("Age", text="Age")
         self.student_tree.heading("Email", text="Email")
         self.student_tree.bind("<Double-1>", self.on_student_double_click)
+        self.student_tree.bind("<Delete>", lambda event: self.delete_student(self.student_id.get()))
         self.refresh_student_display()
 
     def refresh_student_display(self):
         """
         This method makes sure that the table of students is refreshed and shows its current contents
         """
-        for i in self.student_tree.get_children():
-            self.student_tree.delete(i)
-
-        self.cursor.execute("SELECT * FROM students")
-        for row in self.cursor.fetchall():
-            self.student_tree.insert("", "end", values=row)
+        self.run_in_background(self.fetch_rows, "Loading students...", self.STUDENT_QUERY,
+                               on_done=self.student_table.set_rows)
 
     def on_student_double_click(self, event):
         """
@@ -204,10 +663,21 @@ class App(tk.Tk):
         :param student_id: The ID of the student to edit.
         :type student_id: str
         """
-        self.cursor.execute("SELECT * FROM students WHERE student_id=?", (student_id,))
-        student = self.cursor.fetchone()
+        self.run_in_background(self.fetch_rows, "Loading the student...",
+                               "SELECT student_id, name, age, email FROM Students WHERE student_id=?", (student_id,),
+                               on_done=lambda rows: self.show_student(rows, student_id))
+
+    def show_student(self, rows, student_id):
+        """
+        This method fills the input fields with the student loaded for editing and shows the update and delete buttons.
 
-        if student:
+        :param rows: the student found, a list of at most one row
+        :type rows: list
+        :param student_id: The ID of the student to edit.
+        :type student_id: str
+        """
+        if rows:
+            student = rows[0]
             self.student_id.delete(0, tk.END)
             self.student_name.delete(0, tk.END)
             self.student_age.delete(0, tk.END)
@@ -241,29 +711,24 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please fill in all fields correctly.")
             return
 
-        try:
-            self.cursor.execute('''
-                UPDATE students
-                SET name=?, age=?, email=?
-                WHERE student_id=?
-            ''', (name, int(age), email, student_id))
-            self.connection.commit()
+        def updated(_):
             messagebox.showinfo("Success", "Student updated successfully!")
             self.clear_student_inputs()
             self.refresh_student_display()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.run_in_background(self.write, "Updating the student...", '''
+                UPDATE Students
+                SET name=?, age=?, email=?
+                WHERE student_id=?
+            ''', (name, int(age), email, student_id), on_done=updated)
 
     def search_student(self):
         """This method allows for the search of the student from the database using the chosen inputs in the textboxes"""
-        student_id_query = self.student_id.get()
-        name_query = self.student_name.get()
-        age_query = self.student_age.get()
+        student_id_query = normalize_search(self.student_id.get())
+        name_query = normalize_search(self.student_name.get())
+        age_query = normalize_search(self.student_age.get())
 
-        for i in self.student_tree.get_children():
-            self.student_tree.delete(i)  
-
-        query = "SELECT * FROM students WHERE 1=1"  
+        query = self.STUDENT_QUERY + " WHERE 1=1"
         params = []
 
         if student_id_query:
@@ -278,10 +743,8 @@ class App(tk.Tk):
             query += " AND age LIKE ?"
             params.append(age_query)
 
-
-        self.cursor.execute(query, params)
-        for row in self.cursor.fetchall():
-            self.student_tree.insert("", "end", values=row)
+        self.run_in_background(self.search_rows, "Searching students...", ("Students",), query, params,
+                               on_done=lambda rows: self.student_table.set_rows(rows, whole=False))
 
     def clear_student_inputs(self):
         """This method erases the inputs in the textboxes of the student fields"""
@@ -291,18 +754,63 @@ class App(tk.Tk):
         self.student_id.delete(0, tk.END)
 
     def delete_student(self, student_id):
-        """This method deletes the student chosen using the student_id from the database. Shows a success or error message accordingly.
+        """This method deletes the student chosen using the student_id from the database, or the students selected in the table if there are any. Shows a success or error message accordingly.
         
         :param student_id: the ID of the student to delete
         :type student_id: str
         """
-        try:
-            self.cursor.execute("DELETE FROM students WHERE student_id=?", (student_id,))
-            self.connection.commit()
-            messagebox.showinfo("Success", "Student deleted successfully!")
+        keys = self.keys_to_delete(self.student_table, student_id, "student")
+        if not keys:
+            return
+
+        def deleted(count):
+            messagebox.showinfo("Success", "Student deleted successfully!" if count == 1 else f"{count} students deleted successfully!")
             self.refresh_student_display()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.run_in_background(self.delete_by_keys, f"Deleting {len(keys)} student(s)...", "Students", "student_id", keys, on_done=deleted)
+
+    @staticmethod
+    def delete_by_keys(connection, table, column, keys):
+        """This method soft-deletes students, instructors or courses found by their IDs, in the worker thread, all in one transaction. The records leave the tables shown by the application but are kept for historical queries.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param table: 'Students', 'Instructors' or 'Courses'
+        :type table: str
+        :param column: the ID column of the table
+        :type column: str
+        :param keys: the IDs of the records
+        :type keys: list
+        :raises ValueError: if there is no record with one of the IDs
+        :return: the number of records deleted
+        :rtype: int
+        """
+        rows = []
+        for key in keys:
+            row = connection.execute(f"SELECT id, version FROM {table} WHERE {column}=?", (key,)).fetchone()
+            if row is None:
+                raise ValueError(f"There is no record with ID {key}.")
+            rows.append(row)
+        return delete_records(connection, table, rows)
+
+    def keys_to_delete(self, table, key, kind):
+        """This method gives the IDs to delete: the selected rows of the table, after a confirmation when there are several, or else the ID in the input fields.
+
+        :param table: the table of the tab
+        :type table: ProgressiveTable
+        :param key: the ID in the input fields
+        :type key: str
+        :param kind: 'student', 'instructor' or 'course', for the confirmation
+        :type kind: str
+        :return: the IDs, or an empty list if the deletion was not confirmed
+        :rtype: list
+        """
+        keys = table.selected_keys()
+        if not keys:
+            return [key]
+        if len(keys) > 1 and not messagebox.askyesno("Confirm", f"Delete the {len(keys)} selected {kind}s?"):
+            return []
+        return keys
 
     def input_instructor(self):
         """This method implements the ability of inputting the filled out data of an instructor in the text boxes into the database as long as they are correct. 
@@ -317,19 +825,21 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please fill in all fields correctly.")
             return
 
-        try:
-            self.cursor.execute('''
-                INSERT INTO instructors (instructor_id, name, age, email)
-                VALUES (?, ?, ?, ?)
-            ''', (instructor_id, name, int(age), email))
-            self.connection.commit()
+        def added(_):
             messagebox.showinfo("Success", "Instructor added successfully!")
             self.clear_instructor_inputs()
             self.refresh_instructor_display()
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "Instructor ID already exists!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "Instructor ID or email already exists!")
+            else:
+                self.show_error(error)
+
+        self.run_in_background(self.write, "Adding the instructor...", '''
+                INSERT INTO Instructors (instructor_id, name, age, email)
+                VALUES (?, ?, ?, ?)
+            ''', (instructor_id, name, int(age), email), on_done=added, on_error=failed)
 
     def create_instructor(self):
         """
@@ -360,39 +870,39 @@ class App(tk.Tk):
         search_button = ttk.Button(instructor_frame, text="Search", command=self.search_instructor)
         search_button.pack(pady=5)
 
-        self.instructor_tree = ttk.Treeview(instructor_frame, columns=("ID", "Name", "Age", "Email"), show='headings')
-        self.instructor_tree.pack(expand=True, fill='both')
+        self.instructor_table = ProgressiveTable(instructor_frame, columns=("ID", "Name", "Age", "Email"), show='headings')
+        self.instructor_table.pack(expand=True, fill='both')
+        self.instructor_tree = self.instructor_table.tree
         self.instructor_tree.heading("ID", text="Instructor ID")
         self.instructor_tree.heading("Name", text="Name")
         self.instructor_tree.heading("Age", text="Age")
         self.instructor_tree.heading("Email", text="Email")
         self.instructor_tree.bind("<Double-1>", self.on_instructor_double_click)
+        self.instructor_tree.bind("<Delete>", lambda event: self.delete_instructor(self.instructor_id.get()))
         self.refresh_instructor_display()
 
     def refresh_instructor_display(self):
         """
         This method makes sure that the table of instructors is refreshed and shows its current contents
         """
-        for i in self.instructor_tree.get_children():
-            self.instructor_tree.delete(i)
-
-        self.cursor.execute("SELECT * FROM instructors")
-        for row in self.cursor.fetchall():
-            self.instructor_tree.insert("", "end", values=row)
+        self.run_in_background(self.fetch_rows, "Loading instructors...", self.INSTRUCTOR_QUERY,
+                               on_done=self.instructor_table.set_rows)
 
     def delete_instructor(self, instructor_id):
-        """This method deletes the instructor chosen using the instructor_id from the database. Shows a success or error message accordingly.
+        """This method deletes the instructor chosen using the instructor_id from the database, or the instructors selected in the table if there are any. Shows a success or error message accordingly.
         
         :param instructor_id: the ID of the student to delete
         :type instructor_id: str
         """
-        try:
-            self.cursor.execute("DELETE FROM instructors WHERE instructor_id=?", (instructor_id,))
-            self.connection.commit()
-            messagebox.showinfo("Success", "Instructor deleted successfully!")
+        keys = self.keys_to_delete(self.instructor_table, instructor_id, "instructor")
+        if not keys:
+            return
+
+        def deleted(count):
+            messagebox.showinfo("Success", "Instructor deleted successfully!" if count == 1 else f"{count} instructors deleted successfully!")
             self.refresh_instructor_display()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.run_in_background(self.delete_by_keys, f"Deleting {len(keys)} instructor(s)...", "Instructors", "instructor_id", keys, on_done=deleted)
 
     def on_instructor_double_click(self, event):
         """
@@ -415,10 +925,21 @@ class App(tk.Tk):
         :param instructor_id: The ID of the instructor to edit.
         :type instructor_id: str
         """
-        self.cursor.execute("SELECT * FROM instructors WHERE instructor_id=?", (instructor_id,))
-        instructor = self.cursor.fetchone()
+        self.run_in_background(self.fetch_rows, "Loading the instructor...",
+                               "SELECT instructor_id, name, age, email FROM Instructors WHERE instructor_id=?", (instructor_id,),
+                               on_done=lambda rows: self.show_instructor(rows, instructor_id))
 
-        if instructor:
+    def show_instructor(self, rows, instructor_id):
+        """
+        This method fills the input fields with the instructor loaded for editing and shows the update and delete buttons.
+
+        :param rows: the instructor found, a list of at most one row
+        :type rows: list
+        :param instructor_id: The ID of the instructor to edit.
+        :type instructor_id: str
+        """
+        if rows:
+            instructor = rows[0]
             self.instructor_id.delete(0, tk.END)
             self.instructor_name.delete(0, tk.END)
             self.instructor_age.delete(0, tk.END)
@@ -453,30 +974,24 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please fill in all fields correctly.")
             return
 
-        try:
-            self.cursor.execute('''
-                UPDATE instructors
-                SET name=?, age=?, email=?
-                WHERE instructor_id=?
-            ''', (name, int(age), email, instructor_id))
-            self.connection.commit()
+        def updated(_):
             messagebox.showinfo("Success", "Instructor updated successfully!")
             self.clear_instructor_inputs()
             self.refresh_instructor_display()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.run_in_background(self.write, "Updating the instructor...", '''
+                UPDATE Instructors
+                SET name=?, age=?, email=?
+                WHERE instructor_id=?
+            ''', (name, int(age), email, instructor_id), on_done=updated)
 
     def search_instructor(self):
         """This method allows for the selection of the instructor from the database using the chosen inputs in the textboxes."""
-        instructor_id_query = self.instructor_id.get()
-        name_query = self.instructor_name.get()
-        age_query = self.instructor_age.get()
-
-        for i in self.instructor_tree.get_children():
-            self.instructor_tree.delete(i) 
+        instructor_id_query = normalize_search(self.instructor_id.get())
+        name_query = normalize_search(self.instructor_name.get())
+        age_query = normalize_search(self.instructor_age.get())
 
-
-        query = "SELECT * FROM instructors WHERE 1=1"  
+        query = self.INSTRUCTOR_QUERY + " WHERE 1=1"
         params = []
 
         if instructor_id_query:
@@ -490,11 +1005,9 @@ class App(tk.Tk):
         if age_query:
             query += " AND age LIKE ?"
             params.append(age_query)
-        self.cursor.execute(query, params)
-        
 
-        for row in self.cursor.fetchall():
-            self.instructor_tree.insert("", "end", values=row)
+        self.run_in_background(self.search_rows, "Searching instructors...", ("Instructors",), query, params,
+                               on_done=lambda rows: self.instructor_table.set_rows(rows, whole=False))
 
     def clear_instructor_inputs(self):
         """This method erases the inputs in the textboxes of the instructor fields"""
@@ -516,19 +1029,21 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please fill in all fields correctly.")
             return
 
-        try:
-            self.cursor.execute('''
-                INSERT INTO courses (course_id, course_name, instructor_id)
-                VALUES (?, ?, ?)
-            ''', (course_id, course_name, instructor_id))
-            self.connection.commit()
+        def added(_):
             messagebox.showinfo("Success", "Course added successfully!")
             self.clear_course_inputs()
             self.refresh_course_display()
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "Course ID already exists!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", "Course ID already exists!")
+            else:
+                self.show_error(error)
+
+        self.run_in_background(self.write_course, "Adding the course...", '''
+                INSERT INTO Courses (course_id, course_name, instructor_id)
+                VALUES (:course_id, :course_name, :instructor)
+            ''', {"course_id": course_id, "course_name": course_name}, instructor_id, on_done=added, on_error=failed)
 
     def create_course(self):
         """
@@ -555,38 +1070,38 @@ class App(tk.Tk):
         search_button = ttk.Button(course_frame, text="Search", command=self.search_course)
         search_button.pack(pady=5)
 
-        self.course_tree = ttk.Treeview(course_frame, columns=("ID", "Course Name", "Instructor ID"), show='headings')
-        self.course_tree.pack(expand=True, fill='both')
+        self.course_table = ProgressiveTable(course_frame, columns=("ID", "Course Name", "Instructor ID"), show='headings')
+        self.course_table.pack(expand=True, fill='both')
+        self.course_tree = self.course_table.tree
         self.course_tree.heading("ID", text="Course ID")
         self.course_tree.heading("Course Name", text="Course Name")
         self.course_tree.heading("Instructor ID", text="Instructor ID")
         self.course_tree.bind("<Double-1>", self.on_course_double_click)
+        self.course_tree.bind("<Delete>", lambda event: self.delete_course(self.course_id.get()))
         self.refresh_course_display()
 
     def refresh_course_display(self):
         """
         This method makes sure that the table of courses is refreshed and shows its current contents
         """
-        for i in self.course_tree.get_children():
-            self.course_tree.delete(i)
-
-        self.cursor.execute("SELECT * FROM courses")
-        for row in self.cursor.fetchall():
-            self.course_tree.insert("", "end", values=row)
+        self.run_in_background(self.fetch_rows, "Loading courses...", self.COURSE_QUERY,
+                               on_done=self.course_table.set_rows)
 
     def delete_course(self, course_id):
-        """This method deletes the course chosen using the course_id from the database. Shows a success or error message accordingly.
+        """This method deletes the course chosen using the course_id from the database, or the courses selected in the table if there are any. Shows a success or error message accordingly.
         
         :param course_id: the ID of the student to delete
         :type course_id: str
         """
-        try:
-            self.cursor.execute("DELETE FROM courses WHERE course_id=?", (course_id,))
-            self.connection.commit()
-            messagebox.showinfo("Success", "Course deleted successfully!")
+        keys = self.keys_to_delete(self.course_table, course_id, "course")
+        if not keys:
+            return
+
+        def deleted(count):
+            messagebox.showinfo("Success", "Course deleted successfully!" if count == 1 else f"{count} courses deleted successfully!")
             self.refresh_course_display()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.run_in_background(self.delete_by_keys, f"Deleting {len(keys)} course(s)...", "Courses", "course_id", keys, on_done=deleted)
 
     def on_course_double_click(self, event):
         """
@@ -608,10 +1123,21 @@ class App(tk.Tk):
         :param course_id: The ID of the course to edit.
         :type course_id: str
         """
-        self.cursor.execute("SELECT * FROM courses WHERE course_id=?", (course_id,))
-        course = self.cursor.fetchone()
+        self.run_in_background(self.fetch_rows, "Loading the course...",
+                               self.COURSE_QUERY + " WHERE c.course_id=?", (course_id,),
+                               on_done=lambda rows: self.show_course(rows, course_id))
+
+    def show_course(self, rows, course_id):
+        """
+        This method fills the input fields with the course loaded for editing and shows the update and delete buttons.
 
-        if course:
+        :param rows: the course found, a list of at most one row
+        :type rows: list
+        :param course_id: The ID of the course to edit.
+        :type course_id: str
+        """
+        if rows:
+            course = rows[0]
             self.course_id.delete(0, tk.END)
             self.course_name.delete(0, tk.END)
             self.course_instructor_id.delete(0, tk.END)
@@ -642,42 +1168,70 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please fill in all fields correctly.")
             return
 
-        try:
-            self.cursor.execute('''
-                UPDATE courses
-                SET course_name=?, instructor_id=?
-                WHERE course_id=?
-            ''', (course_name, instructor_id, course_id))
-            self.connection.commit()
+        def updated(_):
             messagebox.showinfo("Success", "Course updated successfully!")
             self.clear_course_inputs()
             self.refresh_course_display()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.run_in_background(self.write_course, "Updating the course...", '''
+                UPDATE Courses
+                SET course_name=:course_name, instructor_id=:instructor
+                WHERE course_id=:course_id
+            ''', {"course_id": course_id, "course_name": course_name}, instructor_id, on_done=updated)
 
     def search_course(self):
         """This method allows for the selection of the course from the database using the chosen inputs in the textboxes"""
-        course_id_query = self.course_id.get()
-        course_name_query = self.course_name.get()
-
-        for i in self.course_tree.get_children():
-            self.course_tree.delete(i)  
+        course_id_query = normalize_search(self.course_id.get())
+        course_name_query = normalize_search(self.course_name.get())
 
-        query = "SELECT * FROM courses WHERE 1=1"  
+        query = self.COURSE_QUERY + " WHERE 1=1"  
         params = []
 
         if course_id_query:
-            query += " AND course_id LIKE ?"
+            query += " AND c.course_id LIKE ?"
             params.append(f"%{course_id_query}%")
 
         if course_name_query:
-            query += " AND course_name LIKE ?"
+            query += " AND c.course_name LIKE ?"
             params.append(f"%{course_name_query}%")
 
-        self.cursor.execute(query, params)
-        
-        for row in self.cursor.fetchall():
-            self.course_tree.insert("", "end", values=row)
+        self.run_in_background(self.search_rows, "Searching courses...", ("Courses", "Instructors"), query, params,
+                               on_done=lambda rows: self.course_table.set_rows(rows, whole=False))
+
+    @staticmethod
+    def find_instructor(connection, instructor_id):
+        """This method looks up the database key of the instructor with the given instructor ID.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param instructor_id: the instructor ID typed by the user
+        :type instructor_id: str
+        :return: the ``id`` of the instructor, or None if there is no such instructor
+        :rtype: int
+        """
+        row = connection.execute("SELECT id FROM Instructors WHERE instructor_id=?", (instructor_id,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def write_course(connection, query, params, instructor_id):
+        """This method adds or updates a course in the worker thread, once the instructor ID typed by the user is turned into the instructor's database key.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param query: the INSERT or UPDATE statement, with the instructor's key as the ``:instructor`` placeholder
+        :type query: str
+        :param params: the values of the other named placeholders
+        :type params: dict
+        :param instructor_id: the instructor ID typed by the user
+        :type instructor_id: str
+        :raises ValueError: if there is no instructor with this ID
+        :return: the number of rows changed
+        :rtype: int
+        """
+        instructor = App.find_instructor(connection, instructor_id)
+        if instructor is None:
+            raise ValueError("Instructor ID not found!")
+        return App.write(connection, query, {**params, "instructor": instructor})
 
     def clear_course_inputs(self):
         """This method erases the inputs in the textboxes of the course fields"""
@@ -698,14 +1252,39 @@ class App(tk.Tk):
         register_button = tk.Button(self.registration_tab, text="Register", command=self.register_student)
         register_button.pack(pady=10)
 
+        bulk_frame = ttk.LabelFrame(self.registration_tab, text="Bulk Registration")
+        bulk_frame.pack(pady=10, padx=10, fill='both', expand=True)
+
+        tk.Label(bulk_frame, text="Students (ID or email, one per line)").grid(row=0, column=0)
+        self.bulk_students = tk.Text(bulk_frame, height=6, width=30)
+        self.bulk_students.grid(row=1, column=0, padx=5)
+
+        tk.Label(bulk_frame, text="Courses (ID or name, one per line)").grid(row=0, column=1)
+        self.bulk_courses = tk.Text(bulk_frame, height=6, width=30)
+        self.bulk_courses.grid(row=1, column=1, padx=5)
+
+        ttk.Button(bulk_frame, text="Register All", command=self.bulk_register).grid(row=2, column=0, pady=5)
+        ttk.Button(bulk_frame, text="Import Pairs from CSV", command=self.bulk_register_csv).grid(row=2, column=1, pady=5)
+
+        self.bulk_report = ttk.Treeview(bulk_frame, columns=("Student", "Course", "Outcome"), show='headings', height=6)
+        self.bulk_report.grid(row=3, column=0, columnspan=2, sticky='nsew')
+        self.bulk_report.heading("Student", text="Student")
+        self.bulk_report.heading("Course", text="Course")
+        self.bulk_report.heading("Outcome", text="Outcome")
+
         self.populate_comboboxes()  
 
     def populate_comboboxes(self):
         """
         This method populates the comboboxes for selecting student ID and course ID from the database.
         """
-        self.registration_student_id['values'] = [student[0] for student in self.cursor.execute("SELECT student_id FROM students").fetchall()]
-        self.registration_course_id['values'] = [course[0] for course in self.cursor.execute("SELECT course_id FROM courses").fetchall()]
+        def fill(combobox):
+            return lambda rows: combobox.configure(values=[row[0] for row in rows])
+
+        self.run_in_background(self.fetch_rows, "Loading student IDs...", "SELECT student_id FROM Students",
+                               on_done=fill(self.registration_student_id))
+        self.run_in_background(self.fetch_rows, "Loading course IDs...", "SELECT course_id FROM Courses",
+                               on_done=fill(self.registration_course_id))
 
     def register_student(self):
         """This method lets student register to a course according to the dropdown inputs. A messagebox shows whether the registration worked or an error occured."""
@@ -716,13 +1295,66 @@ class App(tk.Tk):
             messagebox.showerror("Error", "Please select both Student ID and Course ID.")
             return
 
-        try:
-            self.cursor.execute('''INSERT INTO registrations (student_id, course_id) VALUES (?, ?)''', (student_id, course_id))
-            self.connection.commit()
-            messagebox.showinfo("Success", "Course registered successfully!")
-            self.clear_registration_inputs()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def registered(outcomes):
+            outcome = outcomes[0]
+            if outcome.status == REGISTERED:
+                messagebox.showinfo("Success", "Course registered successfully!")
+                self.clear_registration_inputs()
+            elif outcome.status == WAITLISTED:
+                messagebox.showinfo("Waitlisted", "The course is full, so the student was put on its waitlist.")
+                self.clear_registration_inputs()
+            else:
+                messagebox.showerror("Error", outcome.status)
+
+        self.run_in_background(register_pairs, "Registering the student...", [(student_id, course_id)], on_done=registered)
+
+    def bulk_register(self):
+        """This method registers every student typed in the bulk registration box into every course typed next to it, then shows the outcome of each pair."""
+        students = parse_keys(self.bulk_students.get("1.0", tk.END))
+        courses = parse_keys(self.bulk_courses.get("1.0", tk.END))
+
+        if not students or not courses:
+            messagebox.showerror("Error", "Please enter at least one student and one course.")
+            return
+
+        self.run_in_background(register_pairs, "Registering students...",
+                               [(student, course) for student in students for course in courses],
+                               on_done=self.show_bulk_registration)
+
+    def bulk_register_csv(self):
+        """This method registers the (student, course) pairs listed in a .csv file chosen by the user."""
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not file_path:
+            return
+
+        self.run_in_background(self.register_csv, "Registering students from the file...", file_path,
+                               on_done=self.show_bulk_registration)
+
+    @staticmethod
+    def register_csv(connection, file_path):
+        """This method reads the pairs of a .csv file and registers them all in one transaction, in the worker thread.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param file_path: the .csv file, one (student, course) pair per row
+        :type file_path: str
+        :return: the outcome of each pair
+        :rtype: list
+        """
+        return register_pairs(connection, read_pairs_csv(file_path))
+
+    def show_bulk_registration(self, outcomes):
+        """This method fills the report table with the outcome of each pair of a bulk registration and sums them up in a messagebox.
+
+        :param outcomes: the outcome of each (student, course) pair
+        :type outcomes: list
+        """
+        self.bulk_report.delete(*self.bulk_report.get_children())
+        for outcome in outcomes:
+            self.bulk_report.insert("", "end", values=outcome)
+
+        counts = summarize(outcomes)
+        messagebox.showinfo("Bulk Registration", "\n".join(f"{status}: {count}" for status, count in counts.items()))
 
     def clear_registration_inputs(self):
         """This method clears the dropdown inputs for the course registration."""
@@ -742,8 +1374,9 @@ class App(tk.Tk):
         self.clear_button = ttk.Button(control_frame, text="Clear Database", command=self.clear_database)
         self.clear_button.pack(side='right', padx=5)
 
-        self.display_tree = ttk.Treeview(display_frame, columns=("Type", "ID", "Name", "Age", "Email"), show='headings')
-        self.display_tree.pack(expand=True, fill='both', padx=5, pady=5)
+        self.display_table = ProgressiveTable(display_frame, columns=("Type", "ID", "Name", "Age", "Email"), show='headings')
+        self.display_table.pack(expand=True, fill='both', padx=5, pady=5)
+        self.display_tree = self.display_table.tree
         self.display_tree.heading("Type", text="Type")
         self.display_tree.heading("ID", text="ID")
         self.display_tree.heading("Name", text="Name")
@@ -758,26 +1391,8 @@ class App(tk.Tk):
 
     def display_all(self):
         """This method displays all the records in the database tree view"""
-        for i in self.display_tree.get_children():
-            self.display_tree.delete(i) 
-
-        self.cursor.execute("SELECT 'Student' AS Type, student_id, name, age, email FROM students")
-        students = self.cursor.fetchall()
-
-        for row in students:
-            self.display_tree.insert("", "end", values=row)
-
-        self.cursor.execute("SELECT 'Instructor' AS Type, instructor_id, name, age, email FROM instructors")
-        instructors = self.cursor.fetchall()
-
-        for row in instructors:
-            self.display_tree.insert("", "end", values=row)
-
-        self.cursor.execute("SELECT 'Course' AS Type, course_id, course_name, NULL AS age, NULL AS email FROM courses")
-        courses = self.cursor.fetchall()
-
-        for row in courses:
-            self.display_tree.insert("", "end", values=row)
+        self.run_in_background(lambda connection: list(iter_directory(connection)), "Loading all records...",
+                               on_done=self.display_table.set_rows)
 
     def export(self):
         """This method allows for the export of the database to a .csv file. A messagebox shows whether this was successful or not"""
@@ -786,38 +1401,46 @@ class App(tk.Tk):
         if not file_path:
             return  
 
-        try:
-            with open(file_path, mode='w', newline='') as csvfile:
-                csv_writer = csv.writer(csvfile)
-                csv_writer.writerow(["Type", "ID", "Name", "Age", "Email"])
-                self.cursor.execute("SELECT 'Student', student_id, name, age, email FROM students")
-                csv_writer.writerows(self.cursor.fetchall())
-                self.cursor.execute("SELECT 'Instructor', instructor_id, name, age, email FROM instructors")
-                csv_writer.writerows(self.cursor.fetchall())
-                self.cursor.execute("SELECT 'Course', course_id, course_name, NULL AS age, NULL AS email FROM courses")
-                csv_writer.writerows(self.cursor.fetchall())
-
-            messagebox.showinfo("Success", "Data exported successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.run_in_background(self.write_csv, "Exporting to CSV...", file_path,
+                               on_done=lambda _: messagebox.showinfo("Success", "Data exported successfully!"))
+
+    @staticmethod
+    def write_csv(connection, file_path):
+        """This method writes every record of the directory table to a .csv file, in the worker thread.
+
+        :param connection: the worker's database connection
+        :type connection: sqlite3.Connection
+        :param file_path: the file to write
+        :type file_path: str
+        """
+        with open(file_path, mode='w', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(["Type", "ID", "Name", "Age", "Email"])
+            # One scan of the directory table, written a batch at a time as it is read
+            csv_writer.writerows(iter_directory(connection))
 
     def clear_database(self):
         """
         This method clears all tables from the database after user confirmation.
         """
         if messagebox.askyesno("Confirm", "Are you sure you want to clear the database?"):
-            self.cursor.execute("DROP TABLE IF EXISTS registrations")
-            self.cursor.execute("DROP TABLE IF EXISTS courses")
-            self.cursor.execute("DROP TABLE IF EXISTS instructors")
-            self.cursor.execute("DROP TABLE IF EXISTS students")
-            self.connection.commit()
-            messagebox.showinfo("Success", "Database cleared!")
+            # Records are soft-deleted, so they can still be found in historical queries
+            self.run_in_background(clear, "Clearing the database...",
+                                   on_done=lambda _: messagebox.showinfo("Success", "Database cleared!"))
 
     def on_closing(self):
         """
-        This handles the cleanup when the application is closed, including closing the database connection.
+        This handles the cleanup when the application is closed: running database work is cancelled and the worker and the change watcher close their connections.
         """
-        self.connection.close()
+        self.worker.cancel()
+        self.worker.stop()
+        self.worker.join(timeout=5)
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.poll_job is not None:
+            self.after_cancel(self.poll_job)
+        if self.change_job is not None:
+            self.after_cancel(self.change_job)
         self.destroy()
 
 if __name__ == "__main__":